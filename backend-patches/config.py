@@ -33,6 +33,22 @@ class Config(BaseSettings):
     # Local database settings
     SQLITE_DB_PATH: str = "./data/sqlite/suna.db"
     VECTOR_STORE_PATH: str = "./data/vector_store"
+    BLOB_STORE_PATH: str = "./data/blobs"
+    MESSAGE_COMPRESSION_ENABLED: bool = False  # Compress large message payloads in SQLite
+    MESSAGE_COMPRESSION_THRESHOLD: int = 4096  # Bytes of content above which messages are compressed
+    THREAD_ARCHIVE_PATH: str = "./data/sqlite/archive"
+    THREAD_ARCHIVE_AFTER_DAYS: int = 30  # Idle days before a thread moves to the archive (0 disables)
+    THREAD_ARCHIVE_FORMAT: str = "sqlite"  # "sqlite" (monthly archive databases) or "ndjson" (gzipped, per thread)
+    THREAD_ARCHIVE_INTERVAL: int = 3600  # Seconds between archiving passes
+    SQLITE_BACKUP_PATH: str = "./data/sqlite/backups"
+    SQLITE_BACKUP_INTERVAL: int = 21600  # Seconds between online snapshots (0 disables)
+    SQLITE_BACKUP_RETENTION: int = 7  # Snapshots kept
+    SQLITE_BACKUP_PAGES_PER_STEP: int = 256  # Pages copied per backup step
+    SQLITE_BACKUP_STEP_SLEEP: float = 0.01  # Seconds to pause between backup steps
+    
+    # Per-turn tool selection (small local models have little context to spare)
+    TOOL_SELECTION_ENABLED: bool = True
+    TOOL_SELECTION_MAX_TOOLS: int = 4
     
     # Redis settings
     REDIS_URL: str = "redis://localhost:6379"
@@ -54,6 +70,15 @@ class Config(BaseSettings):
     MAX_TOKENS: int = 4096
     TEMPERATURE: float = 0.7
     
+    # LLM request hedging
+    LLM_HEDGE_ENABLED: bool = False
+    LLM_HEDGE_API_BASE: Optional[str] = None
+    LLM_HEDGE_MODEL: Optional[str] = None
+    LLM_HEDGE_PERCENTILE: float = 95.0
+    LLM_HEDGE_MIN_DELAY: float = 1.0
+    LLM_HEDGE_INITIAL_DELAY: float = 5.0
+    LLM_HEDGE_BUDGET: float = 0.1
+    
     # Local mode settings
     LOCAL_USER_ID: str = "local-user-123"
     LOCAL_PROJECT_ID: str = "local-project-123"
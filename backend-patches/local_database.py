@@ -7,19 +7,250 @@ import sqlite3
 import json
 import uuid
 import asyncio
-from datetime import datetime, timezone
+import re
+import os
+import time
+import gzip
+import shutil
+import threading
+import base64
+import zlib
+from collections import Counter
+from datetime import datetime, timezone, timedelta
 from typing import Dict, List, Any, Optional, Union
 from contextlib import asynccontextmanager
 import aiosqlite
 from utils.logger import logger
 from utils.config import config, is_local_mode
+from services.pagination import encode_cursor, decode_cursor
+from utils.token_cache import token_cache
+
+# Message types indexed for full-text search
+SEARCHABLE_MESSAGE_TYPES = ("user", "assistant", "tool")
+SNIPPET_START = "<mark>"
+SNIPPET_END = "</mark>"
+SNIPPET_TOKENS = 16
+
+# Plain text of a message: the "content" field of LLM message JSON, or the raw content
+_MESSAGE_TEXT_SQL = """
+    CASE WHEN json_valid({content}) AND json_type({content}, '$.content') = 'text'
+         THEN json_extract({content}, '$.content') ELSE {content} END
+"""
+_SEARCHABLE_TYPES_SQL = ", ".join(f"'{t}'" for t in SEARCHABLE_MESSAGE_TYPES)
+
+# FTS5 index over message text, kept in sync with the messages table by triggers.
+# Index rows share the rowid of their message. Compressed messages cannot be read
+# in SQL, so add_message indexes them itself; changing only the codec of a message
+# (compressing it) leaves its text and index row as they are. Messages of archived
+# threads stay searchable: their index rows move to negative rowids, described by
+# archived_messages (see archive_idle_threads), which new messages never reuse.
+_SEARCH_INDEX_SCHEMA = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+        body,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    "DROP TRIGGER IF EXISTS messages_fts_insert",
+    "DROP TRIGGER IF EXISTS messages_fts_delete",
+    "DROP TRIGGER IF EXISTS messages_fts_update",
+    f"""
+    CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages
+    WHEN new.type IN ({_SEARCHABLE_TYPES_SQL}) AND new.content_codec IS NULL
+    BEGIN
+        INSERT INTO messages_fts (rowid, body) VALUES (new.rowid, {_MESSAGE_TEXT_SQL.format(content="new.content")});
+    END
+    """,
+    """
+    CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages
+    BEGIN
+        DELETE FROM messages_fts WHERE rowid = old.rowid;
+    END
+    """,
+    f"""
+    CREATE TRIGGER messages_fts_update AFTER UPDATE OF content, type ON messages
+    WHEN new.content_codec IS NULL AND old.content_codec IS NULL
+    BEGIN
+        DELETE FROM messages_fts WHERE rowid = old.rowid;
+        INSERT INTO messages_fts (rowid, body)
+        SELECT new.rowid, {_MESSAGE_TEXT_SQL.format(content="new.content")}
+        WHERE new.type IN ({_SEARCHABLE_TYPES_SQL});
+    END
+    """,
+]
+
+# Message compression: content above the threshold is stored as a zlib blob,
+# optionally with a preset dictionary trained on the database's own messages.
+# messages.content_codec is NULL for plain text, "zlib" or "zlib:<dictionary id>".
+COMPRESSION_LEVEL = 6
+DICTIONARY_SIZE = 32 * 1024     # zlib uses at most the last 32KB of a preset dictionary
+DICTIONARY_SAMPLE_SIZE = 2000   # Messages sampled to train a dictionary
+
+
+def _message_text(content: str) -> str:
+    """Plain text of a message, as indexed for search (see _MESSAGE_TEXT_SQL)"""
+    try:
+        parsed = json.loads(content)
+    except (TypeError, ValueError):
+        return content
+    if isinstance(parsed, dict) and isinstance(parsed.get("content"), str):
+        return parsed["content"]
+    return content
+
+
+def _train_dictionary(samples: List[str], size: int = DICTIONARY_SIZE) -> bytes:
+    """Build a zlib preset dictionary from the most frequent fragments of sample messages.
+    
+    Fragments are scored by frequency times length. The best ones go last,
+    where zlib finds them at the shortest distances.
+    """
+    counts = Counter()
+    for sample in samples:
+        counts.update(set(re.findall(r'[^\s]{4,64}\s?', sample)))
+    fragments, total = [], 0
+    for fragment, count in sorted(counts.items(), key=lambda item: item[1] * len(item[0]), reverse=True):
+        if count < 2:
+            break
+        encoded = fragment.encode("utf-8")
+        if total + len(encoded) > size:
+            continue
+        fragments.append(encoded)
+        total += len(encoded)
+    return b"".join(reversed(fragments))
+
+
+# Days an applied usage batch ID is remembered (retries happen within minutes)
+USAGE_BATCH_RETENTION_DAYS = 7
+
+# Cold storage: tables whose rows move to the archive with their thread
+ARCHIVED_TABLES = ("messages", "agent_runs")
+
+# Online backups: snapshots are named "<database name>-<UTC timestamp>.db", with a
+# copy of the thread archive in "<database name>-<UTC timestamp>.archive"
+BACKUP_TIMESTAMP_FORMAT = "%Y%m%dT%H%M%S%fZ"
+# In a snapshot's archive copy: the version of each SQLite archive it holds
+ARCHIVE_MANIFEST = "manifest.json"
+
+
+class BackupCancelled(Exception):
+    """A snapshot was stopped before it was complete"""
+
+
+def _archive_snapshot_path(backup_path: str) -> str:
+    """Directory holding the copy of the thread archive taken with a snapshot"""
+    return f"{os.path.splitext(backup_path)[0]}.archive"
+
+
+def _archive_version(path: str) -> List[int]:
+    """Identify the contents of a SQLite archive: size, mtime and SQLite's file change counter
+    
+    Archives are not in WAL mode, so every write transaction increments the counter.
+    """
+    stat = os.stat(path)
+    with open(path, "rb") as f:
+        header = f.read(28)
+    return [stat.st_size, stat.st_mtime_ns, int.from_bytes(header[24:28], "big") if len(header) == 28 else 0]
+
+
+def _link_or_copy(source_path: str, target_path: str):
+    try:
+        os.link(source_path, target_path)
+    except OSError:
+        shutil.copy2(source_path, target_path)
+
+
+def _copy_archive(source_dir: str, target_dir: str, previous_dir: Optional[str] = None, snapshot: bool = False):
+    """Copy a thread archive directory (not in use by the database while copying)
+    
+    SQLite archives are copied with the backup API. For a snapshot, those
+    unchanged since an earlier snapshot copied them to `previous_dir` are
+    hard-linked from that copy instead: past months' archives only change when
+    a thread is rehydrated from them, so usually only the current month's is
+    copied. NDJSON archives are never modified once written, so they are
+    hard-linked where possible.
+    
+    Args:
+        source_dir: Thread archive to copy
+        target_dir: Directory created with the copy
+        previous_dir: Archive copy of an earlier snapshot, to reuse unchanged files from
+        snapshot: Record the version of each SQLite archive (ARCHIVE_MANIFEST) for later snapshots
+    """
+    previous = {}
+    if previous_dir and os.path.exists(os.path.join(previous_dir, ARCHIVE_MANIFEST)):
+        with open(os.path.join(previous_dir, ARCHIVE_MANIFEST)) as f:
+            previous = json.load(f)
+    versions = {}
+    os.makedirs(target_dir, exist_ok=True)
+    if os.path.isdir(source_dir):
+        for root, _, names in os.walk(source_dir):
+            target_root = os.path.join(target_dir, os.path.relpath(root, source_dir))
+            os.makedirs(target_root, exist_ok=True)
+            for name in names:
+                if name.endswith((".tmp", "-journal", "-wal", "-shm")) or name == ARCHIVE_MANIFEST:
+                    continue
+                source_path, target_path = os.path.join(root, name), os.path.join(target_root, name)
+                if not name.endswith(".db"):
+                    _link_or_copy(source_path, target_path)
+                    continue
+                relative_path = os.path.relpath(source_path, source_dir)
+                if snapshot:
+                    versions[relative_path] = _archive_version(source_path)
+                    if previous.get(relative_path) == versions[relative_path]:
+                        _link_or_copy(os.path.join(previous_dir, relative_path), target_path)
+                        continue
+                source = sqlite3.connect(f"file:{source_path}?mode=ro", uri=True)
+                target = sqlite3.connect(target_path)
+                try:
+                    source.backup(target)
+                finally:
+                    source.close()
+                    target.close()
+    if snapshot:
+        with open(os.path.join(target_dir, ARCHIVE_MANIFEST), "w") as f:
+            json.dump(versions, f)
+
+
+def _write_ndjson_archive(path: str, rows: Dict[str, List[Dict[str, Any]]]):
+    """Write a thread's rows as gzipped NDJSON ({"table": ..., "row": ...} per line)"""
+    tmp_path = f"{path}.tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        for table, table_rows in rows.items():
+            for row in table_rows:
+                # Compressed message content is binary
+                row = {k: {"$base64": base64.b64encode(v).decode()} if isinstance(v, bytes) else v for k, v in row.items()}
+                f.write(json.dumps({"table": table, "row": row}) + "\n")
+    os.replace(tmp_path, path)
+
+
+def _read_ndjson_archive(path: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Read a thread archive written by _write_ndjson_archive"""
+    rows: Dict[str, List[Dict[str, Any]]] = {}
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            row = {k: base64.b64decode(v["$base64"]) if isinstance(v, dict) and "$base64" in v else v
+                   for k, v in record["row"].items()}
+            rows.setdefault(record["table"], []).append(row)
+    return rows
+
+
+def _fts_query(text: str) -> Optional[str]:
+    """Turn free text into an FTS5 query matching all of its words"""
+    terms = re.findall(r"\w+", text)
+    return " ".join(f'"{term}"' for term in terms) or None
 
 
 class LocalDatabase:
     """Local SQLite database implementation"""
     
-    def __init__(self, db_path: str = None):
+    def __init__(self, db_path: str = None, archive_dir: str = None):
         self.db_path = db_path or config.SQLITE_DB_PATH
+        self.archive_dir = archive_dir or config.THREAD_ARCHIVE_PATH
+        self._dictionaries: Dict[int, bytes] = {}
+        self._rehydrate_locks: Dict[str, asyncio.Lock] = {}
+        # Held while threads move between the database and the archive, and while
+        # backups capture both, so a snapshot never sees a thread half moved
+        self.archive_lock = asyncio.Lock()
         self._ensure_db_directory()
     
     def _ensure_db_directory(self):
@@ -30,6 +261,11 @@ class LocalDatabase:
     async def initialize(self):
         """Initialize database with required tables"""
         async with aiosqlite.connect(self.db_path) as db:
+            # Let archiving return freed pages to the OS (takes effect on new databases and after VACUUM)
+            await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            # Readers (including online backups) never block writers
+            await db.execute("PRAGMA journal_mode = WAL")
+            
             # Users table
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS users (
@@ -111,11 +347,241 @@ class LocalDatabase:
                 )
             """)
             
+            # Usage rollups table (token/cost usage per account, model and day)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS usage_rollups (
+                    account_id TEXT,
+                    model TEXT,
+                    day TEXT,
+                    prompt_tokens INTEGER DEFAULT 0,
+                    completion_tokens INTEGER DEFAULT 0,
+                    cost REAL DEFAULT 0,
+                    request_count INTEGER DEFAULT 0,
+                    updated_at TEXT,
+                    PRIMARY KEY (account_id, model, day)
+                )
+            """)
+            
+            # Usage batches already added to the rollups (makes retried writes idempotent)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS usage_rollup_batches (
+                    batch_id TEXT PRIMARY KEY,
+                    applied_at TEXT
+                )
+            """)
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_usage_rollup_batches_applied ON usage_rollup_batches (applied_at)")
+            
+            # Compression marker of message content (NULL for plain text)
+            if "content_codec" not in await self._table_columns(db, "messages"):
+                await db.execute("ALTER TABLE messages ADD COLUMN content_codec TEXT")
+            
+            # Archive holding the messages of a cold thread (NULL while the thread is hot)
+            if "archive_path" not in await self._table_columns(db, "threads"):
+                await db.execute("ALTER TABLE threads ADD COLUMN archive_path TEXT")
+            
+            # Preset dictionaries for message compression
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS compression_dictionaries (
+                    id INTEGER PRIMARY KEY,
+                    data BLOB,
+                    created_at TEXT
+                )
+            """)
+            
+            # Search results for messages moved to the archive (rowid = their messages_fts rowid, < 0)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS archived_messages (
+                    rowid INTEGER PRIMARY KEY,
+                    message_id TEXT,
+                    thread_id TEXT,
+                    type TEXT,
+                    created_at TEXT
+                )
+            """)
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_archived_messages_thread ON archived_messages (thread_id)")
+            
+            # Indexes for keyset pagination of thread lists and message histories
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_threads_user_created ON threads (user_id, created_at, id)")
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_messages_thread_created ON messages (thread_id, created_at, id)")
+            
             await db.commit()
             
+            # Full-text search index over messages
+            await self._create_search_index(db)
+            
             # Create default user if not exists
             await self._create_default_user(db)
     
+    async def _create_search_index(self, db: aiosqlite.Connection):
+        """Create the FTS5 message index and its triggers, indexing existing messages once"""
+        cursor = await db.execute("SELECT 1 FROM sqlite_master WHERE name = 'messages_fts'")
+        exists = await cursor.fetchone() is not None
+        
+        for statement in _SEARCH_INDEX_SCHEMA:
+            await db.execute(statement)
+        if not exists:
+            await self._index_messages(db)
+            logger.info("Created full-text search index over messages")
+        await db.commit()
+    
+    async def _index_messages(self, db: aiosqlite.Connection, thread_id: str = None):
+        """Add searchable messages to the FTS5 index.
+        
+        Args:
+            thread_id: Only index the compressed messages of this thread (its plain
+                messages were indexed by the insert trigger); all messages if None
+        """
+        if thread_id is None:
+            await db.execute(f"""
+                INSERT INTO messages_fts (rowid, body)
+                SELECT rowid, {_MESSAGE_TEXT_SQL.format(content="content")}
+                FROM messages WHERE type IN ({_SEARCHABLE_TYPES_SQL}) AND content_codec IS NULL
+            """)
+        cursor = await db.execute(f"""
+            SELECT rowid, content, content_codec FROM messages
+            WHERE type IN ({_SEARCHABLE_TYPES_SQL}) AND content_codec IS NOT NULL
+            {"AND thread_id = ?" if thread_id else ""}
+        """, (thread_id,) if thread_id else ())
+        while rows := await cursor.fetchmany(1000):
+            decoded = [(row[0], _message_text(await self._decode_content(db, row[1], row[2]))) for row in rows]
+            await db.executemany("INSERT INTO messages_fts (rowid, body) VALUES (?, ?)", decoded)
+    
+    # Message compression
+    async def _get_dictionary(self, db: aiosqlite.Connection, dictionary_id: int) -> bytes:
+        """Get a compression dictionary, cached in memory"""
+        if dictionary_id not in self._dictionaries:
+            cursor = await db.execute("SELECT data FROM compression_dictionaries WHERE id = ?", (dictionary_id,))
+            row = await cursor.fetchone()
+            if row is None:
+                raise ValueError(f"Compression dictionary {dictionary_id} not found")
+            self._dictionaries[dictionary_id] = bytes(row[0])
+        return self._dictionaries[dictionary_id]
+    
+    async def _get_latest_dictionary_id(self, db: aiosqlite.Connection) -> Optional[int]:
+        """Get the ID of the newest compression dictionary, if any was trained"""
+        cursor = await db.execute("SELECT max(id) FROM compression_dictionaries")
+        return (await cursor.fetchone())[0]
+    
+    async def _encode_content(self, db: aiosqlite.Connection, content: str, dictionary_id: Optional[int]):
+        """Compress content, using a dictionary if given.
+        
+        Returns:
+            Tuple of (stored content, codec marker)
+        """
+        if dictionary_id is None:
+            return zlib.compress(content.encode("utf-8"), COMPRESSION_LEVEL), "zlib"
+        compressor = zlib.compressobj(COMPRESSION_LEVEL, zdict=await self._get_dictionary(db, dictionary_id))
+        return compressor.compress(content.encode("utf-8")) + compressor.flush(), f"zlib:{dictionary_id}"
+    
+    async def _decode_content(self, db: aiosqlite.Connection, content: Any, codec: Optional[str]) -> str:
+        """Decompress content stored by _encode_content (plain content is returned as is)"""
+        if not codec:
+            return content
+        name, _, dictionary_id = codec.partition(":")
+        if name != "zlib":
+            raise ValueError(f"Unknown content codec: {codec}")
+        if not dictionary_id:
+            return zlib.decompress(content).decode("utf-8")
+        decompressor = zlib.decompressobj(zdict=await self._get_dictionary(db, int(dictionary_id)))
+        return (decompressor.decompress(content) + decompressor.flush()).decode("utf-8")
+    
+    async def _read_message(self, db: aiosqlite.Connection, row: aiosqlite.Row) -> Dict[str, Any]:
+        """Convert a messages row to a message dict, decompressing its content"""
+        message = dict(row)
+        codec = message.pop("content_codec", None)
+        message["content"] = await self._decode_content(db, message["content"], codec)
+        try:
+            message["metadata"] = json.loads(message["metadata"])
+        except:
+            message["metadata"] = {}
+        return message
+    
+    async def train_compression_dictionary(self) -> Optional[int]:
+        """Train a compression dictionary on a sample of large messages.
+        
+        Returns:
+            ID of the new dictionary, or None if there are too few messages to train on
+        """
+        async with self.get_connection() as db:
+            cursor = await db.execute("""
+                SELECT content FROM messages
+                WHERE content_codec IS NULL AND length(content) >= ?
+                ORDER BY random() LIMIT ?
+            """, (config.MESSAGE_COMPRESSION_THRESHOLD, DICTIONARY_SAMPLE_SIZE))
+            samples = [row[0] for row in await cursor.fetchall()]
+            dictionary = _train_dictionary(samples)
+            if len(dictionary) < 1024:
+                logger.info(f"Not enough message samples to train a compression dictionary ({len(samples)})")
+                return None
+            
+            cursor = await db.execute(
+                "INSERT INTO compression_dictionaries (data, created_at) VALUES (?, ?)",
+                (dictionary, datetime.now(timezone.utc).isoformat())
+            )
+            await db.commit()
+            logger.info(f"Trained {len(dictionary)} byte compression dictionary {cursor.lastrowid} on {len(samples)} messages")
+            return cursor.lastrowid
+    
+    async def compress_messages(self, batch_size: int = 500) -> Dict[str, int]:
+        """Compress stored messages above the size threshold (one-off migration).
+        
+        Messages are compressed in batches with the newest dictionary, each
+        batch in its own transaction, so the database stays usable meanwhile.
+        
+        Returns:
+            Dict with the number of messages compressed and bytes before/after
+        """
+        stats = {"messages": 0, "bytes_before": 0, "bytes_after": 0}
+        async with self.get_connection() as db:
+            dictionary_id = await self._get_latest_dictionary_id(db)
+            last_rowid = 0
+            while True:
+                cursor = await db.execute("""
+                    SELECT rowid, content FROM messages
+                    WHERE rowid > ? AND content_codec IS NULL AND length(content) >= ?
+                    ORDER BY rowid LIMIT ?
+                """, (last_rowid, config.MESSAGE_COMPRESSION_THRESHOLD, batch_size))
+                rows = await cursor.fetchall()
+                if not rows:
+                    break
+                updates = []
+                for rowid, content in rows:
+                    encoded, codec = await self._encode_content(db, content, dictionary_id)
+                    stats["bytes_before"] += len(content.encode("utf-8"))
+                    stats["bytes_after"] += len(encoded)
+                    updates.append((encoded, codec, rowid))
+                await db.executemany("UPDATE messages SET content = ?, content_codec = ? WHERE rowid = ?", updates)
+                await db.commit()
+                stats["messages"] += len(rows)
+                last_rowid = rows[-1][0]
+        logger.info(f"Compressed {stats['messages']} messages: {stats['bytes_before']} -> {stats['bytes_after']} bytes")
+        return stats
+    
+    async def vacuum(self):
+        """Reclaim free pages (e.g. after compressing messages) and re-key the search index"""
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            await db.execute("VACUUM")
+        await self.rebuild_search_index()
+    
+    async def rebuild_search_index(self):
+        """Rebuild the FTS5 index from the messages table.
+        
+        Needed after VACUUM, which may renumber the rowids the index is keyed on.
+        Index rows of archived messages are kept (their rowids are not renumbered).
+        """
+        async with self.get_connection() as db:
+            await db.execute("DELETE FROM messages_fts WHERE rowid > 0")
+            await self._index_messages(db)
+            await db.execute("INSERT INTO messages_fts (messages_fts) VALUES ('optimize')")
+            await db.commit()
+        logger.info("Rebuilt full-text search index over messages")
+    
+    async def _table_columns(self, db: aiosqlite.Connection, table: str, schema: str = "main") -> List[str]:
+        """Get the column names of a table"""
+        cursor = await db.execute(f"PRAGMA {schema}.table_info({table})")
+        return [row[1] for row in await cursor.fetchall()]
+    
     async def _create_default_user(self, db: aiosqlite.Connection):
         """Create default local user"""
         user_id = config.LOCAL_USER_ID
@@ -232,6 +698,43 @@ class LocalDatabase:
             rows = await cursor.fetchall()
             return [dict(row) for row in rows]
     
+    async def get_user_threads_page(
+        self,
+        user_id: str,
+        limit: int = 50,
+        cursor: str = None,
+        project_id: str = None
+    ) -> Dict[str, Any]:
+        """Get a page of a user's threads, newest first (see services/pagination.py)"""
+        conditions, params = ["user_id = ?"], [user_id]
+        if project_id:
+            conditions.append("project_id = ?")
+            params.append(project_id)
+        
+        async with self.get_connection() as db:
+            total = None
+            if not cursor:
+                db_cursor = await db.execute(f"SELECT count(*) FROM threads WHERE {' AND '.join(conditions)}", params)
+                total = (await db_cursor.fetchone())[0]
+            if cursor:
+                created_at, thread_id = decode_cursor(cursor)
+                conditions.append("(created_at, id) < (?, ?)")
+                params += [created_at, thread_id]
+            db_cursor = await db.execute(
+                f"SELECT * FROM threads WHERE {' AND '.join(conditions)} ORDER BY created_at DESC, id DESC LIMIT ?",
+                params + [limit + 1]
+            )
+            rows = [dict(row) for row in await db_cursor.fetchall()]
+        
+        return self._page(rows, limit, total)
+    
+    def _page(self, rows: List[Dict[str, Any]], limit: int, total: Optional[int]) -> Dict[str, Any]:
+        """Trim rows fetched with limit + 1 into a page with a cursor on (created_at, id)"""
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1]["created_at"], rows[-1]["id"]]) if has_more else None
+        return {"rows": rows, "next_cursor": next_cursor, "has_more": has_more, "total_estimate": total}
+    
     # Message operations
     async def add_message(
         self,
@@ -247,10 +750,18 @@ class LocalDatabase:
         metadata_json = json.dumps(metadata or {})
         
         async with self.get_connection() as db:
-            await db.execute("""
-                INSERT INTO messages (id, thread_id, type, content, is_llm_message, created_at, metadata)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (message_id, thread_id, message_type, content, is_llm_message, now, metadata_json))
+            await self._ensure_hot(db, thread_id)
+            stored_content, codec = content, None
+            if config.MESSAGE_COMPRESSION_ENABLED and len(content) >= config.MESSAGE_COMPRESSION_THRESHOLD:
+                stored_content, codec = await self._encode_content(db, content, await self._get_latest_dictionary_id(db))
+            
+            cursor = await db.execute("""
+                INSERT INTO messages (id, thread_id, type, content, is_llm_message, created_at, metadata, content_codec)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (message_id, thread_id, message_type, stored_content, is_llm_message, now, metadata_json, codec))
+            if codec and message_type in SEARCHABLE_MESSAGE_TYPES:
+                # The insert trigger cannot read compressed content
+                await db.execute("INSERT INTO messages_fts (rowid, body) VALUES (?, ?)", (cursor.lastrowid, _message_text(content)))
             await db.commit()
         
         return {
@@ -266,22 +777,302 @@ class LocalDatabase:
     async def get_thread_messages(self, thread_id: str) -> List[Dict[str, Any]]:
         """Get all messages for a thread"""
         async with self.get_connection() as db:
+            await self._ensure_hot(db, thread_id)
             cursor = await db.execute(
                 "SELECT * FROM messages WHERE thread_id = ? ORDER BY created_at ASC",
                 (thread_id,)
             )
             rows = await cursor.fetchall()
+            return [await self._read_message(db, row) for row in rows]
+    
+    async def get_thread_messages_page(
+        self,
+        thread_id: str,
+        limit: int = 50,
+        cursor: str = None,
+        latest_first: bool = True
+    ) -> Dict[str, Any]:
+        """Get a page of a thread's messages in chronological order.
+        
+        With latest_first the first page holds the latest messages and the
+        cursor scrolls back; otherwise pages run forwards from the start
+        (see services/pagination.py).
+        """
+        conditions, params = ["thread_id = ?"], [thread_id]
+        
+        async with self.get_connection() as db:
+            await self._ensure_hot(db, thread_id)
+            total = None
+            if not cursor:
+                db_cursor = await db.execute("SELECT count(*) FROM messages WHERE thread_id = ?", (thread_id,))
+                total = (await db_cursor.fetchone())[0]
+            if cursor:
+                created_at, message_id = decode_cursor(cursor)
+                conditions.append(f"(created_at, id) {'<' if latest_first else '>'} (?, ?)")
+                params += [created_at, message_id]
+            order = "DESC" if latest_first else "ASC"
+            db_cursor = await db.execute(
+                f"SELECT * FROM messages WHERE {' AND '.join(conditions)} ORDER BY created_at {order}, id {order} LIMIT ?",
+                params + [limit + 1]
+            )
+            page = self._page(await db_cursor.fetchall(), limit, total)
+            # Only the rows of the page are decompressed
+            page["rows"] = [await self._read_message(db, row) for row in page["rows"]]
+        
+        if latest_first:
+            page["rows"].reverse()
+        return page
+    
+    async def search_messages(
+        self,
+        query: str,
+        user_id: str = None,
+        thread_id: str = None,
+        limit: int = 20,
+        cursor: str = None
+    ) -> Dict[str, Any]:
+        """Full-text search over message text, best matches first.
+        
+        Args:
+            query: Words to search for; all of them must appear in a message
+            user_id: Only search threads of this user
+            thread_id: Only search this thread
+            limit: Max results per page
+            cursor: next_cursor of the previous page
             
-            messages = []
-            for row in rows:
-                message = dict(row)
-                try:
-                    message["metadata"] = json.loads(message["metadata"])
-                except:
-                    message["metadata"] = {}
-                messages.append(message)
+        Returns:
+            Dict with "results" (message_id, thread_id, thread_title, type,
+            created_at, snippet with highlighted matches, rank) and
+            "next_cursor" (None on the last page)
+        """
+        match = _fts_query(query)
+        if not match:
+            return {"results": [], "next_cursor": None}
+        
+        conditions = ["messages_fts MATCH ?"]
+        params: List[Any] = [match]
+        if user_id:
+            conditions.append("t.user_id = ?")
+            params.append(user_id)
+        if thread_id:
+            conditions.append("COALESCE(m.thread_id, a.thread_id) = ?")
+            params.append(thread_id)
+        if cursor:
+            # Keyset pagination: continue after the last (rank, rowid) of the previous page
+            last_rank, last_rowid = decode_cursor(cursor)
+            conditions.append("(messages_fts.rank > ? OR (messages_fts.rank = ? AND messages_fts.rowid > ?))")
+            params += [last_rank, last_rank, last_rowid]
+        
+        async with self.get_connection() as db:
+            db_cursor = await db.execute(f"""
+                SELECT COALESCE(m.id, a.message_id) AS message_id, COALESCE(m.thread_id, a.thread_id) AS thread_id,
+                       t.title AS thread_title, COALESCE(m.type, a.type) AS type,
+                       COALESCE(m.created_at, a.created_at) AS created_at,
+                       snippet(messages_fts, 0, ?, ?, '…', ?) AS snippet,
+                       messages_fts.rank AS rank, messages_fts.rowid AS fts_rowid
+                FROM messages_fts
+                LEFT JOIN messages m ON m.rowid = messages_fts.rowid AND messages_fts.rowid > 0
+                LEFT JOIN archived_messages a ON a.rowid = messages_fts.rowid AND messages_fts.rowid < 0
+                {"JOIN" if user_id else "LEFT JOIN"} threads t ON t.id = COALESCE(m.thread_id, a.thread_id)
+                WHERE {" AND ".join(conditions)}
+                ORDER BY messages_fts.rank, messages_fts.rowid
+                LIMIT ?
+            """, [SNIPPET_START, SNIPPET_END, SNIPPET_TOKENS] + params + [limit + 1])
+            rows = [dict(row) for row in await db_cursor.fetchall()]
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor([rows[-1]["rank"], rows[-1]["fts_rowid"]])
+        for row in rows:
+            del row["fts_rowid"]
+        return {"results": rows, "next_cursor": next_cursor}
+    
+    # Cold storage operations
+    async def archive_idle_threads(self, idle_days: int = None, batch_size: int = 100) -> int:
+        """Move the messages and agent runs of idle threads out of the primary database.
+        
+        Threads without messages for idle_days (and without running agent runs) go to
+        the archive of the current month: an attached SQLite database, or one gzipped
+        NDJSON file per thread (THREAD_ARCHIVE_FORMAT). The thread rows stay in the
+        primary database so thread lists are unaffected, their messages stay in the
+        search index, and a thread is rehydrated the next time its messages are read
+        or written.
+        
+        Args:
+            idle_days: Days without messages before a thread is archived (THREAD_ARCHIVE_AFTER_DAYS if None)
+            batch_size: Max threads archived in this call
             
-            return messages
+        Returns:
+            Number of threads archived
+        """
+        idle_days = config.THREAD_ARCHIVE_AFTER_DAYS if idle_days is None else idle_days
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=idle_days)).isoformat()
+        month = datetime.now(timezone.utc).strftime("%Y-%m")
+        use_ndjson = config.THREAD_ARCHIVE_FORMAT == "ndjson"
+        archive_path = os.path.join(self.archive_dir, month if use_ndjson else f"archive-{month}.db")
+        os.makedirs(archive_path if use_ndjson else self.archive_dir, exist_ok=True)
+        
+        async with self.archive_lock, self.get_connection() as db:
+            if not use_ndjson:
+                await db.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+            try:
+                # Select and move in one write transaction, so a thread that gets a
+                # new message meanwhile is either archived with it or not at all
+                await db.execute("BEGIN IMMEDIATE")
+                cursor = await db.execute("""
+                    SELECT id FROM threads t
+                    WHERE archive_path IS NULL AND created_at < ?
+                    AND NOT EXISTS (SELECT 1 FROM messages m WHERE m.thread_id = t.id AND m.created_at >= ?)
+                    AND NOT EXISTS (SELECT 1 FROM agent_runs r WHERE r.thread_id = t.id AND r.status = 'running')
+                    LIMIT ?
+                """, (cutoff, cutoff, batch_size))
+                thread_ids = [row[0] for row in await cursor.fetchall()]
+                if not thread_ids:
+                    await db.rollback()
+                    return 0
+                
+                placeholders = ", ".join("?" * len(thread_ids))
+                await self._keep_archived_searchable(db, thread_ids)
+                if use_ndjson:
+                    for thread_id in thread_ids:
+                        rows = {}
+                        for table in ARCHIVED_TABLES:
+                            cursor = await db.execute(f"SELECT * FROM {table} WHERE thread_id = ?", (thread_id,))
+                            rows[table] = [dict(row) for row in await cursor.fetchall()]
+                        await asyncio.to_thread(_write_ndjson_archive, os.path.join(archive_path, f"{thread_id}.ndjson.gz"), rows)
+                else:
+                    for table in ARCHIVED_TABLES:
+                        columns = await self._ensure_archive_table(db, table)
+                        await db.execute(
+                            f"INSERT INTO archive.{table} ({columns}) SELECT {columns} FROM main.{table} WHERE thread_id IN ({placeholders})",
+                            thread_ids
+                        )
+                
+                for table in ARCHIVED_TABLES:
+                    await db.execute(f"DELETE FROM main.{table} WHERE thread_id IN ({placeholders})", thread_ids)
+                await db.execute(
+                    f"UPDATE threads SET archive_path = ? WHERE id IN ({placeholders})", [archive_path] + thread_ids
+                )
+                await db.commit()
+            except:
+                await db.rollback()
+                raise
+            finally:
+                if not use_ndjson:
+                    await db.execute("DETACH DATABASE archive")
+            
+            # Shrink the primary database file by the archived rows (executescript
+            # steps the pragma to completion; execute would free a single page)
+            await db.executescript("PRAGMA incremental_vacuum;")
+        
+        logger.info(f"Archived {len(thread_ids)} threads idle for {idle_days} days to {archive_path}")
+        return len(thread_ids)
+    
+    async def _keep_archived_searchable(self, db: aiosqlite.Connection, thread_ids: List[str]):
+        """Move the search index rows of messages about to be archived to new negative rowids
+        
+        Deleting the messages then removes only their old index rows (via the
+        delete trigger), so archived threads keep showing up in search.
+        """
+        placeholders = ", ".join("?" * len(thread_ids))
+        cursor = await db.execute(f"""
+            SELECT m.id, m.thread_id, m.type, m.created_at, f.body
+            FROM messages m JOIN messages_fts f ON f.rowid = m.rowid
+            WHERE m.thread_id IN ({placeholders})
+        """, thread_ids)
+        rows = await cursor.fetchall()
+        if not rows:
+            return
+        cursor = await db.execute("SELECT COALESCE(MIN(rowid), 0) FROM archived_messages")
+        first = (await cursor.fetchone())[0] - 1
+        rowids = range(first, first - len(rows), -1)
+        await db.executemany(
+            "INSERT INTO archived_messages (rowid, message_id, thread_id, type, created_at) VALUES (?, ?, ?, ?, ?)",
+            [(rowid, row[0], row[1], row[2], row[3]) for rowid, row in zip(rowids, rows)]
+        )
+        await db.executemany(
+            "INSERT INTO messages_fts (rowid, body) VALUES (?, ?)",
+            [(rowid, row[4]) for rowid, row in zip(rowids, rows)]
+        )
+    
+    async def _ensure_archive_table(self, db: aiosqlite.Connection, table: str) -> str:
+        """Create a table in the attached archive like its primary one.
+        
+        Returns:
+            Comma-separated list of the primary table's columns
+        """
+        columns = await self._table_columns(db, table)
+        await db.execute(f"CREATE TABLE IF NOT EXISTS archive.{table} AS SELECT * FROM main.{table} WHERE 0")
+        await db.execute(f"CREATE INDEX IF NOT EXISTS archive.idx_archive_{table}_thread ON {table} (thread_id)")
+        archive_columns = await self._table_columns(db, table, "archive")
+        for column in columns:
+            if column not in archive_columns:
+                await db.execute(f"ALTER TABLE archive.{table} ADD COLUMN {column}")
+        return ", ".join(columns)
+    
+    async def _ensure_hot(self, db: aiosqlite.Connection, thread_id: str):
+        """Move an archived thread's messages and agent runs back into the primary database"""
+        cursor = await db.execute("SELECT archive_path FROM threads WHERE id = ?", (thread_id,))
+        row = await cursor.fetchone()
+        if not row or not row[0]:
+            return
+        
+        lock = self._rehydrate_locks.setdefault(thread_id, asyncio.Lock())
+        async with lock, self.archive_lock:
+            cursor = await db.execute("SELECT archive_path FROM threads WHERE id = ?", (thread_id,))
+            archive_path = (await cursor.fetchone())[0]
+            if archive_path:
+                await self._rehydrate(db, thread_id, archive_path)
+        self._rehydrate_locks.pop(thread_id, None)
+    
+    async def _rehydrate(self, db: aiosqlite.Connection, thread_id: str, archive_path: str):
+        """Restore a thread from its archive (called with the thread's rehydration lock held)"""
+        started = datetime.now(timezone.utc)
+        use_ndjson = not archive_path.endswith(".db")
+        if use_ndjson:
+            ndjson_path = os.path.join(archive_path, f"{thread_id}.ndjson.gz")
+            rows = await asyncio.to_thread(_read_ndjson_archive, ndjson_path)
+        else:
+            await db.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+        try:
+            await db.execute("BEGIN IMMEDIATE")
+            # The messages are indexed again under their new rowids as they are inserted
+            await db.execute(
+                "DELETE FROM messages_fts WHERE rowid IN (SELECT rowid FROM archived_messages WHERE thread_id = ?)",
+                (thread_id,)
+            )
+            await db.execute("DELETE FROM archived_messages WHERE thread_id = ?", (thread_id,))
+            for table in ARCHIVED_TABLES:
+                columns = await self._table_columns(db, table)
+                if use_ndjson:
+                    await db.executemany(
+                        f"INSERT INTO main.{table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                        [[row.get(column) for column in columns] for row in rows.get(table, [])]
+                    )
+                else:
+                    archive_columns = await self._table_columns(db, table, "archive")
+                    shared = [column for column in columns if column in archive_columns]
+                    await db.execute(
+                        f"INSERT INTO main.{table} ({', '.join(shared)}) SELECT {', '.join(shared)} FROM archive.{table} WHERE thread_id = ?",
+                        (thread_id,)
+                    )
+                    await db.execute(f"DELETE FROM archive.{table} WHERE thread_id = ?", (thread_id,))
+            # The insert trigger indexed the plain messages; index the compressed ones
+            await self._index_messages(db, thread_id)
+            await db.execute("UPDATE threads SET archive_path = NULL WHERE id = ?", (thread_id,))
+            await db.commit()
+        except:
+            await db.rollback()
+            raise
+        finally:
+            if not use_ndjson:
+                await db.execute("DETACH DATABASE archive")
+        
+        if use_ndjson:
+            os.remove(ndjson_path)
+        elapsed = (datetime.now(timezone.utc) - started).total_seconds()
+        logger.info(f"Rehydrated archived thread {thread_id} from {archive_path} in {elapsed * 1000:.0f}ms")
     
     # Agent run operations
     async def create_agent_run(
@@ -327,6 +1118,51 @@ class LocalDatabase:
             """, (status, error_message, now, run_id))
             await db.commit()
     
+    # Usage rollup operations
+    async def increment_usage_rollups(self, rows: List[Dict[str, Any]], batch_id: str = None):
+        """Add a batch of usage deltas to the per account/model/day rollups
+        
+        A batch ID already applied is ignored, so retrying a batch whose write
+        succeeded but was reported as failed does not count it twice.
+        """
+        now = datetime.now(timezone.utc).isoformat()
+        
+        async with self.get_connection() as db:
+            if batch_id:
+                cursor = await db.execute(
+                    "INSERT OR IGNORE INTO usage_rollup_batches (batch_id, applied_at) VALUES (?, ?)", (batch_id, now)
+                )
+                if cursor.rowcount == 0:
+                    logger.info(f"Usage batch {batch_id} was already applied, skipping it")
+                    return
+                cutoff = (datetime.now(timezone.utc) - timedelta(days=USAGE_BATCH_RETENTION_DAYS)).isoformat()
+                await db.execute("DELETE FROM usage_rollup_batches WHERE applied_at < ?", (cutoff,))
+            await db.executemany("""
+                INSERT INTO usage_rollups (account_id, model, day, prompt_tokens, completion_tokens, cost, request_count, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (account_id, model, day) DO UPDATE SET
+                    prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                    completion_tokens = completion_tokens + excluded.completion_tokens,
+                    cost = cost + excluded.cost,
+                    request_count = request_count + excluded.request_count,
+                    updated_at = excluded.updated_at
+            """, [
+                (row["account_id"], row["model"], row["day"], row["prompt_tokens"],
+                 row["completion_tokens"], row["cost"], row["request_count"], now)
+                for row in rows
+            ])
+            await db.commit()
+    
+    async def get_usage_rollups(self, account_id: str, since_day: str) -> List[Dict[str, Any]]:
+        """Get usage rollups for an account from a day (YYYY-MM-DD) onwards"""
+        async with self.get_connection() as db:
+            cursor = await db.execute(
+                "SELECT * FROM usage_rollups WHERE account_id = ? AND day >= ? ORDER BY day ASC, model ASC",
+                (account_id, since_day)
+            )
+            rows = await cursor.fetchall()
+            return [dict(row) for row in rows]
+    
     # Session operations (for authentication)
     async def create_session(self, user_id: str) -> Dict[str, Any]:
         """Create a new session"""
@@ -358,12 +1194,392 @@ class LocalDatabase:
             )
             row = await cursor.fetchone()
             return dict(row) if row else None
+    
+    async def delete_session(self, access_token: str) -> bool:
+        """Delete a session and revoke its cached token"""
+        async with self.get_connection() as db:
+            cursor = await db.execute("DELETE FROM sessions WHERE access_token = ?", (access_token,))
+            await db.commit()
+            deleted = cursor.rowcount > 0
+        
+        token_cache.revoke(access_token)
+        return deleted
+    
+    async def delete_user_sessions(self, user_id: str) -> int:
+        """Delete all sessions of a user and revoke their cached tokens"""
+        async with self.get_connection() as db:
+            cursor = await db.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+            await db.commit()
+            deleted = cursor.rowcount
+        
+        token_cache.revoke_user(user_id)
+        return deleted
 
 
 # Global database instance
 local_db = LocalDatabase()
 
 
+class ThreadArchiver:
+    """Background task that moves idle threads to cold storage in batches"""
+    
+    def __init__(self, db: LocalDatabase, interval: int = None, batch_size: int = 100):
+        self.db = db
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        """Start archiving on the running event loop (no-op if THREAD_ARCHIVE_AFTER_DAYS is 0)"""
+        if config.THREAD_ARCHIVE_AFTER_DAYS <= 0 or (self._task and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Thread archiver started (threads idle for {config.THREAD_ARCHIVE_AFTER_DAYS} days)")
+    
+    async def stop(self):
+        """Stop archiving; a batch in progress is rolled back"""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+    
+    async def _run(self):
+        while True:
+            try:
+                # Keep going while full batches are found, yielding to requests in between
+                while await self.db.archive_idle_threads(batch_size=self.batch_size) == self.batch_size:
+                    await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error archiving idle threads: {str(e)}", exc_info=True)
+            await asyncio.sleep(self.interval or config.THREAD_ARCHIVE_INTERVAL)
+
+
+thread_archiver = ThreadArchiver(local_db)
+
+
+class DatabaseBackup:
+    """Scheduled online snapshots of the local database, with retention and restore
+    
+    Snapshots use SQLite's backup API. In WAL mode the copy runs inside one read
+    transaction, so it is consistent and copies a few pages per step, pausing
+    between steps, without ever blocking writers. Without WAL the copy is done in
+    one step instead, since a stepped copy restarts whenever another connection
+    writes.
+    
+    Each snapshot includes a copy of the thread archive (cold storage). The
+    archive is copied, and the read transaction of the database copy started,
+    while the database's archive lock is held, so both show the same threads
+    archived; archiving and rehydration wait for that part only. Archive files
+    unchanged since the previous snapshot are hard-linked from its copy, so
+    that part copies only what changed (usually the current month's archive)
+    and snapshots share the rest on disk.
+    """
+    
+    def __init__(self, db: LocalDatabase, backup_dir: str = None, interval: int = None, retention: int = None,
+                 pages_per_step: int = None, step_sleep: float = None):
+        self.db = db
+        self.backup_dir = backup_dir or config.SQLITE_BACKUP_PATH
+        self.interval = interval
+        self.retention = retention
+        self.pages_per_step = pages_per_step
+        self.step_sleep = step_sleep
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        # Set to stop the copy running in a thread
+        self._cancel = threading.Event()
+        self.stats = {"backups": 0, "failures": 0, "restores": 0, "last_backup_at": None, "last_duration_seconds": None,
+                      "last_size_bytes": None, "last_steps": None, "write_wait_baseline_ms": None,
+                      "write_wait_max_ms": None}
+    
+    def _settings(self):
+        return (self.interval if self.interval is not None else config.SQLITE_BACKUP_INTERVAL,
+                self.retention if self.retention is not None else config.SQLITE_BACKUP_RETENTION,
+                self.pages_per_step or config.SQLITE_BACKUP_PAGES_PER_STEP,
+                self.step_sleep if self.step_sleep is not None else config.SQLITE_BACKUP_STEP_SLEEP)
+    
+    def list_backups(self) -> List[str]:
+        """Get the paths of the snapshots, newest first"""
+        if not os.path.isdir(self.backup_dir):
+            return []
+        prefix = f"{os.path.splitext(os.path.basename(self.db.db_path))[0]}-"
+        names = [name for name in os.listdir(self.backup_dir) if name.startswith(prefix) and name.endswith(".db")]
+        return [os.path.join(self.backup_dir, name) for name in sorted(names, reverse=True)]
+    
+    async def backup(self) -> str:
+        """Take a snapshot now and prune the old ones; returns its path"""
+        async with self._lock:
+            self._cancel.clear()
+            try:
+                async with self.db.archive_lock:
+                    snapshot = await self._in_thread(self._begin_backup, discard=self._discard_backup)
+                path = await self._in_thread(self._finish_backup, snapshot)
+            except Exception:
+                self.stats["failures"] += 1
+                raise
+            await asyncio.to_thread(self._prune)
+            return path
+    
+    async def _in_thread(self, fn, *args, discard=None):
+        """Run a step of a snapshot in a thread; if cancelled, stop the step and wait for it to clean up"""
+        future = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            self._cancel.set()
+            try:
+                result = await future
+            except Exception:
+                pass  # Stopped (BackupCancelled) or failed; the step cleaned up either way
+            else:
+                if discard is not None:
+                    # The step was done before it saw the cancellation
+                    await asyncio.to_thread(discard, result)
+            raise
+    
+    async def restore(self, backup_path: str, keep_current: bool = True):
+        """Replace the database with a snapshot
+        
+        Other connections see the database either before or after the restore.
+        Stop writing (e.g. stop the API) first, or their later writes apply on
+        top of the restored state.
+        
+        The thread archive is restored with the database. A snapshot whose
+        archive copy lacks threads it marks as archived (e.g. one taken before
+        archives were included) is refused, since their messages would be lost.
+        
+        Args:
+            backup_path: Snapshot to restore
+            keep_current: Take a snapshot of the current database first
+        
+        Raises:
+            sqlite3.DatabaseError: If the snapshot is damaged or its archive is incomplete
+        """
+        async with self._lock:
+            self._cancel.clear()
+            async with self.db.archive_lock:
+                await asyncio.to_thread(self._check_archive, backup_path)
+                if keep_current and os.path.exists(self.db.db_path):
+                    await asyncio.to_thread(self._backup)
+                await asyncio.to_thread(self._restore, backup_path)
+            await asyncio.to_thread(self._prune)
+        # Dictionary IDs may refer to different dictionaries in the restored database
+        self.db._dictionaries.clear()
+        self.stats["restores"] += 1
+        logger.info(f"Restored local database from {backup_path}")
+    
+    def _backup(self) -> str:
+        """Take a snapshot (the caller keeps the thread archive from changing meanwhile)"""
+        return self._finish_backup(self._begin_backup())
+    
+    def _begin_backup(self) -> Dict[str, Any]:
+        """Copy the thread archive and fix the database state the snapshot will hold
+        
+        In WAL mode this starts the read transaction the copy runs in; otherwise
+        the database is copied here in one step.
+        """
+        os.makedirs(self.backup_dir, exist_ok=True)
+        stem = os.path.splitext(os.path.basename(self.db.db_path))[0]
+        path = os.path.join(self.backup_dir, f"{stem}-{datetime.now(timezone.utc).strftime(BACKUP_TIMESTAMP_FORMAT)}.db")
+        snapshot = {"path": path, "tmp_path": f"{path}.tmp", "archive_tmp_path": f"{_archive_snapshot_path(path)}.tmp",
+                    "started": time.perf_counter(), "steps": 0}
+        # The connections are used by the thread that finishes the backup as well
+        source = sqlite3.connect(self.db.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        target = sqlite3.connect(snapshot["tmp_path"], check_same_thread=False)
+        probe = sqlite3.connect(self.db.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        snapshot.update(source=source, target=target, probe=probe)
+        
+        try:
+            snapshot["baseline"] = self._write_wait(probe)
+            snapshot["wal"] = source.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+            if snapshot["wal"]:
+                source.execute("BEGIN")
+                source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            else:
+                source.backup(target)
+                snapshot["steps"] = 1
+            backups = self.list_backups()
+            _copy_archive(self.db.archive_dir, snapshot["archive_tmp_path"],
+                          previous_dir=_archive_snapshot_path(backups[0]) if backups else None, snapshot=True)
+            if self._cancel.is_set():
+                raise BackupCancelled()
+        except Exception:
+            self._discard_backup(snapshot)
+            raise
+        return snapshot
+    
+    def _write_wait(self, probe: sqlite3.Connection) -> float:
+        # Time for a writer to get the write lock; nothing is written, so the copy is not disturbed
+        probe_started = time.perf_counter()
+        probe.execute("BEGIN IMMEDIATE")
+        probe.execute("ROLLBACK")
+        return (time.perf_counter() - probe_started) * 1000
+    
+    def _discard_backup(self, snapshot: Dict[str, Any]):
+        for name in ("source", "target", "probe"):
+            snapshot[name].close()
+        if os.path.exists(snapshot["tmp_path"]):
+            os.remove(snapshot["tmp_path"])
+        shutil.rmtree(snapshot["archive_tmp_path"], ignore_errors=True)
+    
+    def _finish_backup(self, snapshot: Dict[str, Any]) -> str:
+        """Copy the database pages for a snapshot started by _begin_backup; returns its path"""
+        _, _, pages_per_step, step_sleep = self._settings()
+        source, target, probe = snapshot["source"], snapshot["target"], snapshot["probe"]
+        path, tmp_path = snapshot["path"], snapshot["tmp_path"]
+        steps = snapshot["steps"]
+        write_waits = []
+        
+        try:
+            if snapshot["wal"]:
+                def progress(status, remaining, total):
+                    nonlocal steps
+                    if self._cancel.is_set():
+                        # Aborts the copy
+                        raise BackupCancelled()
+                    steps += 1
+                    write_waits.append(self._write_wait(probe))
+                    if remaining:
+                        time.sleep(step_sleep)
+                
+                source.backup(target, pages=pages_per_step, progress=progress)
+                source.execute("COMMIT")
+            
+            check = target.execute("PRAGMA quick_check").fetchone()[0]
+            if check != "ok":
+                raise sqlite3.DatabaseError(f"Snapshot failed integrity check: {check}")
+        except Exception:
+            self._discard_backup(snapshot)
+            raise
+        source.close()
+        probe.close()
+        target.close()
+        # The archive copy goes in place first: a snapshot's .db file implies a complete archive
+        os.replace(snapshot["archive_tmp_path"], _archive_snapshot_path(path))
+        os.replace(tmp_path, path)
+        baseline = snapshot["baseline"]
+        started = snapshot["started"]
+        
+        duration = time.perf_counter() - started
+        self.stats.update({
+            "backups": self.stats["backups"] + 1,
+            "last_backup_at": datetime.now(timezone.utc).isoformat(),
+            "last_duration_seconds": duration,
+            "last_size_bytes": os.path.getsize(path),
+            "last_steps": steps,
+            "write_wait_baseline_ms": baseline,
+            "write_wait_max_ms": max(write_waits, default=None),
+        })
+        logger.info(f"Backed up local database to {path} in {duration:.2f}s ({steps} steps, "
+                    f"max write wait {self.stats['write_wait_max_ms'] or 0:.1f}ms)")
+        return path
+    
+    def _check_archive(self, backup_path: str):
+        """Make sure a snapshot's archive copy holds every thread the snapshot marks as archived"""
+        archive_copy = _archive_snapshot_path(backup_path)
+        source = sqlite3.connect(f"file:{backup_path}?mode=ro", uri=True)
+        try:
+            if "archive_path" not in [row[1] for row in source.execute("PRAGMA table_info(threads)")]:
+                return
+            archived = source.execute("SELECT id, archive_path FROM threads WHERE archive_path IS NOT NULL").fetchall()
+        finally:
+            source.close()
+        
+        missing = []
+        for thread_id, archive_path in archived:
+            path = os.path.join(archive_copy, os.path.relpath(archive_path, self.db.archive_dir))
+            if not archive_path.endswith(".db"):
+                path = os.path.join(path, f"{thread_id}.ndjson.gz")
+            if not os.path.exists(path):
+                missing.append(thread_id)
+        if missing:
+            raise sqlite3.DatabaseError(
+                f"Snapshot {backup_path} has no archive for {len(missing)} archived threads "
+                f"(e.g. {', '.join(missing[:3])}); restoring it would lose their messages"
+            )
+    
+    def _restore(self, backup_path: str):
+        source = sqlite3.connect(f"file:{backup_path}?mode=ro", uri=True)
+        target = sqlite3.connect(self.db.db_path, timeout=30)
+        # Stage the archive next to the live one, so swapping it in is a rename
+        staged_archive = f"{self.db.archive_dir.rstrip(os.sep)}.restore"
+        shutil.rmtree(staged_archive, ignore_errors=True)
+        try:
+            check = source.execute("PRAGMA quick_check").fetchone()[0]
+            if check != "ok":
+                raise sqlite3.DatabaseError(f"Snapshot {backup_path} failed integrity check: {check}")
+            _copy_archive(_archive_snapshot_path(backup_path), staged_archive)
+            # One step: holds the write lock until the whole database is replaced
+            source.backup(target)
+        except Exception:
+            shutil.rmtree(staged_archive, ignore_errors=True)
+            raise
+        finally:
+            source.close()
+            target.close()
+        
+        replaced_archive = f"{self.db.archive_dir.rstrip(os.sep)}.old"
+        shutil.rmtree(replaced_archive, ignore_errors=True)
+        if os.path.exists(self.db.archive_dir):
+            os.replace(self.db.archive_dir, replaced_archive)
+        os.replace(staged_archive, self.db.archive_dir)
+        shutil.rmtree(replaced_archive, ignore_errors=True)
+    
+    def _prune(self):
+        _, retention, _, _ = self._settings()
+        for path in self.list_backups()[max(retention, 1):]:
+            os.remove(path)
+            # Reading a snapshot of a WAL database (e.g. to restore it) leaves these behind
+            for suffix in ("-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+            shutil.rmtree(_archive_snapshot_path(path), ignore_errors=True)
+            logger.info(f"Removed old backup {path}")
+    
+    def start(self):
+        """Start taking snapshots on the running event loop (no-op if SQLITE_BACKUP_INTERVAL is 0)"""
+        interval = self._settings()[0]
+        if interval <= 0 or (self._task and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Database backups started (every {interval}s to {self.backup_dir})")
+    
+    async def stop(self):
+        """Stop taking snapshots; a snapshot in progress is stopped and discarded"""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+    
+    async def _run(self):
+        while True:
+            interval = self._settings()[0]
+            backups = self.list_backups()
+            # Continue the schedule across restarts
+            age = time.time() - os.path.getmtime(backups[0]) if backups else interval
+            if age < interval:
+                await asyncio.sleep(interval - age)
+            try:
+                await self.backup()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error backing up local database: {str(e)}", exc_info=True)
+                await asyncio.sleep(interval)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get backup metrics, including the snapshots kept"""
+        return {**self.stats, "snapshots": len(self.list_backups())}
+
+
+database_backup = DatabaseBackup(local_db)
+
+
 class LocalDBConnection:
     """Local database connection wrapper compatible with Supabase interface"""
     
@@ -439,3 +1655,262 @@ class LocalTableInterface:
         # Default empty result
         return {"data": [], "error": None}
 
+
+async def _benchmark_search(db_path: str, message_count: int, thread_count: int, queries: List[str]):
+    """Search latency on a synthetic corpus, compared with scanning messages in Python"""
+    import random
+    import time
+    
+    random.seed(42)
+    vocabulary = [f"word{i}" for i in range(20000)]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]  # Zipf-like word frequencies
+    db = LocalDatabase(db_path)
+    await db.initialize()
+    
+    users = [config.LOCAL_USER_ID, "benchmark-user"]
+    async with db.get_connection() as conn:
+        now = datetime.now(timezone.utc).isoformat()
+        await conn.executemany(
+            "INSERT OR IGNORE INTO threads (id, project_id, user_id, title, created_at, updated_at, metadata) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(f"thread-{i}", config.LOCAL_PROJECT_ID, users[i % 2], f"Thread {i}", now, now, "{}") for i in range(thread_count)]
+        )
+        started = time.perf_counter()
+        batch_size = 10000
+        for offset in range(0, message_count, batch_size):
+            rows = []
+            for i in range(offset, min(offset + batch_size, message_count)):
+                text = " ".join(random.choices(vocabulary, weights, k=40))
+                content = json.dumps({"role": "user" if i % 2 else "assistant", "content": text})
+                rows.append((str(uuid.uuid4()), f"thread-{i % thread_count}", "user" if i % 2 else "assistant",
+                             content, True, f"{now}-{i:09d}", "{}"))
+            await conn.executemany(
+                "INSERT INTO messages (id, thread_id, type, content, is_llm_message, created_at, metadata) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            await conn.commit()
+        print(f"Inserted {message_count} messages (index maintained by triggers) in {time.perf_counter() - started:.1f}s")
+    
+    for query in queries:
+        started = time.perf_counter()
+        page = await db.search_messages(query, limit=20)
+        first_page = time.perf_counter() - started
+        
+        started = time.perf_counter()
+        pages = 1
+        while page["next_cursor"] and pages < 5:
+            page = await db.search_messages(query, limit=20, cursor=page["next_cursor"])
+            pages += 1
+        later_pages = (time.perf_counter() - started) / max(1, pages - 1)
+        
+        started = time.perf_counter()
+        await db.search_messages(query, user_id="benchmark-user", limit=20)
+        user_filtered = time.perf_counter() - started
+        
+        print(f"{query!r}: first page {first_page * 1000:.1f}ms, later pages {later_pages * 1000:.1f}ms, "
+              f"user-filtered {user_filtered * 1000:.1f}ms")
+    
+    # Baseline: load every message and scan it in Python
+    started = time.perf_counter()
+    async with db.get_connection() as conn:
+        db_cursor = await conn.execute("SELECT id, content FROM messages")
+        matches = [row["id"] for row in await db_cursor.fetchall() if queries[0] in row["content"]]
+    print(f"Python scan for {queries[0]!r}: {(time.perf_counter() - started) * 1000:.1f}ms ({len(matches)} matches)")
+
+
+async def _migrate_compression(db_path: str, train_dictionary: bool, vacuum: bool, sample_threads: int):
+    """Compress existing messages and report the database size and read latency before and after"""
+    import time
+    
+    db = LocalDatabase(db_path)
+    await db.initialize()
+    
+    async with db.get_connection() as conn:
+        cursor = await conn.execute("SELECT DISTINCT thread_id FROM messages ORDER BY random() LIMIT ?", (sample_threads,))
+        thread_ids = [row[0] for row in await cursor.fetchall()]
+    
+    async def measure() -> str:
+        started = time.perf_counter()
+        for thread_id in thread_ids:
+            await db.get_thread_messages(thread_id)
+        per_thread = (time.perf_counter() - started) / max(1, len(thread_ids))
+        return f"{os.path.getsize(db_path) / 1e6:.1f}MB, {per_thread * 1000:.1f}ms per thread read"
+    
+    print(f"Before: {await measure()}")
+    if train_dictionary:
+        await db.train_compression_dictionary()
+    stats = await db.compress_messages()
+    if stats["messages"]:
+        print(f"Compressed {stats['messages']} messages: {stats['bytes_before'] / 1e6:.1f}MB -> "
+              f"{stats['bytes_after'] / 1e6:.1f}MB ({stats['bytes_after'] / stats['bytes_before']:.0%})")
+    if vacuum:
+        await db.vacuum()
+    print(f"After: {await measure()}")
+
+
+async def _benchmark_archive(tmp_dir: str, hot_threads: int, cold_threads: int, messages_per_thread: int, growth: int):
+    """Hot-path latency with and without cold storage as the archived history grows"""
+    import random
+    import statistics
+    import time
+    
+    random.seed(42)
+    now = datetime.now(timezone.utc)
+    body = json.dumps({"role": "user", "content": "lorem ipsum dolor sit amet " * 80})
+    
+    for scale in (1, growth):
+        for archive in (False, True):
+            name = f"scale{scale}-{'archived' if archive else 'single'}"
+            db = LocalDatabase(os.path.join(tmp_dir, f"{name}.db"), os.path.join(tmp_dir, f"{name}-archive"))
+            await db.initialize()
+            
+            async with db.get_connection() as conn:
+                for i in range(hot_threads + cold_threads * scale):
+                    hot = i < hot_threads
+                    started_at = now - timedelta(days=1 if hot else 90 + random.randint(0, 300))
+                    thread_id = f"{'hot' if hot else 'cold'}-{i}"
+                    await conn.execute(
+                        "INSERT INTO threads (id, project_id, user_id, title, created_at, updated_at, metadata) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (thread_id, config.LOCAL_PROJECT_ID, config.LOCAL_USER_ID, thread_id, started_at.isoformat(), started_at.isoformat(), "{}")
+                    )
+                    await conn.executemany(
+                        "INSERT INTO messages (id, thread_id, type, content, is_llm_message, created_at, metadata) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        [(str(uuid.uuid4()), thread_id, "user", body, True, (started_at + timedelta(seconds=n)).isoformat(), "{}")
+                         for n in range(messages_per_thread)]
+                    )
+                await conn.commit()
+            
+            if archive:
+                started = time.perf_counter()
+                while await db.archive_idle_threads(idle_days=30, batch_size=500):
+                    pass
+                print(f"{name}: archived {cold_threads * scale} threads in {time.perf_counter() - started:.1f}s")
+            
+            latencies = []
+            for _ in range(300):
+                thread_id = f"hot-{random.randrange(hot_threads)}"
+                started = time.perf_counter()
+                await db.get_thread_messages_page(thread_id, limit=50)
+                await db.add_message(thread_id, "user", body, True)
+                latencies.append(time.perf_counter() - started)
+            latencies.sort()
+            print(f"{name}: primary DB {os.path.getsize(db.db_path) / 1e6:.0f}MB, hot path (page read + insert) "
+                  f"p50 {statistics.median(latencies) * 1000:.2f}ms, p95 {latencies[int(len(latencies) * 0.95)] * 1000:.2f}ms")
+            
+            if archive:
+                started = time.perf_counter()
+                await db.get_thread_messages(f"cold-{hot_threads}")
+                print(f"{name}: rehydrating a cold thread took {(time.perf_counter() - started) * 1000:.1f}ms")
+
+
+async def _benchmark_backup(tmp_dir: str, message_count: int, pages_per_step: int, step_sleep: float):
+    """Writer latency while the database is copied by an online snapshot vs a locked file copy"""
+    import statistics
+    import threading
+    
+    db = LocalDatabase(os.path.join(tmp_dir, "bench.db"), os.path.join(tmp_dir, "archive"))
+    await db.initialize()
+    thread = await db.create_thread(config.LOCAL_PROJECT_ID, config.LOCAL_USER_ID, "bench")
+    body = json.dumps({"role": "user", "content": "lorem ipsum dolor sit amet " * 40})
+    async with db.get_connection() as conn:
+        await conn.executemany(
+            "INSERT INTO messages (id, thread_id, type, content, is_llm_message, created_at, metadata) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(str(uuid.uuid4()), thread["id"], "user", body, True, datetime.now(timezone.utc).isoformat(), "{}")
+             for _ in range(message_count)]
+        )
+        await conn.commit()
+    print(f"Database: {message_count} messages, {os.path.getsize(db.db_path) / 1e6:.0f}MB")
+    
+    def measure_writes(copy) -> str:
+        latencies, stop = [], threading.Event()
+        def writer():
+            conn = sqlite3.connect(db.db_path, timeout=60)
+            while not stop.is_set():
+                started = time.perf_counter()
+                conn.execute("UPDATE threads SET updated_at = ? WHERE id = ?", (datetime.now(timezone.utc).isoformat(), thread["id"]))
+                conn.commit()
+                latencies.append(time.perf_counter() - started)
+                time.sleep(0.005)
+            conn.close()
+        writer_thread = threading.Thread(target=writer)
+        writer_thread.start()
+        started = time.perf_counter()
+        copy()
+        duration = time.perf_counter() - started
+        stop.set()
+        writer_thread.join()
+        latencies.sort()
+        return (f"{duration:.2f}s, {len(latencies)} writes, write p50 {statistics.median(latencies) * 1000:.2f}ms, "
+                f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f}ms, max {latencies[-1] * 1000:.1f}ms")
+    
+    def locked_copy():
+        conn = sqlite3.connect(db.db_path, isolation_level=None)
+        conn.execute("BEGIN IMMEDIATE")
+        shutil.copy(db.db_path, os.path.join(tmp_dir, "copy.db"))
+        conn.execute("ROLLBACK")
+        conn.close()
+    
+    backup = DatabaseBackup(db, os.path.join(tmp_dir, "backups"), retention=1, pages_per_step=pages_per_step, step_sleep=step_sleep)
+    print(f"No copy (1s):            {measure_writes(lambda: time.sleep(1))}")
+    print(f"Locked file copy:        {measure_writes(locked_copy)}")
+    print(f"Online snapshot:         {measure_writes(backup._backup)}")
+    print(f"Snapshot metrics: {backup.get_stats()}")
+
+
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+    
+    parser = argparse.ArgumentParser(description="Local database maintenance and benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    search_parser = subparsers.add_parser("benchmark-search", help="Benchmark full-text message search on a synthetic corpus")
+    search_parser.add_argument("--messages", type=int, default=1_000_000, help="Number of messages to generate")
+    search_parser.add_argument("--threads", type=int, default=10_000, help="Number of threads to spread them over")
+    search_parser.add_argument("--query", action="append", help="Query to time (repeatable)")
+    
+    compress_parser = subparsers.add_parser("compress", help="Compress stored messages above MESSAGE_COMPRESSION_THRESHOLD")
+    compress_parser.add_argument("--db", default=config.SQLITE_DB_PATH, help="Database to migrate")
+    compress_parser.add_argument("--no-dictionary", action="store_true", help="Do not train a compression dictionary")
+    compress_parser.add_argument("--no-vacuum", action="store_true", help="Do not VACUUM to reclaim the freed space")
+    compress_parser.add_argument("--sample-threads", type=int, default=50, help="Threads read to measure read latency")
+    archive_parser = subparsers.add_parser("benchmark-archive", help="Benchmark hot-path latency with cold storage as history grows")
+    archive_parser.add_argument("--hot-threads", type=int, default=200, help="Recently active threads")
+    archive_parser.add_argument("--cold-threads", type=int, default=1000, help="Idle threads at the smallest scale")
+    archive_parser.add_argument("--messages-per-thread", type=int, default=50, help="Messages per thread")
+    archive_parser.add_argument("--growth", type=int, default=10, help="Factor by which the idle history grows")
+    backup_parser = subparsers.add_parser("backup", help="Take an online snapshot of the database")
+    backup_parser.add_argument("--db", default=config.SQLITE_DB_PATH, help="Database to back up")
+    backup_parser.add_argument("--dir", default=config.SQLITE_BACKUP_PATH, help="Directory of the snapshots")
+    restore_parser = subparsers.add_parser("restore", help="Restore the database from a snapshot (stop the API first)")
+    restore_parser.add_argument("snapshot", nargs="?", help="Snapshot to restore (default: the newest)")
+    restore_parser.add_argument("--db", default=config.SQLITE_DB_PATH, help="Database to restore")
+    restore_parser.add_argument("--dir", default=config.SQLITE_BACKUP_PATH, help="Directory of the snapshots")
+    benchmark_backup_parser = subparsers.add_parser("benchmark-backup", help="Benchmark writer latency during backups")
+    benchmark_backup_parser.add_argument("--messages", type=int, default=200_000, help="Messages in the database")
+    benchmark_backup_parser.add_argument("--pages-per-step", type=int, default=config.SQLITE_BACKUP_PAGES_PER_STEP)
+    benchmark_backup_parser.add_argument("--step-sleep", type=float, default=config.SQLITE_BACKUP_STEP_SLEEP)
+    args = parser.parse_args()
+    
+    if args.command in ("backup", "restore"):
+        backup = DatabaseBackup(LocalDatabase(args.db), args.dir)
+        if args.command == "backup":
+            print(asyncio.run(backup.backup()))
+        else:
+            snapshot = args.snapshot or next(iter(backup.list_backups()), None)
+            if not snapshot:
+                parser.error(f"No snapshots in {args.dir}")
+            asyncio.run(backup.restore(snapshot))
+    elif args.command == "benchmark-backup":
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            asyncio.run(_benchmark_backup(tmp_dir, args.messages, args.pages_per_step, args.step_sleep))
+    elif args.command == "benchmark-archive":
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            asyncio.run(_benchmark_archive(tmp_dir, args.hot_threads, args.cold_threads, args.messages_per_thread, args.growth))
+    elif args.command == "compress":
+        asyncio.run(_migrate_compression(args.db, not args.no_dictionary, not args.no_vacuum, args.sample_threads))
+    else:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            asyncio.run(_benchmark_search(
+                os.path.join(tmp_dir, "bench.db"), args.messages, args.threads,
+                args.query or ["word3", "word150 word7", "word15000"]
+            ))
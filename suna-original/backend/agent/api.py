@@ -17,9 +17,7 @@ from services import redis
 from agent.run import run_agent
 from utils.auth_utils import get_current_user_id_from_jwt, get_user_id_from_stream_auth, verify_thread_access
 from utils.logger import logger
-from services.billing import check_billing_status
-from sandbox.sandbox import create_sandbox, get_or_start_sandbox
-from services.llm import make_llm_api_call
+from services.billing import check_billing_status, record_agent_run_usage, USAGE_HEARTBEAT_INTERVAL
 
 # Initialize shared resources
 router = APIRouter()
@@ -138,6 +136,9 @@ async def update_agent_run_status(
                 if hasattr(update_result, 'data') and update_result.data:
                     logger.info(f"Successfully updated agent run {agent_run_id} status to '{status}' (retry {retry})")
 
+                    # Count the run's final minutes towards the account's monthly usage
+                    await record_agent_run_usage(client, agent_run_id)
+
                     # Verify the update
                     verify_result = await client.table('agent_runs').select('status', 'completed_at').eq("id", agent_run_id).execute()
                     if verify_result.data:
@@ -330,19 +331,25 @@ async def get_or_create_project_sandbox(client, project_id: str):
         raise ValueError(f"Project {project_id} not found")
     project_data = project.data[0]
 
+    from sandbox.sandbox import get_or_start_sandbox # Deferred: imports the Daytona SDK
+    from sandbox.pool import sandbox_pool
+    from sandbox.handle_cache import sandbox_handles
+
     if project_data.get('sandbox', {}).get('id'):
         sandbox_id = project_data['sandbox']['id']
         sandbox_pass = project_data['sandbox']['pass']
         logger.info(f"Project {project_id} already has sandbox {sandbox_id}, retrieving it")
         try:
             sandbox = await get_or_start_sandbox(sandbox_id)
+            sandbox_handles.remember_project(project_id, sandbox_id, sandbox_pass)
             return sandbox, sandbox_id, sandbox_pass
         except Exception as e:
             logger.error(f"Failed to retrieve existing sandbox {sandbox_id}: {str(e)}. Creating a new one.")
+            sandbox_handles.invalidate(sandbox_id)
 
     logger.info(f"Creating new sandbox for project {project_id}")
-    sandbox_pass = str(uuid.uuid4())
-    sandbox = create_sandbox(sandbox_pass, project_id)
+    # Takes a pre-warmed sandbox from the pool when one is ready
+    sandbox, sandbox_pass = await sandbox_pool.get_sandbox(project_id)
     sandbox_id = sandbox.id
     logger.info(f"Created new sandbox {sandbox_id}")
 
@@ -367,12 +374,16 @@ async def get_or_create_project_sandbox(client, project_id: str):
         logger.error(f"Failed to update project {project_id} with new sandbox {sandbox_id}")
         raise Exception("Database update failed")
 
+    # Tools of the project's first run use the new sandbox without looking it up again
+    sandbox_handles.put(sandbox, sandbox_pass)
+    sandbox_handles.remember_project(project_id, sandbox_id, sandbox_pass)
     return sandbox, sandbox_id, sandbox_pass
 
 @router.get("/test-local-llm")
 async def test_local_llm():
     """Test endpoint for local LLM."""
     try:
+        from services.llm import make_llm_api_call
         # Make a simple call to the local LLM
         response = await make_llm_api_call(
             model_name="openai/gpt-3.5-turbo",  # This will be routed to our local endpoint
@@ -493,6 +504,68 @@ async def get_agent_runs(thread_id: str, user_id: str = Depends(get_current_user
     logger.debug(f"Found {len(agent_runs.data)} agent runs for thread: {thread_id}")
     return {"agent_runs": agent_runs.data}
 
+@router.get("/threads")
+async def list_threads(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    project_id: Optional[str] = None,
+    user_id: str = Depends(get_current_user_id_from_jwt)
+):
+    """Get a page of the user's threads, newest first; pass next_cursor to get older ones."""
+    from services.pagination import get_threads_page
+    client = await db.client
+    try:
+        page = await get_threads_page(client, user_id, limit=limit, cursor=cursor, project_id=project_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"threads": page["rows"], "next_cursor": page["next_cursor"],
+            "has_more": page["has_more"], "total_estimate": page["total_estimate"]}
+
+@router.get("/thread/{thread_id}/messages")
+async def list_thread_messages(
+    thread_id: str,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    latest_first: bool = True,
+    user_id: str = Depends(get_current_user_id_from_jwt)
+):
+    """Get a page of a thread's messages.
+    
+    By default the first page holds the latest messages and next_cursor scrolls
+    back through older ones; with latest_first=false pages run from the start.
+    """
+    from services.pagination import get_messages_page
+    client = await db.client
+    await verify_thread_access(client, thread_id, user_id)
+    try:
+        page = await get_messages_page(client, thread_id, limit=limit, cursor=cursor, latest_first=latest_first)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"messages": page["rows"], "next_cursor": page["next_cursor"],
+            "has_more": page["has_more"], "total_estimate": page["total_estimate"]}
+
+@router.get("/threads/search")
+async def search_threads(
+    q: str,
+    thread_id: Optional[str] = None,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    user_id: str = Depends(get_current_user_id_from_jwt)
+):
+    """Full-text search over the messages of the user's threads, best matches first."""
+    from utils.config import config, EnvMode
+    if config.ENV_MODE != EnvMode.LOCAL:
+        raise HTTPException(status_code=501, detail="Message search is only available in LOCAL mode")
+    if not 1 <= limit <= 100:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 100")
+    
+    logger.info(f"Searching messages for user {user_id}: {q!r}")
+    from services.local_database import local_db
+    try:
+        return await local_db.search_messages(q, user_id=user_id, thread_id=thread_id, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.get("/agent-run/{agent_run_id}")
 async def get_agent_run(agent_run_id: str, user_id: str = Depends(get_current_user_id_from_jwt)):
     """Get agent run status and responses."""
@@ -724,6 +797,7 @@ async def run_agent_background(
     total_responses = 0
     pubsub = None
     stop_checker = None
+    usage_heartbeat = None
     stop_signal_received = False
 
     # Define Redis keys and channels
@@ -733,6 +807,12 @@ async def run_agent_background(
     global_control_channel = f"agent_run:{agent_run_id}:control"
     instance_active_key = f"active_run:{instance_id}:{agent_run_id}"
 
+    async def heartbeat_usage():
+        # Keep the monthly usage counter current while the run goes on
+        while True:
+            await asyncio.sleep(USAGE_HEARTBEAT_INTERVAL)
+            await record_agent_run_usage(client, agent_run_id)
+
     async def check_for_stop_signal():
         nonlocal stop_signal_received
         if not pubsub: return
@@ -763,6 +843,7 @@ async def run_agent_background(
         await pubsub.subscribe(instance_control_channel, global_control_channel)
         logger.debug(f"Subscribed to control channels: {instance_control_channel}, {global_control_channel}")
         stop_checker = asyncio.create_task(check_for_stop_signal())
+        usage_heartbeat = asyncio.create_task(heartbeat_usage())
 
         # Ensure active run key exists and has TTL
         await redis.set(instance_active_key, "running", ex=redis.REDIS_KEY_TTL)
@@ -866,6 +947,8 @@ async def run_agent_background(
             try: await stop_checker
             except asyncio.CancelledError: pass
             except Exception as e: logger.warning(f"Error during stop_checker cancellation: {e}")
+        if usage_heartbeat and not usage_heartbeat.done():
+            usage_heartbeat.cancel()
 
         # Close pubsub connection
         if pubsub:
@@ -897,6 +980,7 @@ async def generate_and_update_project_name(project_id: str, prompt: str):
         messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_message}]
 
         logger.debug(f"Calling LLM ({model_name}) for project {project_id} naming.")
+        from services.llm import make_llm_api_call
         response = await make_llm_api_call(messages=messages, model_name=model_name, max_tokens=20, temperature=0.7)
 
         generated_name = None
@@ -993,52 +1077,20 @@ async def initiate_agent_with_files(
         # 4. Upload Files to Sandbox (if any)
         message_content = prompt
         if files:
-            successful_uploads = []
-            failed_uploads = []
-            for file in files:
-                if file.filename:
-                    try:
-                        safe_filename = file.filename.replace('/', '_').replace('\\', '_')
-                        target_path = f"/workspace/{safe_filename}"
-                        logger.info(f"Attempting to upload {safe_filename} to {target_path} in sandbox {sandbox_id}")
-                        content = await file.read()
-                        upload_successful = False
-                        try:
-                            if hasattr(sandbox, 'fs') and hasattr(sandbox.fs, 'upload_file'):
-                                import inspect
-                                if inspect.iscoroutinefunction(sandbox.fs.upload_file):
-                                    await sandbox.fs.upload_file(target_path, content)
-                                else:
-                                    sandbox.fs.upload_file(target_path, content)
-                                logger.debug(f"Called sandbox.fs.upload_file for {target_path}")
-                                upload_successful = True
-                            else:
-                                raise NotImplementedError("Suitable upload method not found on sandbox object.")
-                        except Exception as upload_error:
-                            logger.error(f"Error during sandbox upload call for {safe_filename}: {str(upload_error)}", exc_info=True)
-
-                        if upload_successful:
-                            try:
-                                await asyncio.sleep(0.2)
-                                parent_dir = os.path.dirname(target_path)
-                                files_in_dir = sandbox.fs.list_files(parent_dir)
-                                file_names_in_dir = [f.name for f in files_in_dir]
-                                if safe_filename in file_names_in_dir:
-                                    successful_uploads.append(target_path)
-                                    logger.info(f"Successfully uploaded and verified file {safe_filename} to sandbox path {target_path}")
-                                else:
-                                    logger.error(f"Verification failed for {safe_filename}: File not found in {parent_dir} after upload attempt.")
-                                    failed_uploads.append(safe_filename)
-                            except Exception as verify_error:
-                                logger.error(f"Error verifying file {safe_filename} after upload: {str(verify_error)}", exc_info=True)
-                                failed_uploads.append(safe_filename)
-                        else:
-                            failed_uploads.append(safe_filename)
-                    except Exception as file_error:
-                        logger.error(f"Error processing file {file.filename}: {str(file_error)}", exc_info=True)
-                        failed_uploads.append(file.filename)
-                    finally:
-                        await file.close()
+            # One archive, one transfer, one extraction with checksums for all attachments
+            from sandbox.bulk_upload import upload_files_bulk
+            named_files = [file for file in files if file.filename]
+            logger.info(f"Uploading {len(named_files)} files to /workspace in sandbox {sandbox_id}")
+            try:
+                successful_uploads, failed_uploads = await upload_files_bulk(
+                    sandbox, [(file.filename, file.file) for file in named_files], "/workspace"
+                )
+            except Exception as upload_error:
+                logger.error(f"Error uploading files to sandbox {sandbox_id}: {str(upload_error)}", exc_info=True)
+                successful_uploads, failed_uploads = [], [file.filename for file in named_files]
+            finally:
+                for file in files:
+                    await file.close()
 
             if successful_uploads:
                 message_content += "\n\n" if message_content else ""
@@ -4,25 +4,15 @@ import re
 from uuid import uuid4
 from typing import Optional
 
-# from agent.tools.message_tool import MessageTool
-from agent.tools.message_tool import MessageTool
-from agent.tools.sb_deploy_tool import SandboxDeployTool
-from agent.tools.sb_expose_tool import SandboxExposeTool
-from agent.tools.web_search_tool import WebSearchTool
 from dotenv import load_dotenv
 from utils.config import config
 
 from agentpress.thread_manager import ThreadManager
 from agentpress.response_processor import ProcessorConfig
-from agent.tools.sb_shell_tool import SandboxShellTool
-from agent.tools.sb_files_tool import SandboxFilesTool
-from agent.tools.sb_browser_tool import SandboxBrowserTool
-from agent.tools.data_providers_tool import DataProvidersTool
 from agent.prompt import get_system_prompt
 from utils.logger import logger
 from utils.auth_utils import get_account_id_from_thread
 from services.billing import check_billing_status
-from agent.tools.sb_vision_tool import SandboxVisionTool
 
 load_dotenv()
 
@@ -63,29 +53,27 @@ async def run_agent(
             "password": "local-sandbox-pass"
         }
     else:
-        project = await client.table('projects').select('*').eq('project_id', project_id).execute()
-        if not project.data or len(project.data) == 0:
-            raise ValueError(f"Project {project_id} not found")
-        
-        project_data = project.data[0]
-        sandbox_info = project_data.get('sandbox', {})
-        if not sandbox_info.get('id'):
-            raise ValueError(f"No sandbox found for project {project_id}")
+        # Usually cached by start_agent, which just resolved the project's sandbox
+        from sandbox.handle_cache import sandbox_handles
+        sandbox_id, sandbox_pass = await sandbox_handles.get_project_sandbox(client, project_id)
+        sandbox_info = {"id": sandbox_id, "password": sandbox_pass}
     
     # Initialize tools with project_id instead of sandbox object
     # This ensures each tool independently verifies it's operating on the correct project
-    thread_manager.add_tool(SandboxShellTool, project_id=project_id, thread_manager=thread_manager)
-    thread_manager.add_tool(SandboxFilesTool, project_id=project_id, thread_manager=thread_manager)
-    thread_manager.add_tool(SandboxBrowserTool, project_id=project_id, thread_id=thread_id, thread_manager=thread_manager)
-    thread_manager.add_tool(SandboxDeployTool, project_id=project_id, thread_manager=thread_manager)
-    thread_manager.add_tool(SandboxExposeTool, project_id=project_id, thread_manager=thread_manager)
-    thread_manager.add_tool(MessageTool) # we are just doing this via prompt as there is no need to call it as a tool
-    thread_manager.add_tool(WebSearchTool)
-    thread_manager.add_tool(SandboxVisionTool, project_id=project_id, thread_id=thread_id, thread_manager=thread_manager)
+    # Tools are registered by path so their modules (and the SDKs behind them) are only imported on first use
+    thread_manager.add_tool("agent.tools.sb_shell_tool:SandboxShellTool", project_id=project_id, thread_manager=thread_manager)
+    thread_manager.add_tool("agent.tools.sb_files_tool:SandboxFilesTool", project_id=project_id, thread_manager=thread_manager)
+    thread_manager.add_tool("agent.tools.sb_browser_tool:SandboxBrowserTool", project_id=project_id, thread_id=thread_id, thread_manager=thread_manager)
+    thread_manager.add_tool("agent.tools.sb_deploy_tool:SandboxDeployTool", project_id=project_id, thread_manager=thread_manager)
+    thread_manager.add_tool("agent.tools.sb_expose_tool:SandboxExposeTool", project_id=project_id, thread_manager=thread_manager)
+    thread_manager.add_tool("agent.tools.message_tool:MessageTool") # we are just doing this via prompt as there is no need to call it as a tool
+    thread_manager.add_tool("agent.tools.web_search_tool:WebSearchTool")
+    thread_manager.add_tool("agent.tools.tool_output_tool:ToolOutputTool")
+    thread_manager.add_tool("agent.tools.sb_vision_tool:SandboxVisionTool", project_id=project_id, thread_id=thread_id, thread_manager=thread_manager)
         
     # Add data providers tool if RapidAPI key is available
     if config.RAPID_API_KEY:
-        thread_manager.add_tool(DataProvidersTool)
+        thread_manager.add_tool("agent.tools.data_providers_tool:DataProvidersTool")
 
     system_message = { "role": "system", "content": get_system_prompt() }
 
@@ -215,7 +203,10 @@ async def run_agent(
             include_xml_examples=True,
             enable_thinking=enable_thinking,
             reasoning_effort=reasoning_effort,
-            enable_context_manager=enable_context_manager
+            enable_context_manager=enable_context_manager,
+            select_tools=config.TOOL_SELECTION_ENABLED,
+            core_tools=["MessageTool", "ToolOutputTool"],
+            max_selected_tools=config.TOOL_SELECTION_MAX_TOOLS
         )
             
         if isinstance(response, dict) and "status" in response and response["status"] == "error":
@@ -1,11 +1,16 @@
 import json
+import importlib
 
 from agentpress.tool import Tool, ToolResult, openapi_schema, xml_schema
-from agent.tools.data_providers.LinkedinProvider import LinkedinProvider
-from agent.tools.data_providers.YahooFinanceProvider import YahooFinanceProvider
-from agent.tools.data_providers.AmazonProvider import AmazonProvider
-from agent.tools.data_providers.ZillowProvider import ZillowProvider
-from agent.tools.data_providers.TwitterProvider import TwitterProvider
+
+# Providers are imported and instantiated on first use
+DATA_PROVIDERS = {
+    "linkedin": "agent.tools.data_providers.LinkedinProvider:LinkedinProvider",
+    "yahoo_finance": "agent.tools.data_providers.YahooFinanceProvider:YahooFinanceProvider",
+    "amazon": "agent.tools.data_providers.AmazonProvider:AmazonProvider",
+    "zillow": "agent.tools.data_providers.ZillowProvider:ZillowProvider",
+    "twitter": "agent.tools.data_providers.TwitterProvider:TwitterProvider"
+}
 
 class DataProvidersTool(Tool):
     """Tool for making requests to various data providers."""
@@ -13,13 +18,16 @@ class DataProvidersTool(Tool):
     def __init__(self):
         super().__init__()
 
-        self.register_data_providers = {
-            "linkedin": LinkedinProvider(),
-            "yahoo_finance": YahooFinanceProvider(),
-            "amazon": AmazonProvider(),
-            "zillow": ZillowProvider(),
-            "twitter": TwitterProvider()
-        }
+        self.register_data_providers = DATA_PROVIDERS
+        self._provider_instances = {}
+
+    def _get_data_provider(self, service_name: str):
+        """Get a data provider instance, importing it on first use."""
+        if service_name not in self._provider_instances:
+            module_name, _, class_name = self.register_data_providers[service_name].partition(":")
+            provider_class = getattr(importlib.import_module(module_name), class_name)
+            self._provider_instances[service_name] = provider_class()
+        return self._provider_instances[service_name]
 
     @openapi_schema({
         "type": "function",
@@ -71,7 +79,7 @@ Use this tool when you need to discover what endpoints are available.
             if service_name not in self.register_data_providers:
                 return self.fail_response(f"Data provider '{service_name}' not found. Available data providers: {list(self.register_data_providers.keys())}")
                 
-            endpoints = self.register_data_providers[service_name].get_endpoints()
+            endpoints = self._get_data_provider(service_name).get_endpoints()
             return self.success_response(endpoints)
             
         except Exception as e:
@@ -152,7 +160,7 @@ Use this tool when you need to discover what endpoints are available.
             if service_name not in self.register_data_providers:
                 return self.fail_response(f"API '{service_name}' not found. Available APIs: {list(self.register_data_providers.keys())}")
             
-            data_provider = self.register_data_providers[service_name]
+            data_provider = self._get_data_provider(service_name)
             if route == service_name:
                 return self.fail_response(f"route '{route}' is the same as service_name '{service_name}'. YOU FUCKING IDIOT!")
             
@@ -1,5 +1,6 @@
 import traceback
 import json
+import asyncio
 
 from agentpress.tool import ToolResult, openapi_schema, xml_schema
 from agentpress.thread_manager import ThreadManager
@@ -13,6 +14,40 @@ class SandboxBrowserTool(SandboxToolsBase):
     def __init__(self, project_id: str, thread_id: str, thread_manager: ThreadManager):
         super().__init__(project_id, thread_manager)
         self.thread_id = thread_id
+        self._browser_api_ready = False
+
+    async def warm_up(self) -> None:
+        """Start the sandbox and wait for the browser automation API to accept requests."""
+        await super().warm_up()
+        await self._wait_for_browser_api()
+
+    async def _wait_for_browser_api(self, attempts: int = 20, interval: float = 0.5) -> bool:
+        """Poll the in-sandbox browser API health endpoint until it responds.
+
+        Args:
+            attempts: Maximum number of health checks
+            interval: Seconds to wait between checks
+
+        Returns:
+            True if the browser API is ready
+        """
+        if self._browser_api_ready:
+            return True
+
+        health_cmd = "curl -s -o /dev/null -w '%{http_code}' http://localhost:8002/api"
+        for _ in range(attempts):
+            try:
+                response = await asyncio.to_thread(self.sandbox.process.exec, health_cmd, timeout=5)
+                if response.exit_code == 0 and str(response.result).strip() == "200":
+                    self._browser_api_ready = True
+                    logger.debug("Browser automation API is ready")
+                    return True
+            except Exception as e:
+                logger.debug(f"Browser API health check failed: {e}")
+            await asyncio.sleep(interval)
+
+        logger.warning("Browser automation API did not become ready during warm-up")
+        return False
 
     async def _execute_browser_action(self, endpoint: str, params: dict = None, method: str = "POST") -> ToolResult:
         """Execute a browser automation action through the API
@@ -71,8 +71,8 @@ class SandboxExposeTool(SandboxToolsBase):
             if not 1 <= port <= 65535:
                 return self.fail_response(f"Invalid port number: {port}. Must be between 1 and 65535.")
 
-            # Get the preview link for the specified port
-            preview_link = self.sandbox.get_preview_link(port)
+            # Get the preview link for the specified port (cached on the sandbox handle)
+            preview_link = await self.handle.get_preview_link(port)
             
             # Extract the actual URL from the preview link object
             url = preview_link.url if hasattr(preview_link, 'url') else str(preview_link)
@@ -1,12 +1,24 @@
 from daytona_sdk.process import SessionExecuteRequest
-from typing import Optional
+from typing import Dict, List, Optional
 
+from agentpress.blob_store import BLOB_THRESHOLD_CHARS
 from agentpress.tool import ToolResult, openapi_schema, xml_schema
+from sandbox.file_edits import EditError, apply_edits, format_snippets, parse_unified_diff, replace_op, write_op
+from sandbox.file_reader import file_reader
+from sandbox.remote_exec import RemoteExecError
 from sandbox.sandbox import SandboxToolsBase, Sandbox, get_or_start_sandbox
 from utils.files_utils import EXCLUDED_FILES, EXCLUDED_DIRS, EXCLUDED_EXT, should_exclude_file, clean_path
 from agentpress.thread_manager import ThreadManager
 from utils.logger import logger
+import json
 import os
+import re
+import textwrap
+
+# Constants
+# read_file results stay under the blob store's offload threshold, so a ranged
+# read returns the lines themselves instead of a stub of them
+READ_FILE_MAX_BYTES = BLOB_THRESHOLD_CHARS // 2
 
 class SandboxFilesTool(SandboxToolsBase):
     """Tool for executing file system operations in a Daytona sandbox. All operations are performed relative to the /workspace directory."""
@@ -32,42 +44,6 @@ class SandboxFilesTool(SandboxToolsBase):
         except Exception:
             return False
 
-    async def get_workspace_state(self) -> dict:
-        """Get the current workspace state by reading all files"""
-        files_state = {}
-        try:
-            # Ensure sandbox is initialized
-            await self._ensure_sandbox()
-            
-            files = self.sandbox.fs.list_files(self.workspace_path)
-            for file_info in files:
-                rel_path = file_info.name
-                
-                # Skip excluded files and directories
-                if self._should_exclude_file(rel_path) or file_info.is_dir:
-                    continue
-
-                try:
-                    full_path = f"{self.workspace_path}/{rel_path}"
-                    content = self.sandbox.fs.download_file(full_path).decode()
-                    files_state[rel_path] = {
-                        "content": content,
-                        "is_dir": file_info.is_dir,
-                        "size": file_info.size,
-                        "modified": file_info.mod_time
-                    }
-                except Exception as e:
-                    print(f"Error reading file {rel_path}: {e}")
-                except UnicodeDecodeError:
-                    print(f"Skipping binary file: {rel_path}")
-
-            return files_state
-        
-        except Exception as e:
-            print(f"Error getting workspace state: {str(e)}")
-            return {}
-
-
     # def _get_preview_url(self, file_path: str) -> Optional[str]:
     #     """Get the preview URL for a file if it's an HTML file."""
     #     if file_path.lower().endswith('.html') and self._sandbox_url:
@@ -186,39 +162,20 @@ class SandboxFilesTool(SandboxToolsBase):
             await self._ensure_sandbox()
             
             file_path = self.clean_path(file_path)
-            full_path = f"{self.workspace_path}/{file_path}"
-            if not self._file_exists(full_path):
-                return self.fail_response(f"File '{file_path}' does not exist")
-            
-            content = self.sandbox.fs.download_file(full_path).decode()
-            old_str = old_str.expandtabs()
-            new_str = new_str.expandtabs()
-            
-            occurrences = content.count(old_str)
-            if occurrences == 0:
-                return self.fail_response(f"String '{old_str}' not found in file")
-            if occurrences > 1:
-                lines = [i+1 for i, line in enumerate(content.split('\n')) if old_str in line]
-                return self.fail_response(f"Multiple occurrences found in lines {lines}. Please ensure string is unique")
-            
-            # Perform replacement
-            new_content = content.replace(old_str, new_str)
-            self.sandbox.fs.upload_file(full_path, new_content.encode())
-            
-            # Show snippet around the edit
-            replacement_line = content.split(old_str)[0].count('\n')
-            start_line = max(0, replacement_line - self.SNIPPET_LINES)
-            end_line = replacement_line + self.SNIPPET_LINES + new_str.count('\n')
-            snippet = '\n'.join(new_content.split('\n')[start_line:end_line + 1])
+            # The replacement is applied in the sandbox; only the snippet comes back
+            changed = await apply_edits(self.sandbox, [replace_op(file_path, [(old_str.expandtabs(), new_str.expandtabs())])],
+                                        root=self.workspace_path, context_lines=self.SNIPPET_LINES)
             
             # Get preview URL if it's an HTML file
             # preview_url = self._get_preview_url(file_path)
-            message = f"Replacement successful."
+            message = f"Replacement successful.\n\n{format_snippets(file_path, changed[file_path]['snippets'])}"
             # if preview_url:
             #     message += f"\n\nYou can preview this HTML file at: {preview_url}"
             
             return self.success_response(message)
             
+        except EditError as e:
+            return self.fail_response(e.errors[0]["error"])
         except Exception as e:
             return self.fail_response(f"Error replacing string: {str(e)}")
 
@@ -269,12 +226,8 @@ class SandboxFilesTool(SandboxToolsBase):
             await self._ensure_sandbox()
             
             file_path = self.clean_path(file_path)
-            full_path = f"{self.workspace_path}/{file_path}"
-            if not self._file_exists(full_path):
-                return self.fail_response(f"File '{file_path}' does not exist. Use create_file to create a new file.")
-            
-            self.sandbox.fs.upload_file(full_path, file_contents.encode())
-            self.sandbox.fs.set_file_permissions(full_path, permissions)
+            # Written to a temporary file and renamed into place, with permissions, in one call
+            await apply_edits(self.sandbox, [write_op(file_path, file_contents, permissions)], root=self.workspace_path)
             
             # Get preview URL if it's an HTML file
             # preview_url = self._get_preview_url(file_path)
@@ -283,9 +236,113 @@ class SandboxFilesTool(SandboxToolsBase):
             #     message += f"\n\nYou can preview this HTML file at: {preview_url}"
             
             return self.success_response(message)
+        except EditError as e:
+            if e.errors[0]["code"] == "not_found":
+                return self.fail_response(f"File '{file_path}' does not exist. Use create_file to create a new file.")
+            return self.fail_response(e.errors[0]["error"])
         except Exception as e:
             return self.fail_response(f"Error rewriting file: {str(e)}")
 
+    @openapi_schema({
+        "type": "function",
+        "function": {
+            "name": "edit_files",
+            "description": "Apply many edits across one or more files in a single call. The edits are given as a list of exact string replacements, as a unified diff, or both. Either every edit is applied or, if any edit fails, no file is changed. Paths must be relative to /workspace. Use this instead of repeated str_replace calls for multi-location or multi-file changes.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "edits": {
+                        "type": "array",
+                        "description": "String replacements, applied in order. Each old_str must appear exactly once in the file at the time it is applied.",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "file_path": {
+                                    "type": "string",
+                                    "description": "Path to the target file, relative to /workspace (e.g., 'src/main.py')"
+                                },
+                                "old_str": {
+                                    "type": "string",
+                                    "description": "Text to be replaced (must appear exactly once)"
+                                },
+                                "new_str": {
+                                    "type": "string",
+                                    "description": "Replacement text"
+                                }
+                            },
+                            "required": ["file_path", "old_str", "new_str"]
+                        }
+                    },
+                    "diff": {
+                        "type": "string",
+                        "description": "A unified diff with '--- a/path' and '+++ b/path' headers and '@@' hunks, relative to /workspace. May change several files, create files (--- /dev/null) and delete files (+++ /dev/null)."
+                    }
+                }
+            }
+        }
+    })
+    @xml_schema(
+        tag_name="edit-files",
+        mappings=[
+            {"param_name": "diff", "node_type": "content", "path": "."}
+        ],
+        example='''
+        <edit-files>
+        --- a/src/main.py
+        +++ b/src/main.py
+        @@ -1,3 +1,3 @@
+         import os
+        -from utils import load
+        +from utils import load_config
+         
+        --- a/src/utils.py
+        +++ b/src/utils.py
+        @@ -10,2 +10,2 @@
+        -def load(path):
+        +def load_config(path):
+             with open(path) as f:
+        </edit-files>
+        '''
+    )
+    async def edit_files(self, edits: Optional[List[Dict[str, str]]] = None, diff: Optional[str] = None) -> ToolResult:
+        try:
+            # Ensure sandbox is initialized
+            await self._ensure_sandbox()
+            
+            operations = []
+            if diff and diff.strip():
+                try:
+                    operations.extend(parse_unified_diff(textwrap.dedent(diff)))
+                except ValueError as e:
+                    return self.fail_response(f"Invalid diff: {str(e)}")
+                for operation in operations:
+                    operation["path"] = self.clean_path(operation["path"])
+            # Consecutive replacements in the same file become one operation
+            for edit in edits or []:
+                file_path = self.clean_path(edit["file_path"])
+                if operations and operations[-1]["op"] == "replace" and operations[-1]["path"] == file_path:
+                    operations[-1]["replacements"].append([edit["old_str"], edit["new_str"]])
+                else:
+                    operations.append(replace_op(file_path, [(edit["old_str"], edit["new_str"])]))
+            if not operations:
+                return self.fail_response("No edits given. Provide 'edits', 'diff', or both.")
+            
+            changed = await apply_edits(self.sandbox, operations, root=self.workspace_path,
+                                        context_lines=self.SNIPPET_LINES)
+            
+            sections = []
+            for path, result in changed.items():
+                if result["deleted"]:
+                    sections.append(f"{path}: deleted")
+                else:
+                    sections.append(format_snippets(path, result["snippets"]))
+            return self.success_response(f"Edited {len(changed)} file(s); all edits applied.\n\n" + "\n\n".join(sections))
+        
+        except EditError as e:
+            return self.fail_response(f"No files were changed. {len(e.errors)} edit(s) failed:\n{str(e)}")
+        except Exception as e:
+            return self.fail_response(f"Error editing files: {str(e)}")
+
     @openapi_schema({
         "type": "function",
         "function": {
@@ -328,105 +385,117 @@ class SandboxFilesTool(SandboxToolsBase):
         except Exception as e:
             return self.fail_response(f"Error deleting file: {str(e)}")
 
-    # @openapi_schema({
-    #     "type": "function",
-    #     "function": {
-    #         "name": "read_file",
-    #         "description": "Read and return the contents of a file. This tool is essential for verifying data, checking file contents, and analyzing information. Always use this tool to read file contents before processing or analyzing data. The file path must be relative to /workspace.",
-    #         "parameters": {
-    #             "type": "object",
-    #             "properties": {
-    #                 "file_path": {
-    #                     "type": "string",
-    #                     "description": "Path to the file to read, relative to /workspace (e.g., 'src/main.py' for /workspace/src/main.py). Must be a valid file path within the workspace."
-    #                 },
-    #                 "start_line": {
-    #                     "type": "integer",
-    #                     "description": "Optional starting line number (1-based). Use this to read specific sections of large files. If not specified, reads from the beginning of the file.",
-    #                     "default": 1
-    #                 },
-    #                 "end_line": {
-    #                     "type": "integer",
-    #                     "description": "Optional ending line number (inclusive). Use this to read specific sections of large files. If not specified, reads to the end of the file.",
-    #                     "default": None
-    #                 }
-    #             },
-    #             "required": ["file_path"]
-    #         }
-    #     }
-    # })
-    # @xml_schema(
-    #     tag_name="read-file",
-    #     mappings=[
-    #         {"param_name": "file_path", "node_type": "attribute", "path": "."},
-    #         {"param_name": "start_line", "node_type": "attribute", "path": ".", "required": False},
-    #         {"param_name": "end_line", "node_type": "attribute", "path": ".", "required": False}
-    #     ],
-    #     example='''
-    #     <!-- Example 1: Read entire file -->
-    #     <read-file file_path="src/main.py">
-    #     </read-file>
+    @openapi_schema({
+        "type": "function",
+        "function": {
+            "name": "read_file",
+            "description": "Read and return the contents of a file. This tool is essential for verifying data, checking file contents, and analyzing information. Always use this tool to read file contents before processing or analyzing data. The file path must be relative to /workspace. For large files, read the lines you need: only the requested lines are fetched, so reading part of a large log or CSV is cheap.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "file_path": {
+                        "type": "string",
+                        "description": "Path to the file to read, relative to /workspace (e.g., 'src/main.py' for /workspace/src/main.py). Must be a valid file path within the workspace."
+                    },
+                    "start_line": {
+                        "type": "integer",
+                        "description": "Optional starting line number (1-based). Use this to read specific sections of large files. Negative values count from the end of the file (-10 starts at the 10th line from the end). If not specified, reads from the beginning of the file.",
+                        "default": 1
+                    },
+                    "end_line": {
+                        "type": "integer",
+                        "description": "Optional ending line number (inclusive). Use this to read specific sections of large files. If not specified, reads to the end of the file.",
+                        "default": None
+                    }
+                },
+                "required": ["file_path"]
+            }
+        }
+    })
+    @xml_schema(
+        tag_name="read-file",
+        mappings=[
+            {"param_name": "file_path", "node_type": "attribute", "path": "."},
+            {"param_name": "start_line", "node_type": "attribute", "path": ".", "required": False},
+            {"param_name": "end_line", "node_type": "attribute", "path": ".", "required": False}
+        ],
+        example='''
+        <!-- Example 1: Read entire file -->
+        <read-file file_path="src/main.py">
+        </read-file>
 
-    #     <!-- Example 2: Read specific lines (lines 10-20) -->
-    #     <read-file file_path="src/main.py" start_line="10" end_line="20">
-    #     </read-file>
+        <!-- Example 2: Read specific lines (lines 10-20) -->
+        <read-file file_path="src/main.py" start_line="10" end_line="20">
+        </read-file>
 
-    #     <!-- Example 3: Read from line 5 to end -->
-    #     <read-file file_path="config.json" start_line="5">
-    #     </read-file>
+        <!-- Example 3: Read from line 5 to end -->
+        <read-file file_path="config.json" start_line="5">
+        </read-file>
 
-    #     <!-- Example 4: Read last 10 lines -->
-    #     <read-file file_path="logs/app.log" start_line="-10">
-    #     </read-file>
-    #     '''
-    # )
-    # async def read_file(self, file_path: str, start_line: int = 1, end_line: Optional[int] = None) -> ToolResult:
-    #     """Read file content with optional line range specification.
+        <!-- Example 4: Read last 10 lines -->
+        <read-file file_path="logs/app.log" start_line="-10">
+        </read-file>
+        '''
+    )
+    async def read_file(self, file_path: str, start_line: int = 1, end_line: Optional[int] = None) -> ToolResult:
+        """Read file content with optional line range specification.
         
-    #     Args:
-    #         file_path: Path to the file relative to /workspace
-    #         start_line: Starting line number (1-based), defaults to 1
-    #         end_line: Ending line number (inclusive), defaults to None (end of file)
-            
-    #     Returns:
-    #         ToolResult containing:
-    #         - Success: File content and metadata
-    #         - Failure: Error message if file doesn't exist or is binary
-    #     """
-    #     try:
-    #         file_path = self.clean_path(file_path)
-    #         full_path = f"{self.workspace_path}/{file_path}"
+        Only the requested lines are fetched from the sandbox (see sandbox.file_reader).
+        The result is cut at a line boundary to stay within BLOB_THRESHOLD_CHARS; the
+        note in the result says where to continue.
+        
+        Args:
+            file_path: Path to the file relative to /workspace
+            start_line: Starting line number (1-based, negative counts from the end), defaults to 1
+            end_line: Ending line number (inclusive), defaults to None (end of file)
             
-    #         if not self._file_exists(full_path):
-    #             return self.fail_response(f"File '{file_path}' does not exist")
+        Returns:
+            ToolResult containing:
+            - Success: File content and metadata
+            - Failure: Error message if file doesn't exist or is binary
+        """
+        try:
+            # Ensure sandbox is initialized
+            await self._ensure_sandbox()
             
-    #         # Download and decode file content
-    #         content = self.sandbox.fs.download_file(full_path).decode()
+            file_path = self.clean_path(file_path)
+            full_path = f"{self.workspace_path}/{file_path}"
             
-    #         # Split content into lines
-    #         lines = content.split('\n')
-    #         total_lines = len(lines)
+            # XML attributes arrive as strings
+            start_line = int(start_line) if start_line not in (None, "") else 1
+            end_line = int(end_line) if end_line not in (None, "") else None
             
-    #         # Handle line range if specified
-    #         if start_line > 1 or end_line is not None:
-    #             # Convert to 0-based indices
-    #             start_idx = max(0, start_line - 1)
-    #             end_idx = end_line if end_line is not None else total_lines
-    #             end_idx = min(end_idx, total_lines)  # Ensure we don't exceed file length
-                
-    #             # Extract the requested lines
-    #             content = '\n'.join(lines[start_idx:end_idx])
+            try:
+                lines = await file_reader.read_lines(self.sandbox, full_path, start_line, end_line,
+                                                     max_bytes=READ_FILE_MAX_BYTES)
+            except RemoteExecError:
+                return self.fail_response(f"File '{file_path}' does not exist or cannot be read")
+            if lines.binary:
+                return self.fail_response(f"File '{file_path}' appears to be binary and cannot be read as text")
             
-    #         return self.success_response({
-    #             "content": content,
-    #             "file_path": file_path,
-    #             "start_line": start_line,
-    #             "end_line": end_line if end_line is not None else total_lines,
-    #             "total_lines": total_lines
-    #         })
+            text_lines = re.findall(r"[^\n]*\n|[^\n]+$", lines.text)
+            end = lines.end_line
+            truncated = lines.truncated
+            while True:
+                result = {
+                    "content": "".join(text_lines),
+                    "file_path": file_path,
+                    "start_line": lines.start_line,
+                    "end_line": end,
+                    "total_lines": lines.total_lines
+                }
+                if truncated:
+                    result["note"] = f"Output truncated at line {end}; read from line {end + 1} to continue."
+                # JSON escaping can grow the text past the threshold: drop lines until it fits
+                # (a single longer line is still returned, and offloaded)
+                excess = len(json.dumps(result, indent=2)) - BLOB_THRESHOLD_CHARS
+                if excess <= 0 or len(text_lines) <= 1:
+                    break
+                while excess > 0 and len(text_lines) > 1:
+                    excess -= len(json.dumps(text_lines.pop())) - 2
+                    end -= 1
+                truncated = True
+            return self.success_response(result)
             
-    #     except UnicodeDecodeError:
-    #         return self.fail_response(f"File '{file_path}' appears to be binary and cannot be read as text")
-    #     except Exception as e:
-    #         return self.fail_response(f"Error reading file: {str(e)}")
-
+        except Exception as e:
+            return self.fail_response(f"Error reading file: {str(e)}")
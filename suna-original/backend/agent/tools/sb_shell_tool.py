@@ -1,37 +1,48 @@
-from typing import Optional, Dict, List
-from uuid import uuid4
+import asyncio
+from typing import Optional, Dict, List, Union
 from agentpress.tool import ToolResult, openapi_schema, xml_schema
 from sandbox.sandbox import SandboxToolsBase, Sandbox
+from sandbox import shell_commands
 from agentpress.thread_manager import ThreadManager
 
+# Output returned per check of a command (the most recent characters are kept)
+MAX_RESULT_CHARS = 20_000
+
 class SandboxShellTool(SandboxToolsBase):
     """Tool for executing tasks in a Daytona sandbox with browser-use capabilities. 
     Uses sessions for maintaining state between commands and provides comprehensive process management."""
 
     def __init__(self, project_id: str, thread_manager: ThreadManager):
         super().__init__(project_id, thread_manager)
-        self._sessions: Dict[str, str] = {}  # Maps session names to session IDs
+        self._session_names = set()  # Sessions used by this tool (the IDs live in the shared sandbox handle)
         self.workspace_path = "/workspace"  # Ensure we're always operating in /workspace
 
+    async def warm_up(self) -> None:
+        """Start the sandbox and create the default session ahead of execution."""
+        await super().warm_up()
+        await self._ensure_session("default")
+
     async def _ensure_session(self, session_name: str = "default") -> str:
-        """Ensure a session exists and return its ID."""
-        if session_name not in self._sessions:
-            session_id = str(uuid4())
-            try:
-                await self._ensure_sandbox()  # Ensure sandbox is initialized
-                self.sandbox.process.create_session(session_id)
-                self._sessions[session_name] = session_id
-            except Exception as e:
-                raise RuntimeError(f"Failed to create session: {str(e)}")
-        return self._sessions[session_name]
+        """Ensure a session exists and return its ID.
+        
+        Sessions are shared through the sandbox handle, so tools on the same sandbox
+        reuse them until the sandbox restarts.
+        """
+        try:
+            await self._ensure_sandbox()  # Ensure sandbox is initialized
+            session_id = await self.handle.get_session(session_name)
+            self._session_names.add(session_name)
+            return session_id
+        except Exception as e:
+            raise RuntimeError(f"Failed to create session: {str(e)}")
 
     async def _cleanup_session(self, session_name: str):
         """Clean up a session if it exists."""
-        if session_name in self._sessions:
+        if session_name in self._session_names:
             try:
                 await self._ensure_sandbox()  # Ensure sandbox is initialized
-                self.sandbox.process.delete_session(self._sessions[session_name])
-                del self._sessions[session_name]
+                await self.handle.delete_session(session_name)
+                self._session_names.discard(session_name)
             except Exception as e:
                 print(f"Warning: Failed to cleanup session {session_name}: {str(e)}")
 
@@ -39,7 +50,7 @@ class SandboxShellTool(SandboxToolsBase):
         "type": "function",
         "function": {
             "name": "execute_command",
-            "description": "Execute a shell command in the workspace directory. IMPORTANT: By default, commands are blocking and will wait for completion before returning. For long-running operations, use background execution techniques (& operator, nohup) to prevent timeouts. Uses sessions to maintain state between commands. This tool is essential for running CLI tools, installing packages, and managing system operations. Always verify command outputs before using the data. Commands can be chained using && for sequential execution, || for fallback execution, and | for piping output.",
+            "description": "Execute a shell command in the workspace directory. IMPORTANT: By default, commands are blocking and will wait for completion (up to the timeout) before returning; their output is streamed to the user while they run. A command still running at the timeout keeps running and can be followed with check_command_output. For servers and other long-running operations, set background to true: the command starts, its command_id is returned immediately, and it can be followed with check_command_output and stopped with kill_command. Uses sessions to maintain state between commands (background commands run in their own shell). This tool is essential for running CLI tools, installing packages, and managing system operations. Always verify command outputs before using the data. Commands can be chained using && for sequential execution, || for fallback execution, and | for piping output.",
             "parameters": {
                 "type": "object",
                 "properties": {
@@ -58,8 +69,13 @@ class SandboxShellTool(SandboxToolsBase):
                     },
                     "timeout": {
                         "type": "integer",
-                        "description": "Optional timeout in seconds. Increase for long-running commands. Defaults to 60. For commands that might exceed this timeout, use background execution with & operator instead.",
+                        "description": "Optional timeout in seconds. Increase for long-running commands. Defaults to 60. For commands that might exceed this timeout, use background execution instead.",
                         "default": 60
+                    },
+                    "background": {
+                        "type": "boolean",
+                        "description": "Optional. Start the command and return its command_id immediately instead of waiting for it. Use for servers, watchers and long builds.",
+                        "default": False
                     }
                 },
                 "required": ["command"]
@@ -72,7 +88,8 @@ class SandboxShellTool(SandboxToolsBase):
             {"param_name": "command", "node_type": "content", "path": "."},
             {"param_name": "folder", "node_type": "attribute", "path": ".", "required": False},
             {"param_name": "session_name", "node_type": "attribute", "path": ".", "required": False},
-            {"param_name": "timeout", "node_type": "attribute", "path": ".", "required": False}
+            {"param_name": "timeout", "node_type": "attribute", "path": ".", "required": False},
+            {"param_name": "background", "node_type": "attribute", "path": ".", "required": False}
         ],
         example='''
         <!-- BLOCKING COMMANDS (Direct Execution) -->
@@ -101,6 +118,17 @@ class SandboxShellTool(SandboxToolsBase):
         npm run build > build.log 2>&1
         </execute-command>
 
+        <!-- BACKGROUND COMMANDS (followed with check-command-output, stopped with kill-command) -->
+        <!-- Example 1: Start a Development Server -->
+        <execute-command background="true">
+        npm run dev
+        </execute-command>
+
+        <!-- Example 2: Run a Long Build Without Waiting -->
+        <execute-command folder="app" background="true">
+        npm run build
+        </execute-command>
+
         <!-- NON-BLOCKING COMMANDS (TMUX Sessions) -->
         <!-- Example 1: Start a Vite Development Server -->
         <execute-command>
@@ -153,7 +181,8 @@ class SandboxShellTool(SandboxToolsBase):
         command: str, 
         folder: Optional[str] = None,
         session_name: str = "default",
-        timeout: int = 60
+        timeout: int = 60,
+        background: Union[bool, str] = False
     ) -> ToolResult:
         try:
             # Ensure sandbox is initialized
@@ -168,45 +197,187 @@ class SandboxShellTool(SandboxToolsBase):
                 folder = folder.strip('/')
                 cwd = f"{self.workspace_path}/{folder}"
             
-            # Ensure we're in the correct directory before executing the command
-            command = f"cd {cwd} && {command}"
+            # XML attributes arrive as strings
+            background = background is True or str(background).lower() == "true"
+            timeout = int(timeout) if timeout not in (None, "") else 60
             
-            # Execute command in session
-            from sandbox.sandbox import SessionExecuteRequest
-            req = SessionExecuteRequest(
-                command=command,
-                var_async=False,  # This makes the command blocking by default
-                cwd=cwd  # Still set the working directory for reference
-            )
+            # Start without blocking; the command's output is followed as it runs
+            started = await shell_commands.start_command(self.handle, session_id, session_name, command, cwd, background=background)
+            if background:
+                return self.success_response({
+                    "command_id": started.command_id,
+                    "status": "running",
+                    "cwd": cwd,
+                    "message": "Command started in the background. Use check_command_output to follow it and kill_command to stop it."
+                })
             
-            response = self.sandbox.process.execute_session_command(
-                session_id=session_id,
-                req=req,
-                timeout=timeout
-            )
+            finished = await started.wait(timeout, on_output=self._progress_reporter(started.command_id))
+            # Everything kept so far is returned now; later checks only show newer output
+            started.read_position = started.output.total
+            output = started.output.text()
             
-            # Get detailed logs
-            logs = self.sandbox.process.get_session_command_logs(
-                session_id=session_id,
-                command_id=response.cmd_id
-            )
+            if not finished:
+                return self.success_response({
+                    "command_id": started.command_id,
+                    "status": "running",
+                    "output": output,
+                    "cwd": cwd,
+                    "message": f"Command still running after {timeout}s. Use check_command_output to follow it."
+                })
             
-            if response.exit_code == 0:
+            if started.exit_code == 0:
                 return self.success_response({
-                    "output": logs,
-                    "exit_code": response.exit_code,
+                    "output": output,
+                    "exit_code": started.exit_code,
                     "cwd": cwd
                 })
             else:
-                error_msg = f"Command failed with exit code {response.exit_code}"
-                if logs:
-                    error_msg += f": {logs}"
+                error_msg = f"Command failed with exit code {started.exit_code}"
+                if output:
+                    error_msg += f": {output}"
                 return self.fail_response(error_msg)
                 
         except Exception as e:
             return self.fail_response(f"Error executing command: {str(e)}")
 
+    def _progress_reporter(self, command_id: str):
+        """Report a command's new output as tool progress."""
+        def report(output: str, omitted: int) -> None:
+            self.report_progress({"command_id": command_id, "output": output, "omitted_chars": omitted})
+        return report
+
+    @openapi_schema({
+        "type": "function",
+        "function": {
+            "name": "check_command_output",
+            "description": "Check on a command started with execute_command that is running in the background or outlived its timeout: its status, exit code and the output produced since the last check (or the last lines of output). Without a command_id, lists the commands started in this sandbox.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "command_id": {
+                        "type": "string",
+                        "description": "The command_id returned by execute_command. Omit to list all commands."
+                    },
+                    "tail_lines": {
+                        "type": "integer",
+                        "description": "Optional. Return the last N lines of output instead of the output since the last check."
+                    },
+                    "wait_seconds": {
+                        "type": "integer",
+                        "description": "Optional. Wait up to this many seconds for the command to finish before returning (output is streamed while waiting). Defaults to 0.",
+                        "default": 0
+                    }
+                }
+            }
+        }
+    })
+    @xml_schema(
+        tag_name="check-command-output",
+        mappings=[
+            {"param_name": "command_id", "node_type": "attribute", "path": ".", "required": False},
+            {"param_name": "tail_lines", "node_type": "attribute", "path": ".", "required": False},
+            {"param_name": "wait_seconds", "node_type": "attribute", "path": ".", "required": False}
+        ],
+        example='''
+        <!-- Example 1: Output since the last check -->
+        <check-command-output command_id="abc123">
+        </check-command-output>
+
+        <!-- Example 2: Last 50 lines -->
+        <check-command-output command_id="abc123" tail_lines="50">
+        </check-command-output>
+
+        <!-- Example 3: Wait up to 120 seconds for a build to finish -->
+        <check-command-output command_id="abc123" wait_seconds="120">
+        </check-command-output>
+
+        <!-- Example 4: List commands -->
+        <check-command-output>
+        </check-command-output>
+        '''
+    )
+    async def check_command_output(
+        self,
+        command_id: Optional[str] = None,
+        tail_lines: Optional[int] = None,
+        wait_seconds: int = 0
+    ) -> ToolResult:
+        try:
+            # Ensure sandbox is initialized
+            await self._ensure_sandbox()
+            
+            commands = self.handle.commands
+            if not command_id:
+                return self.success_response({"commands": [c.summary() for c in commands.values()]})
+            
+            started = commands.get(command_id)
+            if started is None:
+                return self.fail_response(f"Unknown command_id '{command_id}'. Commands are forgotten when the sandbox restarts.")
+            
+            wait_seconds = int(wait_seconds) if wait_seconds not in (None, "") else 0
+            if wait_seconds > 0 and started.running:
+                await started.wait(wait_seconds, on_output=self._progress_reporter(command_id))
+            
+            result = started.summary()
+            if tail_lines not in (None, ""):
+                result["output"] = started.output.last_lines(int(tail_lines))[-MAX_RESULT_CHARS:]
+            else:
+                result["output"], result["omitted_chars"] = started.read_new(MAX_RESULT_CHARS)
+            return self.success_response(result)
+            
+        except Exception as e:
+            return self.fail_response(f"Error checking command: {str(e)}")
+
+    @openapi_schema({
+        "type": "function",
+        "function": {
+            "name": "kill_command",
+            "description": "Stop a command started with execute_command in the background, including any processes it started.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "command_id": {
+                        "type": "string",
+                        "description": "The command_id returned by execute_command"
+                    }
+                },
+                "required": ["command_id"]
+            }
+        }
+    })
+    @xml_schema(
+        tag_name="kill-command",
+        mappings=[
+            {"param_name": "command_id", "node_type": "attribute", "path": "."}
+        ],
+        example='''
+        <kill-command command_id="abc123">
+        </kill-command>
+        '''
+    )
+    async def kill_command(self, command_id: str) -> ToolResult:
+        try:
+            # Ensure sandbox is initialized
+            await self._ensure_sandbox()
+            
+            started = self.handle.commands.get(command_id)
+            if started is None:
+                return self.fail_response(f"Unknown command_id '{command_id}'. Commands are forgotten when the sandbox restarts.")
+            if not started.running:
+                return self.success_response({**started.summary(), "message": "Command had already finished."})
+            if not started.background:
+                return self.fail_response("Only commands started with background=true can be killed.")
+            
+            stopped = await shell_commands.kill_command(self.handle, started)
+            result = started.summary()
+            result["output"] = started.output.last_lines(20)
+            result["message"] = "Command killed." if stopped else "Kill signal sent, but the command has not exited yet."
+            return self.success_response(result)
+            
+        except Exception as e:
+            return self.fail_response(f"Error killing command: {str(e)}")
+
     async def cleanup(self):
         """Clean up all sessions."""
-        for session_name in list(self._sessions.keys()):
+        for session_name in list(self._session_names):
             await self._cleanup_session(session_name)
\ No newline at end of file
@@ -0,0 +1,65 @@
+import asyncio
+
+from agentpress.tool import Tool, ToolResult, openapi_schema, xml_schema
+from agentpress.blob_store import blob_store
+
+class ToolOutputTool(Tool):
+    """Tool for reading large tool outputs that were stored outside the conversation."""
+
+    def __init__(self):
+        super().__init__()
+
+    @openapi_schema({
+        "type": "function",
+        "function": {
+            "name": "read_tool_output",
+            "description": "Read the full output of an earlier tool call that was too large to include in the conversation. Such outputs are shown truncated to their beginning and end with a note naming a blob_id (e.g. blob_3f2a...). Use this to page through the omitted middle part when you need details that are not in the visible beginning or end.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "blob_id": {
+                        "type": "string",
+                        "description": "The blob_id shown in the truncated tool output"
+                    },
+                    "page": {
+                        "type": "integer",
+                        "description": "1-based page number to read. The truncation note states the total number of pages.",
+                        "default": 1
+                    }
+                },
+                "required": ["blob_id"]
+            }
+        }
+    })
+    @xml_schema(
+        tag_name="read-tool-output",
+        mappings=[
+            {"param_name": "blob_id", "node_type": "attribute", "path": "."},
+            {"param_name": "page", "node_type": "attribute", "path": ".", "required": False}
+        ],
+        example='''
+        <!-- Read the second page of a long command output that was truncated -->
+        <read-tool-output blob_id="blob_3f2a9c1e7b8d4a6f0e5c2b1a9d8e7f6a" page="2">
+        </read-tool-output>
+        '''
+    )
+    async def read_tool_output(self, blob_id: str, page: int = 1) -> ToolResult:
+        try:
+            page = int(page)
+            if page < 1:
+                return self.fail_response(f"Invalid page {page}. Pages start at 1.")
+
+            blob_page = await asyncio.to_thread(blob_store.read_page, blob_id.strip(), page)
+            if blob_page is None:
+                return self.fail_response(f"No stored tool output found for '{blob_id}'.")
+
+            text, total_pages = blob_page
+            if page > total_pages:
+                return self.fail_response(f"Page {page} does not exist. '{blob_id}' has {total_pages} pages.")
+
+            return self.success_response(f"[{blob_id} page {page} of {total_pages}]\n{text}")
+
+        except ValueError:
+            return self.fail_response(f"Invalid page number: {page}. Must be an integer.")
+        except Exception as e:
+            return self.fail_response(f"Error reading tool output {blob_id}: {str(e)}")
@@ -0,0 +1,148 @@
+"""
+Content-addressed storage for large tool outputs.
+
+Tool results such as shell logs or scraped pages can be hundreds of kilobytes.
+Saved verbatim as tool messages, they are re-sent to the LLM on every later
+turn. Instead, results above a size threshold are written here once, keyed by
+the SHA-256 of their content (so identical outputs are stored once) and
+zlib-compressed. The conversation keeps a stub with the head and tail of the
+output and the blob ID, and the agent can page through the full output with
+the `read_tool_output` tool.
+"""
+
+import hashlib
+import os
+import re
+import zlib
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from utils.logger import logger
+from utils.config import config
+
+# Constants
+BLOB_THRESHOLD_CHARS = 8000     # Outputs longer than this are offloaded to the store
+STUB_HEAD_CHARS = 2000          # Characters kept from the start of an offloaded output
+STUB_TAIL_CHARS = 2000          # Characters kept from the end of an offloaded output
+PAGE_HEADER_CHARS = 200         # Room left for the "[blob_id page N of M]" header of a page
+PAGE_CHARS = BLOB_THRESHOLD_CHARS - PAGE_HEADER_CHARS  # Characters returned per page by read_page; a page plus its header stays inline
+CACHE_SIZE = 16                 # Decompressed blobs kept in memory for paging
+
+# Tool functions whose results are never offloaded (they read the store back)
+UNOFFLOADED_FUNCTIONS = frozenset({"read_tool_output"})
+
+_BLOB_ID_PATTERN = re.compile(r"^blob_[0-9a-f]{32}$")
+
+
+class BlobStore:
+    """Filesystem blob store with deduplication by content hash.
+
+    Blobs are stored as `<root>/<2 hex chars>/<blob id>.z`. Writes go to a
+    temporary file that is renamed into place, so readers never see partial
+    blobs and concurrent writers of the same content are harmless.
+    """
+
+    def __init__(self, root: str):
+        """Initialize the store.
+
+        Args:
+            root: Directory that holds the blobs
+        """
+        self.root = root
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+
+    def _path(self, blob_id: str) -> str:
+        return os.path.join(self.root, blob_id[5:7], f"{blob_id}.z")
+
+    def put(self, text: str) -> str:
+        """Store text and return its blob ID; storing the same text again is a no-op.
+
+        Args:
+            text: Content to store
+
+        Returns:
+            Blob ID ("blob_" + 32 hex chars of the SHA-256 of the content)
+        """
+        data = text.encode("utf-8")
+        blob_id = f"blob_{hashlib.sha256(data).hexdigest()[:32]}"
+        path = self._path(blob_id)
+        if os.path.exists(path):
+            logger.debug(f"Blob {blob_id} already stored, deduplicated {len(data)} bytes")
+            return blob_id
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        compressed = zlib.compress(data, 6)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(compressed)
+        os.replace(tmp_path, path)
+        logger.debug(f"Stored blob {blob_id}: {len(data)} bytes, {len(compressed)} compressed")
+        return blob_id
+
+    def get(self, blob_id: str) -> Optional[str]:
+        """Get the full content of a blob.
+
+        Args:
+            blob_id: ID returned by `put`
+
+        Returns:
+            The stored text, or None if the ID is invalid or unknown
+        """
+        if not _BLOB_ID_PATTERN.match(blob_id or ""):
+            return None
+        if blob_id in self._cache:
+            self._cache.move_to_end(blob_id)
+            return self._cache[blob_id]
+
+        try:
+            with open(self._path(blob_id), "rb") as f:
+                text = zlib.decompress(f.read()).decode("utf-8")
+        except FileNotFoundError:
+            return None
+
+        self._cache[blob_id] = text
+        if len(self._cache) > CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return text
+
+    def read_page(self, blob_id: str, page: int = 1, page_chars: int = PAGE_CHARS) -> Optional[Tuple[str, int]]:
+        """Get one page of a blob.
+
+        Args:
+            blob_id: ID returned by `put`
+            page: 1-based page number
+            page_chars: Characters per page
+
+        Returns:
+            Tuple of (page text, total pages), or None if the blob is unknown
+        """
+        text = self.get(blob_id)
+        if text is None:
+            return None
+        total_pages = max(1, -(-len(text) // page_chars))
+        start = (page - 1) * page_chars
+        return text[start:start + page_chars], total_pages
+
+
+def make_stub(text: str, blob_id: str, head_chars: int = STUB_HEAD_CHARS, tail_chars: int = STUB_TAIL_CHARS) -> str:
+    """Build the context stub for an offloaded output.
+
+    Args:
+        text: Full output
+        blob_id: ID of the stored output
+
+    Returns:
+        Head and tail of the output with a marker explaining how to read the rest
+    """
+    omitted = len(text) - head_chars - tail_chars
+    total_pages = max(1, -(-len(text) // PAGE_CHARS))
+    return (
+        f"{text[:head_chars]}\n"
+        f"... [{omitted} characters omitted. Full output ({len(text)} characters, {total_pages} pages) "
+        f"stored as {blob_id}; use read_tool_output with this blob_id to page through it] ...\n"
+        f"{text[-tail_chars:]}"
+    )
+
+
+# Process-wide store
+blob_store = BlobStore(config.BLOB_STORE_PATH)
@@ -6,17 +6,20 @@ reaching the context window limitations of LLM models.
 """
 
 import json
-from typing import List, Dict, Any, Optional
+import asyncio
+from typing import List, Dict, Any, Optional, Tuple
 
-from litellm import token_counter, completion, completion_cost
+from services.pagination import keyset_filter
 from services.supabase import DBConnection
-from services.llm import make_llm_api_call
 from utils.logger import logger
 
 # Constants for token management
 DEFAULT_TOKEN_THRESHOLD = 120000  # 80k tokens threshold for summarization
 SUMMARY_TARGET_TOKENS = 10000    # Target ~10k tokens for the summary message
 RESERVE_TOKENS = 5000            # Reserve tokens for new messages
+SOFT_WATERMARK_RATIO = 0.6       # Start background summarization at 60% of the threshold
+TAIL_TOKENS = 20000              # Most recent tokens kept verbatim after a rolling summary
+MIN_MESSAGES_TO_SUMMARIZE = 3
 
 class ContextManager:
     """Manages thread context including token counting and summarization."""
@@ -29,6 +32,8 @@ class ContextManager:
         """
         self.db = DBConnection()
         self.token_threshold = token_threshold
+        self.soft_watermark = int(token_threshold * SOFT_WATERMARK_RATIO)
+        self._summary_tasks: Dict[str, asyncio.Task] = {}  # thread_id -> in-flight rolling summary
     
     async def get_thread_token_count(self, thread_id: str) -> int:
         """Get the current token count for a thread using LiteLLM.
@@ -51,6 +56,7 @@ class ContextManager:
             
             # Use litellm's token_counter for accurate model-specific counting
             # This is much more accurate than the SQL-based estimation
+            from litellm import token_counter
             token_count = token_counter(model="gpt-4", messages=messages)
             
             logger.info(f"Thread {thread_id} has {token_count} tokens (calculated with litellm)")
@@ -60,12 +66,82 @@ class ContextManager:
             logger.error(f"Error getting token count: {str(e)}")
             return 0
     
+    async def _get_unsummarized_rows(self, thread_id: str) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Get the latest summary and the raw message rows it does not cover.
+
+        A rolling summary covers messages up to the sort key (`boundary_created_at`,
+        `boundary_message_id`) stored in its metadata, so messages sharing the
+        boundary's timestamp are split the same way the summary split them;
+        older summaries cover everything created before them.
+
+        Args:
+            thread_id: ID of the thread to get messages from
+
+        Returns:
+            Tuple of (latest summary row or None, unsummarized LLM message rows in order)
+        """
+        client = await self.db.client
+
+        # Find the most recent summary message
+        summary_result = await client.table('messages').select('message_id, content, metadata, created_at') \
+            .eq('thread_id', thread_id) \
+            .eq('type', 'summary') \
+            .eq('is_llm_message', True) \
+            .order('created_at', desc=True) \
+            .limit(1) \
+            .execute()
+
+        latest_summary = summary_result.data[0] if summary_result.data else None
+        query = client.table('messages').select('*') \
+            .eq('thread_id', thread_id) \
+            .eq('is_llm_message', True) \
+            .neq('type', 'summary')
+
+        if latest_summary:
+            metadata = latest_summary.get('metadata') or {}
+            if isinstance(metadata, str):
+                try:
+                    metadata = json.loads(metadata)
+                except json.JSONDecodeError:
+                    metadata = {}
+            boundary = metadata.get('boundary_created_at') or latest_summary['created_at']
+            boundary_id = metadata.get('boundary_message_id') if metadata.get('boundary_created_at') else None
+            logger.debug(f"Found last summary at {latest_summary['created_at']} covering messages up to {boundary}")
+            # Get all messages after the boundary, but NOT including the summary itself
+            if boundary_id:
+                query = query.or_(keyset_filter(boundary, boundary_id, 'message_id'))
+            else:
+                query = query.gt('created_at', boundary)
+        else:
+            logger.debug("No previous summary found, getting all messages")
+
+        messages_result = await query.order('created_at').order('message_id').execute()
+        return latest_summary, messages_result.data or []
+
+    def _format_message(self, msg: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert a stored message row to the LLM message format."""
+        # Parse content if it's a string
+        content = msg['content']
+        if isinstance(content, str):
+            try:
+                content = json.loads(content)
+            except json.JSONDecodeError:
+                pass  # Keep as string if not valid JSON
+
+        # Ensure we have the proper format for the LLM
+        if not isinstance(content, dict) or 'role' not in content:
+            # Convert message type to role if needed
+            role = msg.get('type')
+            if role == 'assistant' or role == 'user' or role == 'system' or role == 'tool':
+                content = {'role': role, 'content': content}
+        return content
+
     async def get_messages_for_summarization(self, thread_id: str) -> List[Dict[str, Any]]:
         """Get all LLM messages from the thread that need to be summarized.
         
-        This gets messages after the most recent summary or all messages if
-        no summary exists. Unlike get_llm_messages, this includes ALL messages 
-        since the last summary, even if we're generating a new summary.
+        This gets messages after the most recent summary boundary or all
+        messages if no summary exists. Unlike get_llm_messages, this includes
+        ALL messages since the last summary, even if we're generating a new summary.
         
         Args:
             thread_id: ID of the thread to get messages from
@@ -74,63 +150,10 @@ class ContextManager:
             List of message objects to summarize
         """
         logger.debug(f"Getting messages for summarization for thread {thread_id}")
-        client = await self.db.client
         
         try:
-            # Find the most recent summary message
-            summary_result = await client.table('messages').select('created_at') \
-                .eq('thread_id', thread_id) \
-                .eq('type', 'summary') \
-                .eq('is_llm_message', True) \
-                .order('created_at', desc=True) \
-                .limit(1) \
-                .execute()
-            
-            # Get messages after the most recent summary or all messages if no summary
-            if summary_result.data and len(summary_result.data) > 0:
-                last_summary_time = summary_result.data[0]['created_at']
-                logger.debug(f"Found last summary at {last_summary_time}")
-                
-                # Get all messages after the summary, but NOT including the summary itself
-                messages_result = await client.table('messages').select('*') \
-                    .eq('thread_id', thread_id) \
-                    .eq('is_llm_message', True) \
-                    .gt('created_at', last_summary_time) \
-                    .order('created_at') \
-                    .execute()
-            else:
-                logger.debug("No previous summary found, getting all messages")
-                # Get all messages
-                messages_result = await client.table('messages').select('*') \
-                    .eq('thread_id', thread_id) \
-                    .eq('is_llm_message', True) \
-                    .order('created_at') \
-                    .execute()
-            
-            # Parse the message content if needed
-            messages = []
-            for msg in messages_result.data:
-                # Skip existing summary messages - we don't want to summarize summaries
-                if msg.get('type') == 'summary':
-                    logger.debug(f"Skipping summary message from {msg.get('created_at')}")
-                    continue
-                    
-                # Parse content if it's a string
-                content = msg['content']
-                if isinstance(content, str):
-                    try:
-                        content = json.loads(content)
-                    except json.JSONDecodeError:
-                        pass  # Keep as string if not valid JSON
-                
-                # Ensure we have the proper format for the LLM
-                if 'role' not in content and 'type' in msg:
-                    # Convert message type to role if needed
-                    role = msg['type']
-                    if role == 'assistant' or role == 'user' or role == 'system' or role == 'tool':
-                        content = {'role': role, 'content': content}
-                
-                messages.append(content)
+            _, rows = await self._get_unsummarized_rows(thread_id)
+            messages = [self._format_message(msg) for msg in rows]
             
             logger.info(f"Got {len(messages)} messages to summarize for thread {thread_id}")
             return messages
@@ -186,6 +209,8 @@ THE CONVERSATION HISTORY TO SUMMARIZE IS AS FOLLOWS:
 """
         }
         
+        from services.llm import make_llm_api_call
+        from litellm import token_counter, completion_cost
         try:
             # Call LLM to generate summary
             response = await make_llm_api_call(
@@ -295,4 +320,117 @@ The above is a summary of the conversation history. The conversation continues b
                 
         except Exception as e:
             logger.error(f"Error in check_and_summarize_if_needed: {str(e)}", exc_info=True)
-            return False 
\ No newline at end of file
+            return False
+
+    def schedule_summarization(
+        self,
+        thread_id: str,
+        token_count: int,
+        add_message_callback,
+        model: str = "gpt-4o-mini"
+    ) -> bool:
+        """Start a background rolling summary once a thread crosses the soft watermark.
+
+        The summary is written while the agent keeps running; the next call to
+        get_llm_messages picks it up. At most one summary runs per thread.
+
+        Args:
+            thread_id: ID of the thread to check
+            token_count: Current prompt token count of the thread
+            add_message_callback: Callback to add the summary message to the thread
+            model: LLM model to use for summarization
+
+        Returns:
+            True if a background summarization was started
+        """
+        if token_count < self.soft_watermark:
+            return False
+
+        task = self._summary_tasks.get(thread_id)
+        if task and not task.done():
+            if token_count >= self.token_threshold:
+                logger.warning(f"Thread {thread_id} is over the token threshold ({token_count} >= {self.token_threshold}) while its summary is still running")
+            return False
+
+        logger.info(f"Thread {thread_id} crossed the soft watermark ({token_count} >= {self.soft_watermark}), summarizing in the background")
+        task = asyncio.create_task(self.summarize_oldest_span(thread_id, add_message_callback, model))
+        self._summary_tasks[thread_id] = task
+        task.add_done_callback(lambda _: self._summary_tasks.pop(thread_id, None) if self._summary_tasks.get(thread_id) is task else None)
+        return True
+
+    async def summarize_oldest_span(
+        self,
+        thread_id: str,
+        add_message_callback,
+        model: str = "gpt-4o-mini"
+    ) -> bool:
+        """Fold the oldest unsummarized messages into a new rolling summary.
+
+        The most recent TAIL_TOKENS worth of messages are left out of the span so
+        they stay verbatim in the context. The new summary replaces the previous
+        one, so it is built from the previous summary plus the span, and records
+        the span's last message as its boundary.
+
+        Args:
+            thread_id: ID of the thread to summarize
+            add_message_callback: Callback to add the summary message to the thread
+            model: LLM model to use for summarization
+
+        Returns:
+            True if a summary was added
+        """
+        try:
+            from litellm import token_counter
+
+            latest_summary, rows = await self._get_unsummarized_rows(thread_id)
+            messages = [self._format_message(row) for row in rows]
+
+            # Walk back from the newest message until the tail budget is used up
+            # (token counting is CPU-bound: keep it off the event loop)
+            def find_tail_start() -> int:
+                tail_tokens = 0
+                split = len(messages)
+                while split > 0 and tail_tokens < TAIL_TOKENS:
+                    split -= 1
+                    tail_tokens += token_counter(model=model, messages=[messages[split]])
+                return split
+            split = await asyncio.to_thread(find_tail_start)
+
+            # Never start the tail with tool results separated from their tool call
+            while split > 0 and messages[split - 1].get('role') == 'assistant' and messages[split - 1].get('tool_calls'):
+                split -= 1
+            while split < len(messages) and messages[split].get('role') == 'tool':
+                split += 1
+
+            if split < MIN_MESSAGES_TO_SUMMARIZE:
+                logger.info(f"Thread {thread_id} has too few messages outside the tail ({split}) to summarize")
+                return False
+
+            span = messages[:split]
+            if latest_summary:
+                span = [self._format_message(latest_summary)] + span
+
+            summary = await self.create_summary(thread_id, span, model)
+            if not summary:
+                logger.error(f"Failed to create rolling summary for thread {thread_id}")
+                return False
+
+            boundary_row = rows[split - 1]
+            await add_message_callback(
+                thread_id=thread_id,
+                type="summary",
+                content=summary,
+                is_llm_message=True,
+                metadata={
+                    "boundary_created_at": boundary_row['created_at'],
+                    "boundary_message_id": boundary_row.get('message_id'),
+                    "summarized_messages": split,
+                    "tail_messages": len(messages) - split
+                }
+            )
+            logger.info(f"Added rolling summary to thread {thread_id} covering {split} messages, {len(messages) - split} kept verbatim")
+            return True
+
+        except Exception as e:
+            logger.error(f"Error in rolling summarization for thread {thread_id}: {str(e)}", exc_info=True)
+            return False
@@ -11,15 +11,17 @@ This module handles processing of LLM responses including:
 import json
 import asyncio
 import re
+import time
 import uuid
 from typing import List, Dict, Any, Optional, Tuple, AsyncGenerator, Callable, Union, Literal
 from dataclasses import dataclass
 from datetime import datetime, timezone
 
-from litellm import completion_cost, token_counter
-
-from agentpress.tool import Tool, ToolResult
+from agentpress.tool import Tool, ToolResult, progress_reporter
 from agentpress.tool_registry import ToolRegistry
+from agentpress.streaming_json import StreamingJsonTracker
+from agentpress.blob_store import blob_store, make_stub, BLOB_THRESHOLD_CHARS, UNOFFLOADED_FUNCTIONS
+from services.usage import usage_pipeline, UsageEvent
 from utils.logger import logger
 
 # Type alias for XML result adding strategy
@@ -28,6 +30,9 @@ XmlAddingStrategy = Literal["user_message", "assistant_message", "inline_edit"]
 # Type alias for tool execution strategy
 ToolExecutionStrategy = Literal["sequential", "parallel"]
 
+# Progress reports buffered per run; further reports are dropped until the stream catches up
+TOOL_PROGRESS_QUEUE_SIZE = 256
+
 @dataclass
 class ToolExecutionContext:
     """Context for a tool execution including call details, result, and display info."""
@@ -91,6 +96,8 @@ class ResponseProcessor:
         """
         self.tool_registry = tool_registry
         self.add_message = add_message_callback
+        # Speculative warm-up accounting across all runs handled by this processor
+        self.warm_up_stats = {"warm_ups_started": 0, "tool_calls_warmed": 0, "time_saved_seconds": 0.0}
         
     async def process_streaming_response(
         self,
@@ -113,7 +120,8 @@ class ResponseProcessor:
             Complete message objects matching the DB schema, except for content chunks.
         """
         accumulated_content = ""
-        tool_calls_buffer = {}
+        tool_calls_buffer = {} # index -> {'id', 'type', 'function': {'name'}, 'tracker'}
+        executed_native_indices = set() # Native tool call indices already dispatched on stream
         current_xml_content = ""
         xml_chunks_buffer = []
         pending_tool_executions = []
@@ -124,6 +132,10 @@ class ResponseProcessor:
         last_assistant_message_object = None # Store the final saved assistant message object
         tool_result_message_objects = {} # tool_index -> full saved message object
         has_printed_thinking_prefix = False # Flag for printing thinking prefix only once
+        warm_ups = {} # id(tool instance) -> warm-up state (holding its task) for speculative sandbox start
+        warm_up_tags = self._get_warm_up_xml_tags() if config.execute_tools and config.xml_tool_calling else {}
+        max_warm_up_tag_len = max((len(tag) for tag in warm_up_tags), default=0)
+        progress_queue = asyncio.Queue(maxsize=TOOL_PROGRESS_QUEUE_SIZE) # (tool_call, data) reported by running tools
 
         logger.info(f"Streaming Config: XML={config.xml_tool_calling}, Native={config.native_tool_calling}, "
                    f"Execute on stream={config.execute_on_stream}, Strategy={config.tool_execution_strategy}")
@@ -148,6 +160,10 @@ class ResponseProcessor:
             # --- End Start Events ---
 
             async for chunk in llm_response:
+                # Forward progress of tools already running on stream
+                while not progress_queue.empty():
+                    yield self._format_tool_progress(thread_id, thread_run_id, *progress_queue.get_nowait())
+
                 if hasattr(chunk, 'choices') and chunk.choices and hasattr(chunk.choices[0], 'finish_reason') and chunk.choices[0].finish_reason:
                     finish_reason = chunk.choices[0].finish_reason
                     logger.debug(f"Detected finish_reason: {finish_reason}")
@@ -184,6 +200,14 @@ class ResponseProcessor:
                         else:
                             logger.info("XML tool call limit reached - not yielding more content chunks")
 
+                        # --- Detect opening tags of warm-up capable XML tools ---
+                        if warm_up_tags:
+                            tail = current_xml_content[-(len(chunk_content) + max_warm_up_tag_len + 1):]
+                            for tag_name, tool_instance in warm_up_tags.items():
+                                if id(tool_instance) not in warm_ups and f'<{tag_name}' in tail:
+                                    self._start_warm_up(tool_instance, warm_ups)
+                                    yield self._format_tool_intent(thread_id, thread_run_id, xml_tag_name=tag_name)
+
                         # --- Process XML Tool Calls (if enabled and limit not reached) ---
                         if config.xml_tool_calling and not (config.max_xml_tool_calls > 0 and xml_tool_call_count >= config.max_xml_tool_calls):
                             xml_chunks = self._extract_xml_chunks(current_xml_content)
@@ -205,7 +229,8 @@ class ResponseProcessor:
                                         if started_msg_obj: yield started_msg_obj
                                         yielded_tool_indices.add(tool_index) # Mark status as yielded
 
-                                        execution_task = asyncio.create_task(self._execute_tool(tool_call))
+                                        self._record_warm_up_savings(tool_call, warm_ups)
+                                        execution_task = asyncio.create_task(self._execute_tool(tool_call, progress_queue))
                                         pending_tool_executions.append({
                                             "task": execution_task, "tool_call": tool_call,
                                             "tool_index": tool_index, "context": context
@@ -245,24 +270,41 @@ class ResponseProcessor:
                             # --- Buffer and Execute Complete Native Tool Calls ---
                             if not hasattr(tool_call_chunk, 'function'): continue
                             idx = tool_call_chunk.index if hasattr(tool_call_chunk, 'index') else 0
-                            # ... (buffer update logic remains same) ...
-                            # ... (check complete logic remains same) ...
-                            has_complete_tool_call = False # Placeholder
-                            if (tool_calls_buffer.get(idx) and
-                                tool_calls_buffer[idx]['id'] and
-                                tool_calls_buffer[idx]['function']['name'] and
-                                tool_calls_buffer[idx]['function']['arguments']):
-                                try:
-                                    json.loads(tool_calls_buffer[idx]['function']['arguments'])
-                                    has_complete_tool_call = True
-                                except json.JSONDecodeError: pass
-
+                            if idx not in tool_calls_buffer:
+                                tool_calls_buffer[idx] = {
+                                    'id': None, 'type': 'function',
+                                    'function': {'name': None},
+                                    'tracker': StreamingJsonTracker() # Accumulates function.arguments
+                                }
+                            current_tool = tool_calls_buffer[idx]
+                            if getattr(tool_call_chunk, 'id', None):
+                                current_tool['id'] = tool_call_chunk.id
+                            if getattr(tool_call_chunk.function, 'name', None):
+                                current_tool['function']['name'] = tool_call_chunk.function.name
+                                if config.execute_tools:
+                                    native_tool_info = self.tool_registry.tools.get(tool_call_chunk.function.name)
+                                    native_instance = native_tool_info['instance'] if native_tool_info else None
+                                    if (native_instance and native_instance.supports_warm_up()
+                                            and id(native_instance) not in warm_ups):
+                                        self._start_warm_up(native_instance, warm_ups)
+                                        yield self._format_tool_intent(thread_id, thread_run_id, function_name=tool_call_chunk.function.name)
+                            arguments_fragment = getattr(tool_call_chunk.function, 'arguments', None)
+                            if arguments_fragment:
+                                # Only the new fragment is scanned; the full arguments are parsed once on close
+                                current_tool['tracker'].feed(arguments_fragment)
+
+                            has_complete_tool_call = (
+                                idx not in executed_native_indices and
+                                current_tool['id'] and
+                                current_tool['function']['name'] and
+                                current_tool['tracker'].parse() is not None
+                            )
 
                             if has_complete_tool_call and config.execute_tools and config.execute_on_stream:
-                                current_tool = tool_calls_buffer[idx]
+                                executed_native_indices.add(idx)
                                 tool_call_data = {
                                     "function_name": current_tool['function']['name'],
-                                    "arguments": json.loads(current_tool['function']['arguments']),
+                                    "arguments": current_tool['tracker'].parse(),
                                     "id": current_tool['id']
                                 }
                                 current_assistant_id = last_assistant_message_object['message_id'] if last_assistant_message_object else None
@@ -275,7 +317,8 @@ class ResponseProcessor:
                                 if started_msg_obj: yield started_msg_obj
                                 yielded_tool_indices.add(tool_index) # Mark status as yielded
 
-                                execution_task = asyncio.create_task(self._execute_tool(tool_call_data))
+                                self._record_warm_up_savings(tool_call_data, warm_ups)
+                                execution_task = asyncio.create_task(self._execute_tool(tool_call_data, progress_queue))
                                 pending_tool_executions.append({
                                     "task": execution_task, "tool_call": tool_call_data,
                                     "tool_index": tool_index, "context": context
@@ -296,7 +339,8 @@ class ResponseProcessor:
                 logger.info(f"Waiting for {len(pending_tool_executions)} pending streamed tool executions")
                 # ... (asyncio.wait logic) ...
                 pending_tasks = [execution["task"] for execution in pending_tool_executions]
-                done, _ = await asyncio.wait(pending_tasks)
+                async for progress_msg in self._stream_tool_progress(pending_tasks, progress_queue, thread_id, thread_run_id):
+                    yield progress_msg
 
                 for execution in pending_tool_executions:
                     tool_idx = execution.get("tool_index", -1)
@@ -364,14 +408,13 @@ class ResponseProcessor:
                 complete_native_tool_calls = []
                 if config.native_tool_calling:
                     for idx, tc_buf in tool_calls_buffer.items():
-                        if tc_buf['id'] and tc_buf['function']['name'] and tc_buf['function']['arguments']:
-                            try:
-                                args = json.loads(tc_buf['function']['arguments'])
-                                complete_native_tool_calls.append({
-                                    "id": tc_buf['id'], "type": "function",
-                                    "function": {"name": tc_buf['function']['name'],"arguments": args}
-                                })
-                            except json.JSONDecodeError: continue
+                        if tc_buf['id'] and tc_buf['function']['name']:
+                            args = tc_buf['tracker'].parse() # Cached if already parsed during the stream
+                            if args is None: continue
+                            complete_native_tool_calls.append({
+                                "id": tc_buf['id'], "type": "function",
+                                "function": {"name": tc_buf['function']['name'],"arguments": args}
+                            })
 
                 message_data = { # Dict to be saved in 'content'
                     "role": "assistant", "content": accumulated_content,
@@ -463,7 +506,14 @@ class ResponseProcessor:
                 # Or execute now if not streamed
                 elif final_tool_calls_to_process and not config.execute_on_stream:
                     logger.info(f"Executing {len(final_tool_calls_to_process)} tools ({config.tool_execution_strategy}) after stream")
-                    results_list = await self._execute_tools(final_tool_calls_to_process, config.tool_execution_strategy)
+                    for tc in final_tool_calls_to_process:
+                        self._record_warm_up_savings(tc, warm_ups)
+                    execution = asyncio.create_task(self._execute_tools(
+                        final_tool_calls_to_process, config.tool_execution_strategy, progress_queue
+                    ))
+                    async for progress_msg in self._stream_tool_progress([execution], progress_queue, thread_id, thread_run_id):
+                        yield progress_msg
+                    results_list = execution.result()
                     current_tool_idx = 0
                     for tc, res in results_list:
                        # Map back using all_tool_data_map which has correct indices
@@ -517,29 +567,14 @@ class ResponseProcessor:
                              logger.error(f"Failed to save tool result for index {tool_idx}, not yielding result message.")
                              # Optionally yield error status for saving failure?
 
-            # --- Calculate and Store Cost ---
-            if last_assistant_message_object: # Only calculate if assistant message was saved
-                try:
-                    # Use accumulated_content for streaming cost calculation
-                    final_cost = completion_cost(
-                        model=llm_model,
-                        messages=prompt_messages, # Use the prompt messages provided
-                        completion=accumulated_content
-                    )
-                    if final_cost is not None and final_cost > 0:
-                        logger.info(f"Calculated final cost for stream: {final_cost}")
-                        await self.add_message(
-                            thread_id=thread_id,
-                            type="cost",
-                            content={"cost": final_cost},
-                            is_llm_message=False, # Cost is metadata
-                            metadata={"thread_run_id": thread_run_id} # Keep track of the run
-                        )
-                        logger.info(f"Cost message saved for stream: {final_cost}")
-                    else:
-                         logger.info("Stream cost calculation resulted in zero or None, not storing cost message.")
-                except Exception as e:
-                    logger.error(f"Error calculating final cost for stream: {str(e)}")
+            # --- Record Usage (cost is computed in the background) ---
+            if last_assistant_message_object: # Only record if assistant message was saved
+                usage_pipeline.record(UsageEvent(
+                    thread_id=thread_id,
+                    model=llm_model,
+                    prompt_messages=prompt_messages,
+                    completion=accumulated_content
+                ))
 
 
             # --- Final Finish Status ---
@@ -562,6 +597,11 @@ class ResponseProcessor:
             if err_msg_obj: yield err_msg_obj # Yield the saved error message
 
         finally:
+            # Warm-ups still running would outlive the stream that wanted them
+            for state in warm_ups.values():
+                if not state["task"].done():
+                    state["task"].cancel()
+
             # Save and Yield the final thread_run_end status
             end_content = {"status_type": "thread_run_end"}
             end_msg_obj = await self.add_message(
@@ -667,45 +707,21 @@ class ResponseProcessor:
                  )
                  if err_msg_obj: yield err_msg_obj
 
-            # --- Calculate and Store Cost ---
-            if assistant_message_object: # Only calculate if assistant message was saved
-                try:
-                    # Use the full llm_response object for potentially more accurate cost calculation
-                    final_cost = None
-                    if hasattr(llm_response, '_hidden_params') and 'response_cost' in llm_response._hidden_params and llm_response._hidden_params['response_cost'] is not None and llm_response._hidden_params['response_cost'] != 0.0:
-                        final_cost = llm_response._hidden_params['response_cost']
-                        logger.info(f"Using response_cost from _hidden_params: {final_cost}")
-
-                    if final_cost is None: # Fall back to calculating cost if direct cost not available or zero
-                        logger.info("Calculating cost using completion_cost function.")
-                        # Note: litellm might need 'messages' kwarg depending on model/provider
-                        final_cost = completion_cost(
-                            completion_response=llm_response,
-                            model=llm_model, # Explicitly pass the model name
-                            # messages=prompt_messages # Pass prompt messages if needed by litellm for this model
-                        )
-
-                    if final_cost is not None and final_cost > 0:
-                        logger.info(f"Calculated final cost for non-stream: {final_cost}")
-                        await self.add_message(
-                            thread_id=thread_id,
-                            type="cost",
-                            content={"cost": final_cost},
-                            is_llm_message=False, # Cost is metadata
-                            metadata={"thread_run_id": thread_run_id} # Keep track of the run
-                        )
-                        logger.info(f"Cost message saved for non-stream: {final_cost}")
-                    else:
-                        logger.info("Non-stream cost calculation resulted in zero or None, not storing cost message.")
-
-                except Exception as e:
-                    logger.error(f"Error calculating final cost for non-stream: {str(e)}")
+            # --- Record Usage (cost is computed in the background) ---
+            if assistant_message_object: # Only record if assistant message was saved
+                usage_pipeline.record(UsageEvent(thread_id=thread_id, model=llm_model, response=llm_response))
 
             # --- Execute Tools and Yield Results ---
             tool_calls_to_execute = [item['tool_call'] for item in all_tool_data]
             if config.execute_tools and tool_calls_to_execute:
                 logger.info(f"Executing {len(tool_calls_to_execute)} tools with strategy: {config.tool_execution_strategy}")
-                tool_results = await self._execute_tools(tool_calls_to_execute, config.tool_execution_strategy)
+                progress_queue = asyncio.Queue(maxsize=TOOL_PROGRESS_QUEUE_SIZE)
+                execution = asyncio.create_task(self._execute_tools(
+                    tool_calls_to_execute, config.tool_execution_strategy, progress_queue
+                ))
+                async for progress_msg in self._stream_tool_progress([execution], progress_queue, thread_id, thread_run_id):
+                    yield progress_msg
+                tool_results = execution.result()
 
                 for i, (returned_tool_call, result) in enumerate(tool_results):
                     original_data = all_tool_data[i]
@@ -1042,8 +1058,12 @@ class ResponseProcessor:
         return parsed_data
 
     # Tool execution methods
-    async def _execute_tool(self, tool_call: Dict[str, Any]) -> ToolResult:
-        """Execute a single tool call and return the result."""
+    async def _execute_tool(self, tool_call: Dict[str, Any], progress_queue: Optional[asyncio.Queue] = None) -> ToolResult:
+        """Execute a single tool call and return the result.
+        
+        Progress the tool reports while it runs is put on progress_queue as
+        (tool_call, data); reports are dropped when the queue is full.
+        """
         try:
             function_name = tool_call["function_name"]
             arguments = tool_call["arguments"]
@@ -1066,7 +1086,12 @@ class ResponseProcessor:
                 return ToolResult(success=False, output=f"Tool function '{function_name}' not found")
             
             logger.debug(f"Found tool function for '{function_name}', executing...")
-            result = await tool_fn(**arguments)
+            token = progress_reporter.set(self._progress_callback(tool_call, progress_queue)) if progress_queue is not None else None
+            try:
+                result = await tool_fn(**arguments)
+            finally:
+                if token is not None:
+                    progress_reporter.reset(token)
             logger.info(f"Tool execution complete: {function_name} -> {result}")
             return result
         except Exception as e:
@@ -1076,7 +1101,8 @@ class ResponseProcessor:
     async def _execute_tools(
         self, 
         tool_calls: List[Dict[str, Any]], 
-        execution_strategy: ToolExecutionStrategy = "sequential"
+        execution_strategy: ToolExecutionStrategy = "sequential",
+        progress_queue: Optional[asyncio.Queue] = None
     ) -> List[Tuple[Dict[str, Any], ToolResult]]:
         """Execute tool calls with the specified strategy.
         
@@ -1088,6 +1114,7 @@ class ResponseProcessor:
             execution_strategy: Strategy for executing tools:
                 - "sequential": Execute tools one after another, waiting for each to complete
                 - "parallel": Execute all tools simultaneously for better performance 
+            progress_queue: Queue receiving the tools' progress reports (optional)
                 
         Returns:
             List of tuples containing the original tool call and its result
@@ -1095,14 +1122,14 @@ class ResponseProcessor:
         logger.info(f"Executing {len(tool_calls)} tools with strategy: {execution_strategy}")
             
         if execution_strategy == "sequential":
-            return await self._execute_tools_sequentially(tool_calls)
+            return await self._execute_tools_sequentially(tool_calls, progress_queue)
         elif execution_strategy == "parallel":
-            return await self._execute_tools_in_parallel(tool_calls)
+            return await self._execute_tools_in_parallel(tool_calls, progress_queue)
         else:
             logger.warning(f"Unknown execution strategy: {execution_strategy}, falling back to sequential")
-            return await self._execute_tools_sequentially(tool_calls)
+            return await self._execute_tools_sequentially(tool_calls, progress_queue)
 
-    async def _execute_tools_sequentially(self, tool_calls: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], ToolResult]]:
+    async def _execute_tools_sequentially(self, tool_calls: List[Dict[str, Any]], progress_queue: Optional[asyncio.Queue] = None) -> List[Tuple[Dict[str, Any], ToolResult]]:
         """Execute tool calls sequentially and return results.
         
         This method executes tool calls one after another, waiting for each tool to complete
@@ -1127,7 +1154,7 @@ class ResponseProcessor:
                 logger.debug(f"Executing tool {index+1}/{len(tool_calls)}: {tool_name}")
                 
                 try:
-                    result = await self._execute_tool(tool_call)
+                    result = await self._execute_tool(tool_call, progress_queue)
                     results.append((tool_call, result))
                     logger.debug(f"Completed tool {tool_name} with success={result.success}")
                 except Exception as e:
@@ -1150,7 +1177,7 @@ class ResponseProcessor:
                             
             return (results if 'results' in locals() else []) + error_results
 
-    async def _execute_tools_in_parallel(self, tool_calls: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], ToolResult]]:
+    async def _execute_tools_in_parallel(self, tool_calls: List[Dict[str, Any]], progress_queue: Optional[asyncio.Queue] = None) -> List[Tuple[Dict[str, Any], ToolResult]]:
         """Execute tool calls in parallel and return results.
         
         This method executes all tool calls simultaneously using asyncio.gather, which
@@ -1170,7 +1197,7 @@ class ResponseProcessor:
             logger.info(f"Executing {len(tool_calls)} tools in parallel: {tool_names}")
             
             # Create tasks for all tool calls
-            tasks = [self._execute_tool(tool_call) for tool_call in tool_calls]
+            tasks = [self._execute_tool(tool_call, progress_queue) for tool_call in tool_calls]
             
             # Execute all tasks concurrently with error handling
             results = await asyncio.gather(*tasks, return_exceptions=True)
@@ -1234,6 +1261,11 @@ class ResponseProcessor:
                 metadata["parsing_details"] = parsing_details
                 logger.info("Adding parsing_details to tool result metadata")
             # ---
+
+            # --- Keep large outputs out of the context, leaving a stub with a blob reference ---
+            result, blob_id = await self._offload_large_output(result, tool_call.get("function_name"))
+            if blob_id:
+                metadata["blob_id"] = blob_id
             
             # Check if this is a native function call (has id field)
             if "id" in tool_call:
@@ -1323,6 +1355,35 @@ class ResponseProcessor:
                 logger.error(f"Failed even with fallback message: {str(e2)}", exc_info=True)
                 return None # Return None on error
 
+    async def _offload_large_output(self, result: ToolResult, function_name: Optional[str] = None) -> Tuple[ToolResult, Optional[str]]:
+        """Move a tool output above the size threshold to the blob store.
+
+        Pages returned by `read_tool_output` are never offloaded, otherwise the
+        middle of a stored output could not be read back.
+
+        Args:
+            result: The result from the tool execution
+            function_name: Name of the tool function that produced the result
+
+        Returns:
+            Tuple of (result with its output replaced by a head/tail stub, blob ID),
+            or the unchanged result and None if it is small or could not be stored
+        """
+        if not isinstance(result, ToolResult) or function_name in UNOFFLOADED_FUNCTIONS:
+            return result, None
+        output = result.output if isinstance(result.output, str) else json.dumps(result.output)
+        if len(output) <= BLOB_THRESHOLD_CHARS:
+            return result, None
+
+        try:
+            blob_id = await asyncio.to_thread(blob_store.put, output)
+        except Exception as e:
+            logger.error(f"Failed to store large tool output, keeping it inline: {str(e)}")
+            return result, None
+
+        logger.info(f"Offloaded tool output of {len(output)} characters to {blob_id}")
+        return ToolResult(success=result.success, output=make_stub(output, blob_id)), blob_id
+
     def _format_xml_tool_result(self, tool_call: Dict[str, Any], result: ToolResult) -> str:
         """Format a tool result wrapped in a <tool_result> tag.
 
@@ -1342,6 +1403,126 @@ class ResponseProcessor:
         function_name = tool_call["function_name"]
         return f"Result for {function_name}: {str(result)}"
 
+    # Speculative warm-up methods
+    def _get_warm_up_xml_tags(self) -> Dict[str, Tool]:
+        """Get the XML tags whose tool instances implement a warm-up step.
+
+        Returns:
+            Dict mapping XML tag names to their tool instances
+        """
+        return {
+            tag_name: tool_info['instance']
+            for tag_name, tool_info in self.tool_registry.xml_tools.items()
+            if tool_info['instance'].supports_warm_up()
+        }
+
+    def _start_warm_up(self, tool_instance: Tool, warm_ups: Dict[int, Dict[str, Any]]) -> None:
+        """Start a tool's warm-up in the background without blocking the stream.
+
+        The task is kept in the stream's `warm_ups`, which cancels it if it is
+        still running when the stream ends.
+
+        Args:
+            tool_instance: Tool whose call has started streaming
+            warm_ups: Per-stream warm-up state, keyed by tool instance id
+        """
+        state = {"started_at": time.monotonic(), "finished_at": None, "recorded": False}
+
+        async def _run():
+            try:
+                await tool_instance.warm_up()
+            except Exception as e:
+                # The tool call itself will surface any real failure
+                logger.warning(f"Warm-up failed for {tool_instance.__class__.__name__}: {str(e)}")
+            finally:
+                state["finished_at"] = time.monotonic()
+                logger.debug(f"Warm-up for {tool_instance.__class__.__name__} took "
+                             f"{state['finished_at'] - state['started_at']:.2f}s")
+
+        state["task"] = asyncio.create_task(_run())
+        warm_ups[id(tool_instance)] = state
+        self.warm_up_stats["warm_ups_started"] += 1
+        logger.info(f"Started speculative warm-up for {tool_instance.__class__.__name__}")
+
+    def _record_warm_up_savings(self, tool_call: Dict[str, Any], warm_ups: Dict[int, Dict[str, Any]]) -> None:
+        """Record how much warm-up work overlapped with generation for a tool call.
+
+        The saving is the warm-up time that elapsed before the tool started
+        executing, i.e. latency the tool call no longer has to pay itself.
+        """
+        if not warm_ups:
+            return
+        if "xml_tag_name" in tool_call:
+            tool_info = self.tool_registry.xml_tools.get(tool_call["xml_tag_name"])
+        else:
+            tool_info = self.tool_registry.tools.get(tool_call.get("function_name"))
+        state = warm_ups.get(id(tool_info['instance'])) if tool_info else None
+        if not state or state["recorded"]:
+            return
+
+        state["recorded"] = True
+        execution_start = time.monotonic()
+        overlap_end = min(state["finished_at"] or execution_start, execution_start)
+        saved = max(0.0, overlap_end - state["started_at"])
+        self.warm_up_stats["tool_calls_warmed"] += 1
+        self.warm_up_stats["time_saved_seconds"] += saved
+        logger.info(f"Warm-up saved {saved:.2f}s for {tool_call.get('xml_tag_name') or tool_call.get('function_name')} "
+                    f"(total saved: {self.warm_up_stats['time_saved_seconds']:.2f}s over "
+                    f"{self.warm_up_stats['tool_calls_warmed']} calls)")
+
+    def _format_tool_intent(self, thread_id: str, thread_run_id: str, xml_tag_name: Optional[str] = None,
+                            function_name: Optional[str] = None) -> Dict[str, Any]:
+        """Format a transient (unsaved) tool intent status message."""
+        now = datetime.now(timezone.utc).isoformat()
+        return {
+            "message_id": None, "thread_id": thread_id, "type": "status", "is_llm_message": False,
+            "content": json.dumps({"role": "assistant", "status_type": "tool_intent",
+                                   "xml_tag_name": xml_tag_name, "function_name": function_name}),
+            "metadata": json.dumps({"thread_run_id": thread_run_id}),
+            "created_at": now, "updated_at": now
+        }
+
+    def _progress_callback(self, tool_call: Dict[str, Any], progress_queue: asyncio.Queue) -> Callable[[Dict[str, Any]], None]:
+        """Create the progress reporter of one tool call."""
+        def report(data: Dict[str, Any]) -> None:
+            try:
+                progress_queue.put_nowait((tool_call, data))
+            except asyncio.QueueFull:
+                logger.debug(f"Dropping progress report of {tool_call.get('function_name')}: stream is backed up")
+        return report
+
+    def _format_tool_progress(self, thread_id: str, thread_run_id: str, tool_call: Dict[str, Any],
+                              data: Dict[str, Any]) -> Dict[str, Any]:
+        """Format a transient (unsaved) tool progress status message."""
+        now = datetime.now(timezone.utc).isoformat()
+        return {
+            "message_id": None, "thread_id": thread_id, "type": "status", "is_llm_message": False,
+            "content": json.dumps({"role": "assistant", "status_type": "tool_progress",
+                                   "function_name": tool_call.get("function_name"),
+                                   "xml_tag_name": tool_call.get("xml_tag_name"),
+                                   "tool_call_id": tool_call.get("id"), "progress": data}),
+            "metadata": json.dumps({"thread_run_id": thread_run_id}),
+            "created_at": now, "updated_at": now
+        }
+
+    async def _stream_tool_progress(self, tasks: List[asyncio.Task], progress_queue: asyncio.Queue,
+                                    thread_id: str, thread_run_id: str) -> AsyncGenerator[Dict[str, Any], None]:
+        """Wait for tool execution tasks, yielding their progress reports as they arrive."""
+        while True:
+            while not progress_queue.empty():
+                yield self._format_tool_progress(thread_id, thread_run_id, *progress_queue.get_nowait())
+            pending = [task for task in tasks if not task.done()]
+            if not pending:
+                return
+            getter = asyncio.ensure_future(progress_queue.get())
+            try:
+                await asyncio.wait(pending + [getter], return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                if not getter.done():
+                    getter.cancel()
+            if getter.done() and not getter.cancelled():
+                yield self._format_tool_progress(thread_id, thread_run_id, *getter.result())
+
     def _create_tool_context(self, tool_call: Dict[str, Any], tool_index: int, assistant_message_id: Optional[str] = None, parsing_details: Optional[Dict[str, Any]] = None) -> ToolExecutionContext:
         """Create a tool execution context with display name and parsing details populated."""
         context = ToolExecutionContext(
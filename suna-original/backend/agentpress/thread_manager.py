@@ -10,13 +10,15 @@ This module provides comprehensive conversation management, including:
 - Context summarization to manage token limits
 """
 
+import copy
 import json
+import time
 import uuid
 from datetime import datetime, timezone
-from typing import List, Dict, Any, Optional, Type, Union, AsyncGenerator, Literal
-from services.llm import make_llm_api_call
+from typing import List, Dict, Any, Optional, Set, Type, Union, AsyncGenerator, Literal
 from agentpress.tool import Tool
 from agentpress.tool_registry import ToolRegistry
+from agentpress.tool_selector import ToolSelector
 from agentpress.context_manager import ContextManager
 from agentpress.response_processor import (
     ResponseProcessor, 
@@ -29,6 +31,8 @@ from utils.config import config, EnvMode
 # Type alias for tool choice
 ToolChoice = Literal["auto", "required", "none"]
 
+TOOL_SET_TOKEN_CACHE_SIZE = 32  # Prompt/tool set token counts kept for tool selection savings
+
 class ThreadManager:
     """Manages conversation threads with LLM models and tool execution.
     
@@ -48,8 +52,10 @@ class ThreadManager:
             add_message_callback=self.add_message
         )
         self.context_manager = ContextManager()
+        # Prompt tokens of a system prompt and tool set, by (model, prompt, functions, native tool calling)
+        self._tool_set_tokens: Dict[Any, int] = {}
 
-    def add_tool(self, tool_class: Type[Tool], function_names: Optional[List[str]] = None, **kwargs):
+    def add_tool(self, tool_class: Union[Type[Tool], str], function_names: Optional[List[str]] = None, **kwargs):
         """Add a tool to the ThreadManager."""
         self.tool_registry.register_tool(tool_class, function_names, **kwargs)
 
@@ -177,6 +183,98 @@ class ThreadManager:
             logger.error(f"Failed to get messages for thread {thread_id}: {str(e)}", exc_info=True)
             return []
 
+    def _add_xml_examples(self, system_prompt: Dict[str, Any], xml_examples: Dict[str, str]) -> Dict[str, Any]:
+        """Get a copy of the system prompt with XML tool examples appended.
+        
+        Args:
+            system_prompt: System message to extend (not modified)
+            xml_examples: Dict mapping tag names to their example usage
+            
+        Returns:
+            The extended system message
+        """
+        prompt = copy.deepcopy(system_prompt)
+        if not xml_examples:
+            return prompt
+
+        examples_content = """
+--- XML TOOL CALLING ---
+
+In this environment you have access to a set of tools you can use to answer the user's question. The tools are specified in XML format.
+Format your tool calls using the specified XML tags. Place parameters marked as 'attribute' within the opening tag (e.g., `<tag attribute='value'>`). Place parameters marked as 'content' between the opening and closing tags. Place parameters marked as 'element' within their own child tags (e.g., `<tag><element>value</element></tag>`). Refer to the examples provided below for the exact structure of each tool.
+String and scalar parameters should be specified as attributes, while content goes between tags.
+Note that spaces for string values are not stripped. The output is parsed with regular expressions.
+
+Here are the XML tools available with examples:
+"""
+        for tag_name, example in xml_examples.items():
+            examples_content += f"<{tag_name}> Example: {example}\\n"
+
+        system_content = prompt.get('content')
+
+        if isinstance(system_content, str):
+            prompt['content'] += examples_content
+            logger.debug("Appended XML examples to string system prompt content.")
+        elif isinstance(system_content, list):
+            appended = False
+            for item in prompt['content']: # Modify the copy
+                if isinstance(item, dict) and item.get('type') == 'text' and 'text' in item:
+                    item['text'] += examples_content
+                    logger.debug("Appended XML examples to the first text block in list system prompt content.")
+                    appended = True
+                    break
+            if not appended:
+                logger.warning("System prompt content is a list but no text block found to append XML examples.")
+        else:
+            logger.warning(f"System prompt content is of unexpected type ({type(system_content)}), cannot add XML examples.")
+
+        return prompt
+
+    def _record_tool_selection_savings(
+        self,
+        tool_selector: ToolSelector,
+        full_system_prompt: Dict[str, Any],
+        selected_system_prompt: Dict[str, Any],
+        selected_functions: Optional[Set[str]],
+        native_tool_calling: bool,
+        llm_model: str,
+        seconds_per_prompt_token: Optional[float]
+    ) -> None:
+        """Count the prompt tokens saved by a tool selection and report them to the selector.
+
+        Runs before every LLM call, so the counts of each prompt and tool set are
+        cached: a run selects from a handful of tool sets and only counts each once.
+        """
+        try:
+            full_tokens = self._count_tool_set_tokens(llm_model, full_system_prompt, None, native_tool_calling)
+            selected_tokens = self._count_tool_set_tokens(llm_model, selected_system_prompt, selected_functions,
+                                                          native_tool_calling)
+            tool_selector.record_savings(full_tokens, selected_tokens, seconds_per_prompt_token)
+        except Exception as e:
+            logger.warning(f"Could not count tool selection savings: {str(e)}")
+
+    def _count_tool_set_tokens(
+        self,
+        llm_model: str,
+        system_prompt: Dict[str, Any],
+        functions: Optional[Set[str]],
+        native_tool_calling: bool
+    ) -> int:
+        """Count the prompt tokens of a system prompt and (with native tool calling) tool schemas."""
+        content = system_prompt.get('content')
+        key = (llm_model, content if isinstance(content, str) else json.dumps(content),
+               frozenset(functions) if functions is not None else None, native_tool_calling)
+        tokens = self._tool_set_tokens.get(key)
+        if tokens is None:
+            from litellm import token_counter
+            tokens = token_counter(model=llm_model, messages=[system_prompt])
+            if native_tool_calling:
+                tokens += token_counter(model=llm_model, text=json.dumps(self.tool_registry.get_openapi_schemas(functions)))
+            if len(self._tool_set_tokens) >= TOOL_SET_TOKEN_CACHE_SIZE:
+                self._tool_set_tokens.clear()
+            self._tool_set_tokens[key] = tokens
+        return tokens
+
     async def run_thread(
         self,
         thread_id: str,
@@ -193,7 +291,10 @@ class ThreadManager:
         include_xml_examples: bool = False,
         enable_thinking: Optional[bool] = False,
         reasoning_effort: Optional[str] = 'low',
-        enable_context_manager: bool = True
+        enable_context_manager: bool = True,
+        select_tools: bool = False,
+        core_tools: Optional[List[str]] = None,
+        max_selected_tools: int = 4
     ) -> Union[Dict[str, Any], AsyncGenerator]:
         """Run a conversation thread with LLM integration and tool execution.
         
@@ -214,6 +315,9 @@ class ThreadManager:
             enable_thinking: Whether to enable thinking before making a decision
             reasoning_effort: The effort level for reasoning
             enable_context_manager: Whether to enable automatic context summarization.
+            select_tools: Whether to describe only the tools relevant to each turn in the prompt
+            core_tools: Tool class names that are always described when select_tools is set
+            max_selected_tools: Max tools selected by relevance to the request when select_tools is set
             
         Returns:
             An async generator yielding response chunks or error dict
@@ -231,43 +335,18 @@ class ThreadManager:
         if max_xml_tool_calls > 0 and not processor_config.max_xml_tool_calls:
             processor_config.max_xml_tool_calls = max_xml_tool_calls
             
-        # Create a working copy of the system prompt to potentially modify
-        working_system_prompt = system_prompt.copy()
-
-        # Add XML examples to system prompt if requested, do this only ONCE before the loop
-        if include_xml_examples and processor_config.xml_tool_calling:
-            xml_examples = self.tool_registry.get_xml_examples()
-            if xml_examples:
-                examples_content = """
---- XML TOOL CALLING ---
-
-In this environment you have access to a set of tools you can use to answer the user's question. The tools are specified in XML format.
-Format your tool calls using the specified XML tags. Place parameters marked as 'attribute' within the opening tag (e.g., `<tag attribute='value'>`). Place parameters marked as 'content' between the opening and closing tags. Place parameters marked as 'element' within their own child tags (e.g., `<tag><element>value</element></tag>`). Refer to the examples provided below for the exact structure of each tool.
-String and scalar parameters should be specified as attributes, while content goes between tags.
-Note that spaces for string values are not stripped. The output is parsed with regular expressions.
-
-Here are the XML tools available with examples:
-"""
-                for tag_name, example in xml_examples.items():
-                    examples_content += f"<{tag_name}> Example: {example}\\n"
-
-                system_content = working_system_prompt.get('content')
-
-                if isinstance(system_content, str):
-                    working_system_prompt['content'] += examples_content
-                    logger.debug("Appended XML examples to string system prompt content.")
-                elif isinstance(system_content, list):
-                    appended = False
-                    for item in working_system_prompt['content']: # Modify the copy
-                        if isinstance(item, dict) and item.get('type') == 'text' and 'text' in item:
-                            item['text'] += examples_content
-                            logger.debug("Appended XML examples to the first text block in list system prompt content.")
-                            appended = True
-                            break
-                    if not appended:
-                        logger.warning("System prompt content is a list but no text block found to append XML examples.")
-                else:
-                    logger.warning(f"System prompt content is of unexpected type ({type(system_content)}), cannot add XML examples.")
+        # Add XML examples to the system prompt. With tool selection they are
+        # chosen per turn, otherwise this is done only ONCE before the loop
+        use_xml_examples = include_xml_examples and processor_config.xml_tool_calling
+        tool_selector = None
+        full_system_prompt = system_prompt
+        if use_xml_examples:
+            full_system_prompt = self._add_xml_examples(system_prompt, self.tool_registry.get_xml_examples())
+        if select_tools:
+            tool_selector = ToolSelector(self.tool_registry, core_tools=core_tools, max_tools=max_selected_tools)
+        
+        # Prefill timing of the last LLM call, used to estimate the latency saved by tool selection
+        prefill_timing = {"started": None, "prompt_tokens": 0, "seconds_per_token": None}
         
         # Control whether we need to auto-continue due to tool_calls finish reason
         auto_continue = True
@@ -283,6 +362,23 @@ Here are the XML tools available with examples:
                 # 1. Get messages from thread for LLM call
                 messages = await self.get_llm_messages(thread_id)
                 
+                # Choose the tools to describe for this turn
+                working_system_prompt = full_system_prompt
+                selected_functions = None
+                if tool_selector:
+                    selection = tool_selector.select(messages)
+                    if not selection.expanded:
+                        selected_functions = selection.functions
+                        if use_xml_examples:
+                            working_system_prompt = self._add_xml_examples(
+                                system_prompt, self.tool_registry.get_xml_examples(selection.xml_tags)
+                            )
+                    self._record_tool_selection_savings(
+                        tool_selector, full_system_prompt, working_system_prompt,
+                        selected_functions, processor_config.native_tool_calling,
+                        llm_model, prefill_timing["seconds_per_token"]
+                    )
+                
                 # 2. Check token count before proceeding
                 token_count = 0
                 try:
@@ -292,24 +388,17 @@ Here are the XML tools available with examples:
                     token_threshold = self.context_manager.token_threshold
                     logger.info(f"Thread {thread_id} token count: {token_count}/{token_threshold} ({(token_count/token_threshold)*100:.1f}%)")
                     
-                    # if token_count >= token_threshold and enable_context_manager:
-                    #     logger.info(f"Thread token count ({token_count}) exceeds threshold ({token_threshold}), summarizing...")
-                    #     summarized = await self.context_manager.check_and_summarize_if_needed(
-                    #         thread_id=thread_id,
-                    #         add_message_callback=self.add_message,
-                    #         model=llm_model,
-                    #         force=True
-                    #     )
-                    #     if summarized:
-                    #         logger.info("Summarization complete, fetching updated messages with summary")
-                    #         messages = await self.get_llm_messages(thread_id)
-                    #         # Recount tokens after summarization, using the modified prompt
-                    #         new_token_count = token_counter(model=llm_model, messages=[working_system_prompt] + messages) 
-                    #         logger.info(f"After summarization: token count reduced from {token_count} to {new_token_count}")
-                    #     else:
-                    #         logger.warning("Summarization failed or wasn't needed - proceeding with original messages")
-                    # elif not enable_context_manager: 
-                    #     logger.info("Automatic summarization disabled. Skipping token count check and summarization.")
+                    # Summarize the oldest part of the thread in the background once it
+                    # crosses the soft watermark; the summary is picked up on a later turn
+                    if enable_context_manager:
+                        self.context_manager.schedule_summarization(
+                            thread_id=thread_id,
+                            token_count=token_count,
+                            add_message_callback=self.add_message,
+                            model=llm_model
+                        )
+                    else:
+                        logger.info("Automatic summarization disabled. Skipping summarization.")
 
                 except Exception as e:
                     logger.error(f"Error counting tokens or summarizing: {str(e)}")
@@ -340,11 +429,14 @@ Here are the XML tools available with examples:
                 # 4. Prepare tools for LLM call
                 openapi_tool_schemas = None
                 if processor_config.native_tool_calling:
-                    openapi_tool_schemas = self.tool_registry.get_openapi_schemas()
+                    openapi_tool_schemas = self.tool_registry.get_openapi_schemas(selected_functions)
                     logger.debug(f"Retrieved {len(openapi_tool_schemas) if openapi_tool_schemas else 0} OpenAPI tool schemas")
 
                 # 5. Make LLM API call
                 logger.debug("Making LLM API call")
+                from services.llm import make_llm_api_call # Deferred: pulls in litellm
+                prefill_timing["started"] = time.monotonic()
+                prefill_timing["prompt_tokens"] = token_count
                 try:
                     llm_response = await make_llm_api_call(
                         prepared_messages, # Pass the potentially modified messages
@@ -417,6 +509,13 @@ Here are the XML tools available with examples:
                 
                 # Process each chunk
                 async for chunk in response_gen:
+                    # Time to the first streamed assistant chunk approximates the prefill time
+                    if prefill_timing["started"] and chunk.get('type') == 'assistant':
+                        elapsed = time.monotonic() - prefill_timing["started"]
+                        prefill_timing["started"] = None
+                        if prefill_timing["prompt_tokens"]:
+                            prefill_timing["seconds_per_token"] = elapsed / prefill_timing["prompt_tokens"]
+                    
                     # Check if this is a finish reason chunk with tool_calls or xml_tool_limit_reached
                     if chunk.get('type') == 'finish':
                         if chunk.get('finish_reason') == 'tool_calls':
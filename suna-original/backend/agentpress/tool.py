@@ -7,14 +7,18 @@ This module defines the base classes and decorators for creating tools in AgentP
 - Result containers for standardized tool outputs
 """
 
-from typing import Dict, Any, Union, Optional, List, Type
+from typing import Dict, Any, Union, Optional, List, Type, Callable
 from dataclasses import dataclass, field
 from abc import ABC
+from contextvars import ContextVar
 import json
 import inspect
 from enum import Enum
 from utils.logger import logger
 
+# Set by the ResponseProcessor while a tool call runs; receives the call's progress reports
+progress_reporter: ContextVar[Optional[Callable[[Dict[str, Any]], None]]] = ContextVar("progress_reporter", default=None)
+
 class SchemaType(Enum):
     """Enumeration of supported schema types for tool definitions."""
     OPENAPI = "openapi"
@@ -129,6 +133,39 @@ class Tool(ABC):
         """
         return self._schemas
 
+    async def warm_up(self) -> None:
+        """Prepare resources the tool will need before it is executed.
+
+        Called speculatively by the ResponseProcessor as soon as the LLM starts
+        writing a call to one of this tool's functions, so that slow setup can
+        overlap with the remaining token generation. The default is a no-op.
+        """
+        pass
+
+    @classmethod
+    def supports_warm_up(cls) -> bool:
+        """Check whether the tool overrides `warm_up`.
+
+        Returns:
+            True if the tool has a speculative warm-up step
+        """
+        return cls.warm_up is not Tool.warm_up
+
+    def report_progress(self, data: Dict[str, Any]) -> None:
+        """Report intermediate progress of the running tool call.
+
+        The ResponseProcessor forwards reports to the run's response stream as
+        transient `tool_progress` status messages (they are not saved). Reports
+        are best-effort: they are dropped when nothing is listening or the
+        stream is backed up, so tools must not rely on them for results.
+
+        Args:
+            data: JSON-serializable progress payload
+        """
+        reporter = progress_reporter.get()
+        if reporter is not None:
+            reporter(data)
+
     def success_response(self, data: Union[Dict[str, Any], str]) -> ToolResult:
         """Create a successful tool result.
         
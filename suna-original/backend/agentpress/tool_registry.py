@@ -1,8 +1,28 @@
-from typing import Dict, Type, Any, List, Optional, Callable
+import importlib
+from functools import lru_cache
+from typing import Dict, Type, Any, List, Optional, Callable, Set, Union
 from agentpress.tool import Tool, SchemaType, ToolSchema
 from utils.logger import logger
 
 
+@lru_cache(maxsize=None)
+def resolve_tool_class(tool_path: str) -> Type[Tool]:
+    """Import a tool class from its "package.module:ClassName" path.
+
+    Tool modules pull in heavy dependencies (sandbox SDK, search clients, ...),
+    so they are only imported the first time a tool is registered.
+
+    Args:
+        tool_path: Dotted module path and class name separated by a colon
+
+    Returns:
+        The tool class
+    """
+    module_name, _, class_name = tool_path.partition(":")
+    logger.debug(f"Importing tool class {class_name} from {module_name}")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
 class ToolRegistry:
     """Registry for managing and accessing tools.
     
@@ -27,11 +47,11 @@ class ToolRegistry:
         self.xml_tools = {}
         logger.debug("Initialized new ToolRegistry instance")
     
-    def register_tool(self, tool_class: Type[Tool], function_names: Optional[List[str]] = None, **kwargs):
+    def register_tool(self, tool_class: Union[Type[Tool], str], function_names: Optional[List[str]] = None, **kwargs):
         """Register a tool with optional function filtering.
         
         Args:
-            tool_class: The tool class to register
+            tool_class: The tool class to register, or its "module:ClassName" path to import lazily
             function_names: Optional list of specific functions to register
             **kwargs: Additional arguments passed to tool initialization
             
@@ -39,6 +59,8 @@ class ToolRegistry:
             - If function_names is None, all functions are registered
             - Handles both OpenAPI and XML schema registration
         """
+        if isinstance(tool_class, str):
+            tool_class = resolve_tool_class(tool_class)
         logger.debug(f"Registering tool class: {tool_class.__name__}")
         tool_instance = tool_class(**kwargs)
         schemas = tool_instance.get_schemas()
@@ -123,28 +145,37 @@ class ToolRegistry:
             logger.warning(f"XML tool not found for tag: {tag_name}")
         return tool
 
-    def get_openapi_schemas(self) -> List[Dict[str, Any]]:
+    def get_openapi_schemas(self, function_names: Optional[Set[str]] = None) -> List[Dict[str, Any]]:
         """Get OpenAPI schemas for function calling.
         
+        Args:
+            function_names: Optional set of functions to include (all if None)
+            
         Returns:
             List of OpenAPI-compatible schema definitions
         """
         schemas = [
             tool_info['schema'].schema 
-            for tool_info in self.tools.values()
+            for name, tool_info in self.tools.items()
             if tool_info['schema'].schema_type == SchemaType.OPENAPI
+            and (function_names is None or name in function_names)
         ]
         logger.debug(f"Retrieved {len(schemas)} OpenAPI schemas")
         return schemas
 
-    def get_xml_examples(self) -> Dict[str, str]:
-        """Get all XML tag examples.
+    def get_xml_examples(self, tag_names: Optional[Set[str]] = None) -> Dict[str, str]:
+        """Get XML tag examples.
         
+        Args:
+            tag_names: Optional set of tags to include (all if None)
+            
         Returns:
             Dict mapping tag names to their example usage
         """
         examples = {}
-        for tool_info in self.xml_tools.values():
+        for tag_name, tool_info in self.xml_tools.items():
+            if tag_names is not None and tag_name not in tag_names:
+                continue
             schema = tool_info['schema']
             if schema.xml_schema and schema.xml_schema.example:
                 examples[schema.xml_schema.tag_name] = schema.xml_schema.example
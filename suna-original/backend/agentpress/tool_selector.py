@@ -0,0 +1,250 @@
+"""
+Per-turn tool selection for AgentPress threads.
+
+Sending every registered tool's XML examples and OpenAPI schemas with every
+request costs thousands of prompt tokens, which dominates prefill time on small
+local models. The ToolSelector picks the tools worth describing for a turn:
+
+- core tools that are always available (e.g. messaging the user)
+- tools used in the thread's recent messages, so multi-step work keeps its tools
+- tools whose names and descriptions best match the latest user request
+
+Tools that are not selected stay registered and can still be executed. If the
+model refers to a tool outside the subset, that tool is added on the next turn,
+and a reference to a tool that does not exist expands the prompt to all tools.
+"""
+
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from agentpress.tool_registry import ToolRegistry
+from utils.logger import logger
+
+# Constants
+DEFAULT_MAX_TOOLS = 4         # Max tools selected by relevance (core and recent tools come on top)
+HISTORY_WINDOW = 12           # Recent messages scanned for tool usage
+MIN_RELEVANCE = 0.5           # Minimum relevance score for a tool to be selected
+
+_WORD_PATTERN = re.compile(r"[a-z][a-z0-9]{2,}")
+_TAG_PATTERN = re.compile(r"<([a-z][a-z0-9]*(?:-[a-z0-9]+)+)")
+_UNKNOWN_TOOL_MARKER = "not found"
+_STOPWORDS = {
+    "the", "and", "for", "with", "this", "that", "from", "your", "you", "are", "can", "use", "using",
+    "will", "should", "must", "into", "when", "which", "what", "any", "all", "not", "have", "has",
+    "its", "their", "them", "then", "than", "also", "such", "other", "only", "more", "most", "each",
+    "may", "like", "one", "two", "via", "about", "please", "need", "want", "make", "get", "set",
+}
+
+
+def _tokenize(text: str) -> List[str]:
+    """Split text into lowercase keywords, dropping stopwords and plural 's'."""
+    words = []
+    for word in _WORD_PATTERN.findall(text.lower().replace("_", " ").replace("-", " ")):
+        if word in _STOPWORDS:
+            continue
+        if len(word) > 4 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    return words
+
+
+def _message_text(message: Dict[str, Any]) -> str:
+    """Get the text of a message whose content may be a string or a list of parts."""
+    content = message.get("content")
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return ""
+
+
+@dataclass
+class ToolSelection:
+    """Tools chosen for a turn.
+
+    Attributes:
+        tools: Names of the selected tool classes
+        functions: OpenAPI function names of the selected tools
+        xml_tags: XML tags of the selected tools
+        expanded: True if every tool was selected
+        reasons: Why each tool was selected ("core", "recent", "relevant" or "expanded")
+    """
+    tools: Set[str]
+    functions: Set[str]
+    xml_tags: Set[str]
+    expanded: bool = False
+    reasons: Dict[str, str] = field(default_factory=dict)
+
+
+class ToolSelector:
+    """Chooses the subset of registered tools to describe in a turn's prompt."""
+
+    def __init__(
+        self,
+        tool_registry: ToolRegistry,
+        core_tools: Optional[Iterable[str]] = None,
+        max_tools: int = DEFAULT_MAX_TOOLS
+    ):
+        """Initialize the selector.
+
+        Args:
+            tool_registry: Registry holding all tools of the thread
+            core_tools: Tool class names that are always selected
+            max_tools: Max tools selected by relevance to the request
+        """
+        self.tool_registry = tool_registry
+        self.core_tools = set(core_tools or [])
+        self.max_tools = max_tools
+        self._index_size = -1
+        self._groups: Dict[str, Dict[str, Any]] = {}
+        self.stats = {"turns": 0, "expanded_turns": 0, "full_tokens": 0, "selected_tokens": 0,
+                      "estimated_seconds_saved": 0.0}
+
+    def _build_index(self) -> None:
+        """Group registered functions and XML tags by tool class and index their keywords."""
+        size = len(self.tool_registry.tools) + len(self.tool_registry.xml_tools)
+        if size == self._index_size:
+            return
+
+        groups: Dict[str, Dict[str, Any]] = {}
+        def group_for(instance) -> Dict[str, Any]:
+            return groups.setdefault(instance.__class__.__name__, {
+                "functions": set(), "xml_tags": set(), "methods": set(), "text": [instance.__class__.__name__]
+            })
+
+        for name, info in self.tool_registry.tools.items():
+            group = group_for(info["instance"])
+            group["functions"].add(name)
+            group["methods"].add(name)
+            function_schema = info["schema"].schema.get("function", {})
+            group["text"] += [name, function_schema.get("description", "")]
+        for tag, info in self.tool_registry.xml_tools.items():
+            group = group_for(info["instance"])
+            group["xml_tags"].add(tag)
+            group["methods"].add(info["method"])
+            group["text"] += [tag, info["method"]]
+
+        document_frequency = Counter()
+        for group in groups.values():
+            group["keywords"] = Counter(_tokenize(" ".join(group["text"])))
+            document_frequency.update(group["keywords"].keys())
+        for group in groups.values():
+            group["weights"] = {
+                word: (1 + math.log(count)) * math.log(1 + len(groups) / document_frequency[word])
+                for word, count in group["keywords"].items()
+            }
+
+        self._groups = groups
+        self._index_size = size
+
+    def _find_tool(self, name: str) -> Optional[str]:
+        """Get the tool class that owns a function name or XML tag."""
+        for tool_name, group in self._groups.items():
+            if name in group["functions"] or name in group["xml_tags"] or name in group["methods"]:
+                return tool_name
+        return None
+
+    def _referenced_tools(self, messages: List[Dict[str, Any]]) -> Tuple[Set[str], bool]:
+        """Find tools referenced in recent messages.
+
+        Returns:
+            Tuple of (tool class names used or requested, whether an unknown tool was requested)
+        """
+        referenced, unknown = set(), False
+        for message in messages[-HISTORY_WINDOW:]:
+            names = []
+            for tool_call in message.get("tool_calls") or []:
+                if isinstance(tool_call, dict):
+                    names.append(tool_call.get("function", {}).get("name", ""))
+            if message.get("role") == "tool" and message.get("name"):
+                names.append(message["name"])
+            text = _message_text(message)
+            if message.get("role") == "assistant":
+                names += _TAG_PATTERN.findall(text)
+            elif "<tool_result>" in text:
+                names += [tag for tag in _TAG_PATTERN.findall(text) if tag != "tool_result"]
+                unknown = unknown or (_UNKNOWN_TOOL_MARKER in text and "Tool function" in text)
+            elif message.get("role") == "tool":
+                unknown = unknown or (_UNKNOWN_TOOL_MARKER in text and "Tool function" in text)
+
+            for name in names:
+                tool_name = self._find_tool(name)
+                if tool_name:
+                    referenced.add(tool_name)
+                elif message.get("role") == "tool" or message.get("tool_calls"):
+                    # A native call to a function that is not registered at all
+                    unknown = True
+        return referenced, unknown
+
+    def select(self, messages: List[Dict[str, Any]]) -> ToolSelection:
+        """Choose the tools to describe for the next LLM call of a thread.
+
+        Args:
+            messages: The thread's LLM messages, oldest first
+
+        Returns:
+            The tool selection for this turn
+        """
+        self._build_index()
+        all_tools = set(self._groups)
+        reasons = {name: "core" for name in self.core_tools if name in self._groups}
+
+        referenced, unknown_requested = self._referenced_tools(messages)
+        for name in referenced:
+            reasons.setdefault(name, "recent")
+
+        # Score the remaining tools against the latest user request
+        request_words = []
+        for message in reversed(messages):
+            if message.get("role") == "user" and "<tool_result>" not in _message_text(message):
+                request_words = _tokenize(_message_text(message))
+                break
+        scores = {
+            name: sum(group["weights"].get(word, 0.0) for word in set(request_words))
+            for name, group in self._groups.items() if name not in reasons
+        }
+        relevant = [name for name, score in sorted(scores.items(), key=lambda item: -item[1]) if score >= MIN_RELEVANCE]
+        for name in relevant[:self.max_tools]:
+            reasons[name] = "relevant"
+
+        # Nothing to go on (e.g. a vague first message) or an unknown tool: describe everything
+        expanded = unknown_requested or not (set(reasons) - self.core_tools)
+        if expanded:
+            reasons.update({name: "expanded" for name in all_tools if name not in reasons})
+
+        selected = set(reasons)
+        selection = ToolSelection(
+            tools=selected,
+            functions={f for name in selected for f in self._groups[name]["functions"]},
+            xml_tags={t for name in selected for t in self._groups[name]["xml_tags"]},
+            expanded=expanded,
+            reasons=reasons
+        )
+        logger.info(f"Selected {len(selected)}/{len(all_tools)} tools for this turn"
+                    f"{' (expanded)' if expanded else ''}: {reasons}")
+        return selection
+
+    def record_savings(self, full_tokens: int, selected_tokens: int, seconds_per_prompt_token: Optional[float]) -> None:
+        """Record the prompt tokens saved by a selection and log the running totals.
+
+        Args:
+            full_tokens: Tokens needed to describe all tools
+            selected_tokens: Tokens used to describe the selected tools
+            seconds_per_prompt_token: Measured prefill time per prompt token, if known
+        """
+        saved = max(0, full_tokens - selected_tokens)
+        self.stats["turns"] += 1
+        self.stats["full_tokens"] += full_tokens
+        self.stats["selected_tokens"] += selected_tokens
+        if selected_tokens >= full_tokens:
+            self.stats["expanded_turns"] += 1
+        if seconds_per_prompt_token:
+            self.stats["estimated_seconds_saved"] += saved * seconds_per_prompt_token
+
+        total_saved = self.stats["full_tokens"] - self.stats["selected_tokens"]
+        logger.info(f"Tool selection saved {saved} prompt tokens this turn "
+                    f"({total_saved} over {self.stats['turns']} turns, "
+                    f"~{self.stats['estimated_seconds_saved']:.1f}s of prefill)")
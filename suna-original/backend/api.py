@@ -63,12 +63,42 @@ async def lifespan(app: FastAPI):
         # Start background tasks
         asyncio.create_task(agent_api.restore_running_agent_runs())
         
+        # Start the usage accounting pipeline
+        from services.usage import usage_pipeline
+        usage_pipeline.start()
+        
+        # Move idle threads of the local database to cold storage
+        if config.ENV_MODE == EnvMode.LOCAL:
+            from services.local_database import thread_archiver, database_backup
+            thread_archiver.start()
+            # Take scheduled online snapshots of the local database
+            database_backup.start()
+        
+        # Drop access cache entries for sharing and ownership changes logged in the database
+        from utils.access_cache import access_cache
+        if config.ENV_MODE != EnvMode.LOCAL:
+            access_cache.start_listener()
+        
+        # Keep started sandboxes ready for new projects (LOCAL mode has no sandboxes)
+        from sandbox.pool import sandbox_pool
+        if config.ENV_MODE != EnvMode.LOCAL:
+            sandbox_pool.start()
+        
         yield
         
         # Clean up agent resources
         logger.info("Cleaning up agent resources")
         await agent_api.cleanup()
         
+        # Write any queued usage before shutting down
+        await usage_pipeline.stop()
+        
+        if config.ENV_MODE == EnvMode.LOCAL:
+            await thread_archiver.stop()
+            await database_backup.stop()
+        await access_cache.stop_listener()
+        await sandbox_pool.stop()
+        
         # Clean up Redis connection
         try:
             logger.info("Closing Redis connection")
@@ -167,6 +197,12 @@ async def health_check():
     }
 
 if __name__ == "__main__":
+    import sys
+    if "--profile-startup" in sys.argv:
+        # Print an import-time tree and optionally enforce a startup budget (--budget SECONDS)
+        from utils.startup_profile import main as profile_startup
+        sys.exit(profile_startup(sys.argv[sys.argv.index("--profile-startup") + 1:]))
+
     import uvicorn
     
     workers = 2
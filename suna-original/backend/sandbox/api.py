@@ -1,15 +1,16 @@
+import asyncio
 import os
 from typing import List, Optional
 
 from fastapi import FastAPI, UploadFile, File, HTTPException, APIRouter, Form, Depends, Request
-from fastapi.responses import Response, JSONResponse
+from fastapi.responses import Response, JSONResponse, StreamingResponse
 from pydantic import BaseModel
 
 from utils.logger import logger
 from utils.auth_utils import get_current_user_id_from_jwt, get_user_id_from_stream_auth, get_optional_user_id
-from sandbox.sandbox import get_or_start_sandbox
 from services.supabase import DBConnection
 from agent.api import get_or_create_project_sandbox
+from sandbox.file_reader import RANGE_CHUNK_BYTES, RangeNotSatisfiable, file_reader, parse_range_header
 
 
 # Initialize shared resources
@@ -103,6 +104,7 @@ async def get_sandbox_by_id_safely(client, sandbox_id: str):
         if retrieved_sandbox_id != sandbox_id:
             logger.warning(f"Retrieved sandbox ID {retrieved_sandbox_id} doesn't match requested ID {sandbox_id} for project {project_id}")
             # Fall back to the direct method if IDs don't match (shouldn't happen but just in case)
+            from sandbox.sandbox import get_or_start_sandbox
             sandbox = await get_or_start_sandbox(sandbox_id)
         
         return sandbox
@@ -227,10 +229,19 @@ async def list_files(
 async def read_file(
     sandbox_id: str, 
     path: str,
+    start_line: Optional[int] = None,
+    end_line: Optional[int] = None,
     request: Request = None,
     user_id: Optional[str] = Depends(get_optional_user_id)
 ):
-    """Read a file from the sandbox"""
+    """Read a file from the sandbox
+    
+    Supports a single HTTP byte range (Range: bytes=start-end), and line ranges
+    with start_line/end_line (1-based, inclusive, negative counts from the end),
+    which return the lines as text with X-Start-Line, X-End-Line, X-Total-Lines
+    and X-Truncated headers. Only the requested part is read from the sandbox;
+    large files are streamed in chunks.
+    """
     logger.info(f"Received file read request for sandbox {sandbox_id}, path: {path}, user_id: {user_id}")
     client = await db.client
     
@@ -240,17 +251,50 @@ async def read_file(
     try:
         # Get sandbox using the safer method
         sandbox = await get_sandbox_by_id_safely(client, sandbox_id)
+        filename = os.path.basename(path)
         
-        # Read file
-        content = sandbox.fs.download_file(path)
+        if start_line is not None or end_line is not None:
+            lines = await file_reader.read_lines(sandbox, path, start_line or 1, end_line)
+            logger.info(f"Read lines {lines.start_line}-{lines.end_line} of {filename} from sandbox {sandbox_id}")
+            return Response(
+                content=lines.text,
+                media_type="text/plain; charset=utf-8",
+                headers={
+                    "X-Start-Line": str(lines.start_line),
+                    "X-End-Line": str(lines.end_line),
+                    "X-Total-Lines": str(lines.total_lines),
+                    "X-Truncated": str(lines.truncated).lower()
+                }
+            )
         
-        # Return a Response object with the content directly
-        filename = os.path.basename(path)
-        logger.info(f"Successfully read file {filename} from sandbox {sandbox_id}")
-        return Response(
-            content=content,
+        headers = {"Content-Disposition": f"attachment; filename={filename}", "Accept-Ranges": "bytes"}
+        range_header = request.headers.get("range") if request else None
+        first = None
+        if range_header is None:
+            # The first chunk comes with the file size: small files take one call
+            first = await file_reader.read_bytes(sandbox, path, 0, RANGE_CHUNK_BYTES)
+            content, size, _ = first
+            if len(content) >= size:
+                logger.info(f"Successfully read file {filename} from sandbox {sandbox_id}")
+                return Response(content=content, media_type="application/octet-stream", headers=headers)
+            byte_range = None
+        else:
+            size = (await asyncio.to_thread(sandbox.fs.get_file_info, path)).size
+            try:
+                byte_range = parse_range_header(range_header, size)
+            except RangeNotSatisfiable:
+                return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+        
+        start, end = byte_range or (0, size)
+        if byte_range is not None:
+            headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+        headers["Content-Length"] = str(end - start)
+        logger.info(f"Streaming bytes {start}-{end - 1} of {filename} ({size} bytes) from sandbox {sandbox_id}")
+        return StreamingResponse(
+            file_reader.iter_bytes(sandbox, path, start, end, first=first),
+            status_code=206 if byte_range is not None else 200,
             media_type="application/octet-stream",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
+            headers=headers
         )
     except Exception as e:
         logger.error(f"Error reading file in sandbox {sandbox_id}: {str(e)}")
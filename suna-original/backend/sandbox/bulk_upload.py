@@ -0,0 +1,218 @@
+"""
+Upload many files to a sandbox in one transfer.
+
+Uploading attachments one by one costs an upload call, a settle delay and a
+directory listing per file. `upload_files_bulk` instead:
+
+1. streams all files into one tar archive (spooled to disk when large),
+   hashing each file on the way
+2. uploads the archive with a single SDK call
+3. extracts it with a single command in the sandbox, which also reports the
+   SHA-256 of every extracted file
+4. verifies each file against the hash computed while archiving
+
+If the sandbox cannot run the extraction script, the files are uploaded one by
+one instead and verified with a single directory listing.
+"""
+
+import asyncio
+import hashlib
+import io
+import os
+import tarfile
+import tempfile
+import time
+import uuid
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+
+from sandbox.remote_exec import RemoteExecError, run_python
+from utils.logger import logger
+
+# Constants
+SPOOL_MAX_BYTES = 16 * 1024 * 1024      # Archives larger than this are spooled to disk while built
+EXTRACT_TIMEOUT = 300                   # Seconds the extraction may take
+
+# Extracts the archive into the target directory, deletes it and prints {name: sha256}
+EXTRACT_SCRIPT = r'''
+import hashlib, json, os, sys, tarfile
+
+archive, target = sys.argv[1], sys.argv[2]
+os.makedirs(target, exist_ok=True)
+result = {}
+try:
+    with tarfile.open(archive) as tar:
+        for member in tar.getmembers():
+            # Only plain files directly in the target directory
+            if not member.isfile() or os.path.basename(member.name) != member.name:
+                continue
+            source = tar.extractfile(member)
+            path = os.path.join(target, member.name)
+            tmp = path + ".partial"
+            h = hashlib.sha256()
+            with open(tmp, "wb") as f:
+                for chunk in iter(lambda: source.read(1 << 20), b""):
+                    h.update(chunk)
+                    f.write(chunk)
+            os.replace(tmp, path)
+            result[member.name] = h.hexdigest()
+finally:
+    os.remove(archive)
+print(json.dumps(result))
+'''
+
+
+class _HashingReader(io.RawIOBase):
+    """Reads from a file object while hashing what was read."""
+
+    def __init__(self, source: BinaryIO):
+        self._source = source
+        self.sha256 = hashlib.sha256()
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._source.read(size)
+        self.sha256.update(data)
+        return data
+
+
+def safe_filename(filename: str) -> str:
+    """Flatten an uploaded file name into a single path component."""
+    return filename.replace('/', '_').replace('\\', '_')
+
+
+def build_archive(files: List[Tuple[str, BinaryIO]]) -> Tuple[bytes, Dict[str, str]]:
+    """Stream files into a tar archive (blocking).
+
+    Args:
+        files: (file name, readable binary file object) pairs
+
+    Returns:
+        The archive and the SHA-256 of each file by its name in the archive
+    """
+    hashes = {}
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as spool:
+        with tarfile.open(fileobj=spool, mode="w") as tar:
+            for filename, source in files:
+                name = safe_filename(filename)
+                source.seek(0, os.SEEK_END)
+                size = source.tell()
+                source.seek(0)
+                info = tarfile.TarInfo(name)
+                info.size = size
+                info.mode = 0o644
+                info.mtime = int(time.time())
+                reader = _HashingReader(source)
+                tar.addfile(info, reader)
+                hashes[name] = reader.sha256.hexdigest()
+        # The SDK uploads bytes
+        spool.seek(0)
+        return spool.read(), hashes
+
+
+async def upload_files_bulk(sandbox: Any, files: List[Tuple[str, BinaryIO]],
+                            target_dir: str = "/workspace") -> Tuple[List[str], List[str]]:
+    """Upload files to a sandbox directory with one transfer and one extraction.
+
+    Args:
+        sandbox: Daytona sandbox
+        files: (file name, readable binary file object) pairs; names are flattened
+        target_dir: Directory the files are written to
+
+    Returns:
+        Paths of the verified files in the sandbox, and names of the files that failed
+    """
+    if not files:
+        return [], []
+
+    started = time.monotonic()
+    archive, hashes = await asyncio.to_thread(build_archive, files)
+    archive_path = f"/tmp/upload-{uuid.uuid4().hex}.tar"
+
+    try:
+        await asyncio.to_thread(sandbox.fs.upload_file, archive_path, archive)
+        extracted = await run_python(sandbox, EXTRACT_SCRIPT, archive_path, target_dir, timeout=EXTRACT_TIMEOUT)
+    except RemoteExecError as e:
+        logger.warning(f"Bulk extraction failed in sandbox {sandbox.id}, uploading files one by one: {str(e)}")
+        return await upload_files_individually(sandbox, files, target_dir)
+
+    successful, failed = [], []
+    for name, digest in hashes.items():
+        if extracted.get(name) == digest:
+            successful.append(f"{target_dir}/{name}")
+        else:
+            logger.error(f"Verification failed for {name}: expected sha256 {digest}, got {extracted.get(name)}")
+            failed.append(name)
+
+    logger.info(f"Uploaded {len(successful)} files ({len(archive)} bytes) to sandbox {sandbox.id} "
+                f"in {time.monotonic() - started:.2f}s ({len(failed)} failed)")
+    return successful, failed
+
+
+async def upload_files_individually(sandbox: Any, files: List[Tuple[str, BinaryIO]],
+                                    target_dir: str = "/workspace") -> Tuple[List[str], List[str]]:
+    """Upload files one SDK call each, then verify them with one directory listing."""
+    uploaded, failed = {}, []
+    for filename, source in files:
+        name = safe_filename(filename)
+        try:
+            source.seek(0)
+            await asyncio.to_thread(sandbox.fs.upload_file, f"{target_dir}/{name}", source.read())
+            uploaded[name] = f"{target_dir}/{name}"
+        except Exception as e:
+            logger.error(f"Error during sandbox upload call for {name}: {str(e)}", exc_info=True)
+            failed.append(name)
+
+    if uploaded:
+        try:
+            listed = {f.name for f in await asyncio.to_thread(sandbox.fs.list_files, target_dir)}
+        except Exception as e:
+            logger.error(f"Error verifying uploads in {target_dir}: {str(e)}", exc_info=True)
+            listed = set()
+        for name in list(uploaded):
+            if name not in listed:
+                logger.error(f"Verification failed for {name}: File not found in {target_dir} after upload attempt.")
+                failed.append(name)
+                del uploaded[name]
+    return list(uploaded.values()), failed
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from sandbox.local_sandbox import LocalSandbox
+
+    parser = argparse.ArgumentParser(description="Benchmark attachment uploads: per-file (previous path) vs bulk archive")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per simulated SDK call")
+    parser.add_argument("--file-size", type=int, default=64 * 1024, help="Bytes per file")
+    args = parser.parse_args()
+
+    async def previous_path(sandbox: LocalSandbox, files: List[Tuple[str, BinaryIO]]) -> int:
+        """The former per-file path: upload, settle for 0.2s, list the directory."""
+        verified = 0
+        for filename, source in files:
+            sandbox.fs.upload_file(f"{sandbox.workspace}/{safe_filename(filename)}", source.read())
+            await asyncio.sleep(0.2)
+            if safe_filename(filename) in {f.name for f in sandbox.fs.list_files(sandbox.workspace)}:
+                verified += 1
+        return verified
+
+    async def main() -> None:
+        for count in (1, 10, 100):
+            payloads = [(f"attachment-{i}.bin", os.urandom(args.file_size)) for i in range(count)]
+            results = []
+            for name, upload in (("per-file", previous_path), ("bulk", None)):
+                sandbox = LocalSandbox(latency=args.latency)
+                files = [(filename, io.BytesIO(data)) for filename, data in payloads]
+                start = time.perf_counter()
+                if upload is None:
+                    successful, _ = await upload_files_bulk(sandbox, files, sandbox.workspace)
+                    verified = len(successful)
+                else:
+                    verified = await upload(sandbox, files)
+                results.append(f"{name} {time.perf_counter() - start:.2f}s ({sandbox.calls} SDK calls, {verified} verified)")
+                sandbox.remove()
+            print(f"{count:>3} files: " + ", ".join(results))
+
+    asyncio.run(main())
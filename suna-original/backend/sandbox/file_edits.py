@@ -0,0 +1,414 @@
+"""
+Apply file edits inside a sandbox.
+
+Editing a file used to download the whole file, edit it in the backend and
+upload it back: two full transfers per edit, one more SDK call to check the file
+exists, and every edit of a multi-file change as a separate tool call.
+`apply_edits` instead sends the edits to a script run in the sandbox, which:
+
+1. applies every operation in memory: (old, new) replacements, unified diff
+   hunks, full rewrites and deletions, any number of them across any number of
+   files
+2. writes nothing if any operation fails, and reports every failure
+3. otherwise writes each changed file to a temporary file next to it, then
+   renames them all into place
+4. returns only the lines around each change
+
+Only the edits travel to the sandbox, and only the snippets travel back.
+"""
+
+import asyncio
+import json
+import re
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from sandbox.remote_exec import build_command, run_python
+from utils.logger import logger
+
+# Constants
+WORKSPACE_PATH = "/workspace"
+SNIPPET_LINES = 4                   # Context lines shown around each change
+# Commands longer than this upload the edit spec instead of passing it inline. The
+# sandbox runs the whole command as one shell argument, which Linux limits to 128 KiB.
+MAX_INLINE_COMMAND_BYTES = 96 * 1024
+EDIT_TIMEOUT = 120                  # Seconds the edit script may run
+
+# Applies the edit spec (JSON, or "@path" of a JSON file) and prints the snippets
+# of each changed file, or the errors if any operation failed
+EDIT_SCRIPT = r'''
+import json, os, sys
+
+arg = sys.argv[1]
+if arg.startswith("@"):
+    with open(arg[1:]) as f:
+        spec = json.load(f)
+    os.remove(arg[1:])
+else:
+    spec = json.loads(arg)
+root = os.path.realpath(spec["root"])
+context = spec["context"]
+
+
+class EditError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+def resolve(path):
+    full = os.path.realpath(os.path.join(root, path))
+    if not full.startswith(root + os.sep):
+        raise EditError("invalid", f"Path '{path}' is outside the workspace")
+    return full
+
+
+def shift(spans, at, delta):
+    # Move the changes below line `at` by `delta` lines
+    return [(s + delta if s > at else s, n) for s, n in spans]
+
+
+def replace(content, spans, old, new):
+    if not old:
+        raise EditError("invalid", "The string to replace is empty")
+    occurrences = content.count(old)
+    if occurrences == 0:
+        raise EditError("no_match", f"String '{old}' not found in file")
+    if occurrences > 1:
+        lines = [i + 1 for i, line in enumerate(content.split("\n")) if old in line]
+        raise EditError("ambiguous", f"Multiple occurrences found in lines {lines}. Please ensure string is unique")
+    index = content.index(old)
+    start = content.count("\n", 0, index)
+    spans = shift(spans, start, new.count("\n") - old.count("\n"))
+    return content[:index] + new + content[index + len(old):], spans + [(start, new.count("\n") + 1)]
+
+
+def find_block(lines, old, expected, lowest):
+    last = len(lines) - len(old)
+    candidates = []
+    for distance in range(max(expected - lowest, last - expected) + 1):
+        for pos in (expected - distance, expected + distance):
+            if lowest <= pos <= last and pos not in candidates:
+                candidates.append(pos)
+    for same in (lambda a, b: a == b, lambda a, b: a.rstrip() == b.rstrip()):
+        for pos in candidates:
+            if all(same(lines[pos + i], line) for i, line in enumerate(old)):
+                return pos
+    return None
+
+
+def patch(content, spans, hunks):
+    eol = "\r\n" if "\r\n" in content else "\n"
+    lines = content.split(eol)
+    offset, lowest = 0, 0
+    for hunk in hunks:
+        old, new, old_start = hunk["old"], hunk["new"], hunk["old_start"]
+        # A hunk without old lines inserts after line old_start
+        expected = old_start + offset if not old else max(old_start - 1, 0) + offset
+        if not old:
+            pos = min(max(expected, lowest), len(lines))
+        else:
+            pos = find_block(lines, old, min(max(expected, lowest), len(lines)), lowest)
+            if pos is None:
+                raise EditError("no_match", f"Hunk at line {old_start} does not match the file:\n" + "\n".join(old[:10]))
+        lines[pos:pos + len(old)] = new
+        spans = shift(spans, pos, len(new) - len(old)) + [(pos, max(len(new), 1))]
+        offset = pos - expected + offset + len(new) - len(old)
+        lowest = pos + len(new)
+    return eol.join(lines), spans
+
+
+def snippets(content, spans):
+    lines = content.split("\n")
+    if len(lines) > 1 and lines[-1] == "":
+        # The final newline ends the last line rather than starting a new one
+        lines.pop()
+    ranges = []
+    for start, count in sorted(spans):
+        first, last = max(0, start - context), min(len(lines) - 1, start + count - 1 + context)
+        if ranges and first <= ranges[-1][1] + 1:
+            ranges[-1][1] = max(ranges[-1][1], last)
+        else:
+            ranges.append([first, last])
+    return [{"start_line": first + 1, "end_line": last + 1, "text": "\n".join(lines[first:last + 1])}
+            for first, last in ranges]
+
+
+files = {}      # path -> {"full", "content" (None when deleted), "existed", "mode", "spans", "changed"}
+errors = []
+for op in spec["operations"]:
+    path = op["path"]
+    try:
+        full = resolve(path)
+        state = files.get(path)
+        if state is None:
+            state = {"full": full, "spans": [], "changed": False, "mode": None}
+            if os.path.isfile(full):
+                try:
+                    with open(full, encoding="utf-8", newline="") as f:
+                        state["content"] = f.read()
+                except UnicodeDecodeError:
+                    state["content"] = None
+                    state["binary"] = True
+                state["existed"] = True
+                state["mode"] = os.stat(full).st_mode & 0o7777
+            elif os.path.exists(full):
+                raise EditError("invalid", f"'{path}' is not a file")
+            else:
+                state["content"], state["existed"] = None, False
+            files[path] = state
+
+        kind = op["op"]
+        exists = state["content"] is not None or state.get("binary")
+        if kind == "create":
+            if exists:
+                raise EditError("exists", f"File '{path}' already exists")
+            state["content"] = ""
+        elif not exists:
+            raise EditError("not_found", f"File '{path}' does not exist")
+        elif state.get("binary") and kind != "delete" and kind != "write":
+            raise EditError("invalid", f"File '{path}' is not a UTF-8 text file")
+
+        if kind == "replace":
+            for old, new in op["replacements"]:
+                state["content"], state["spans"] = replace(state["content"], state["spans"], old, new)
+        elif kind == "create" or kind == "patch":
+            state["content"], state["spans"] = patch(state["content"], state["spans"], op.get("hunks", []))
+        elif kind == "write":
+            state["content"], state["spans"], state["binary"] = op["content"], [], False
+        elif kind == "delete":
+            state["content"], state["spans"], state["binary"] = None, [], False
+        if op.get("mode"):
+            state["mode"] = int(op["mode"], 8)
+        state["changed"] = True
+    except EditError as e:
+        errors.append({"path": path, "code": e.code, "error": str(e)})
+    except (OSError, KeyError, TypeError, ValueError) as e:
+        errors.append({"path": path, "code": "invalid", "error": f"{type(e).__name__}: {e}"})
+
+if errors:
+    print(json.dumps({"ok": False, "errors": errors}))
+    sys.exit(0)
+
+# Write every file next to its target first, then rename them all into place
+staged = []
+try:
+    for path, state in files.items():
+        if not state["changed"] or state["content"] is None:
+            continue
+        os.makedirs(os.path.dirname(state["full"]), exist_ok=True)
+        tmp = f"{state['full']}.edit-{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8", newline="") as f:
+            f.write(state["content"])
+        os.chmod(tmp, state["mode"] if state["mode"] is not None else 0o644)
+        staged.append((tmp, state["full"]))
+except OSError as e:
+    for tmp, _ in staged:
+        os.remove(tmp)
+    print(json.dumps({"ok": False, "errors": [{"path": path, "code": "invalid", "error": f"Error writing file: {e}"}]}))
+    sys.exit(0)
+for tmp, full in staged:
+    os.replace(tmp, full)
+
+result = {}
+for path, state in files.items():
+    if not state["changed"]:
+        continue
+    if state["content"] is None:
+        if state["existed"]:
+            os.remove(state["full"])
+        result[path] = {"deleted": True, "snippets": []}
+    else:
+        result[path] = {"deleted": False, "snippets": snippets(state["content"], state["spans"])}
+print(json.dumps({"ok": True, "files": result}))
+'''
+
+
+class EditError(Exception):
+    """One or more edits could not be applied; no file was changed.
+
+    Attributes:
+        errors: {"path", "code", "error"} for each failed operation; code is one of
+            "not_found", "exists", "no_match", "ambiguous" or "invalid"
+    """
+
+    def __init__(self, errors: List[Dict[str, str]]):
+        super().__init__("\n".join(f"{e['path']}: {e['error']}" for e in errors))
+        self.errors = errors
+
+
+# --- Operations ---
+
+def replace_op(path: str, replacements: List[Tuple[str, str]]) -> Dict[str, Any]:
+    """Replace strings in a file, in order; each old string must occur exactly once."""
+    return {"op": "replace", "path": path, "replacements": [list(pair) for pair in replacements]}
+
+
+def write_op(path: str, content: str, mode: Optional[str] = None) -> Dict[str, Any]:
+    """Replace the whole content of an existing file."""
+    return {"op": "write", "path": path, "content": content, "mode": mode}
+
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,\d+)? \+\d+(?:,\d+)? @@")
+
+
+def _diff_path(header: str) -> Optional[str]:
+    """Get the path from a '--- ' or '+++ ' line; None for /dev/null."""
+    path = header[4:].split("\t")[0].strip()
+    if path == "/dev/null":
+        return None
+    if path.startswith(("a/", "b/")):
+        path = path[2:]
+    return path
+
+
+def parse_unified_diff(diff: str) -> List[Dict[str, Any]]:
+    """Turn a unified diff (one or more files) into edit operations.
+
+    Hunk line counts are not trusted, since hand-written diffs often get them
+    wrong: a hunk runs until the next hunk or file header, and hunk positions are
+    only used as a hint for where to look for the old lines.
+
+    Raises:
+        ValueError: If the diff has no file headers or hunks
+    """
+    operations = []
+    lines = diff.splitlines()
+    op = hunk = None
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if line.startswith("--- ") and i + 1 < len(lines) and lines[i + 1].startswith("+++ "):
+            old_path, new_path = _diff_path(line), _diff_path(lines[i + 1])
+            if new_path is None:
+                op = {"op": "delete", "path": old_path}
+            else:
+                op = {"op": "create" if old_path is None else "patch", "path": new_path, "hunks": []}
+            operations.append(op)
+            hunk = None
+            i += 2
+            continue
+        match = _HUNK_HEADER.match(line)
+        if match:
+            if op is None:
+                raise ValueError("Hunk before any '---'/'+++' file header")
+            hunk = {"old_start": int(match.group(1)), "old": [], "new": []}
+            op.setdefault("hunks", []).append(hunk)
+        elif hunk is not None and not line.startswith(("diff ", "index ", "\\")):
+            marker, text = (line[0], line[1:]) if line else (" ", "")
+            if marker in " -":
+                hunk["old"].append(text)
+            if marker in " +":
+                hunk["new"].append(text)
+        i += 1
+
+    for op in operations:
+        for hunk in op.get("hunks", []):
+            # Trailing blank context is usually an artifact of how the diff was pasted
+            while hunk["old"] and hunk["new"] and hunk["old"][-1] == "" and hunk["new"][-1] == "":
+                hunk["old"].pop()
+                hunk["new"].pop()
+    if not operations or not any(op.get("hunks") or op["op"] == "delete" for op in operations):
+        raise ValueError("No file changes found in the diff")
+    return operations
+
+
+# --- Application ---
+
+async def apply_edits(sandbox: Any, operations: List[Dict[str, Any]], root: str = WORKSPACE_PATH,
+                      context_lines: int = SNIPPET_LINES) -> Dict[str, Dict[str, Any]]:
+    """Apply edit operations to files in a sandbox, all or nothing.
+
+    Args:
+        sandbox: Daytona sandbox
+        operations: Operations from replace_op, write_op and parse_unified_diff;
+            paths are relative to root
+        root: Directory the paths are relative to; edits cannot leave it
+        context_lines: Lines of context in each snippet
+
+    Returns:
+        For each changed path: {"deleted": bool, "snippets": [{"start_line",
+        "end_line", "text"}]} with 1-based, inclusive line numbers
+
+    Raises:
+        EditError: If any operation failed (no file was changed)
+        RemoteExecError: If the edit script could not be run
+    """
+    started = time.monotonic()
+    spec = json.dumps({"root": root, "context": context_lines, "operations": operations})
+    # Measured after quoting: each ' in the spec takes 5 bytes on the command line
+    if len(build_command(EDIT_SCRIPT, spec).encode()) > MAX_INLINE_COMMAND_BYTES:
+        spec_path = f"/tmp/edits-{uuid.uuid4().hex}.json"
+        await asyncio.to_thread(sandbox.fs.upload_file, spec_path, spec.encode())
+        spec = f"@{spec_path}"
+
+    result = await run_python(sandbox, EDIT_SCRIPT, spec, timeout=EDIT_TIMEOUT)
+    if not result["ok"]:
+        raise EditError(result["errors"])
+    logger.debug(f"Applied {len(operations)} edit operations to {len(result['files'])} files in sandbox "
+                 f"{sandbox.id} in {time.monotonic() - started:.2f}s")
+    return result["files"]
+
+
+def format_snippets(path: str, snippets: List[Dict[str, Any]]) -> str:
+    """Render a file's snippets for a tool result."""
+    return "\n\n".join(f"{path} (lines {s['start_line']}-{s['end_line']}):\n{s['text']}" for s in snippets)
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    from sandbox.local_sandbox import LocalSandbox
+
+    parser = argparse.ArgumentParser(description="Benchmark file edits: download/edit/upload (previous path) vs in-sandbox")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per simulated SDK call")
+    parser.add_argument("--files", type=int, default=5, help="Files edited")
+    parser.add_argument("--edits", type=int, default=4, help="Edits per file")
+    parser.add_argument("--lines", type=int, default=50000, help="Lines per file")
+    args = parser.parse_args()
+
+    def make_files(sandbox: LocalSandbox) -> List[str]:
+        paths = []
+        for f in range(args.files):
+            path = f"module_{f}.py"
+            with open(os.path.join(sandbox.workspace, path), "w") as out:
+                out.write("".join(f"value_{i} = {i}\n" for i in range(args.lines)))
+            paths.append(path)
+        return paths
+
+    def targets() -> List[Tuple[str, str]]:
+        step = args.lines // (args.edits + 1)
+        return [(f"value_{step * (e + 1)} = ", f"renamed_{step * (e + 1)} = ") for e in range(args.edits)]
+
+    def previous_path(sandbox: LocalSandbox, paths: List[str]) -> int:
+        """The former str_replace: check, download, edit, upload, once per edit."""
+        transferred = 0
+        for path in paths:
+            full = os.path.join(sandbox.workspace, path)
+            for old, new in targets():
+                sandbox.fs.get_file_info(full)
+                content = sandbox.fs.download_file(full).decode()
+                content = content.replace(old, new)
+                sandbox.fs.upload_file(full, content.encode())
+                transferred += 2 * len(content)
+        return transferred
+
+    async def main() -> None:
+        for name in ("per-edit", "in-sandbox"):
+            sandbox = LocalSandbox(latency=args.latency)
+            paths = make_files(sandbox)
+            start = time.perf_counter()
+            if name == "per-edit":
+                transferred = previous_path(sandbox, paths)
+            else:
+                operations = [replace_op(path, targets()) for path in paths]
+                spec_bytes = len(json.dumps(operations))
+                result = await apply_edits(sandbox, operations, root=sandbox.workspace)
+                transferred = spec_bytes + len(json.dumps(result))
+            print(f"{name:>10}: {time.perf_counter() - start:.2f}s, {sandbox.calls} SDK calls, "
+                  f"{transferred / 1024:.0f} KiB transferred ({args.files} files x {args.edits} edits)")
+            sandbox.remove()
+
+    asyncio.run(main())
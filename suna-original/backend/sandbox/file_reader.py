@@ -0,0 +1,340 @@
+"""
+Ranged reads of sandbox files.
+
+Reading part of a file used to download all of it. The reader instead runs a
+script in the sandbox that returns only the requested part:
+
+- byte ranges: the script seeks and returns the bytes; large ranges are
+  streamed in chunks of RANGE_CHUNK_BYTES, one call each
+- line ranges: the backend keeps a sparse index of line offsets (one every
+  INDEX_STRIDE lines) per file, valid while the file's size and mtime are
+  unchanged. The script seeks to the closest indexed line at or before the
+  start and reads from there. When the file is new or has changed, the same
+  call rebuilds the index in the sandbox and sends it back, so no read costs
+  more than one call.
+
+Negative line numbers count from the end of the file (-1 is the last line).
+"""
+
+import asyncio
+import base64
+import json
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from sandbox.remote_exec import run_python
+from utils.logger import logger
+
+# Constants
+INDEX_STRIDE = 1000                     # Lines between indexed offsets
+MAX_INDEXES = 256                       # Line indexes kept in the backend (LRU)
+RANGE_CHUNK_BYTES = 2 * 1024 * 1024     # Bytes fetched per call when streaming a byte range
+MAX_LINE_BYTES = 1024 * 1024            # Bytes of text returned per line-range read
+
+# Reads a byte or line range; rebuilds the line index when the file changed
+READ_SCRIPT = r'''
+import base64, json, os, stat, sys
+
+req = json.loads(sys.argv[1])
+st = os.stat(req["path"])
+if not stat.S_ISREG(st.st_mode):
+    raise SystemExit(f"{req['path']} is not a file")
+out = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def build_index(f, stride):
+    # Offsets of lines 1, 1 + stride, 1 + 2 * stride, ... and the number of lines
+    offsets, newlines, position, last = [0], 0, 0, b"\n"
+    for chunk in iter(lambda: f.read(1 << 20), b""):
+        count = chunk.count(b"\n")
+        if newlines + count < len(offsets) * stride:
+            newlines += count
+        else:
+            start = 0
+            while True:
+                i = chunk.find(b"\n", start)
+                if i < 0:
+                    break
+                newlines += 1
+                if newlines % stride == 0:
+                    offsets.append(position + i + 1)
+                start = i + 1
+        position += len(chunk)
+        last = chunk[-1:]
+    total = newlines + (1 if last != b"\n" else 0)
+    if offsets[-1] >= position and len(offsets) > 1:
+        offsets.pop()
+    return offsets, total
+
+
+def line_number(n, total):
+    # Negative line numbers count from the end
+    return n if n >= 0 else max(total + n + 1, 1)
+
+
+with open(req["path"], "rb") as f:
+    if req["mode"] == "bytes":
+        start, end = min(req["start"], st.st_size), min(req["end"], st.st_size)
+        f.seek(start)
+        out["data"] = base64.b64encode(f.read(max(end - start, 0))).decode()
+    else:
+        stride = req["stride"]
+        if req.get("known") == [st.st_size, st.st_mtime_ns]:
+            total = req["total"]
+            start = max(line_number(req["start"], total), 1)
+            line, offset = req["seek"]
+        else:
+            offsets, total = build_index(f, stride)
+            out["offsets"] = offsets
+            start = max(line_number(req["start"], total), 1)
+            slot = min((start - 1) // stride, len(offsets) - 1)
+            line, offset = slot * stride + 1, offsets[slot]
+        out["total_lines"] = total
+        end = line_number(req["end"], total) if req["end"] is not None else total
+
+        f.seek(offset)
+        while line < start and f.readline():
+            line += 1
+        lines, size, truncated = [], 0, False
+        while line <= end:
+            text = f.readline()
+            if not text:
+                break
+            if size + len(text) > req["max_bytes"] and lines:
+                truncated = True
+                break
+            lines.append(text)
+            size += len(text)
+            line += 1
+        data = b"".join(lines)
+        out["binary"] = b"\0" in data
+        out["text"] = data.decode("utf-8", errors="replace")
+        out["start_line"] = start
+        out["end_line"] = start + len(lines) - 1
+        out["truncated"] = truncated
+print(json.dumps(out))
+'''
+
+
+class RangeNotSatisfiable(Exception):
+    """The requested byte range lies outside the file."""
+
+
+@dataclass
+class LineIndex:
+    """Sparse line offsets of one version of a file."""
+    size: int
+    mtime_ns: int
+    total_lines: int
+    offsets: List[int]  # offsets[k] is where line k * INDEX_STRIDE + 1 starts
+
+
+@dataclass
+class LineRange:
+    """Lines read from a file (1-based, inclusive)."""
+    text: str
+    start_line: int
+    end_line: int
+    total_lines: int
+    truncated: bool     # Stopped at MAX_LINE_BYTES before end_line
+    binary: bool
+
+
+def parse_range_header(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse an HTTP Range header against a file size.
+
+    Only single byte ranges are served; anything else (no header, other units,
+    several ranges, malformed values) is ignored, meaning the full file.
+
+    Returns:
+        (start, end) with end exclusive, or None for the full file
+
+    Raises:
+        RangeNotSatisfiable: If the range starts at or after the end of the file
+    """
+    if not header:
+        return None
+    match = re.fullmatch(r"\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*", header)
+    if not match or not (match.group(1) or match.group(2)):
+        return None
+    first, last = match.group(1), match.group(2)
+    if not first:
+        # Suffix range: the last N bytes
+        suffix = int(last)
+        if suffix == 0 or size == 0:
+            raise RangeNotSatisfiable(header)
+        return max(size - suffix, 0), size
+    start = int(first)
+    end = min(int(last) + 1, size) if last else size
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable(header)
+    return start, end
+
+
+class FileReader:
+    """Byte- and line-range reads of sandbox files, with cached line indexes."""
+
+    def __init__(self, max_indexes: int = MAX_INDEXES, stride: int = INDEX_STRIDE):
+        """Initialize the reader.
+
+        Args:
+            max_indexes: Line indexes kept, least recently used first out
+            stride: Lines between indexed offsets
+        """
+        self.max_indexes = max_indexes
+        self.stride = stride
+        self._indexes: "OrderedDict[Tuple[str, str], LineIndex]" = OrderedDict()
+        self.stats = {"index_hits": 0, "index_builds": 0, "line_reads": 0, "byte_reads": 0, "bytes_read": 0}
+
+    async def read_lines(self, sandbox: Any, path: str, start_line: int = 1, end_line: Optional[int] = None,
+                         max_bytes: int = MAX_LINE_BYTES) -> LineRange:
+        """Read a range of lines from a file.
+
+        Args:
+            sandbox: Daytona sandbox
+            path: Absolute path of the file in the sandbox
+            start_line: First line (1-based; negative counts from the end)
+            end_line: Last line, inclusive (default: the last line; negative counts from the end)
+            max_bytes: Stop before the text exceeds this size (at least one line is returned)
+
+        Returns:
+            The lines read; end_line < start_line if the range is empty
+
+        Raises:
+            RemoteExecError: If the file cannot be read
+        """
+        key = (sandbox.id, path)
+        index = self._indexes.get(key)
+        request = {"mode": "lines", "path": path, "start": start_line, "end": end_line,
+                   "stride": self.stride, "max_bytes": max_bytes}
+        if index is not None:
+            # Only the indexed line closest to the start is sent; the script checks the file is unchanged
+            start = max(start_line if start_line >= 0 else index.total_lines + start_line + 1, 1)
+            slot = min((start - 1) // self.stride, len(index.offsets) - 1)
+            request.update(known=[index.size, index.mtime_ns], total=index.total_lines,
+                           seek=[slot * self.stride + 1, index.offsets[slot]])
+
+        result = await run_python(sandbox, READ_SCRIPT, json.dumps(request))
+        self.stats["line_reads"] += 1
+        if "offsets" in result:
+            self.stats["index_builds"] += 1
+            logger.debug(f"Indexed {path} in sandbox {sandbox.id}: {result['total_lines']} lines, "
+                         f"{len(result['offsets'])} offsets")
+            self._remember(key, LineIndex(result["size"], result["mtime_ns"], result["total_lines"], result["offsets"]))
+        else:
+            self.stats["index_hits"] += 1
+            self._indexes.move_to_end(key)
+        return LineRange(result["text"], result["start_line"], result["end_line"], result["total_lines"],
+                         result["truncated"], result["binary"])
+
+    async def read_bytes(self, sandbox: Any, path: str, start: int, end: int) -> Tuple[bytes, int, int]:
+        """Read bytes [start, end) of a file in one call.
+
+        Returns:
+            The bytes (cut short at the end of the file), the file size and mtime_ns
+        """
+        result = await run_python(sandbox, READ_SCRIPT, json.dumps({"mode": "bytes", "path": path,
+                                                                    "start": start, "end": end}))
+        data = base64.b64decode(result["data"])
+        self.stats["byte_reads"] += 1
+        self.stats["bytes_read"] += len(data)
+        return data, result["size"], result["mtime_ns"]
+
+    async def iter_bytes(self, sandbox: Any, path: str, start: int, end: int,
+                         chunk_size: int = RANGE_CHUNK_BYTES,
+                         first: Optional[Tuple[bytes, int, int]] = None) -> AsyncIterator[bytes]:
+        """Stream bytes [start, end) of a file, one call per chunk.
+
+        Args:
+            first: What read_bytes returned for a first chunk already read from start
+
+        Raises:
+            RuntimeError: If the file changes while it is streamed
+        """
+        version = None
+        position = start
+        if first is not None:
+            data, size, mtime_ns = first
+            version = (size, mtime_ns)
+            position += len(data)
+            yield data
+        while position < end:
+            data, size, mtime_ns = await self.read_bytes(sandbox, path, position, min(position + chunk_size, end))
+            if version is None:
+                version = (size, mtime_ns)
+            elif version != (size, mtime_ns):
+                raise RuntimeError(f"{path} changed while it was being read")
+            if not data:
+                break
+            position += len(data)
+            yield data
+
+    def _remember(self, key: Tuple[str, str], index: LineIndex) -> None:
+        self._indexes[key] = index
+        self._indexes.move_to_end(key)
+        while len(self._indexes) > self.max_indexes:
+            self._indexes.popitem(last=False)
+
+    def forget(self, sandbox_id: str, path: Optional[str] = None) -> None:
+        """Drop the line indexes of a file, or of every file of a sandbox."""
+        for key in [k for k in self._indexes if k[0] == sandbox_id and (path is None or k[1] == path)]:
+            del self._indexes[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get reader metrics, including the index hit rate."""
+        lookups = self.stats["index_hits"] + self.stats["index_builds"]
+        return {
+            **self.stats,
+            "indexes": len(self._indexes),
+            "hit_rate": self.stats["index_hits"] / lookups if lookups else 0.0,
+        }
+
+
+# Process-wide reader
+file_reader = FileReader()
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    from sandbox.local_sandbox import LocalSandbox
+
+    parser = argparse.ArgumentParser(description="Benchmark line-range reads: full download (previous path) vs ranged")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per simulated SDK call")
+    parser.add_argument("--lines", type=int, default=500000, help="Lines in the file")
+    parser.add_argument("--reads", type=int, default=10, help="Ranges of 100 lines read")
+    args = parser.parse_args()
+
+    async def main() -> None:
+        sandbox = LocalSandbox(latency=args.latency)
+        path = os.path.join(sandbox.workspace, "app.log")
+        with open(path, "w") as f:
+            f.write("".join(f"{i + 1:>8} request handled in {i % 97} ms\n" for i in range(args.lines)))
+        starts = [(args.lines // args.reads) * r + 1 for r in range(args.reads)]
+
+        begin = time.perf_counter()
+        transferred = 0
+        for start in starts:
+            content = sandbox.fs.download_file(path).decode()
+            transferred += len(content)
+            "\n".join(content.split("\n")[start - 1:start + 99])
+        print(f"   download: {time.perf_counter() - begin:.2f}s, {transferred / 1024 / 1024:.1f} MiB transferred")
+
+        reader = FileReader()
+        begin = time.perf_counter()
+        transferred = 0
+        for start in starts:
+            lines = await reader.read_lines(sandbox, path, start, start + 99)
+            transferred += len(lines.text)
+            assert lines.text.startswith(f"{start:>8} "), lines.text[:20]
+        print(f"     ranged: {time.perf_counter() - begin:.2f}s, {transferred / 1024:.1f} KiB of lines "
+              f"(+ one index of {args.lines // INDEX_STRIDE} offsets), {reader.get_stats()}")
+        sandbox.remove()
+
+    asyncio.run(main())
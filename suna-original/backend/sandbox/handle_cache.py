@@ -0,0 +1,249 @@
+"""
+Process-wide cache of sandbox handles.
+
+Every sandbox tool of an agent run (shell, files, browser, vision, deploy,
+expose) used to look up the project's sandbox and call get_or_start_sandbox on
+its own, and each run looked the project up again. The cache keeps one handle
+per sandbox ID with the state worth sharing:
+
+- the Daytona Sandbox object, known to be started as of `validated_at`
+- shell session IDs by name, so tools reuse sessions instead of creating new ones
+- preview links by port
+- shell commands started in the sandbox, so later calls can check on them
+
+A handle is trusted for HANDLE_TTL seconds, then revalidated with one Daytona
+lookup (and a start if the sandbox stopped, which also drops its sessions).
+Concurrent callers for the same sandbox share one lookup/start. Projects map to
+their sandbox ID and password for PROJECT_TTL seconds.
+
+Both maps are bounded: handles unused for HANDLE_IDLE_TTL seconds are dropped
+(a sandbox is stopped and archived long after that), the least recently used
+handles go beyond MAX_HANDLES, and project entries beyond MAX_PROJECTS. A
+sandbox that can no longer be loaded (e.g. deleted) is forgotten together with
+the projects pointing at it.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+
+from utils.logger import logger
+from utils.singleflight import SingleFlight
+
+# Constants
+HANDLE_TTL = 60                 # Seconds a handle is used before the sandbox state is checked again
+PROJECT_TTL = 300               # Seconds a project's sandbox ID is cached
+HANDLE_IDLE_TTL = 1800          # Seconds an unused handle is kept
+MAX_HANDLES = 1000              # Handles kept before evicting the least recently used
+MAX_PROJECTS = 10000            # Project entries kept before evicting the oldest
+
+
+def _forget_workspace(sandbox_id: str) -> None:
+    from sandbox.workspace_manifest import workspace_manifests
+    workspace_manifests.forget(sandbox_id)
+
+
+@dataclass
+class SandboxHandle:
+    """A started sandbox and the state tools share for it."""
+    sandbox_id: str
+    sandbox: Any
+    validated_at: float  # time.monotonic()
+    password: Optional[str] = None
+    sessions: Dict[str, str] = field(default_factory=dict)  # Session name -> session ID
+    preview_links: Dict[int, Any] = field(default_factory=dict)
+    commands: Dict[str, Any] = field(default_factory=dict)  # Command ID -> sandbox.shell_commands.ShellCommand
+    _session_lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)
+
+    async def get_session(self, session_name: str = "default") -> str:
+        """Get the ID of a shell session, creating the session on first use."""
+        async with self._session_lock:
+            session_id = self.sessions.get(session_name)
+            if session_id is None:
+                from uuid import uuid4
+                session_id = str(uuid4())
+                await asyncio.to_thread(self.sandbox.process.create_session, session_id)
+                self.sessions[session_name] = session_id
+            return session_id
+
+    async def delete_session(self, session_name: str) -> None:
+        """Delete a shell session if it exists."""
+        async with self._session_lock:
+            session_id = self.sessions.pop(session_name, None)
+            if session_id is not None:
+                await asyncio.to_thread(self.sandbox.process.delete_session, session_id)
+
+    async def get_preview_link(self, port: int) -> Any:
+        """Get the preview link of a port (opening the port on first use)."""
+        link = self.preview_links.get(port)
+        if link is None:
+            link = await asyncio.to_thread(self.sandbox.get_preview_link, port)
+            self.preview_links[port] = link
+        return link
+
+
+class SandboxHandleCache:
+    """Sandbox handles by sandbox ID, with TTL-based revalidation and singleflight loading."""
+
+    def __init__(self, ttl: float = HANDLE_TTL, project_ttl: float = PROJECT_TTL,
+                 idle_ttl: float = HANDLE_IDLE_TTL, max_handles: int = MAX_HANDLES,
+                 max_projects: int = MAX_PROJECTS):
+        """Initialize the cache.
+
+        Args:
+            ttl: Seconds a handle is used without checking the sandbox state
+            project_ttl: Seconds a project's sandbox ID and password are cached
+            idle_ttl: Seconds an unused handle is kept
+            max_handles: Handles kept before evicting the least recently used
+            max_projects: Project entries kept before evicting the oldest
+        """
+        self.ttl = ttl
+        self.project_ttl = project_ttl
+        self.idle_ttl = idle_ttl
+        self.max_handles = max_handles
+        self.max_projects = max_projects
+        self._handles: "OrderedDict[str, SandboxHandle]" = OrderedDict()
+        self._projects: "OrderedDict[str, Tuple[float, str, Optional[str]]]" = OrderedDict()
+        self._inflight = SingleFlight()
+        self.stats = {"hits": 0, "misses": 0, "revalidations": 0, "starts": 0, "shared_loads": 0,
+                      "project_hits": 0, "project_misses": 0, "evictions": 0}
+
+    async def get(self, sandbox_id: str) -> SandboxHandle:
+        """Get a handle on a started sandbox, starting the sandbox if needed.
+
+        Args:
+            sandbox_id: Daytona sandbox ID
+
+        Returns:
+            The sandbox's handle
+        """
+        handle = self._handles.get(sandbox_id)
+        if handle is not None and time.monotonic() - handle.validated_at < self.ttl:
+            self.stats["hits"] += 1
+            self._handles.move_to_end(sandbox_id)
+            return handle
+        self.stats["misses" if handle is None else "revalidations"] += 1
+
+        # Share one lookup/start between concurrent callers
+        if sandbox_id in self._inflight:
+            self.stats["shared_loads"] += 1
+        try:
+            return await self._inflight.do(sandbox_id, lambda: self._load(sandbox_id))
+        except Exception:
+            # The sandbox may be gone: do not keep it or the projects pointing at it
+            self.invalidate(sandbox_id)
+            raise
+
+    async def _load(self, sandbox_id: str) -> SandboxHandle:
+        from sandbox.sandbox import start_sandbox_if_needed  # Deferred: imports the Daytona SDK
+        sandbox, started = await start_sandbox_if_needed(sandbox_id)
+        if started:
+            self.stats["starts"] += 1
+
+        handle = self._handles.get(sandbox_id)
+        if handle is not None and not started:
+            # Still running: sessions and preview links remain valid
+            handle.sandbox = sandbox
+            handle.validated_at = time.monotonic()
+            self._handles.move_to_end(sandbox_id)
+            return handle
+
+        # New or restarted sandbox: sessions did not survive a stop
+        if handle is not None:
+            logger.info(f"Sandbox {sandbox_id} was restarted, dropping {len(handle.sessions)} cached sessions "
+                        f"and {len(handle.commands)} commands")
+            _forget_workspace(sandbox_id)
+        handle = SandboxHandle(sandbox_id, sandbox, time.monotonic(),
+                               password=handle.password if handle is not None else None)
+        self._store(handle)
+        return handle
+
+    def _store(self, handle: SandboxHandle) -> None:
+        self._handles[handle.sandbox_id] = handle
+        self._handles.move_to_end(handle.sandbox_id)
+        # Handles in use are revalidated every `ttl` seconds, so validated_at tracks their last use
+        idle_since = time.monotonic() - self.idle_ttl
+        for sandbox_id, cached in list(self._handles.items()):
+            if len(self._handles) <= self.max_handles and cached.validated_at >= idle_since:
+                break
+            del self._handles[sandbox_id]
+            self.stats["evictions"] += 1
+
+    async def get_project_sandbox(self, client, project_id: str) -> Tuple[str, Optional[str]]:
+        """Get the ID and password of a project's sandbox, from the cache if possible.
+
+        Raises:
+            ValueError: If the project does not exist or has no sandbox
+        """
+        entry = self._projects.get(project_id)
+        if entry is not None and entry[0] > time.monotonic():
+            self.stats["project_hits"] += 1
+            return entry[1], entry[2]
+        if entry is not None:
+            del self._projects[project_id]
+        self.stats["project_misses"] += 1
+
+        project = await client.table('projects').select('sandbox').eq('project_id', project_id).execute()
+        if not project.data:
+            raise ValueError(f"Project {project_id} not found")
+        sandbox_info = project.data[0].get('sandbox') or {}
+        if not sandbox_info.get('id'):
+            raise ValueError(f"No sandbox found for project {project_id}")
+
+        self.remember_project(project_id, sandbox_info['id'], sandbox_info.get('pass'))
+        return sandbox_info['id'], sandbox_info.get('pass')
+
+    async def for_project(self, client, project_id: str) -> SandboxHandle:
+        """Get a handle on a project's started sandbox.
+
+        Raises:
+            ValueError: If the project does not exist or has no sandbox
+        """
+        sandbox_id, password = await self.get_project_sandbox(client, project_id)
+        handle = await self.get(sandbox_id)
+        handle.password = password
+        return handle
+
+    def put(self, sandbox: Any, password: Optional[str] = None) -> SandboxHandle:
+        """Cache a sandbox known to be started (e.g. just created)."""
+        handle = SandboxHandle(sandbox.id, sandbox, time.monotonic(), password=password)
+        self._store(handle)
+        return handle
+
+    def remember_project(self, project_id: str, sandbox_id: str, password: Optional[str]) -> None:
+        """Record a project's sandbox (e.g. after creating it)."""
+        now = time.monotonic()
+        self._projects[project_id] = (now + self.project_ttl, sandbox_id, password)
+        self._projects.move_to_end(project_id)
+        # All entries live project_ttl seconds, so the oldest expire first
+        for cached_id, (expires, _, _) in list(self._projects.items()):
+            if len(self._projects) <= self.max_projects and expires > now:
+                break
+            del self._projects[cached_id]
+
+    def invalidate(self, sandbox_id: str) -> None:
+        """Forget a sandbox's handle and the projects pointing at it (e.g. the sandbox was removed or is misbehaving)."""
+        self._handles.pop(sandbox_id, None)
+        _forget_workspace(sandbox_id)
+        for project_id in [key for key, entry in self._projects.items() if entry[1] == sandbox_id]:
+            del self._projects[project_id]
+
+    def invalidate_project(self, project_id: str) -> None:
+        """Forget a project's sandbox (e.g. the project got a new sandbox)."""
+        self._projects.pop(project_id, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache metrics, including the hit rate."""
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["revalidations"]
+        return {
+            **self.stats,
+            "handles": len(self._handles),
+            "projects": len(self._projects),
+            "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+        }
+
+
+# Process-wide cache
+sandbox_handles = SandboxHandleCache()
@@ -0,0 +1,200 @@
+"""
+Local stand-in for a Daytona sandbox.
+
+A LocalSandbox has the parts of the Sandbox API the backend uses (`fs`,
+`process.exec`, session commands, `get_preview_link`), backed by a local
+directory and subprocesses. It is used by the sandbox pool's "process" provider and by the
+benchmarks of the sandbox transfer paths, so they run without Daytona. Every SDK
+call can be given a fixed latency to simulate the network round-trip.
+"""
+
+import asyncio
+import codecs
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+
+class LocalFileSystem:
+    """The `sandbox.fs` subset used by the backend, on local paths."""
+
+    def __init__(self, sandbox: "LocalSandbox"):
+        self._sandbox = sandbox
+
+    def upload_file(self, path: str, file: bytes) -> None:
+        self._sandbox._call()
+        with open(path, "wb") as f:
+            f.write(file)
+
+    def download_file(self, path: str) -> bytes:
+        self._sandbox._call()
+        with open(path, "rb") as f:
+            return f.read()
+
+    def list_files(self, path: str) -> List[SimpleNamespace]:
+        self._sandbox._call()
+        return [self._info(os.path.join(path, name), name) for name in sorted(os.listdir(path))]
+
+    def get_file_info(self, path: str) -> SimpleNamespace:
+        self._sandbox._call()
+        return self._info(path, os.path.basename(path))
+
+    def create_folder(self, path: str, mode: str) -> None:
+        self._sandbox._call()
+        os.makedirs(path, mode=int(mode, 8), exist_ok=True)
+
+    def set_file_permissions(self, path: str, mode: str) -> None:
+        self._sandbox._call()
+        os.chmod(path, int(mode, 8))
+
+    def delete_file(self, path: str) -> None:
+        self._sandbox._call()
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+    @staticmethod
+    def _info(path: str, name: str) -> SimpleNamespace:
+        st = os.stat(path)
+        return SimpleNamespace(
+            name=name, is_dir=os.path.isdir(path), size=st.st_size,
+            mod_time=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(st.st_mtime))
+        )
+
+
+class LocalProcess:
+    """The `sandbox.process` subset used by the backend, as local subprocesses.
+
+    Session commands run in a new shell each, with output going to a log file;
+    unlike Daytona sessions, shell state does not carry over between commands.
+    """
+
+    def __init__(self, sandbox: "LocalSandbox"):
+        self._sandbox = sandbox
+        self._sessions: Dict[str, Dict[str, SimpleNamespace]] = {}
+
+    def exec(self, command: str, cwd: Optional[str] = None, env: Optional[Dict[str, str]] = None,
+             timeout: Optional[int] = None) -> SimpleNamespace:
+        self._sandbox._call()
+        try:
+            result = subprocess.run(
+                command, shell=True, cwd=cwd or self._sandbox.workspace, capture_output=True,
+                env={**os.environ, **(env or {})}, timeout=timeout or None
+            )
+        except subprocess.TimeoutExpired as e:
+            return SimpleNamespace(exit_code=-1, result=(e.stdout or b"").decode(errors="replace"))
+        output = result.stdout + (result.stderr if result.returncode else b"")
+        return SimpleNamespace(exit_code=result.returncode, result=output.decode(errors="replace"))
+
+    def create_session(self, session_id: str) -> None:
+        self._sandbox._call()
+        self._sessions[session_id] = {}
+
+    def delete_session(self, session_id: str) -> None:
+        self._sandbox._call()
+        for command in self._sessions.pop(session_id, {}).values():
+            if command.process.poll() is None:
+                command.process.kill()
+                command.process.wait()
+
+    def execute_session_command(self, session_id: str, req: Any, timeout: Optional[int] = None) -> SimpleNamespace:
+        self._sandbox._call()
+        command_id = uuid.uuid4().hex
+        log_path = os.path.join(self._sandbox._logs_dir, f"{command_id}.log")
+        with open(log_path, "wb") as log:
+            process = subprocess.Popen(["bash", "-c", req.command], cwd=self._sandbox.workspace,
+                                       stdout=log, stderr=subprocess.STDOUT)
+        self._sessions[session_id][command_id] = SimpleNamespace(id=command_id, command=req.command,
+                                                                 process=process, log_path=log_path)
+        # Newer SDKs call var_async run_async
+        if getattr(req, "var_async", None) or getattr(req, "run_async", False):
+            return SimpleNamespace(cmd_id=command_id, output=None, exit_code=None)
+        process.wait(timeout=timeout or None)
+        return SimpleNamespace(cmd_id=command_id, output=self._read_log(log_path), exit_code=process.returncode)
+
+    def get_session_command(self, session_id: str, command_id: str) -> SimpleNamespace:
+        self._sandbox._call()
+        command = self._sessions[session_id][command_id]
+        return SimpleNamespace(id=command_id, command=command.command, exit_code=command.process.poll())
+
+    def get_session_command_logs(self, session_id: str, command_id: str) -> str:
+        self._sandbox._call()
+        return self._read_log(self._sessions[session_id][command_id].log_path)
+
+    async def get_session_command_logs_async(self, session_id: str, command_id: str,
+                                             on_logs: Callable[[str], None]) -> None:
+        """Follow a command's log, passing each new chunk to on_logs until the command exits."""
+        self._sandbox._call()
+        command = self._sessions[session_id][command_id]
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        with open(command.log_path, "rb") as log:
+            while True:
+                exited = command.process.poll() is not None
+                chunk = log.read()
+                if chunk:
+                    on_logs(decoder.decode(chunk))
+                elif exited:
+                    return
+                else:
+                    await asyncio.sleep(0.05)
+
+    @staticmethod
+    def _read_log(log_path: str) -> str:
+        with open(log_path, "rb") as log:
+            return log.read().decode(errors="replace")
+
+
+class LocalSandbox:
+    """A sandbox whose workspace is a local directory."""
+
+    def __init__(self, workspace: Optional[str] = None, latency: float = 0.0, labels: Optional[Dict[str, str]] = None):
+        """Initialize the sandbox.
+
+        Args:
+            workspace: Directory used as the workspace (default: a new temporary directory)
+            latency: Seconds each SDK call takes, to simulate the network round-trip
+            labels: Sandbox labels
+        """
+        self.id = f"local-{uuid.uuid4().hex[:12]}"
+        self.workspace = workspace or tempfile.mkdtemp(prefix="sandbox-")
+        self._logs_dir = tempfile.mkdtemp(prefix="sandbox-logs-")
+        self.latency = latency
+        self.labels = labels or {}
+        self.calls = 0
+        self.fs = LocalFileSystem(self)
+        self.process = LocalProcess(self)
+        # Stands in for the container: the sandbox is "started" while it runs
+        self._keepalive = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(1e9)"], cwd=self.workspace)
+
+    def _call(self) -> None:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def get_preview_link(self, port: int) -> SimpleNamespace:
+        self._call()
+        return SimpleNamespace(url=f"http://localhost:{port}", token=None)
+
+    def set_labels(self, labels: Dict[str, str]) -> Dict[str, str]:
+        self._call()
+        self.labels = labels
+        return labels
+
+    def is_running(self) -> bool:
+        return self._keepalive.poll() is None
+
+    def remove(self) -> None:
+        """Stop the sandbox and delete its workspace."""
+        for session_id in list(self.process._sessions):
+            self.process.delete_session(session_id)
+        self._keepalive.kill()
+        self._keepalive.wait()
+        shutil.rmtree(self.workspace, ignore_errors=True)
+        shutil.rmtree(self._logs_dir, ignore_errors=True)
@@ -0,0 +1,349 @@
+"""
+Pool of pre-created, started sandboxes for new projects.
+
+Creating a sandbox (provisioning the container, starting supervisord) takes
+tens of seconds, and a project's first agent run used to wait for it. The
+SandboxPool keeps SANDBOX_POOL_SIZE sandboxes ready: `get_sandbox` hands one
+out to a new project and a background task creates its replacement. When the
+pool is empty (or disabled), it creates the sandbox on demand as before.
+
+Pooled sandboxes idle for more than SANDBOX_POOL_IDLE_TTL seconds are replaced,
+so they never reach Daytona's auto-stop (15 minutes by default) and new projects
+always get a sandbox from the current image.
+
+The pool is per process. Set SANDBOX_POOL_PROVIDER=process to run it without
+Daytona: sandboxes are then local processes with their own working directory.
+"""
+
+import asyncio
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Optional, Set, Tuple
+
+from sandbox.local_sandbox import LocalSandbox
+from utils.logger import logger
+
+# Constants
+MAX_PARALLEL_CREATES = 2        # Sandboxes created at once when replenishing
+CHECK_INTERVAL = 30             # Seconds between checks for expired sandboxes
+MAX_RETRY_DELAY = 300           # Max seconds to wait before retrying after failed creations
+STOP_TIMEOUT = 60               # Seconds to wait for in-flight creations on shutdown
+
+
+class DaytonaSandboxProvider:
+    """Creates sandboxes on Daytona (blocking SDK calls; the pool runs them in threads)."""
+
+    def create(self, password: str, project_id: Optional[str] = None) -> Any:
+        from sandbox.sandbox import create_sandbox  # Deferred: imports the Daytona SDK
+        return create_sandbox(password, project_id)
+
+    def assign(self, sandbox: Any, project_id: str) -> None:
+        sandbox.set_labels({'id': project_id})
+
+    def is_ready(self, sandbox: Any) -> bool:
+        return sandbox.info().state == "started"
+
+    def remove(self, sandbox: Any) -> None:
+        from sandbox.sandbox import daytona
+        daytona.remove(sandbox)
+
+
+class ProcessSandboxProvider:
+    """Offline stand-in: each sandbox is a LocalSandbox (local directory and processes)."""
+
+    def __init__(self, create_delay: float = 0.0):
+        """Initialize the provider.
+
+        Args:
+            create_delay: Seconds each creation takes, to simulate provisioning
+        """
+        self.create_delay = create_delay
+
+    def create(self, password: str, project_id: Optional[str] = None) -> Any:
+        time.sleep(self.create_delay)
+        return LocalSandbox(labels={'id': project_id} if project_id else None)
+
+    def assign(self, sandbox: Any, project_id: str) -> None:
+        sandbox.set_labels({'id': project_id})
+
+    def is_ready(self, sandbox: Any) -> bool:
+        return sandbox.is_running()
+
+    def remove(self, sandbox: Any) -> None:
+        sandbox.remove()
+
+
+PROVIDERS = {
+    "daytona": DaytonaSandboxProvider,
+    "process": ProcessSandboxProvider,
+}
+
+
+@dataclass
+class PooledSandbox:
+    sandbox: Any
+    password: str
+    created_at: float  # time.monotonic()
+
+
+class SandboxPool:
+    """Keeps started sandboxes ready for new projects and replenishes them in the background."""
+
+    def __init__(self, size: Optional[int] = None, idle_ttl: Optional[float] = None, provider: Any = None):
+        """Initialize the pool.
+
+        Args:
+            size: Sandboxes kept ready (default: SANDBOX_POOL_SIZE; 0 disables the pool)
+            idle_ttl: Seconds a pooled sandbox waits before it is replaced (default: SANDBOX_POOL_IDLE_TTL)
+            provider: Creates and removes sandboxes (default: per SANDBOX_POOL_PROVIDER)
+        """
+        self._size = size
+        self._idle_ttl = idle_ttl
+        self._provider = provider
+        self._ready: Deque[PooledSandbox] = deque()
+        self._creating = 0
+        self._tasks: Set[asyncio.Task] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._failures = 0
+        self._retry_at = 0.0
+        self._stopping = False
+        self.stats = {"hits": 0, "misses": 0, "created": 0, "create_failures": 0, "expired": 0, "unhealthy": 0}
+
+    # Settings are read on first use, so importing the pool does not require them
+    @property
+    def size(self) -> int:
+        if self._size is None:
+            from utils.config import config
+            self._size = config.SANDBOX_POOL_SIZE
+        return self._size
+
+    @property
+    def idle_ttl(self) -> float:
+        if self._idle_ttl is None:
+            from utils.config import config
+            self._idle_ttl = config.SANDBOX_POOL_IDLE_TTL
+        return self._idle_ttl
+
+    @property
+    def provider(self) -> Any:
+        if self._provider is None:
+            from utils.config import config
+            self._provider = PROVIDERS[config.SANDBOX_POOL_PROVIDER]()
+        return self._provider
+
+    async def get_sandbox(self, project_id: str) -> Tuple[Any, str]:
+        """Get a started sandbox for a new project, from the pool if possible.
+
+        Args:
+            project_id: Project the sandbox is for
+
+        Returns:
+            The sandbox and its VNC password
+        """
+        pooled = await self.acquire(project_id)
+        if pooled is not None:
+            return pooled
+
+        # Pool empty or disabled: create one now
+        password = str(uuid.uuid4())
+        sandbox = await asyncio.to_thread(self.provider.create, password, project_id)
+        return sandbox, password
+
+    async def acquire(self, project_id: str) -> Optional[Tuple[Any, str]]:
+        """Take a ready sandbox out of the pool and assign it to a project.
+
+        Returns:
+            The sandbox and its VNC password, or None if no sandbox is ready
+        """
+        while self._ready:
+            # popleft without an await before it: concurrent callers never get the same sandbox
+            entry = self._ready.popleft()
+            self._wake()
+
+            if time.monotonic() - entry.created_at > self.idle_ttl:
+                self.stats["expired"] += 1
+                self._spawn(self._remove(entry.sandbox))
+                continue
+            try:
+                ready = await asyncio.to_thread(self.provider.is_ready, entry.sandbox)
+            except Exception as e:
+                logger.warning(f"Failed to check pooled sandbox {entry.sandbox.id}: {str(e)}")
+                ready = False
+            if not ready:
+                self.stats["unhealthy"] += 1
+                self._spawn(self._remove(entry.sandbox))
+                continue
+
+            try:
+                await asyncio.to_thread(self.provider.assign, entry.sandbox, project_id)
+            except Exception as e:
+                # Labels are informational; the project row records the sandbox
+                logger.warning(f"Failed to label sandbox {entry.sandbox.id} for project {project_id}: {str(e)}")
+            self.stats["hits"] += 1
+            logger.info(f"Assigned pooled sandbox {entry.sandbox.id} to project {project_id} ({len(self._ready)} left)")
+            return entry.sandbox, entry.password
+
+        self.stats["misses"] += 1
+        return None
+
+    # --- Background replenishment ---
+
+    def start(self) -> None:
+        """Fill the pool and keep it full (no-op when the pool size is 0)."""
+        if self.size <= 0 or self._task is not None:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Sandbox pool started (size {self.size}, idle TTL {self.idle_ttl}s)")
+
+    async def stop(self) -> None:
+        """Stop replenishing and remove the sandboxes still in the pool."""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # Let in-flight creations finish so their sandboxes are removed, not leaked
+        if self._tasks:
+            await asyncio.wait(set(self._tasks), timeout=STOP_TIMEOUT)
+        entries = list(self._ready)
+        self._ready.clear()
+        await asyncio.gather(*(self._remove(entry.sandbox) for entry in entries))
+        logger.info(f"Sandbox pool stopped, removed {len(entries)} pooled sandboxes")
+
+    def _wake(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self) -> None:
+        while True:
+            self._expire()
+            missing = self.size - len(self._ready) - self._creating
+            if missing > 0 and time.monotonic() >= self._retry_at:
+                for _ in range(min(missing, MAX_PARALLEL_CREATES - self._creating)):
+                    self._creating += 1
+                    self._spawn(self._create())
+            self._wakeup.clear()
+            timeout = CHECK_INTERVAL
+            if missing > 0 and self._retry_at > time.monotonic():
+                timeout = min(timeout, self._retry_at - time.monotonic())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _create(self) -> None:
+        password = str(uuid.uuid4())
+        try:
+            started = time.monotonic()
+            sandbox = await asyncio.to_thread(self.provider.create, password)
+            if self._stopping:
+                await self._remove(sandbox)
+                return
+            self._ready.append(PooledSandbox(sandbox, password, time.monotonic()))
+            self._failures = 0
+            self.stats["created"] += 1
+            logger.info(f"Added sandbox {sandbox.id} to the pool in {time.monotonic() - started:.1f}s "
+                        f"({len(self._ready)}/{self.size} ready)")
+        except ImportError as e:
+            # A missing module does not come back by retrying: stop replenishing, keep creating on demand
+            self.stats["create_failures"] += 1
+            self._retry_at = float("inf")
+            logger.error(f"Failed to create pooled sandbox, pool replenishment stopped: {str(e)}")
+        except Exception as e:
+            # Back off so a provider outage does not turn into a creation loop
+            self._failures += 1
+            self.stats["create_failures"] += 1
+            delay = min(MAX_RETRY_DELAY, 5 * 2 ** (self._failures - 1))
+            self._retry_at = time.monotonic() + delay
+            logger.error(f"Failed to create pooled sandbox (retrying in {delay}s): {str(e)}")
+        finally:
+            self._creating -= 1
+            self._wake()
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        while self._ready and now - self._ready[0].created_at > self.idle_ttl:
+            entry = self._ready.popleft()
+            self.stats["expired"] += 1
+            logger.info(f"Replacing pooled sandbox {entry.sandbox.id} after {now - entry.created_at:.0f}s idle")
+            self._spawn(self._remove(entry.sandbox))
+
+    async def _remove(self, sandbox: Any) -> None:
+        try:
+            await asyncio.to_thread(self.provider.remove, sandbox)
+        except Exception as e:
+            logger.warning(f"Failed to remove pooled sandbox {sandbox.id}: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get pool metrics, including the hit rate."""
+        requests = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "ready": len(self._ready),
+            "creating": self._creating,
+            "hit_rate": self.stats["hits"] / requests if requests else 0.0,
+        }
+
+
+# Process-wide pool
+sandbox_pool = SandboxPool()
+
+
+if __name__ == "__main__":
+    import argparse
+    import statistics
+
+    parser = argparse.ArgumentParser(description="Benchmark sandbox latency for new projects with and without the pool (offline)")
+    parser.add_argument("--projects", type=int, default=20, help="New projects to simulate")
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between new projects")
+    parser.add_argument("--size", type=int, default=3, help="Pool size")
+    parser.add_argument("--create-delay", type=float, default=2.0, help="Seconds to provision a sandbox")
+    args = parser.parse_args()
+
+    async def simulate(size: int) -> None:
+        provider = ProcessSandboxProvider(create_delay=args.create_delay)
+        pool = SandboxPool(size=size, idle_ttl=600, provider=provider)
+        pool.start()
+        # Let the pool fill before traffic arrives
+        while size and len(pool._ready) < size:
+            await asyncio.sleep(0.05)
+
+        latencies = []
+        sandboxes = []
+
+        async def new_project(i: int) -> None:
+            started = time.perf_counter()
+            sandbox, _ = await pool.get_sandbox(f"project-{i}")
+            latencies.append(time.perf_counter() - started)
+            sandboxes.append(sandbox)
+
+        projects = []
+        for i in range(args.projects):
+            projects.append(asyncio.create_task(new_project(i)))
+            await asyncio.sleep(args.interval)
+        await asyncio.gather(*projects)
+        await pool.stop()
+        for sandbox in sandboxes:
+            provider.remove(sandbox)
+
+        stats = pool.get_stats()
+        print(f"pool size {size}: mean {statistics.mean(latencies) * 1000:.0f}ms, "
+              f"p95 {statistics.quantiles(latencies, n=20, method='inclusive')[18] * 1000:.0f}ms, "
+              f"max {max(latencies) * 1000:.0f}ms, hit rate {stats['hit_rate']:.0%}")
+
+    asyncio.run(simulate(0))
+    asyncio.run(simulate(args.size))
@@ -0,0 +1,64 @@
+"""
+Run small Python programs inside a sandbox.
+
+Operations that would otherwise take many SDK round-trips (one per file) are
+done by a script executed in the sandbox with a single `process.exec` call. The
+script is sent base64-encoded, so it needs no shell quoting, and reports its
+result as JSON on stdout.
+"""
+
+import asyncio
+import base64
+import json
+import shlex
+from typing import Any
+
+from utils.logger import logger
+
+# Constants
+DEFAULT_TIMEOUT = 60            # Seconds a script may run
+
+
+class RemoteExecError(Exception):
+    """A script run in the sandbox failed."""
+
+
+def build_command(script: str, *args: str) -> str:
+    """Build the command that runs a Python script with arguments in the sandbox."""
+    encoded = base64.b64encode(script.encode()).decode()
+    bootstrap = f"import base64;exec(base64.b64decode('{encoded}'))"
+    return " ".join(["python3", "-c", shlex.quote(bootstrap), *(shlex.quote(str(arg)) for arg in args)])
+
+
+def run_python_sync(sandbox: Any, script: str, *args: str, timeout: int = DEFAULT_TIMEOUT) -> Any:
+    """Run a Python script in the sandbox and parse the JSON it prints (blocking).
+
+    Args:
+        sandbox: Daytona sandbox
+        script: Python source; arguments are in sys.argv[1:]
+        *args: Script arguments
+        timeout: Seconds the script may run
+
+    Returns:
+        The decoded JSON output of the script
+
+    Raises:
+        RemoteExecError: If the script exits with an error or prints invalid JSON
+    """
+    response = sandbox.process.exec(build_command(script, *args), timeout=timeout)
+    output = response.result or ""
+    if response.exit_code != 0:
+        raise RemoteExecError(f"Sandbox script failed with exit code {response.exit_code}: {output[-2000:]}")
+    try:
+        return json.loads(output)
+    except ValueError:
+        logger.error(f"Sandbox script printed invalid JSON: {output[:500]}")
+        raise RemoteExecError("Sandbox script printed invalid JSON")
+
+
+async def run_python(sandbox: Any, script: str, *args: str, timeout: int = DEFAULT_TIMEOUT) -> Any:
+    """Run a Python script in the sandbox and parse the JSON it prints.
+
+    The SDK call runs in a worker thread, so the event loop is not blocked.
+    """
+    return await asyncio.to_thread(run_python_sync, sandbox, script, *args, timeout=timeout)
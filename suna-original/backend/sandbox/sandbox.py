@@ -1,5 +1,6 @@
 import os
-from typing import Optional
+import asyncio
+from typing import Optional, Tuple
 
 from daytona_sdk import Daytona, DaytonaConfig, CreateSandboxParams, Sandbox, SessionExecuteRequest
 from daytona_api_client.models.workspace_state import WorkspaceState
@@ -39,31 +40,49 @@ daytona = Daytona(daytona_config)
 logger.debug("Daytona client initialized")
 
 async def get_or_start_sandbox(sandbox_id: str):
-    """Retrieve a sandbox by ID, check its state, and start it if needed."""
+    """Retrieve a sandbox by ID, check its state, and start it if needed.
+    
+    Goes through the process-wide handle cache, so repeated calls within its TTL
+    do not hit Daytona and concurrent calls share one start.
+    """
+    from sandbox.handle_cache import sandbox_handles
+    handle = await sandbox_handles.get(sandbox_id)
+    return handle.sandbox
+
+async def start_sandbox_if_needed(sandbox_id: str) -> Tuple[Sandbox, bool]:
+    """Retrieve a sandbox by ID and start it if it is stopped or archived.
+    
+    Returns:
+        The sandbox and whether it had to be started
+    """
     
     logger.info(f"Getting or starting sandbox with ID: {sandbox_id}")
     
     try:
-        sandbox = daytona.get_current_sandbox(sandbox_id)
+        # The Daytona SDK is synchronous; run it in a worker thread so a slow
+        # start does not block the event loop (and can overlap with streaming)
+        sandbox = await asyncio.to_thread(daytona.get_current_sandbox, sandbox_id)
+        started = False
         
         # Check if sandbox needs to be started
         if sandbox.instance.state == WorkspaceState.ARCHIVED or sandbox.instance.state == WorkspaceState.STOPPED:
             logger.info(f"Sandbox is in {sandbox.instance.state} state. Starting...")
             try:
-                daytona.start(sandbox)
+                await asyncio.to_thread(daytona.start, sandbox)
                 # Wait a moment for the sandbox to initialize
                 # sleep(5)
                 # Refresh sandbox state after starting
-                sandbox = daytona.get_current_sandbox(sandbox_id)
+                sandbox = await asyncio.to_thread(daytona.get_current_sandbox, sandbox_id)
                 
                 # Start supervisord in a session when restarting
-                start_supervisord_session(sandbox)
+                await asyncio.to_thread(start_supervisord_session, sandbox)
+                started = True
             except Exception as e:
                 logger.error(f"Error starting sandbox: {e}")
                 raise e
         
         logger.info(f"Sandbox {sandbox_id} is ready")
-        return sandbox
+        return sandbox, started
         
     except Exception as e:
         logger.error(f"Error retrieving or starting sandbox: {str(e)}")
@@ -146,50 +165,30 @@ class SandboxToolsBase(Tool):
         self._sandbox = None
         self._sandbox_id = None
         self._sandbox_pass = None
+        self._handle = None
+
+    async def warm_up(self) -> None:
+        """Retrieve and start the project's sandbox ahead of tool execution."""
+        await self._ensure_sandbox()
 
     async def _ensure_sandbox(self) -> Sandbox:
-        """Ensure we have a valid sandbox instance, retrieving it from the project if needed."""
-        if self._sandbox is None:
-            try:
-                # Get database client
-                client = await self.thread_manager.db.client
-                
-                # Get project data
-                project = await client.table('projects').select('*').eq('project_id', self.project_id).execute()
-                if not project.data or len(project.data) == 0:
-                    raise ValueError(f"Project {self.project_id} not found")
-                
-                project_data = project.data[0]
-                sandbox_info = project_data.get('sandbox', {})
-                
-                if not sandbox_info.get('id'):
-                    raise ValueError(f"No sandbox found for project {self.project_id}")
-                
-                # Store sandbox info
-                self._sandbox_id = sandbox_info['id']
-                self._sandbox_pass = sandbox_info.get('pass')
-                
-                # Get or start the sandbox
-                self._sandbox = await get_or_start_sandbox(self._sandbox_id)
-                
-                # # Log URLs if not already printed
-                # if not SandboxToolsBase._urls_printed:
-                #     vnc_link = self._sandbox.get_preview_link(6080)
-                #     website_link = self._sandbox.get_preview_link(8080)
-                    
-                #     vnc_url = vnc_link.url if hasattr(vnc_link, 'url') else str(vnc_link)
-                #     website_url = website_link.url if hasattr(website_link, 'url') else str(website_link)
-                    
-                #     print("\033[95m***")
-                #     print(f"VNC URL: {vnc_url}")
-                #     print(f"Website URL: {website_url}")
-                #     print("***\033[0m")
-                #     SandboxToolsBase._urls_printed = True
-                
-            except Exception as e:
-                logger.error(f"Error retrieving sandbox for project {self.project_id}: {str(e)}", exc_info=True)
-                raise e
+        """Ensure we have a valid sandbox instance, retrieving it from the project if needed.
         
+        The handle comes from the process-wide cache shared by all tools, which
+        revalidates it periodically and starts the sandbox once for concurrent callers.
+        """
+        from sandbox.handle_cache import sandbox_handles
+        try:
+            client = await self.thread_manager.db.client
+            handle = await sandbox_handles.for_project(client, self.project_id)
+        except Exception as e:
+            logger.error(f"Error retrieving sandbox for project {self.project_id}: {str(e)}", exc_info=True)
+            raise e
+        
+        self._handle = handle
+        self._sandbox = handle.sandbox
+        self._sandbox_id = handle.sandbox_id
+        self._sandbox_pass = handle.password
         return self._sandbox
 
     @property
@@ -199,6 +198,13 @@ class SandboxToolsBase(Tool):
             raise RuntimeError("Sandbox not initialized. Call _ensure_sandbox() first.")
         return self._sandbox
 
+    @property
+    def handle(self):
+        """Get the shared sandbox handle (sessions, preview links), ensuring it exists."""
+        if self._handle is None:
+            raise RuntimeError("Sandbox not initialized. Call _ensure_sandbox() first.")
+        return self._handle
+
     @property
     def sandbox_id(self) -> str:
         """Get the sandbox ID, ensuring it exists."""
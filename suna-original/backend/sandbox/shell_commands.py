@@ -0,0 +1,277 @@
+"""
+Shell commands followed while they run.
+
+The shell tool used to run each command synchronously: the tool call blocked
+until the command finished (or the request timed out) and only then fetched the
+command's logs, so long builds showed nothing and a timeout lost the command.
+Commands are now started asynchronously (`var_async`) and followed:
+
+- one task per command follows its log stream and records the exit code
+- output is kept bounded: the first OUTPUT_HEAD_CHARS and the last
+  OUTPUT_TAIL_CHARS characters, with a count of what was dropped in between
+- callers wait with a timeout and receive new output as it arrives (the shell
+  tool reports it as tool progress), and can read new output or the tail later
+
+Commands are kept on the sandbox's handle (see sandbox.handle_cache), so every
+tool and run using the sandbox can check on them until the sandbox restarts.
+Background commands run in their own process group and can be killed.
+"""
+
+import asyncio
+import shlex
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from utils.logger import logger
+
+# Constants
+OUTPUT_HEAD_CHARS = 20_000      # First characters of a command's output kept
+OUTPUT_TAIL_CHARS = 80_000      # Last characters of a command's output kept
+PROGRESS_INTERVAL = 0.5         # Seconds between output updates while waiting
+PROGRESS_MAX_CHARS = 4_000      # Characters per output update
+LOG_POLL_INTERVAL = 2.0         # Seconds between log fetches when the log stream is unavailable
+KILL_GRACE_SECONDS = 5          # Seconds between SIGTERM and SIGKILL
+MAX_FINISHED_COMMANDS = 20      # Finished commands remembered per sandbox
+PID_DIR = "/tmp/.shell_commands"
+
+
+class CommandOutput:
+    """The output of a command, bounded to its head and tail."""
+
+    def __init__(self, head_chars: int = OUTPUT_HEAD_CHARS, tail_chars: int = OUTPUT_TAIL_CHARS):
+        self.head_chars = head_chars
+        self.tail_chars = tail_chars
+        self.head = ""
+        self.tail = ""
+        self.total = 0  # Characters written, including dropped ones
+
+    def append(self, text: str) -> None:
+        if not text:
+            return
+        self.total += len(text)
+        if len(self.head) < self.head_chars:
+            room = self.head_chars - len(self.head)
+            self.head += text[:room]
+            text = text[room:]
+        if text:
+            self.tail = (self.tail + text)[-self.tail_chars:]
+
+    @property
+    def omitted(self) -> int:
+        return self.total - len(self.head) - len(self.tail)
+
+    def text(self) -> str:
+        """All kept output, with a marker where characters were dropped."""
+        if self.omitted:
+            return f"{self.head}\n... [{self.omitted} characters omitted] ...\n{self.tail}"
+        return self.head + self.tail
+
+    def since(self, position: int, max_chars: int) -> Tuple[str, int, int]:
+        """Get the output written after a position.
+
+        Args:
+            position: Characters already seen (a previous return value, or 0)
+            max_chars: Maximum characters returned; the most recent are kept
+
+        Returns:
+            The new output, the number of new characters not returned, and the
+            position to pass next time
+        """
+        tail_start = self.total - len(self.tail)
+        text = self.head[position:] if position < len(self.head) else ""
+        omitted = max(tail_start - max(position, len(self.head)), 0)
+        text += self.tail[max(position - tail_start, 0):]
+        if len(text) > max_chars:
+            omitted += len(text) - max_chars
+            text = text[-max_chars:]
+        return text, omitted, self.total
+
+    def last_lines(self, lines: int) -> str:
+        """The last lines of the kept output."""
+        return "\n".join(self.text().rstrip("\n").split("\n")[-lines:])
+
+
+@dataclass
+class ShellCommand:
+    """A command started in a sandbox session, and its output so far."""
+    command_id: str
+    session_id: str
+    session_name: str
+    command: str
+    cwd: str
+    background: bool
+    pid_file: Optional[str] = None      # Background commands record their process group here
+    started_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    exit_code: Optional[int] = None
+    killed: bool = False
+    output: CommandOutput = field(default_factory=CommandOutput)
+    read_position: int = 0              # Output already returned to the agent
+    follower: Optional[asyncio.Task] = field(default=None, repr=False)
+
+    @property
+    def running(self) -> bool:
+        return self.follower is not None and not self.follower.done()
+
+    @property
+    def status(self) -> str:
+        if self.running:
+            return "running"
+        if self.killed:
+            return "killed"
+        return "completed" if self.exit_code == 0 else "failed"
+
+    async def wait(self, timeout: float, on_output: Optional[Callable[[str, int], None]] = None) -> bool:
+        """Wait for the command to finish, passing on output as it arrives.
+
+        Args:
+            timeout: Seconds to wait
+            on_output: Called with each batch of new output and the number of
+                characters dropped from it (at most PROGRESS_MAX_CHARS per batch)
+
+        Returns:
+            True if the command finished
+        """
+        deadline = time.monotonic() + timeout
+        position = self.output.total
+        while self.running:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            await asyncio.wait({self.follower}, timeout=min(PROGRESS_INTERVAL, remaining))
+            if on_output is not None and self.output.total > position:
+                text, omitted, position = self.output.since(position, PROGRESS_MAX_CHARS)
+                on_output(text, omitted)
+        return not self.running
+
+    def read_new(self, max_chars: int) -> Tuple[str, int]:
+        """Get the output the agent has not seen yet, and mark it as seen.
+
+        Returns:
+            The new output and the number of new characters not returned
+        """
+        text, omitted, self.read_position = self.output.since(self.read_position, max_chars)
+        return text, omitted
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "command_id": self.command_id,
+            "command": self.command,
+            "status": self.status,
+            "exit_code": self.exit_code,
+            "background": self.background,
+            "runtime_seconds": round((self.finished_at or time.time()) - self.started_at, 1),
+            "output_chars": self.output.total,
+        }
+
+    async def _follow(self, sandbox: Any) -> None:
+        """Collect the command's output until it exits, then record the exit code."""
+        process = sandbox.process
+        try:
+            # daytona_sdk releases before the log stream (requirements allow 0.14) only have
+            # get_session_command_logs: those poll
+            follow_logs = getattr(process, "get_session_command_logs_async", None)
+            if follow_logs is None:
+                await self._poll_logs(sandbox)
+            else:
+                try:
+                    await follow_logs(self.session_id, self.command_id, self.output.append)
+                except Exception as e:
+                    # Fall back to fetching the logs periodically
+                    logger.warning(f"Log stream of command {self.command_id} unavailable, polling instead: {str(e)}")
+                    await self._poll_logs(sandbox)
+            while self.exit_code is None:
+                status = await asyncio.to_thread(process.get_session_command, self.session_id, self.command_id)
+                self.exit_code = status.exit_code
+                if self.exit_code is None:
+                    await asyncio.sleep(LOG_POLL_INTERVAL)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error following command {self.command_id}: {str(e)}")
+            self.output.append(f"\n[Lost track of the command: {str(e)}]\n")
+            if self.exit_code is None:
+                self.exit_code = -1
+        finally:
+            self.finished_at = time.time()
+
+    async def _poll_logs(self, sandbox: Any) -> None:
+        seen = 0
+        while True:
+            status = await asyncio.to_thread(sandbox.process.get_session_command, self.session_id, self.command_id)
+            logs = await asyncio.to_thread(sandbox.process.get_session_command_logs, self.session_id, self.command_id)
+            self.output.append((logs or "")[seen:])
+            seen = len(logs or "")
+            if status.exit_code is not None:
+                self.exit_code = status.exit_code
+                return
+            await asyncio.sleep(LOG_POLL_INTERVAL)
+
+
+async def start_command(handle: Any, session_id: str, session_name: str, command: str, cwd: str,
+                        background: bool = False) -> ShellCommand:
+    """Start a command in a session without waiting for it, and follow its output.
+
+    Foreground commands run in the session's shell, so state such as exported
+    variables carries over to later commands. Background commands run in a new
+    shell and process group (recorded in a pid file), so they can be killed.
+
+    Args:
+        handle: SandboxHandle of the sandbox
+        session_id: ID of the session to run in
+        session_name: Name of the session (for display)
+        command: Shell command
+        cwd: Directory the command runs in
+        background: Run in its own process group
+
+    Returns:
+        The started command
+    """
+    from daytona_sdk import SessionExecuteRequest  # Deferred: imports the Daytona SDK
+
+    pid_file = None
+    if background:
+        pid_file = f"{PID_DIR}/{uuid.uuid4().hex}.pid"
+        inner = f"echo $$ > {pid_file}; cd {shlex.quote(cwd)} && {command}"
+        shell_command = f"mkdir -p {PID_DIR} && setsid --wait bash -c {shlex.quote(inner)}"
+    else:
+        shell_command = f"cd {shlex.quote(cwd)} && {command}"
+
+    response = await asyncio.to_thread(
+        handle.sandbox.process.execute_session_command,
+        session_id=session_id,
+        req=SessionExecuteRequest(command=shell_command, var_async=True, cwd=cwd),
+    )
+    started = ShellCommand(response.cmd_id, session_id, session_name, command, cwd, background, pid_file)
+    started.follower = asyncio.create_task(started._follow(handle.sandbox))
+
+    commands = handle.commands
+    commands[started.command_id] = started
+    finished = [c for c in commands.values() if not c.running]
+    for old in sorted(finished, key=lambda c: c.started_at)[:max(len(finished) - MAX_FINISHED_COMMANDS, 0)]:
+        del commands[old.command_id]
+    logger.debug(f"Started {'background ' if background else ''}command {started.command_id} in session {session_name}")
+    return started
+
+
+async def kill_command(handle: Any, command: ShellCommand) -> bool:
+    """Kill a background command's process group: SIGTERM, then SIGKILL after a grace period.
+
+    Returns:
+        True if the command has stopped
+    """
+    if not command.running:
+        return True
+    if command.pid_file is None:
+        raise ValueError("Only commands started in the background can be killed")
+    script = (
+        f"pgid=$(cat {command.pid_file} 2>/dev/null) || exit 0; "
+        f"kill -TERM -$pgid 2>/dev/null; "
+        f"for i in $(seq {KILL_GRACE_SECONDS * 5}); do kill -0 -$pgid 2>/dev/null || break; sleep 0.2; done; "
+        f"kill -KILL -$pgid 2>/dev/null; rm -f {command.pid_file}; true"
+    )
+    await asyncio.to_thread(handle.sandbox.process.exec, script, timeout=KILL_GRACE_SECONDS + 10)
+    command.killed = True
+    return await command.wait(LOG_POLL_INTERVAL * 2 + 1)
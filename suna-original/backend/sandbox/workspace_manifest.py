@@ -0,0 +1,251 @@
+"""
+Incremental snapshots of a sandbox's workspace.
+
+Building the workspace state used to list the workspace and download every file,
+one SDK call per file. The manifest instead tracks path -> (size, mtime, content
+hash):
+
+1. One script run in the sandbox walks the workspace (skipping excluded
+   directories) and reports the manifest. It keeps its own copy of the last
+   manifest in the sandbox, so only files whose size or mtime changed are hashed.
+2. The backend compares it with the previous snapshot to get the delta.
+3. Only files whose content hash is not in the backend's content cache are
+   downloaded. The cache is keyed by hash, so unchanged files, renamed files and
+   identical files across sandboxes are never fetched twice.
+
+Usage:
+    state = await workspace_manifests.get(sandbox.id).get_state(sandbox)
+
+Manifests are kept for the MAX_MANIFESTS most recently used sandboxes, and the
+sandbox handle cache forgets a sandbox's manifest when the sandbox is removed or
+restarted.
+"""
+
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from sandbox.remote_exec import run_python
+from utils.files_utils import EXCLUDED_DIRS, should_exclude_file
+from utils.logger import logger
+
+# Constants
+WORKSPACE_PATH = "/workspace"
+STATE_PATH = "/tmp/.workspace_manifest.json"    # Manifest kept in the sandbox to skip rehashing
+MAX_CONTENT_BYTES = 1024 * 1024                 # Larger files are listed but their content is not fetched
+CONTENT_CACHE_BYTES = 64 * 1024 * 1024          # Decoded file contents kept in the backend, by hash
+MAX_PARALLEL_DOWNLOADS = 8
+MAX_MANIFESTS = 256                             # Sandboxes whose last snapshot is kept (LRU)
+
+# Walks the workspace and prints {path: [size, mtime_ns, sha256]}; reuses the hash
+# of files whose size and mtime match the previous run
+MANIFEST_SCRIPT = r'''
+import hashlib, json, os, sys
+
+root, state_path, excluded_dirs = sys.argv[1], sys.argv[2], set(json.loads(sys.argv[3]))
+try:
+    with open(state_path) as f:
+        previous = json.load(f)
+except Exception:
+    previous = {}
+
+manifest = {}
+for directory, dirs, files in os.walk(root):
+    dirs[:] = [d for d in dirs if d not in excluded_dirs]
+    for name in files:
+        path = os.path.join(directory, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        rel = os.path.relpath(path, root)
+        entry = previous.get(rel)
+        if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            digest = entry[2]
+        else:
+            h = hashlib.sha256()
+            try:
+                with open(path, "rb") as f:
+                    for chunk in iter(lambda: f.read(1 << 20), b""):
+                        h.update(chunk)
+            except OSError:
+                continue
+            digest = h.hexdigest()
+        manifest[rel] = [st.st_size, st.st_mtime_ns, digest]
+
+tmp = state_path + ".tmp"
+with open(tmp, "w") as f:
+    json.dump(manifest, f)
+os.replace(tmp, state_path)
+print(json.dumps(manifest, separators=(",", ":")))
+'''
+
+
+@dataclass
+class FileEntry:
+    size: int
+    mtime_ns: int
+    sha256: str
+
+
+@dataclass
+class WorkspaceDelta:
+    """Changes between two snapshots (paths relative to the workspace)."""
+    added: List[str] = field(default_factory=list)
+    modified: List[str] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.added or self.modified or self.deleted)
+
+
+class ContentCache:
+    """Decoded text file contents by SHA-256, bounded by total size (LRU)."""
+
+    def __init__(self, max_bytes: int = CONTENT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        self._bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, digest: str) -> Tuple[bool, Optional[str]]:
+        """Look up content by hash.
+
+        Returns:
+            (found, content); content is None for binary files
+        """
+        if digest not in self._entries:
+            self.stats["misses"] += 1
+            return False, None
+        self._entries.move_to_end(digest)
+        self.stats["hits"] += 1
+        return True, self._entries[digest]
+
+    def __contains__(self, digest: str) -> bool:
+        return digest in self._entries
+
+    def put(self, digest: str, content: Optional[str]) -> None:
+        if digest in self._entries:
+            return
+        self._entries[digest] = content
+        self._bytes += len(content) if content else 0
+        while self._bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted) if evicted else 0
+            self.stats["evictions"] += 1
+
+
+class WorkspaceManifest:
+    """The last snapshot of one sandbox's workspace."""
+
+    def __init__(self, sandbox_id: str, content_cache: ContentCache, workspace_path: str = WORKSPACE_PATH):
+        self.sandbox_id = sandbox_id
+        self.content_cache = content_cache
+        self.workspace_path = workspace_path
+        self.files: Dict[str, FileEntry] = {}
+        self.snapshot_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    async def refresh(self, sandbox: Any) -> WorkspaceDelta:
+        """Take a new snapshot and return what changed since the previous one."""
+        async with self._lock:
+            raw = await run_python(sandbox, MANIFEST_SCRIPT, self.workspace_path, STATE_PATH,
+                                   json.dumps(sorted(EXCLUDED_DIRS)))
+            files = {path: FileEntry(*entry) for path, entry in raw.items() if not should_exclude_file(path)}
+
+            delta = WorkspaceDelta()
+            for path, entry in files.items():
+                previous = self.files.get(path)
+                if previous is None:
+                    delta.added.append(path)
+                elif previous.sha256 != entry.sha256:
+                    delta.modified.append(path)
+            delta.deleted = [path for path in self.files if path not in files]
+
+            self.files = files
+            self.snapshot_at = time.time()
+            return delta
+
+    async def get_state(self, sandbox: Any) -> Dict[str, Dict[str, Any]]:
+        """Get the workspace state: text file contents and metadata by relative path.
+
+        Only files whose content is not cached yet are downloaded. Binary files
+        and files over MAX_CONTENT_BYTES are left out.
+        """
+        await self.refresh(sandbox)
+
+        to_fetch = {}
+        for path, entry in self.files.items():
+            if entry.size > MAX_CONTENT_BYTES:
+                continue
+            if entry.sha256 not in self.content_cache:
+                to_fetch.setdefault(entry.sha256, path)
+        if to_fetch:
+            await self._download(sandbox, to_fetch)
+
+        state = {}
+        for path, entry in self.files.items():
+            if entry.size > MAX_CONTENT_BYTES:
+                continue
+            _, content = self.content_cache.get(entry.sha256)
+            if content is None:
+                # Binary, or evicted/failed download
+                continue
+            state[path] = {
+                "content": content,
+                "is_dir": False,
+                "size": entry.size,
+                "modified": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(entry.mtime_ns / 1e9)),
+                "sha256": entry.sha256,
+            }
+        return state
+
+    async def _download(self, sandbox: Any, to_fetch: Dict[str, str]) -> None:
+        semaphore = asyncio.Semaphore(MAX_PARALLEL_DOWNLOADS)
+
+        async def fetch(digest: str, path: str) -> None:
+            async with semaphore:
+                try:
+                    data = await asyncio.to_thread(sandbox.fs.download_file, f"{self.workspace_path}/{path}")
+                except Exception as e:
+                    logger.warning(f"Error reading file {path} from sandbox {self.sandbox_id}: {str(e)}")
+                    return
+            try:
+                self.content_cache.put(digest, data.decode())
+            except UnicodeDecodeError:
+                # Remember binary files so they are not downloaded again
+                self.content_cache.put(digest, None)
+
+        started = time.monotonic()
+        await asyncio.gather(*(fetch(digest, path) for digest, path in to_fetch.items()))
+        logger.debug(f"Fetched {len(to_fetch)} changed files of {len(self.files)} from sandbox {self.sandbox_id} "
+                     f"in {time.monotonic() - started:.2f}s")
+
+
+class WorkspaceManifests:
+    """Manifests by sandbox ID, sharing one content cache."""
+
+    def __init__(self, content_cache: Optional[ContentCache] = None, max_manifests: int = MAX_MANIFESTS):
+        self.content_cache = content_cache or ContentCache()
+        self.max_manifests = max_manifests
+        self._manifests: "OrderedDict[str, WorkspaceManifest]" = OrderedDict()
+
+    def get(self, sandbox_id: str) -> WorkspaceManifest:
+        manifest = self._manifests.get(sandbox_id)
+        if manifest is None:
+            manifest = self._manifests[sandbox_id] = WorkspaceManifest(sandbox_id, self.content_cache)
+            while len(self._manifests) > self.max_manifests:
+                self._manifests.popitem(last=False)
+        self._manifests.move_to_end(sandbox_id)
+        return manifest
+
+    def forget(self, sandbox_id: str) -> None:
+        self._manifests.pop(sandbox_id, None)
+
+
+# Process-wide manifests
+workspace_manifests = WorkspaceManifests()
@@ -6,20 +6,21 @@ stripe listen --forward-to localhost:8000/api/billing/webhook
 
 from fastapi import APIRouter, HTTPException, Depends, Request
 from typing import Optional, Dict, Any, List, Tuple
-import stripe
-from datetime import datetime, timezone
+from datetime import datetime, timezone, date
 from utils.logger import logger
 from utils.config import config, EnvMode
 from services.supabase import DBConnection
 from utils.auth_utils import get_current_user_id_from_jwt
+from services.usage import get_usage_rollups
+from services.stripe_cache import get_stripe, run_stripe, subscription_cache
 from pydantic import BaseModel, Field
 
-# Initialize Stripe
-stripe.api_key = config.STRIPE_SECRET_KEY
-
 # Initialize router
 router = APIRouter(prefix="/billing", tags=["billing"])
 
+# Seconds between usage counter updates of a running agent run
+USAGE_HEARTBEAT_INTERVAL = 60
+
 SUBSCRIPTION_TIERS = {
     config.STRIPE_FREE_TIER_ID: {'name': 'free', 'minutes': 10},
     config.STRIPE_TIER_2_20_ID: {'name': 'tier_2_20', 'minutes': 120},  # 2 hours
@@ -69,8 +70,9 @@ async def get_stripe_customer_id(client, user_id: str) -> Optional[str]:
 
 async def create_stripe_customer(client, user_id: str, email: str) -> str:
     """Create a new Stripe customer for a user."""
+    stripe = get_stripe()
     # Create customer in Stripe
-    customer = stripe.Customer.create(
+    customer = await run_stripe(stripe.Customer.create,
         email=email,
         metadata={"user_id": user_id}
     )
@@ -86,7 +88,8 @@ async def create_stripe_customer(client, user_id: str, email: str) -> str:
     return customer.id
 
 async def get_user_subscription(user_id: str) -> Optional[Dict]:
-    """Get the current subscription for a user from Stripe."""
+    """Get the current subscription for a user (cached, refreshed by the Stripe webhook)."""
+    stripe = get_stripe()
     try:
         # Get customer ID
         db = DBConnection()
@@ -97,19 +100,15 @@ async def get_user_subscription(user_id: str) -> Optional[Dict]:
             return None
             
         # Get all active subscriptions for the customer
-        subscriptions = stripe.Subscription.list(
-            customer=customer_id,
-            status='active'
-        )
-        # print("Found subscriptions:", subscriptions)
+        subscriptions = await subscription_cache.get_active_subscriptions(customer_id)
         
         # Check if we have any subscriptions
-        if not subscriptions or not subscriptions.get('data'):
+        if not subscriptions:
             return None
             
         # Filter subscriptions to only include our product's subscriptions
         our_subscriptions = []
-        for sub in subscriptions['data']:
+        for sub in subscriptions:
             # Get the first subscription item
             if sub.get('items') and sub['items'].get('data') and len(sub['items']['data']) > 0:
                 item = sub['items']['data'][0]
@@ -139,13 +138,14 @@ async def get_user_subscription(user_id: str) -> Optional[Dict]:
             for sub in our_subscriptions:
                 if sub['id'] != most_recent['id']:
                     try:
-                        stripe.Subscription.modify(
+                        await run_stripe(stripe.Subscription.modify,
                             sub['id'],
                             cancel_at_period_end=True
                         )
                         logger.info(f"Cancelled subscription {sub['id']} for user {user_id}")
                     except Exception as e:
                         logger.error(f"Error cancelling subscription {sub['id']}: {str(e)}")
+            await subscription_cache.invalidate(customer_id)
             
             return most_recent
             
@@ -156,47 +156,56 @@ async def get_user_subscription(user_id: str) -> Optional[Dict]:
         return None
 
 async def calculate_monthly_usage(client, user_id: str) -> float:
-    """Calculate total agent run minutes for the current month for a user."""
-    # Get start of current month in UTC
+    """Get total agent run minutes for the current month for a user.
+    
+    Reads the account's monthly usage counter, which agent runs update when they
+    complete and every USAGE_HEARTBEAT_INTERVAL seconds while they run.
+    """
     now = datetime.now(timezone.utc)
     start_of_month = datetime(now.year, now.month, 1, tzinfo=timezone.utc)
     
-    # First get all threads for this user
-    threads_result = await client.table('threads') \
-        .select('thread_id') \
+    result = await client.table('monthly_usage') \
+        .select('run_seconds') \
         .eq('account_id', user_id) \
+        .eq('month', start_of_month.date().isoformat()) \
         .execute()
     
-    if not threads_result.data:
+    if not result.data:
         return 0.0
     
-    thread_ids = [t['thread_id'] for t in threads_result.data]
-    
-    # Then get all agent runs for these threads in current month
-    runs_result = await client.table('agent_runs') \
-        .select('started_at, completed_at') \
-        .in_('thread_id', thread_ids) \
-        .gte('started_at', start_of_month.isoformat()) \
-        .execute()
-    
-    if not runs_result.data:
-        return 0.0
+    return float(result.data[0]['run_seconds']) / 60  # Convert to minutes
+
+async def record_agent_run_usage(client, agent_run_id: str) -> None:
+    """
+    Add the time an agent run has been going since its last update to its account's
+    monthly usage counter. Safe to call repeatedly and concurrently.
+    """
+    if config.ENV_MODE == EnvMode.LOCAL or client is None:
+        return
     
-    # Calculate total minutes
-    total_seconds = 0
-    now_ts = now.timestamp()
+    try:
+        await client.rpc('record_agent_run_usage', {'p_agent_run_id': agent_run_id}).execute()
+    except Exception as e:
+        # The reconciliation job (utils/scripts/reconcile_monthly_usage.py) catches up missed updates
+        logger.warning(f"Failed to record usage of agent run {agent_run_id}: {str(e)}")
+
+async def reconcile_monthly_usage(client, month: date, fix: bool = False, tolerance: float = 1.0) -> List[Dict]:
+    """
+    Recompute a month's usage from the raw agent runs and compare it with the counters.
     
-    for run in runs_result.data:
-        start_time = datetime.fromisoformat(run['started_at'].replace('Z', '+00:00')).timestamp()
-        if run['completed_at']:
-            end_time = datetime.fromisoformat(run['completed_at'].replace('Z', '+00:00')).timestamp()
-        else:
-            # For running jobs, use current time
-            end_time = now_ts
+    Args:
+        client: The Supabase client
+        month: First day of the month to check
+        fix: Reset drifted counters to the recomputed values
+        tolerance: Seconds of difference tolerated per account
         
-        total_seconds += (end_time - start_time)
-    
-    return total_seconds / 60  # Convert to minutes
+    Returns:
+        List[Dict]: The drifted accounts with their counted_seconds and actual_seconds
+    """
+    result = await client.rpc('reconcile_monthly_usage', {
+        'p_month': month.isoformat(), 'p_fix': fix, 'p_tolerance': tolerance
+    }).execute()
+    return result.data or []
 
 async def check_billing_status(client, user_id: str) -> Tuple[bool, str, Optional[Dict]]:
     """
@@ -253,6 +262,7 @@ async def create_checkout_session(
     current_user_id: str = Depends(get_current_user_id_from_jwt)
 ):
     """Create a Stripe Checkout session or modify an existing subscription."""
+    stripe = get_stripe()
     try:
         # Get Supabase client
         db = DBConnection()
@@ -269,7 +279,7 @@ async def create_checkout_session(
         
         # Get the target price and product ID
         try:
-            price = stripe.Price.retrieve(request.price_id, expand=['product'])
+            price = await run_stripe(stripe.Price.retrieve, request.price_id, expand=['product'])
             product_id = price['product']['id']
         except stripe.error.InvalidRequestError:
             raise HTTPException(status_code=400, detail=f"Invalid price ID: {request.price_id}")
@@ -304,13 +314,13 @@ async def create_checkout_session(
                     }
                 
                 # Get current and new price details
-                current_price = stripe.Price.retrieve(current_price_id)
+                current_price = await run_stripe(stripe.Price.retrieve, current_price_id)
                 new_price = price # Already retrieved
                 is_upgrade = new_price['unit_amount'] > current_price['unit_amount']
 
                 if is_upgrade:
                     # --- Handle Upgrade --- Immediate modification
-                    updated_subscription = stripe.Subscription.modify(
+                    updated_subscription = await run_stripe(stripe.Subscription.modify,
                         subscription_id,
                         items=[{
                             'id': subscription_item['id'],
@@ -319,6 +329,7 @@ async def create_checkout_session(
                         proration_behavior='always_invoice', # Prorate and charge immediately
                         billing_cycle_anchor='now' # Reset billing cycle
                     )
+                    await subscription_cache.invalidate(customer_id)
                     
                     # Update active status in database to true (customer has active subscription)
                     await client.schema('basejump').from_('billing_customers').update(
@@ -328,7 +339,7 @@ async def create_checkout_session(
                     
                     latest_invoice = None
                     if updated_subscription.get('latest_invoice'):
-                       latest_invoice = stripe.Invoice.retrieve(updated_subscription['latest_invoice']) 
+                       latest_invoice = await run_stripe(stripe.Invoice.retrieve, updated_subscription['latest_invoice']) 
                     
                     return {
                         "subscription_id": updated_subscription['id'],
@@ -354,12 +365,12 @@ async def create_checkout_session(
                         
                         # Retrieve the subscription again to get the schedule ID if it exists
                         # This ensures we have the latest state before creating/modifying schedule
-                        sub_with_schedule = stripe.Subscription.retrieve(subscription_id)
+                        sub_with_schedule = await run_stripe(stripe.Subscription.retrieve, subscription_id)
                         schedule_id = sub_with_schedule.get('schedule')
 
                         # Get the current phase configuration from the schedule or subscription
                         if schedule_id:
-                            schedule = stripe.SubscriptionSchedule.retrieve(schedule_id)
+                            schedule = await run_stripe(stripe.SubscriptionSchedule.retrieve, schedule_id)
                             # Find the current phase in the schedule
                             # This logic assumes simple schedules; might need refinement for complex ones
                             current_phase = None
@@ -424,7 +435,7 @@ async def create_checkout_session(
                             logger.info(f"Updating existing schedule {schedule_id} for subscription {subscription_id}")
                             logger.debug(f"Current phase data: {current_phase_update_data}")
                             logger.debug(f"New phase data: {new_downgrade_phase_data}")
-                            updated_schedule = stripe.SubscriptionSchedule.modify(
+                            updated_schedule = await run_stripe(stripe.SubscriptionSchedule.modify,
                                 schedule_id,
                                 phases=[current_phase_update_data, new_downgrade_phase_data],
                                 end_behavior='release' 
@@ -439,7 +450,7 @@ async def create_checkout_session(
                             logger.debug(f"Current price: {current_price_id}, New price: {request.price_id}")
                             
                             try:
-                                updated_schedule = stripe.SubscriptionSchedule.create(
+                                updated_schedule = await run_stripe(stripe.SubscriptionSchedule.create,
                                     from_subscription=subscription_id,
                                     phases=[
                                         {
@@ -471,13 +482,16 @@ async def create_checkout_session(
                                 # print(f"Created new schedule {updated_schedule['id']} from subscription {subscription_id}")
                                 
                                 # Verify the schedule was created correctly
-                                fetched_schedule = stripe.SubscriptionSchedule.retrieve(updated_schedule['id'])
+                                fetched_schedule = await run_stripe(stripe.SubscriptionSchedule.retrieve, updated_schedule['id'])
                                 logger.info(f"Schedule verification - Status: {fetched_schedule.get('status')}, Phase Count: {len(fetched_schedule.get('phases', []))}")
                                 logger.debug(f"Schedule details: {fetched_schedule}")
                             except Exception as schedule_error:
                                 logger.exception(f"Failed to create schedule: {str(schedule_error)}")
                                 raise schedule_error  # Re-raise to be caught by the outer try-except
                         
+                        # The subscription now refers to its schedule
+                        await subscription_cache.invalidate(customer_id)
+                        
                         return {
                             "subscription_id": subscription_id,
                             "schedule_id": updated_schedule['id'],
@@ -499,7 +513,7 @@ async def create_checkout_session(
                 raise HTTPException(status_code=500, detail=f"Error updating subscription: {str(e)}")
         else:
             # --- Create New Subscription via Checkout Session ---
-            session = stripe.checkout.Session.create(
+            session = await run_stripe(stripe.checkout.Session.create,
                 customer=customer_id,
                 payment_method_types=['card'],
                     line_items=[{'price': request.price_id, 'quantity': 1}],
@@ -536,6 +550,7 @@ async def create_portal_session(
     current_user_id: str = Depends(get_current_user_id_from_jwt)
 ):
     """Create a Stripe Customer Portal session for subscription management."""
+    stripe = get_stripe()
     try:
         # Get Supabase client
         db = DBConnection()
@@ -549,7 +564,7 @@ async def create_portal_session(
         # Ensure the portal configuration has subscription_update enabled
         try:
             # First, check if we have a configuration that already enables subscription update
-            configurations = stripe.billing_portal.Configuration.list(limit=100)
+            configurations = await run_stripe(stripe.billing_portal.Configuration.list, limit=100)
             active_config = None
             
             # Look for a configuration with subscription_update enabled
@@ -568,7 +583,7 @@ async def create_portal_session(
                     default_config = configurations['data'][0]
                     logger.info(f"Updating default portal configuration: {default_config['id']} to enable subscription_update")
                     
-                    active_config = stripe.billing_portal.Configuration.update(
+                    active_config = await run_stripe(stripe.billing_portal.Configuration.update,
                         default_config['id'],
                         features={
                             'subscription_update': {
@@ -585,7 +600,7 @@ async def create_portal_session(
                 else:
                     # Create a new configuration with subscription_update enabled
                     logger.info("Creating new portal configuration with subscription_update enabled")
-                    active_config = stripe.billing_portal.Configuration.create(
+                    active_config = await run_stripe(stripe.billing_portal.Configuration.create,
                         business_profile={
                             'headline': 'Subscription Management',
                             'privacy_policy_url': config.FRONTEND_URL + '/privacy',
@@ -623,7 +638,7 @@ async def create_portal_session(
             portal_params["configuration"] = active_config['id']
         
         # Create the session
-        session = stripe.billing_portal.Session.create(**portal_params)
+        session = await run_stripe(stripe.billing_portal.Session.create, **portal_params)
         
         return {"url": session.url}
         
@@ -636,6 +651,7 @@ async def get_subscription(
     current_user_id: str = Depends(get_current_user_id_from_jwt)
 ):
     """Get the current subscription status for the current user, including scheduled changes."""
+    stripe = get_stripe()
     try:
         # Get subscription from Stripe (this helper already handles filtering/cleanup)
         subscription = await get_user_subscription(current_user_id)
@@ -682,7 +698,7 @@ async def get_subscription(
         schedule_id = subscription.get('schedule')
         if schedule_id:
             try:
-                schedule = stripe.SubscriptionSchedule.retrieve(schedule_id)
+                schedule = await run_stripe(stripe.SubscriptionSchedule.retrieve, schedule_id)
                 # Find the *next* phase after the current one
                 next_phase = None
                 current_phase_end = current_item['current_period_end']
@@ -736,9 +752,42 @@ async def check_status(
         logger.error(f"Error checking billing status: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/usage")
+async def get_usage(
+    current_user_id: str = Depends(get_current_user_id_from_jwt)
+):
+    """Get the current month's token and cost usage per model, from the usage rollups."""
+    try:
+        db = DBConnection()
+        client = await db.client
+        
+        now = datetime.now(timezone.utc)
+        start_of_month = datetime(now.year, now.month, 1, tzinfo=timezone.utc).date()
+        rollups = await get_usage_rollups(client, current_user_id, start_of_month)
+        
+        by_model = {}
+        for row in rollups:
+            model_usage = by_model.setdefault(row['model'], {'prompt_tokens': 0, 'completion_tokens': 0, 'cost': 0.0, 'request_count': 0})
+            model_usage['prompt_tokens'] += row['prompt_tokens']
+            model_usage['completion_tokens'] += row['completion_tokens']
+            model_usage['cost'] += float(row['cost'])
+            model_usage['request_count'] += row['request_count']
+        
+        return {
+            "period_start": start_of_month.isoformat(),
+            "total_cost": round(sum(m['cost'] for m in by_model.values()), 6),
+            "models": by_model,
+            "daily": rollups
+        }
+        
+    except Exception as e:
+        logger.error(f"Error getting usage: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/webhook")
 async def stripe_webhook(request: Request):
     """Handle Stripe webhook events."""
+    stripe = get_stripe()
     try:
         # Get the webhook secret from config
         webhook_secret = config.STRIPE_WEBHOOK_SECRET
@@ -771,6 +820,9 @@ async def stripe_webhook(request: Request):
             db = DBConnection()
             client = await db.client
             
+            # Reload the customer's subscriptions; events can arrive out of order, so don't trust the payload
+            active_subscriptions = await subscription_cache.refresh(customer_id)
+            
             if event.type == 'customer.subscription.created' or event.type == 'customer.subscription.updated':
                 # Check if subscription is active
                 if subscription.get('status') in ['active', 'trialing']:
@@ -782,11 +834,7 @@ async def stripe_webhook(request: Request):
                 else:
                     # Subscription is not active (e.g., past_due, canceled, etc.)
                     # Check if customer has any other active subscriptions before updating status
-                    has_active = len(stripe.Subscription.list(
-                        customer=customer_id,
-                        status='active',
-                        limit=1
-                    ).get('data', [])) > 0
+                    has_active = len(active_subscriptions) > 0
                     
                     if not has_active:
                         await client.schema('basejump').from_('billing_customers').update(
@@ -796,11 +844,7 @@ async def stripe_webhook(request: Request):
             
             elif event.type == 'customer.subscription.deleted':
                 # Check if customer has any other active subscriptions
-                has_active = len(stripe.Subscription.list(
-                    customer=customer_id,
-                    status='active',
-                    limit=1
-                ).get('data', [])) > 0
+                has_active = len(active_subscriptions) > 0
                 
                 if not has_active:
                     # If no active subscriptions left, set active to false
@@ -13,7 +13,9 @@ This module provides a unified interface for making API calls to different LLM p
 from typing import Union, Dict, Any, Optional, AsyncGenerator, List
 import os
 import json
+import time
 import asyncio
+from collections import deque
 from openai import OpenAIError
 import litellm
 from utils.logger import logger
@@ -28,6 +30,9 @@ litellm.modify_params=True
 MAX_RETRIES = 3
 RATE_LIMIT_DELAY = 30
 RETRY_DELAY = 5
+HEDGE_LATENCY_WINDOW = 200  # Recent time-to-first-token samples used for the hedge deadline
+HEDGE_MIN_SAMPLES = 20  # Samples needed before the percentile replaces the initial delay
+HEDGE_MAX_BURST = 5.0  # Max hedges that can be saved up from the budget
 
 class LLMError(Exception):
     """Base exception for LLM-related errors."""
@@ -86,6 +91,192 @@ async def handle_error(error: Exception, attempt: int, max_attempts: int) -> Non
     logger.debug(f"Waiting {delay} seconds before retry...")
     await asyncio.sleep(delay)
 
+class HedgePolicy:
+    """Decides when an LLM request should be hedged and tracks hedge metrics.
+
+    A hedge is a duplicate of a request sent to a second backend when the first
+    token of the original has not arrived within a deadline. The deadline is a
+    percentile of recently observed time-to-first-token, so only the slow tail
+    of requests is hedged. Hedges are paid from a token bucket that earns
+    `budget` tokens per request, which caps the extra load at that fraction of
+    the traffic.
+    """
+
+    def __init__(self, percentile: float, min_delay: float, initial_delay: float, budget: float):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.initial_delay = initial_delay
+        self.budget = budget
+        self._latencies = deque(maxlen=HEDGE_LATENCY_WINDOW)
+        self._tokens = 1.0 if budget > 0 else 0.0
+        self.stats = {
+            "requests": 0,
+            "hedges_sent": 0,
+            "hedge_wins": 0,
+            "primary_wins": 0,
+            "budget_exhausted": 0,
+        }
+
+    def record_request(self) -> None:
+        """Count a request and earn its share of the hedge budget."""
+        self.stats["requests"] += 1
+        self._tokens = min(HEDGE_MAX_BURST, self._tokens + self.budget)
+
+    def record_latency(self, seconds: float) -> None:
+        """Record the time to first token of a request."""
+        self._latencies.append(seconds)
+
+    def deadline(self) -> float:
+        """Get how long to wait for the first token before hedging."""
+        if len(self._latencies) < HEDGE_MIN_SAMPLES:
+            return max(self.min_delay, self.initial_delay)
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return max(self.min_delay, ordered[index])
+
+    def try_acquire(self) -> bool:
+        """Spend one hedge from the budget, if available."""
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            self.stats["hedges_sent"] += 1
+            return True
+        self.stats["budget_exhausted"] += 1
+        return False
+
+    def record_winner(self, hedge_won: bool) -> None:
+        """Record which request of a hedged pair delivered first."""
+        self.stats["hedge_wins" if hedge_won else "primary_wins"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hedge metrics, including the hedge win rate."""
+        hedged = self.stats["hedge_wins"] + self.stats["primary_wins"]
+        return {
+            **self.stats,
+            "hedge_win_rate": self.stats["hedge_wins"] / hedged if hedged else 0.0,
+            "hedge_rate": self.stats["hedges_sent"] / self.stats["requests"] if self.stats["requests"] else 0.0,
+            "deadline_seconds": self.deadline(),
+        }
+
+hedge_policy = HedgePolicy(
+    percentile=config.LLM_HEDGE_PERCENTILE,
+    min_delay=config.LLM_HEDGE_MIN_DELAY,
+    initial_delay=config.LLM_HEDGE_INITIAL_DELAY,
+    budget=config.LLM_HEDGE_BUDGET,
+)
+
+def get_hedge_stats() -> Dict[str, Any]:
+    """Get request hedging metrics for monitoring."""
+    return hedge_policy.get_stats()
+
+_STREAM_END = object()
+
+async def _open_completion(params: Dict[str, Any]):
+    """Send a request and wait for its first token.
+
+    For non-streaming requests the complete response counts as the first token.
+
+    Returns:
+        Tuple of (response, first chunk or _STREAM_END, or None if not streaming)
+    """
+    response = await litellm.acompletion(**params)
+    if not params.get("stream"):
+        return response, None
+    try:
+        first_chunk = await response.__aiter__().__anext__()
+    except StopAsyncIteration:
+        first_chunk = _STREAM_END
+    return response, first_chunk
+
+async def _resume_stream(response, first_chunk) -> AsyncGenerator:
+    """Yield an already received first chunk followed by the rest of the stream."""
+    if first_chunk is _STREAM_END:
+        return
+    yield first_chunk
+    async for chunk in response:
+        yield chunk
+
+def _deliver(response, first_chunk):
+    """Turn the result of `_open_completion` back into what `acompletion` returns."""
+    if first_chunk is None:
+        return response
+    return _resume_stream(response, first_chunk)
+
+def _discard(task: asyncio.Task) -> None:
+    """Cancel a losing request and release its stream if it already has one."""
+    if not task.done():
+        task.cancel()
+    elif not task.cancelled() and task.exception() is None:
+        response, _ = task.result()
+        aclose = getattr(response, "aclose", None)
+        if aclose:
+            asyncio.ensure_future(aclose())
+    # Retrieve the outcome so a late failure is not reported as unhandled
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+def _prepare_hedge_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the parameters of the hedge request for the second backend."""
+    hedge_params = dict(params)
+    if config.LLM_HEDGE_API_BASE:
+        hedge_params["api_base"] = config.LLM_HEDGE_API_BASE
+    if config.LLM_HEDGE_MODEL:
+        hedge_params["model"] = config.LLM_HEDGE_MODEL
+    return hedge_params
+
+async def hedged_completion(params: Dict[str, Any], policy: HedgePolicy = hedge_policy):
+    """Make a completion call, hedging it to a second backend if it is slow.
+
+    If the first token has not arrived by the policy deadline and the hedge
+    budget allows, the same request is sent to the hedge backend. Whichever
+    delivers its first token first is returned and the other is cancelled.
+
+    Args:
+        params: Parameters prepared by `prepare_params`
+        policy: Hedge policy providing the deadline, budget and metrics
+
+    Returns:
+        The same as `litellm.acompletion`: a response, or an async stream of chunks
+
+    Raises:
+        Exception: The first error if every issued request failed
+    """
+    policy.record_request()
+    start = time.monotonic()
+    primary = asyncio.create_task(_open_completion(params))
+    tasks = [primary]
+    winner = None
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=policy.deadline())
+        if not done and policy.try_acquire():
+            logger.info(f"No first token from {params.get('model')} after {time.monotonic() - start:.2f}s, sending hedge request")
+            tasks.append(asyncio.create_task(_open_completion(_prepare_hedge_params(params))))
+
+        pending = set(tasks)
+        first_error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in tasks:
+                if task in done and task.exception() is not None:
+                    first_error = first_error or task.exception()
+                elif task in done and winner is None:
+                    winner = task
+            if winner:
+                break
+
+        if winner is None:
+            raise first_error
+
+        policy.record_latency(time.monotonic() - start)
+        if len(tasks) > 1:
+            policy.record_winner(hedge_won=winner is not primary)
+            stats = policy.get_stats()
+            logger.info(f"Hedged request won by {'hedge' if winner is not primary else 'primary'} "
+                        f"(hedge win rate: {stats['hedge_win_rate']:.0%} over {stats['hedge_wins'] + stats['primary_wins']} hedged requests)")
+        return _deliver(*winner.result())
+    finally:
+        for task in tasks:
+            if task is not winner:
+                _discard(task)
+
 def prepare_params(
     messages: List[Dict[str, Any]],
     model_name: str,
@@ -324,7 +515,10 @@ async def make_llm_api_call(
             logger.debug(f"Attempt {attempt + 1}/{MAX_RETRIES}")
             # logger.debug(f"API request parameters: {json.dumps(params, indent=2)}")
             
-            response = await litellm.acompletion(**params)
+            if config.LLM_HEDGE_ENABLED:
+                response = await hedged_completion(params)
+            else:
+                response = await litellm.acompletion(**params)
             logger.debug(f"Successfully received API response from {model_name}")
             logger.debug(f"Response: {response}")
             return response
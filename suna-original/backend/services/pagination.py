@@ -0,0 +1,154 @@
+"""
+Keyset (cursor) pagination for thread lists and message histories.
+
+Pages are ordered by (created_at, id) and continue from the sort key of the
+last row of the previous page, so each page is an index range scan whatever
+its depth, and rows added while scrolling do not shift later pages. Cursors
+are opaque to clients. Works on Supabase and, in LOCAL mode, on the local
+SQLite database.
+"""
+
+import base64
+import json
+from typing import Any, Dict, List, Optional
+
+from utils.config import config, EnvMode
+
+# Constants
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """Encode the sort key of the last row of a page as an opaque cursor."""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor: str, size: int = 2) -> List[Any]:
+    """Decode a cursor created by encode_cursor.
+
+    Args:
+        cursor: The cursor
+        size: Expected number of sort key values
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def _page(rows: List[Dict[str, Any]], limit: int, id_field: str, total_estimate: Optional[int]) -> Dict[str, Any]:
+    """Trim a query result fetched with limit + 1 rows into a page."""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor([rows[-1]["created_at"], rows[-1][id_field]]) if has_more else None
+    return {"rows": rows, "next_cursor": next_cursor, "has_more": has_more, "total_estimate": total_estimate}
+
+
+def keyset_filter(created_at: str, row_id: str, id_field: str, newest_first: bool = False) -> str:
+    """PostgREST `or` filter selecting the rows after the sort key (created_at, row_id)."""
+    op = "lt" if newest_first else "gt"
+    return f'created_at.{op}."{created_at}",and(created_at.eq."{created_at}",{id_field}.{op}.{row_id})'
+
+
+def _keyset_filter(cursor: str, id_field: str, newest_first: bool) -> str:
+    """PostgREST `or` filter selecting the rows after a cursor."""
+    created_at, row_id = decode_cursor(cursor)
+    return keyset_filter(created_at, row_id, id_field, newest_first)
+
+
+async def get_threads_page(
+    client,
+    user_id: str,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    project_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """Get a page of the threads of every account a user belongs to, newest first.
+
+    Args:
+        client: Supabase client (unused in LOCAL mode)
+        user_id: User whose personal and team accounts own the threads
+        limit: Max threads per page
+        cursor: next_cursor of the previous page
+        project_id: Only list threads of this project
+
+    Returns:
+        Dict with "rows", "next_cursor" (None on the last page), "has_more"
+        and "total_estimate" (the accounts' thread count, approximate on
+        Supabase; only computed for the first page)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    if config.ENV_MODE == EnvMode.LOCAL:
+        from services.local_database import local_db
+        return await local_db.get_user_threads_page(user_id, limit, cursor, project_id)
+
+    # Team accounts too, not only the personal account (whose ID is the user ID)
+    accounts = await client.schema('basejump').from_('account_user').select('account_id') \
+        .eq('user_id', user_id).execute()
+    account_ids = [row['account_id'] for row in accounts.data or []]
+    if not account_ids:
+        return {"rows": [], "next_cursor": None, "has_more": False, "total_estimate": 0}
+
+    query = client.table('threads').select('*', count='estimated' if not cursor else None) \
+        .in_('account_id', account_ids)
+    if project_id:
+        query = query.eq('project_id', project_id)
+    if cursor:
+        query = query.or_(_keyset_filter(cursor, 'thread_id', newest_first=True))
+    result = await query.order('created_at', desc=True).order('thread_id', desc=True).limit(limit + 1).execute()
+    return _page(result.data or [], limit, 'thread_id', result.count)
+
+
+async def get_messages_page(
+    client,
+    thread_id: str,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    latest_first: bool = True
+) -> Dict[str, Any]:
+    """Get a page of a thread's messages.
+
+    With latest_first (the default), the first page holds the latest messages
+    and each next_cursor scrolls further back; otherwise pages run from the
+    start of the thread forwards. Rows within a page are always in
+    chronological order.
+
+    Args:
+        client: Supabase client (unused in LOCAL mode)
+        thread_id: Thread to list
+        limit: Max messages per page
+        cursor: next_cursor of the previous page
+        latest_first: Whether to start at the end of the thread and scroll back
+
+    Returns:
+        Dict with "rows", "next_cursor" (None on the last page), "has_more"
+        and "total_estimate" (only computed for the first page)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    if config.ENV_MODE == EnvMode.LOCAL:
+        from services.local_database import local_db
+        return await local_db.get_thread_messages_page(thread_id, limit, cursor, latest_first)
+
+    query = client.table('messages').select('*', count='estimated' if not cursor else None) \
+        .eq('thread_id', thread_id)
+    if cursor:
+        query = query.or_(_keyset_filter(cursor, 'message_id', newest_first=latest_first))
+    result = await query.order('created_at', desc=latest_first).order('message_id', desc=latest_first) \
+        .limit(limit + 1).execute()
+    page = _page(result.data or [], limit, 'message_id', result.count)
+    if latest_first:
+        page["rows"].reverse()
+    return page
@@ -0,0 +1,156 @@
+"""
+Non-blocking Stripe access for the billing service.
+
+The Stripe SDK is synchronous, so each call would block the event loop for a
+network round-trip. `run_stripe` runs SDK calls in a dedicated thread pool
+instead.
+
+Billing checks before every agent run need a customer's active subscriptions.
+The `SubscriptionCache` keeps them in Redis (shared by all backend instances),
+falling back to process memory when Redis is unavailable. It is filled on first
+read, refreshed by the Stripe webhook on subscription events and bounded by a
+TTL in case a webhook is missed. Concurrent misses for the same customer share
+one Stripe request.
+
+Point STRIPE_API_BASE at a fake Stripe server (e.g. stripe-mock) to run all of
+this without Stripe.
+
+The SDK is imported and configured by `get_stripe` on first use, so it stays
+out of the API's startup (and out of LOCAL mode, which never calls Stripe).
+"""
+
+import asyncio
+import functools
+import json
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.logger import logger
+from utils.singleflight import SingleFlight
+
+# Constants
+STRIPE_MAX_WORKERS = 8          # Threads running Stripe SDK calls
+SUBSCRIPTION_TTL = 300          # Seconds a customer's subscriptions are cached without a webhook
+LOCAL_MAX_ENTRIES = 5000        # Customers kept in process memory when Redis is unavailable
+KEY_PREFIX = "stripe:subscriptions:"
+
+_executor = ThreadPoolExecutor(max_workers=STRIPE_MAX_WORKERS, thread_name_prefix="stripe")
+_stripe = None
+
+
+def get_stripe():
+    """Get the Stripe SDK module, importing and configuring it on first use."""
+    global _stripe
+    if _stripe is None:
+        import stripe
+        from utils.config import config
+        stripe.api_key = config.STRIPE_SECRET_KEY
+        if config.STRIPE_API_BASE:
+            # e.g. a local stripe-mock server for testing
+            stripe.api_base = config.STRIPE_API_BASE
+        _stripe = stripe
+    return _stripe
+
+
+async def run_stripe(fn: Callable, *args, **kwargs) -> Any:
+    """Run a synchronous Stripe SDK call in the Stripe thread pool.
+
+    Example:
+        customer = await run_stripe(get_stripe().Customer.create, email=email)
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+def _to_dict(stripe_object) -> Any:
+    """Convert a Stripe object into plain JSON-compatible data."""
+    return json.loads(str(stripe_object))
+
+
+class SubscriptionCache:
+    """Active Stripe subscriptions per customer, cached in Redis or process memory."""
+
+    def __init__(self, ttl: int = SUBSCRIPTION_TTL):
+        self.ttl = ttl
+        self._local: "OrderedDict[str, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._inflight = SingleFlight()
+        self._generations: Dict[str, int] = {}
+        self.stats = {"hits": 0, "misses": 0, "stripe_requests": 0, "refreshes": 0, "invalidations": 0}
+
+    async def get_active_subscriptions(self, customer_id: str) -> List[Dict[str, Any]]:
+        """Get a customer's active subscriptions (all products), from the cache if possible.
+
+        Args:
+            customer_id: Stripe customer ID
+
+        Returns:
+            The subscriptions as plain dicts, as returned by stripe.Subscription.list
+        """
+        subscriptions = await self._read(customer_id)
+        if subscriptions is not None:
+            self.stats["hits"] += 1
+            return subscriptions
+        self.stats["misses"] += 1
+
+        # Share one Stripe request between concurrent misses
+        return await self._inflight.do(customer_id, lambda: self._fetch(customer_id))
+
+    async def refresh(self, customer_id: str) -> List[Dict[str, Any]]:
+        """Reload a customer's subscriptions from Stripe (e.g. on a subscription webhook)."""
+        self.stats["refreshes"] += 1
+        self._generations[customer_id] = self._generations.get(customer_id, 0) + 1
+        return await self._fetch(customer_id)
+
+    async def invalidate(self, customer_id: str) -> None:
+        """Forget a customer's subscriptions (e.g. after changing them); the next read reloads them."""
+        self.stats["invalidations"] += 1
+        self._generations[customer_id] = self._generations.get(customer_id, 0) + 1
+        self._local.pop(customer_id, None)
+        try:
+            from services import redis
+            await redis.delete(f"{KEY_PREFIX}{customer_id}")
+        except Exception as e:
+            logger.warning(f"Failed to invalidate cached subscriptions of {customer_id}: {str(e)}")
+
+    async def _fetch(self, customer_id: str) -> List[Dict[str, Any]]:
+        generation = self._generations.get(customer_id, 0)
+        self.stats["stripe_requests"] += 1
+        result = await run_stripe(get_stripe().Subscription.list, customer=customer_id, status='active')
+        subscriptions = _to_dict(result).get('data', []) if result else []
+        # After an invalidation during the request, the result may predate the change
+        if self._generations.get(customer_id, 0) == generation:
+            await self._write(customer_id, subscriptions)
+        return subscriptions
+
+    async def _read(self, customer_id: str) -> Optional[List[Dict[str, Any]]]:
+        try:
+            from services import redis
+            value = await redis.get(f"{KEY_PREFIX}{customer_id}")
+            return json.loads(value) if value is not None else None
+        except Exception:
+            entry = self._local.get(customer_id)
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            return entry[1]
+
+    async def _write(self, customer_id: str, subscriptions: List[Dict[str, Any]]) -> None:
+        self._local[customer_id] = (time.monotonic() + self.ttl, subscriptions)
+        self._local.move_to_end(customer_id)
+        if len(self._local) > LOCAL_MAX_ENTRIES:
+            self._local.popitem(last=False)
+        try:
+            from services import redis
+            await redis.set(f"{KEY_PREFIX}{customer_id}", json.dumps(subscriptions), ex=self.ttl)
+        except Exception as e:
+            logger.debug(f"Redis unavailable, caching subscriptions of {customer_id} in memory: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache metrics, including the hit rate."""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {**self.stats, "hit_rate": self.stats["hits"] / lookups if lookups else 0.0}
+
+
+# Process-wide cache
+subscription_cache = SubscriptionCache()
@@ -0,0 +1,316 @@
+"""
+Background token and cost usage accounting.
+
+LLM calls report their usage by pushing a `UsageEvent` onto an in-process queue,
+which never blocks the response stream. A background worker drains the queue in
+batches, computes token counts and costs with litellm off the event loop,
+aggregates them per account, model and day, and adds the totals to the
+`usage_rollups` table (Supabase, or the local SQLite database in LOCAL mode).
+Usage queries then read the precomputed rollups instead of raw rows.
+
+Failed batches are retried a bounded number of times. Each aggregated batch
+carries an ID that the database records with the rollup update, so a write
+that was applied but reported as failed is not counted twice when retried.
+"""
+
+import asyncio
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone, date
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from utils.logger import logger
+from utils.config import config, EnvMode
+
+# Constants
+USAGE_BATCH_SIZE = 100        # Max events aggregated into one write
+USAGE_FLUSH_INTERVAL = 5.0    # Seconds to wait for more events before writing a batch
+USAGE_QUEUE_SIZE = 10000      # Events beyond this are dropped rather than blocking the caller
+ACCOUNT_CACHE_SIZE = 5000     # thread_id -> account_id entries kept in memory
+USAGE_MAX_RETRIES = 5         # Retries of a batch (or of events that could not be aggregated) before it is dropped
+
+_STOP = object()
+
+
+@dataclass
+class UsageEvent:
+    """Usage of a single LLM call, as reported by the caller.
+
+    Either `response` (a non-streaming litellm response) or `prompt_messages` and
+    `completion` (for streamed responses) should be set; token counts and cost
+    are derived from them by the worker when not given explicitly.
+    """
+    thread_id: str
+    model: str
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    cost: Optional[float] = None
+    prompt_messages: Optional[List[Dict[str, Any]]] = None
+    completion: Optional[str] = None
+    response: Any = None
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    attempts: int = 0  # Failed attempts to aggregate the event
+
+
+def _compute_usage(event: UsageEvent) -> Tuple[int, int, float]:
+    """Get the token counts and cost of an event (CPU-bound, runs in a worker thread).
+
+    Returns:
+        Tuple of (prompt_tokens, completion_tokens, cost)
+    """
+    from litellm import completion_cost, token_counter
+
+    prompt_tokens, completion_tokens, cost = event.prompt_tokens, event.completion_tokens, event.cost
+
+    if event.response is not None:
+        usage = getattr(event.response, 'usage', None)
+        if usage is not None:
+            prompt_tokens = prompt_tokens if prompt_tokens is not None else getattr(usage, 'prompt_tokens', None)
+            completion_tokens = completion_tokens if completion_tokens is not None else getattr(usage, 'completion_tokens', None)
+        hidden_params = getattr(event.response, '_hidden_params', None) or {}
+        if cost is None and hidden_params.get('response_cost'):
+            cost = hidden_params['response_cost']
+
+    try:
+        if prompt_tokens is None and event.prompt_messages:
+            prompt_tokens = token_counter(model=event.model, messages=event.prompt_messages)
+        if completion_tokens is None and event.completion:
+            completion_tokens = token_counter(model=event.model, text=event.completion)
+    except Exception as e:
+        logger.warning(f"Could not count tokens for model {event.model}: {str(e)}")
+
+    if cost is None:
+        try:
+            if event.response is not None:
+                cost = completion_cost(completion_response=event.response, model=event.model)
+            else:
+                cost = completion_cost(model=event.model, messages=event.prompt_messages or [], completion=event.completion or "")
+        except Exception as e:
+            # Unknown (e.g. local) models have no price; their tokens are still counted
+            logger.debug(f"Could not calculate cost for model {event.model}: {str(e)}")
+
+    return prompt_tokens or 0, completion_tokens or 0, cost or 0.0
+
+
+class UsagePipeline:
+    """Queue and background worker that aggregate usage events into rollups."""
+
+    def __init__(self, batch_size: int = USAGE_BATCH_SIZE, flush_interval: float = USAGE_FLUSH_INTERVAL,
+                 max_queue_size: int = USAGE_QUEUE_SIZE):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._retry_events: List[UsageEvent] = []  # Events whose aggregation failed
+        self._pending_batches: Deque[Dict[str, Any]] = deque()  # Aggregated batches not written yet
+        self._account_cache: "OrderedDict[str, str]" = OrderedDict()
+        self.stats = {"events": 0, "dropped": 0, "batches": 0, "rows_written": 0, "write_errors": 0,
+                      "aggregation_errors": 0, "lost_events": 0, "lost_batches": 0}
+
+    def start(self) -> None:
+        """Start the background worker on the running event loop."""
+        if self._worker and not self._worker.done():
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._worker = asyncio.create_task(self._run())
+        logger.info("Usage pipeline started")
+
+    async def stop(self) -> None:
+        """Write all queued usage and stop the worker."""
+        if not self._worker or self._worker.done():
+            return
+        await self._queue.put(_STOP)
+        await self._worker
+        logger.info(f"Usage pipeline stopped: {self.stats}")
+
+    def record(self, event: UsageEvent) -> None:
+        """Queue a usage event without waiting.
+
+        Args:
+            event: Usage of one LLM call
+        """
+        if not self._worker or self._worker.done():
+            self.start()
+        try:
+            self._queue.put_nowait(event)
+            self.stats["events"] += 1
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            logger.warning(f"Usage queue full, dropping usage event for thread {event.thread_id}")
+
+    async def _run(self) -> None:
+        """Collect events into batches and write them until stopped."""
+        stopping = False
+        while not stopping:
+            batch = []
+            if self._retry_events or self._pending_batches:
+                # Retry failed work after a flush interval even if no new events arrive
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    await self._process_batch(batch)
+                    continue
+            else:
+                item = await self._queue.get()
+            deadline = asyncio.get_running_loop().time() + self.flush_interval
+            while item is not _STOP:
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            stopping = item is _STOP
+
+            await self._process_batch(batch)
+
+        if self._retry_events or self._pending_batches:
+            lost_events = len(self._retry_events) + sum(b["events"] for b in self._pending_batches)
+            self.stats["lost_events"] += lost_events
+            logger.error(f"Usage pipeline stopped with {lost_events} usage events not written")
+
+    async def _process_batch(self, events: List[UsageEvent]) -> None:
+        """Aggregate a batch of events per account/model/day and write the pending rollup batches."""
+        events = self._retry_events + events
+        self._retry_events = []
+        if events:
+            try:
+                self._pending_batches.append(await self._aggregate(events))
+            except Exception as e:
+                self.stats["aggregation_errors"] += 1
+                logger.error(f"Error aggregating {len(events)} usage events, will retry: {str(e)}", exc_info=True)
+                for event in events:
+                    event.attempts += 1
+                    if event.attempts <= USAGE_MAX_RETRIES:
+                        self._retry_events.append(event)
+                    else:
+                        self.stats["lost_events"] += 1
+                        logger.error(f"Dropping usage event for thread {event.thread_id} after {event.attempts} attempts")
+
+        # Oldest first; a batch that fails stays at the front so the order of retries is kept
+        while self._pending_batches:
+            batch = self._pending_batches[0]
+            try:
+                await self._write_rollups(batch["rows"], batch["batch_id"])
+            except Exception as e:
+                self.stats["write_errors"] += 1
+                batch["attempts"] += 1
+                if batch["attempts"] <= USAGE_MAX_RETRIES:
+                    logger.error(f"Failed to write usage batch {batch['batch_id']} ({len(batch['rows'])} rollups), "
+                                 f"will retry: {str(e)}")
+                    return
+                self._pending_batches.popleft()
+                self.stats["lost_batches"] += 1
+                self.stats["lost_events"] += batch["events"]
+                logger.error(f"Dropping usage batch {batch['batch_id']} ({batch['events']} events) "
+                             f"after {batch['attempts']} attempts: {str(e)}")
+                continue
+            self._pending_batches.popleft()
+            self.stats["batches"] += 1
+            self.stats["rows_written"] += len(batch["rows"])
+            logger.debug(f"Wrote usage batch {batch['batch_id']}: {len(batch['rows'])} rollups from {batch['events']} events")
+
+    async def _aggregate(self, events: List[UsageEvent]) -> Dict[str, Any]:
+        """Sum the usage of events per account, model and day into a batch with a new batch ID."""
+        usages = await asyncio.to_thread(lambda: [_compute_usage(event) for event in events])
+        accounts = await self._resolve_accounts({event.thread_id for event in events})
+
+        rows: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        for event, (prompt_tokens, completion_tokens, cost) in zip(events, usages):
+            account_id = accounts.get(event.thread_id)
+            if not account_id:
+                logger.warning(f"No account found for thread {event.thread_id}, skipping usage event")
+                continue
+            key = (account_id, event.model, event.created_at.date().isoformat())
+            row = rows.setdefault(key, {
+                "account_id": key[0], "model": key[1], "day": key[2],
+                "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0, "request_count": 0
+            })
+            row["prompt_tokens"] += prompt_tokens
+            row["completion_tokens"] += completion_tokens
+            row["cost"] += cost
+            row["request_count"] += 1
+        return {"batch_id": str(uuid.uuid4()), "rows": list(rows.values()), "events": len(events), "attempts": 0}
+
+    async def _resolve_accounts(self, thread_ids: set) -> Dict[str, str]:
+        """Map thread IDs to account IDs, using a cache and one query for the misses."""
+        accounts = {tid: self._account_cache[tid] for tid in thread_ids if tid in self._account_cache}
+        missing = [tid for tid in thread_ids if tid not in accounts]
+        if not missing:
+            return accounts
+
+        found = {}
+        if config.ENV_MODE == EnvMode.LOCAL:
+            found = await _get_local_accounts(missing)
+        else:
+            from services.supabase import DBConnection
+            client = await DBConnection().client
+            result = await client.table('threads').select('thread_id, account_id').in_('thread_id', missing).execute()
+            found = {row['thread_id']: row['account_id'] for row in result.data or [] if row.get('account_id')}
+
+        for thread_id, account_id in found.items():
+            self._account_cache[thread_id] = account_id
+            if len(self._account_cache) > ACCOUNT_CACHE_SIZE:
+                self._account_cache.popitem(last=False)
+        accounts.update(found)
+        return accounts
+
+    async def _write_rollups(self, rows: List[Dict[str, Any]], batch_id: str) -> None:
+        """Add the aggregated rows to the usage_rollups table (once per batch ID)."""
+        if not rows:
+            return
+        if config.ENV_MODE == EnvMode.LOCAL:
+            from services.local_database import local_db
+            await local_db.increment_usage_rollups(rows, batch_id)
+        else:
+            from services.supabase import DBConnection
+            client = await DBConnection().client
+            await client.rpc('increment_usage_rollups', {'p_rows': rows, 'p_batch_id': batch_id}).execute()
+
+
+async def _get_local_accounts(thread_ids: List[str]) -> Dict[str, str]:
+    """Resolve accounts of local threads; threads that are not stored belong to the local user.
+
+    In LOCAL mode the account is the user, so /billing/usage finds the usage under the
+    user ID the local auth resolves to.
+    """
+    from services.local_database import local_db
+    accounts = {}
+    for thread_id in thread_ids:
+        thread = await local_db.get_thread(thread_id)
+        accounts[thread_id] = (thread or {}).get('user_id') or config.LOCAL_USER_ID
+    return accounts
+
+
+async def get_usage_rollups(client, account_id: str, since: date) -> List[Dict[str, Any]]:
+    """Get the precomputed usage of an account per model and day.
+
+    Args:
+        client: Supabase client (unused in LOCAL mode)
+        account_id: Account to get usage for
+        since: First day to include
+
+    Returns:
+        Rollup rows ordered by day
+    """
+    if config.ENV_MODE == EnvMode.LOCAL:
+        from services.local_database import local_db
+        return await local_db.get_usage_rollups(account_id, since.isoformat())
+
+    result = await client.table('usage_rollups') \
+        .select('model, day, prompt_tokens, completion_tokens, cost, request_count') \
+        .eq('account_id', account_id) \
+        .gte('day', since.isoformat()) \
+        .order('day') \
+        .execute()
+    return result.data or []
+
+
+# Process-wide pipeline
+usage_pipeline = UsagePipeline()
@@ -0,0 +1,51 @@
+-- USAGE ROLLUPS:
+-- Token and cost usage aggregated per account, model and day by the backend usage pipeline
+CREATE TABLE usage_rollups (
+    account_id UUID NOT NULL REFERENCES basejump.accounts(id) ON DELETE CASCADE,
+    model TEXT NOT NULL,
+    day DATE NOT NULL,
+    prompt_tokens BIGINT NOT NULL DEFAULT 0,
+    completion_tokens BIGINT NOT NULL DEFAULT 0,
+    cost NUMERIC(14, 6) NOT NULL DEFAULT 0,
+    request_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT TIMEZONE('utc'::text, NOW()) NOT NULL,
+    PRIMARY KEY (account_id, model, day)
+);
+
+CREATE INDEX idx_usage_rollups_account_day ON usage_rollups(account_id, day);
+
+ALTER TABLE usage_rollups ENABLE ROW LEVEL SECURITY;
+
+-- Rollups are written by the backend (service role) only; members can read their account's usage
+CREATE POLICY usage_rollup_select_policy ON usage_rollups
+    FOR SELECT
+    USING (basejump.has_role_on_account(account_id) = true);
+
+-- Add a batch of usage deltas to the rollups in a single statement
+CREATE OR REPLACE FUNCTION increment_usage_rollups(p_rows JSONB)
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+    INSERT INTO usage_rollups AS r (account_id, model, day, prompt_tokens, completion_tokens, cost, request_count)
+    SELECT
+        (row->>'account_id')::UUID,
+        row->>'model',
+        (row->>'day')::DATE,
+        COALESCE((row->>'prompt_tokens')::BIGINT, 0),
+        COALESCE((row->>'completion_tokens')::BIGINT, 0),
+        COALESCE((row->>'cost')::NUMERIC, 0),
+        COALESCE((row->>'request_count')::INTEGER, 0)
+    FROM jsonb_array_elements(p_rows) AS row
+    ON CONFLICT (account_id, model, day) DO UPDATE SET
+        prompt_tokens = r.prompt_tokens + EXCLUDED.prompt_tokens,
+        completion_tokens = r.completion_tokens + EXCLUDED.completion_tokens,
+        cost = r.cost + EXCLUDED.cost,
+        request_count = r.request_count + EXCLUDED.request_count,
+        updated_at = TIMEZONE('utc'::text, NOW());
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION increment_usage_rollups FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION increment_usage_rollups TO service_role;
@@ -0,0 +1,99 @@
+-- ROLLING SUMMARIES:
+-- Summaries written by the background summariser cover the messages up to a boundary
+-- (metadata.boundary_created_at) rather than everything before the summary itself, so
+-- the messages between the boundary and the summary stay in the context verbatim.
+CREATE OR REPLACE FUNCTION get_llm_formatted_messages(p_thread_id UUID)
+RETURNS JSONB
+SECURITY DEFINER -- Changed to SECURITY DEFINER to allow service role access
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    messages_array JSONB := '[]'::JSONB;
+    has_access BOOLEAN;
+    current_role TEXT;
+    latest_summary_id UUID;
+    latest_summary_time TIMESTAMP WITH TIME ZONE;
+    latest_summary_metadata JSONB;
+    boundary_time TIMESTAMP WITH TIME ZONE;
+    is_project_public BOOLEAN;
+BEGIN
+    -- Get current role
+    SELECT current_user INTO current_role;
+
+    -- Check if associated project is public
+    SELECT p.is_public INTO is_project_public
+    FROM threads t
+    LEFT JOIN projects p ON t.project_id = p.project_id
+    WHERE t.thread_id = p_thread_id;
+
+    -- Skip access check for service_role or public projects
+    IF current_role = 'authenticated' AND NOT is_project_public THEN
+        -- Check if thread exists and user has access
+        SELECT EXISTS (
+            SELECT 1 FROM threads t
+            LEFT JOIN projects p ON t.project_id = p.project_id
+            WHERE t.thread_id = p_thread_id
+            AND (
+                basejump.has_role_on_account(t.account_id) = true OR
+                basejump.has_role_on_account(p.account_id) = true
+            )
+        ) INTO has_access;
+
+        IF NOT has_access THEN
+            RAISE EXCEPTION 'Thread not found or access denied';
+        END IF;
+    END IF;
+
+    -- Find the latest summary message if it exists
+    SELECT message_id, created_at,
+        CASE WHEN jsonb_typeof(metadata) = 'string' THEN (metadata #>> '{}')::jsonb ELSE metadata END
+    INTO latest_summary_id, latest_summary_time, latest_summary_metadata
+    FROM messages
+    WHERE thread_id = p_thread_id
+    AND type = 'summary'
+    AND is_llm_message = TRUE
+    ORDER BY created_at DESC
+    LIMIT 1;
+
+    -- Rolling summaries end at their boundary; older summaries cover everything before them
+    boundary_time := COALESCE(
+        (latest_summary_metadata->>'boundary_created_at')::TIMESTAMP WITH TIME ZONE,
+        latest_summary_time
+    );
+
+    -- Parse content if it's stored as a string and return proper JSON objects
+    WITH parsed_messages AS (
+        SELECT
+            message_id,
+            CASE
+                WHEN jsonb_typeof(content) = 'string' THEN content::text::jsonb
+                ELSE content
+            END AS parsed_content,
+            created_at,
+            type
+        FROM messages
+        WHERE thread_id = p_thread_id
+        AND is_llm_message = TRUE
+        AND (
+            -- Include the latest summary and all non-summary messages after its boundary,
+            -- or all messages if no summary exists
+            latest_summary_id IS NULL
+            OR message_id = latest_summary_id
+            OR (created_at > boundary_time AND type <> 'summary')
+        )
+    )
+    SELECT JSONB_AGG(parsed_content ORDER BY (message_id = latest_summary_id) DESC, created_at)
+    INTO messages_array
+    FROM parsed_messages;
+
+    -- Handle the case when no messages are found
+    IF messages_array IS NULL THEN
+        RETURN '[]'::JSONB;
+    END IF;
+
+    RETURN messages_array;
+END;
+$$;
+
+-- Grant execute permissions
+GRANT EXECUTE ON FUNCTION get_llm_formatted_messages TO authenticated, anon, service_role;
@@ -0,0 +1,5 @@
+-- KEYSET PAGINATION:
+-- Thread lists and message histories are paged by (created_at, id); these indexes
+-- serve each page as a single range scan (see services/pagination.py).
+CREATE INDEX IF NOT EXISTS idx_threads_account_created ON threads(account_id, created_at DESC, thread_id DESC);
+CREATE INDEX IF NOT EXISTS idx_messages_thread_created ON messages(thread_id, created_at DESC, message_id DESC);
@@ -0,0 +1,26 @@
+-- THREAD ACCESS CHECK:
+-- Everything verify_thread_access needs in a single round-trip: the thread's account and
+-- project, whether the project is public and whether the user is a member of the account.
+CREATE OR REPLACE FUNCTION get_thread_access(p_thread_id UUID, p_user_id UUID)
+RETURNS TABLE (account_id UUID, project_id UUID, is_public BOOLEAN, is_member BOOLEAN)
+SECURITY DEFINER
+SET search_path = public
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        t.account_id,
+        t.project_id,
+        COALESCE(p.is_public, FALSE),
+        EXISTS (
+            SELECT 1 FROM basejump.account_user au
+            WHERE au.account_id = t.account_id AND au.user_id = p_user_id
+        )
+    FROM threads t
+    LEFT JOIN projects p ON p.project_id = t.project_id
+    WHERE t.thread_id = p_thread_id;
+$$;
+
+-- Reveals account membership of any user, so only the backend may call it
+REVOKE EXECUTE ON FUNCTION get_thread_access FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION get_thread_access TO service_role;
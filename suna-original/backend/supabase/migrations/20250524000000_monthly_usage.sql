@@ -0,0 +1,142 @@
+-- MONTHLY USAGE COUNTERS:
+-- Agent run seconds per account and month, kept up to date while runs progress so the
+-- billing check before every agent run reads one row instead of summing the account's runs
+CREATE TABLE monthly_usage (
+    account_id UUID NOT NULL REFERENCES basejump.accounts(id) ON DELETE CASCADE,
+    month DATE NOT NULL,
+    run_seconds NUMERIC(14, 3) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT TIMEZONE('utc'::text, NOW()) NOT NULL,
+    PRIMARY KEY (account_id, month)
+);
+
+ALTER TABLE monthly_usage ENABLE ROW LEVEL SECURITY;
+
+-- Counters are written by the backend (service role) only; members can read their account's usage
+CREATE POLICY monthly_usage_select_policy ON monthly_usage
+    FOR SELECT
+    USING (basejump.has_role_on_account(account_id) = true);
+
+-- Seconds of each run already added to its account's counter
+ALTER TABLE agent_runs ADD COLUMN billed_seconds NUMERIC(14, 3) NOT NULL DEFAULT 0;
+
+CREATE INDEX idx_agent_runs_started_at ON agent_runs(started_at);
+
+-- Add the time a run has been going since its last update to its account's counter for the
+-- month the run started in. The run row is locked, so heartbeats and the final update may
+-- race or repeat and every second is still counted once.
+CREATE OR REPLACE FUNCTION record_agent_run_usage(p_agent_run_id UUID)
+RETURNS NUMERIC
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_account_id UUID;
+    v_month DATE;
+    v_delta NUMERIC;
+BEGIN
+    SELECT
+        t.account_id,
+        DATE_TRUNC('month', r.started_at AT TIME ZONE 'UTC')::DATE,
+        GREATEST(0, EXTRACT(EPOCH FROM COALESCE(r.completed_at, NOW()) - r.started_at)) - r.billed_seconds
+    INTO v_account_id, v_month, v_delta
+    FROM agent_runs r
+    JOIN threads t ON t.thread_id = r.thread_id
+    WHERE r.id = p_agent_run_id
+    FOR UPDATE OF r;
+
+    IF v_account_id IS NULL OR v_delta <= 0 THEN
+        RETURN 0;
+    END IF;
+
+    UPDATE agent_runs SET billed_seconds = billed_seconds + v_delta WHERE id = p_agent_run_id;
+
+    INSERT INTO monthly_usage AS u (account_id, month, run_seconds)
+    VALUES (v_account_id, v_month, v_delta)
+    ON CONFLICT (account_id, month) DO UPDATE SET
+        run_seconds = u.run_seconds + EXCLUDED.run_seconds,
+        updated_at = TIMEZONE('utc'::text, NOW());
+
+    RETURN v_delta;
+END;
+$$;
+
+-- Usage of a month recomputed from the raw runs. Running runs count up to their last
+-- heartbeat, so a healthy counter matches exactly.
+CREATE OR REPLACE FUNCTION monthly_usage_from_runs(p_month DATE)
+RETURNS TABLE (account_id UUID, run_seconds NUMERIC)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    SELECT
+        t.account_id,
+        SUM(CASE
+            WHEN r.completed_at IS NULL THEN r.billed_seconds
+            ELSE GREATEST(0, EXTRACT(EPOCH FROM r.completed_at - r.started_at))
+        END)
+    FROM agent_runs r
+    JOIN threads t ON t.thread_id = r.thread_id
+    WHERE r.started_at >= p_month::TIMESTAMP AT TIME ZONE 'UTC'
+      AND r.started_at < (p_month + INTERVAL '1 month')::TIMESTAMP AT TIME ZONE 'UTC'
+      AND t.account_id IS NOT NULL
+    GROUP BY t.account_id;
+$$;
+
+-- Compare the counters of a month with the raw runs and return the accounts that drifted
+-- by more than p_tolerance seconds. With p_fix, the billed_seconds of the month's completed
+-- runs and the counters that drifted are reset to the recomputed values.
+CREATE OR REPLACE FUNCTION reconcile_monthly_usage(p_month DATE, p_fix BOOLEAN DEFAULT FALSE, p_tolerance NUMERIC DEFAULT 1)
+RETURNS TABLE (account_id UUID, counted_seconds NUMERIC, actual_seconds NUMERIC)
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+#variable_conflict use_column
+BEGIN
+    RETURN QUERY
+    SELECT
+        COALESCE(a.account_id, u.account_id),
+        COALESCE(u.run_seconds, 0),
+        COALESCE(a.run_seconds, 0)
+    FROM monthly_usage_from_runs(p_month) a
+    FULL OUTER JOIN (SELECT * FROM monthly_usage WHERE month = p_month) u ON u.account_id = a.account_id
+    WHERE ABS(COALESCE(a.run_seconds, 0) - COALESCE(u.run_seconds, 0)) > p_tolerance;
+
+    IF p_fix THEN
+        UPDATE agent_runs r
+        SET billed_seconds = GREATEST(0, EXTRACT(EPOCH FROM r.completed_at - r.started_at))
+        WHERE r.completed_at IS NOT NULL
+          AND r.started_at >= p_month::TIMESTAMP AT TIME ZONE 'UTC'
+          AND r.started_at < (p_month + INTERVAL '1 month')::TIMESTAMP AT TIME ZONE 'UTC'
+          AND r.billed_seconds <> GREATEST(0, EXTRACT(EPOCH FROM r.completed_at - r.started_at));
+
+        INSERT INTO monthly_usage AS u (account_id, month, run_seconds)
+        SELECT a.account_id, p_month, a.run_seconds FROM monthly_usage_from_runs(p_month) a
+        ON CONFLICT (account_id, month) DO UPDATE SET
+            run_seconds = EXCLUDED.run_seconds,
+            updated_at = TIMEZONE('utc'::text, NOW())
+        WHERE ABS(u.run_seconds - EXCLUDED.run_seconds) > p_tolerance;
+
+        -- Counters without any runs left (e.g. the runs were deleted)
+        UPDATE monthly_usage u SET run_seconds = 0, updated_at = TIMEZONE('utc'::text, NOW())
+        WHERE u.month = p_month AND u.run_seconds <> 0
+          AND NOT EXISTS (SELECT 1 FROM monthly_usage_from_runs(p_month) a WHERE a.account_id = u.account_id);
+    END IF;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION record_agent_run_usage FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION monthly_usage_from_runs FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION reconcile_monthly_usage FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION record_agent_run_usage TO service_role;
+GRANT EXECUTE ON FUNCTION monthly_usage_from_runs TO service_role;
+GRANT EXECUTE ON FUNCTION reconcile_monthly_usage TO service_role;
+
+-- Seed the current month's counters from the runs so far (earlier months are not billed)
+UPDATE agent_runs
+SET billed_seconds = GREATEST(0, EXTRACT(EPOCH FROM COALESCE(completed_at, NOW()) - started_at))
+WHERE started_at >= DATE_TRUNC('month', NOW() AT TIME ZONE 'UTC') AT TIME ZONE 'UTC';
+
+SELECT * FROM reconcile_monthly_usage(DATE_TRUNC('month', NOW() AT TIME ZONE 'UTC')::DATE, TRUE, 0);
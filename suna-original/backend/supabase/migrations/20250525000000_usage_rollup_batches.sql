@@ -0,0 +1,54 @@
+-- IDEMPOTENT USAGE ROLLUPS:
+-- The usage pipeline retries batches whose write failed. A write can commit and still be
+-- reported as failed (e.g. the connection drops before the response), so each batch carries
+-- an ID and a batch that was already applied is ignored instead of being counted twice.
+CREATE TABLE usage_rollup_batches (
+    batch_id UUID PRIMARY KEY,
+    applied_at TIMESTAMP WITH TIME ZONE DEFAULT TIMEZONE('utc'::text, NOW()) NOT NULL
+);
+
+CREATE INDEX idx_usage_rollup_batches_applied_at ON usage_rollup_batches(applied_at);
+
+ALTER TABLE usage_rollup_batches ENABLE ROW LEVEL SECURITY;
+
+DROP FUNCTION IF EXISTS increment_usage_rollups(JSONB);
+
+-- Add a batch of usage deltas to the rollups, once per batch ID
+CREATE OR REPLACE FUNCTION increment_usage_rollups(p_rows JSONB, p_batch_id UUID)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    INSERT INTO usage_rollup_batches (batch_id) VALUES (p_batch_id)
+    ON CONFLICT (batch_id) DO NOTHING;
+    IF NOT FOUND THEN
+        RETURN FALSE;
+    END IF;
+
+    -- Retries happen within minutes; older batch IDs are not needed
+    DELETE FROM usage_rollup_batches WHERE applied_at < TIMEZONE('utc'::text, NOW()) - INTERVAL '7 days';
+
+    INSERT INTO usage_rollups AS r (account_id, model, day, prompt_tokens, completion_tokens, cost, request_count)
+    SELECT
+        (row->>'account_id')::UUID,
+        row->>'model',
+        (row->>'day')::DATE,
+        COALESCE((row->>'prompt_tokens')::BIGINT, 0),
+        COALESCE((row->>'completion_tokens')::BIGINT, 0),
+        COALESCE((row->>'cost')::NUMERIC, 0),
+        COALESCE((row->>'request_count')::INTEGER, 0)
+    FROM jsonb_array_elements(p_rows) AS row
+    ON CONFLICT (account_id, model, day) DO UPDATE SET
+        prompt_tokens = r.prompt_tokens + EXCLUDED.prompt_tokens,
+        completion_tokens = r.completion_tokens + EXCLUDED.completion_tokens,
+        cost = r.cost + EXCLUDED.cost,
+        request_count = r.request_count + EXCLUDED.request_count,
+        updated_at = TIMEZONE('utc'::text, NOW());
+    RETURN TRUE;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION increment_usage_rollups FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION increment_usage_rollups TO service_role;
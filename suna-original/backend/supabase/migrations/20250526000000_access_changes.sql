@@ -0,0 +1,62 @@
+-- ACCESS CHANGE LOG:
+-- Sharing and ownership change mostly outside the backend (the frontend writes projects,
+-- threads and account members through Supabase). Triggers record every change that can
+-- affect a thread access decision, and each backend instance polls this log to drop the
+-- affected entries of its access cache, so revocations apply within seconds instead of
+-- when the cached decisions expire.
+CREATE TABLE access_changes (
+    id BIGSERIAL PRIMARY KEY,
+    kind TEXT NOT NULL,  -- 'thread', 'project' or 'account'
+    thread_id UUID,
+    project_id UUID,
+    account_id UUID,
+    user_id UUID,
+    changed_at TIMESTAMP WITH TIME ZONE DEFAULT TIMEZONE('utc'::text, NOW()) NOT NULL
+);
+
+CREATE INDEX idx_access_changes_changed_at ON access_changes(changed_at);
+
+-- Read by the backend (service role) only
+ALTER TABLE access_changes ENABLE ROW LEVEL SECURITY;
+
+CREATE OR REPLACE FUNCTION log_access_change()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_row RECORD;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        v_row := OLD;
+    ELSE
+        v_row := NEW;
+    END IF;
+    IF TG_TABLE_NAME = 'threads' THEN
+        INSERT INTO access_changes (kind, thread_id) VALUES ('thread', v_row.thread_id);
+    ELSIF TG_TABLE_NAME = 'projects' THEN
+        INSERT INTO access_changes (kind, project_id) VALUES ('project', v_row.project_id);
+    ELSE
+        INSERT INTO access_changes (kind, account_id, user_id) VALUES ('account', v_row.account_id, v_row.user_id);
+    END IF;
+    -- Instances poll every few seconds; older entries are not needed
+    DELETE FROM access_changes WHERE changed_at < TIMEZONE('utc'::text, NOW()) - INTERVAL '1 day';
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER log_thread_access_change
+    AFTER UPDATE OF account_id, project_id OR DELETE ON threads
+    FOR EACH ROW EXECUTE FUNCTION log_access_change();
+
+CREATE TRIGGER log_project_access_change
+    AFTER UPDATE OF is_public, account_id OR DELETE ON projects
+    FOR EACH ROW EXECUTE FUNCTION log_access_change();
+
+CREATE TRIGGER log_account_member_change
+    AFTER INSERT OR UPDATE OR DELETE ON basejump.account_user
+    FOR EACH ROW EXECUTE FUNCTION log_access_change();
+
+-- For databases that created get_thread_access before it pinned its search_path
+ALTER FUNCTION get_thread_access(UUID, UUID) SET search_path = public;
@@ -0,0 +1,86 @@
+import asyncio
+
+from utils.access_cache import AccessCache
+
+
+class FakeQuery:
+    """Just enough of the Supabase query builder to read access_changes."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.min_id = None
+        self.descending = False
+        self.count = None
+
+    def select(self, columns):
+        return self
+
+    def gt(self, column, value):
+        self.min_id = value
+        return self
+
+    def order(self, column, desc=False):
+        self.descending = desc
+        return self
+
+    def limit(self, count):
+        self.count = count
+        return self
+
+    async def execute(self):
+        rows = [row for row in self.rows if self.min_id is None or row["id"] > self.min_id]
+        rows.sort(key=lambda row: row["id"], reverse=self.descending)
+
+        class Result:
+            data = rows[:self.count]
+        return Result()
+
+
+class FakeClient:
+    def __init__(self):
+        self.rows = []
+
+    def table(self, name):
+        assert name == "access_changes"
+        return FakeQuery(self.rows)
+
+    def log(self, kind, **ids):
+        self.rows.append({"id": len(self.rows) + 1, "kind": kind, "thread_id": None, "project_id": None,
+                          "account_id": None, "user_id": None, **ids})
+
+
+def cache_with_threads():
+    cache = AccessCache()
+    cache.set_thread("t1", "p1", "a1", False)
+    cache.set_thread("t2", "p2", "a2", True)
+    cache.set_decision("u1", "t1", True)
+    cache.set_decision("u2", "t2", True)
+    return cache
+
+
+def test_poll_starts_at_end_of_log():
+    client = FakeClient()
+    client.log("thread", thread_id="t1")
+    cache = cache_with_threads()
+
+    assert asyncio.run(cache.poll_changes(client)) == 0
+    assert cache.get_decision("u1", "t1") is True
+
+
+def test_poll_applies_logged_changes():
+    client = FakeClient()
+    cache = cache_with_threads()
+    asyncio.run(cache.poll_changes(client))
+
+    client.log("project", project_id="p2")
+    assert asyncio.run(cache.poll_changes(client)) == 1
+    assert cache.get_thread("t2") is None
+    assert cache.get_decision("u2", "t2") is None
+    assert cache.get_decision("u1", "t1") is True
+
+    client.log("account", account_id="a1", user_id="u1")
+    assert asyncio.run(cache.poll_changes(client)) == 1
+    assert cache.get_decision("u1", "t1") is None
+
+    # Changes already applied are not read again
+    assert asyncio.run(cache.poll_changes(client)) == 0
@@ -0,0 +1,48 @@
+import asyncio
+import os
+
+from utils.scripts.batch_runner import BatchRunner
+
+
+def run(runner, items, worker, **kwargs):
+    return asyncio.run(runner.run(items, key=str, worker=worker, **kwargs))
+
+
+def test_checkpoint_removed_after_fully_successful_run(tmp_path):
+    path = str(tmp_path / "job.checkpoint.jsonl")
+    items = list(range(5))
+
+    stats = run(BatchRunner("job", checkpoint_path=path), items, lambda item: item)
+    assert stats.succeeded == 5
+    assert not os.path.exists(path)
+
+    stats = run(BatchRunner("job", checkpoint_path=path), items, lambda item: item)
+    assert stats.skipped == 0
+    assert stats.succeeded == 5
+
+
+def test_failed_and_unfinished_items_are_retried_by_next_run(tmp_path):
+    path = str(tmp_path / "job.checkpoint.jsonl")
+    items = list(range(6))
+
+    def worker(item):
+        if item == 0:
+            raise ValueError("boom")
+        return "skipped" if item == 1 else "archived"
+
+    stats = run(BatchRunner("job", checkpoint_path=path, max_retries=0), items, worker,
+                finished=lambda outcome: outcome == "archived")
+    assert (stats.succeeded, stats.failed, stats.unfinished) == (5, 1, 1)
+    assert os.path.exists(path)
+
+    seen = []
+
+    def resume(item):
+        seen.append(item)
+        return "archived"
+
+    stats = run(BatchRunner("job", checkpoint_path=path), items, resume,
+                finished=lambda outcome: outcome == "archived")
+    assert sorted(seen) == [0, 1]
+    assert stats.skipped == 4
+    assert not os.path.exists(path)
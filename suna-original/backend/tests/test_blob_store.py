@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+import agent.tools.tool_output_tool as tool_output_tool
+import agentpress.response_processor as response_processor
+from agentpress.blob_store import BlobStore, BLOB_THRESHOLD_CHARS
+from agentpress.response_processor import ResponseProcessor
+from agentpress.tool import ToolResult
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = BlobStore(str(tmp_path))
+    monkeypatch.setattr(tool_output_tool, "blob_store", store)
+    monkeypatch.setattr(response_processor, "blob_store", store)
+    return store
+
+
+def test_large_output_can_be_paged_from_start_to_end(store):
+    processor = object.__new__(ResponseProcessor)
+    tool = tool_output_tool.ToolOutputTool()
+    output = "".join(f"line {i:06d}\n" for i in range(10000))
+
+    stub, blob_id = asyncio.run(processor._offload_large_output(ToolResult(success=True, output=output), "execute_command"))
+    assert blob_id is not None
+    assert len(stub.output) < len(output)
+
+    pages = []
+    page = 1
+    while True:
+        result = asyncio.run(tool.read_tool_output(blob_id, page))
+        assert result.success
+        # Each page must come back to the conversation verbatim, not as another stub
+        delivered, delivered_blob_id = asyncio.run(processor._offload_large_output(result, "read_tool_output"))
+        assert delivered_blob_id is None
+        assert len(delivered.output) <= BLOB_THRESHOLD_CHARS
+
+        header, text = delivered.output.split("\n", 1)
+        pages.append(text)
+        total_pages = int(header.rstrip("]").rsplit(" ", 1)[1])
+        if page == total_pages:
+            break
+        page += 1
+
+    assert "".join(pages) == output
+
+
+def test_read_tool_output_rejects_page_past_end(store):
+    blob_id = store.put("x" * (BLOB_THRESHOLD_CHARS * 2))
+    result = asyncio.run(tool_output_tool.ToolOutputTool().read_tool_output(blob_id, 99))
+    assert not result.success
@@ -0,0 +1,31 @@
+import asyncio
+import os
+
+import pytest
+
+from sandbox.file_edits import apply_edits, write_op
+from sandbox.local_sandbox import LocalSandbox
+
+
+@pytest.fixture
+def sandbox():
+    sandbox = LocalSandbox()
+    yield sandbox
+    sandbox.remove()
+
+
+def test_quote_heavy_spec_is_uploaded(sandbox, monkeypatch):
+    with open(os.path.join(sandbox.workspace, "quotes.txt"), "w") as f:
+        f.write("old\n")
+    uploads = []
+    upload_file = sandbox.fs.upload_file
+    monkeypatch.setattr(sandbox.fs, "upload_file", lambda path, data: uploads.append(path) or upload_file(path, data))
+
+    # Small as JSON, but each ' takes 5 bytes once quoted for the shell
+    content = "'" * 30000
+    files = asyncio.run(apply_edits(sandbox, [write_op("quotes.txt", content)], root=sandbox.workspace))
+
+    assert list(files) == ["quotes.txt"]
+    assert len(uploads) == 1
+    with open(os.path.join(sandbox.workspace, "quotes.txt")) as f:
+        assert f.read() == content
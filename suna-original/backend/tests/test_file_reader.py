@@ -0,0 +1,51 @@
+import asyncio
+import os
+
+import pytest
+
+from sandbox.file_reader import FileReader
+from sandbox.local_sandbox import LocalSandbox
+
+
+@pytest.fixture
+def sandbox():
+    sandbox = LocalSandbox()
+    yield sandbox
+    sandbox.remove()
+
+
+def write(sandbox, name, data):
+    path = os.path.join(sandbox.workspace, name)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def test_stream_continues_after_the_first_chunk(sandbox):
+    data = bytes(range(256)) * 20
+    path = write(sandbox, "data.bin", data)
+    reader = FileReader()
+
+    async def main():
+        first = await reader.read_bytes(sandbox, path, 0, 1000)
+        chunks = [chunk async for chunk in reader.iter_bytes(sandbox, path, 0, first[1], 1000, first=first)]
+        return first, chunks
+
+    first, chunks = asyncio.run(main())
+    assert first[1] == len(data)
+    assert b"".join(chunks) == data
+    assert len(chunks) == 6
+    assert reader.stats["byte_reads"] == 6
+
+
+def test_stream_fails_when_the_file_changed_after_the_first_chunk(sandbox):
+    path = write(sandbox, "data.bin", b"x" * 3000)
+    reader = FileReader()
+
+    async def main():
+        first = await reader.read_bytes(sandbox, path, 0, 1000)
+        write(sandbox, "data.bin", b"y" * 4000)
+        return [chunk async for chunk in reader.iter_bytes(sandbox, path, 0, first[1], 1000, first=first)]
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(main())
@@ -0,0 +1,104 @@
+import asyncio
+import time
+
+import pytest
+
+from sandbox.handle_cache import SandboxHandleCache
+
+
+class FakeSandbox:
+    def __init__(self, sandbox_id):
+        self.id = sandbox_id
+
+
+def test_least_recently_used_handles_are_evicted():
+    cache = SandboxHandleCache(max_handles=2)
+    cache.put(FakeSandbox("s1"))
+    cache.put(FakeSandbox("s2"))
+    asyncio.run(cache.get("s1"))
+    cache.put(FakeSandbox("s3"))
+
+    assert set(cache._handles) == {"s1", "s3"}
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_idle_handles_are_evicted():
+    cache = SandboxHandleCache(idle_ttl=60)
+    cache.put(FakeSandbox("s1")).validated_at = time.monotonic() - 120
+    cache.put(FakeSandbox("s2"))
+
+    assert set(cache._handles) == {"s2"}
+
+
+def test_project_entries_are_bounded():
+    cache = SandboxHandleCache(max_projects=2, project_ttl=60)
+    for i in range(5):
+        cache.remember_project(f"p{i}", f"s{i}", None)
+
+    assert list(cache._projects) == ["p3", "p4"]
+
+
+def test_failed_load_forgets_sandbox_and_its_projects(monkeypatch):
+    cache = SandboxHandleCache(ttl=0)
+    cache.put(FakeSandbox("s1"))
+    cache.remember_project("p1", "s1", "secret")
+    cache.remember_project("p2", "s2", None)
+
+    async def deleted(sandbox_id):
+        raise RuntimeError(f"Sandbox {sandbox_id} not found")
+    monkeypatch.setattr(cache, "_load", deleted)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(cache.get("s1"))
+    assert "s1" not in cache._handles
+    assert list(cache._projects) == ["p2"]
+
+
+def test_waiter_takes_over_when_the_owner_is_cancelled(monkeypatch):
+    cache = SandboxHandleCache()
+    loads = []
+
+    async def load(sandbox_id):
+        loads.append(sandbox_id)
+        if len(loads) == 1:
+            # The first load never finishes on its own
+            await asyncio.Event().wait()
+        return cache.put(FakeSandbox(sandbox_id))
+    monkeypatch.setattr(cache, "_load", load)
+
+    async def main():
+        owner = asyncio.create_task(cache.get("s1"))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get("s1"))
+        await asyncio.sleep(0)
+        # e.g. the user stopped the run of the first tool call
+        owner.cancel()
+        handle = await asyncio.wait_for(waiter, 5)
+        assert owner.cancelled()
+        return handle
+
+    assert asyncio.run(main()).sandbox_id == "s1"
+    assert loads == ["s1", "s1"]
+    assert cache.get_stats()["shared_loads"] == 1
+
+
+def test_invalidate_forgets_the_workspace_manifest():
+    from sandbox.workspace_manifest import workspace_manifests
+    cache = SandboxHandleCache()
+    cache.put(FakeSandbox("s1"))
+    manifest = workspace_manifests.get("s1")
+
+    cache.invalidate("s1")
+    assert workspace_manifests.get("s1") is not manifest
+    workspace_manifests.forget("s1")
+
+
+def test_workspace_manifests_are_bounded():
+    from sandbox.workspace_manifest import WorkspaceManifests
+    manifests = WorkspaceManifests(max_manifests=2)
+    first = manifests.get("s1")
+    manifests.get("s2")
+    assert manifests.get("s1") is first
+    manifests.get("s3")
+
+    assert list(manifests._manifests) == ["s1", "s3"]
@@ -0,0 +1,77 @@
+import asyncio
+
+import services.pagination as pagination
+from services.pagination import get_threads_page
+from utils.config import EnvMode
+
+
+class FakeQuery:
+    """Just enough of the Supabase query builder to filter and order rows."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.filters = []
+        self.count = None
+
+    def select(self, columns, count=None):
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row[column] == value)
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(lambda row: row[column] in values)
+        return self
+
+    def order(self, column, desc=False):
+        return self
+
+    def limit(self, count):
+        self.count = count
+        return self
+
+    async def execute(self):
+        rows = [row for row in self.rows if all(f(row) for f in self.filters)]
+        rows.sort(key=lambda row: (row.get("created_at", ""), row.get("thread_id", "")), reverse=True)
+
+        class Result:
+            data = rows[:self.count]
+            count = len(rows)
+        return Result()
+
+
+class FakeClient:
+    def __init__(self, memberships, threads):
+        self.tables = {"account_user": memberships, "threads": threads}
+
+    def schema(self, name):
+        return self
+
+    def from_(self, name):
+        return self.table(name)
+
+    def table(self, name):
+        return FakeQuery(self.tables[name])
+
+
+def test_threads_of_team_accounts_are_listed(monkeypatch):
+    monkeypatch.setattr(pagination.config, "ENV_MODE", EnvMode.PRODUCTION)
+    client = FakeClient(
+        [{"user_id": "u1", "account_id": "u1"}, {"user_id": "u1", "account_id": "team"},
+         {"user_id": "u2", "account_id": "other"}],
+        [{"thread_id": "t1", "account_id": "u1", "created_at": "2025-01-01"},
+         {"thread_id": "t2", "account_id": "team", "created_at": "2025-01-02"},
+         {"thread_id": "t3", "account_id": "other", "created_at": "2025-01-03"}])
+
+    page = asyncio.run(get_threads_page(client, "u1"))
+    assert [row["thread_id"] for row in page["rows"]] == ["t2", "t1"]
+    assert not page["has_more"]
+
+
+def test_user_without_accounts_has_no_threads(monkeypatch):
+    monkeypatch.setattr(pagination.config, "ENV_MODE", EnvMode.PRODUCTION)
+    client = FakeClient([], [{"thread_id": "t1", "account_id": "u1", "created_at": "2025-01-01"}])
+
+    page = asyncio.run(get_threads_page(client, "u1"))
+    assert page["rows"] == [] and page["next_cursor"] is None
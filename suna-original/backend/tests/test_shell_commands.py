@@ -0,0 +1,124 @@
+import asyncio
+import time
+
+import pytest
+
+import sandbox.shell_commands as shell_commands
+from sandbox.handle_cache import SandboxHandle
+from sandbox.local_sandbox import LocalSandbox
+from sandbox.shell_commands import CommandOutput, ShellCommand, kill_command, start_command
+
+
+def test_output_keeps_head_and_tail():
+    output = CommandOutput(head_chars=5, tail_chars=5)
+    output.append("abc")
+    output.append("defghijklmnop")
+
+    assert (output.head, output.tail) == ("abcde", "lmnop")
+    assert output.total == 16
+    assert output.omitted == 6
+    assert output.text() == "abcde\n... [6 characters omitted] ...\nlmnop"
+
+
+def test_output_since_position():
+    output = CommandOutput(head_chars=5, tail_chars=5)
+    output.append("0123456789abcdef")
+
+    # From the start: the head, then the dropped middle, then the tail
+    assert output.since(0, 100) == ("01234bcdef", 6, 16)
+    # From inside the tail: only what follows
+    assert output.since(14, 100) == ("ef", 0, 16)
+    # Over max_chars: the most recent characters are kept
+    assert output.since(0, 3) == ("def", 13, 16)
+    assert output.since(16, 100) == ("", 0, 16)
+
+
+def test_wait_passes_output_on_in_batches(monkeypatch):
+    monkeypatch.setattr(shell_commands, "PROGRESS_INTERVAL", 0.05)
+    monkeypatch.setattr(shell_commands, "PROGRESS_MAX_CHARS", 4)
+    command = ShellCommand("c1", "s1", "default", "build", "/workspace", False)
+    batches = []
+
+    async def follow():
+        for part in ["one ", "two three ", "four"]:
+            command.output.append(part)
+            await asyncio.sleep(0.12)
+        command.exit_code = 0
+
+    async def main():
+        command.follower = asyncio.create_task(follow())
+        return await command.wait(5, lambda text, omitted: batches.append((text, omitted)))
+
+    assert asyncio.run(main())
+    assert command.status == "completed"
+    # Batches are cut to the latest PROGRESS_MAX_CHARS characters; nothing is lost unaccounted
+    assert len(batches) > 1
+    assert all(len(text) <= 4 for text, _ in batches)
+    assert sum(len(text) + omitted for text, omitted in batches) == command.output.total
+    assert batches[-1] == ("four", 0)
+
+
+def test_wait_times_out_while_the_command_runs():
+    command = ShellCommand("c1", "s1", "default", "sleep", "/workspace", False)
+
+    async def main():
+        command.follower = asyncio.create_task(asyncio.sleep(5))
+        finished = await command.wait(0.05)
+        command.follower.cancel()
+        return finished
+
+    assert not asyncio.run(main())
+
+
+def test_only_background_commands_can_be_killed():
+    command = ShellCommand("c1", "s1", "default", "sleep", "/workspace", False)
+
+    async def main():
+        command.follower = asyncio.create_task(asyncio.sleep(5))
+        try:
+            await kill_command(None, command)
+        finally:
+            command.follower.cancel()
+
+    with pytest.raises(ValueError):
+        asyncio.run(main())
+
+
+@pytest.fixture
+def handle():
+    sandbox = LocalSandbox()
+    yield SandboxHandle(sandbox.id, sandbox, time.monotonic())
+    sandbox.remove()
+
+
+def test_command_output_is_followed_in_a_local_sandbox(handle, tmp_path):
+    cwd = tmp_path / "dir with 'quotes'"
+    cwd.mkdir()
+
+    async def main():
+        session_id = await handle.get_session()
+        command = await start_command(handle, session_id, "default", "pwd; echo done; exit 3", str(cwd))
+        await command.wait(10)
+        return command
+
+    command = asyncio.run(main())
+    assert command.status == "failed"
+    assert command.exit_code == 3
+    assert command.output.text() == f"{cwd}\ndone\n"
+    assert command.summary()["output_chars"] == len(command.output.text())
+
+
+def test_background_command_is_killed_in_a_local_sandbox(handle, tmp_path):
+    async def main():
+        session_id = await handle.get_session()
+        command = await start_command(handle, session_id, "default", "echo started; sleep 60", str(tmp_path),
+                                      background=True)
+        while "started" not in command.output.text():
+            await asyncio.sleep(0.05)
+        stopped = await kill_command(handle, command)
+        return command, stopped
+
+    command, stopped = asyncio.run(main())
+    assert stopped
+    assert command.status == "killed"
+    assert command.command_id in handle.commands
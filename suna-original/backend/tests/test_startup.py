@@ -0,0 +1,32 @@
+import json
+import os
+import subprocess
+import sys
+
+from utils.startup_profile import BACKEND_DIR
+
+# Seconds allowed for importing the API module in a fresh interpreter
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS") or 5.0)
+
+# SDKs that must only be imported when first used
+DEFERRED_MODULES = ("stripe", "litellm", "daytona_sdk")
+
+_IMPORT_API = f"""
+import json, sys, time
+started = time.perf_counter()
+import api
+elapsed = time.perf_counter() - started
+print(json.dumps({{"elapsed": elapsed, "loaded": [m for m in {DEFERRED_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def test_api_startup_stays_within_budget_without_heavy_sdks():
+    result = subprocess.run(
+        [sys.executable, "-c", _IMPORT_API],
+        cwd=BACKEND_DIR, capture_output=True, text=True, env={**os.environ, "ENV_MODE": "local"}
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    startup = json.loads(result.stdout.strip().splitlines()[-1])
+
+    assert startup["loaded"] == []
+    assert startup["elapsed"] < STARTUP_BUDGET_SECONDS
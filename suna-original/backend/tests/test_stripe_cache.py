@@ -0,0 +1,138 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+import services.redis as redis
+import services.stripe_cache as stripe_cache
+from services.stripe_cache import SubscriptionCache
+
+
+class FakeStripe:
+    """Stands in for the Stripe SDK: Subscription.list returns the configured subscriptions."""
+
+    def __init__(self):
+        self.subscriptions = {}
+        self.calls = 0
+        self.release = threading.Event()
+        self.release.set()
+        self.started = threading.Event()
+        stripe = self
+
+        class Subscription:
+            @staticmethod
+            def list(customer, status):
+                stripe.calls += 1
+                data = list(stripe.subscriptions.get(customer, []))
+                stripe.started.set()
+                stripe.release.wait(5)
+                return json.dumps({"object": "list", "data": data})
+
+        self.Subscription = Subscription
+
+
+@pytest.fixture
+def stripe(monkeypatch):
+    fake = FakeStripe()
+    monkeypatch.setattr(stripe_cache, "_stripe", fake)
+    # In-memory Redis
+    store = {}
+
+    async def get(key, default=None):
+        return store.get(key, default)
+
+    async def set(key, value, ex=None):
+        store[key] = value
+
+    async def delete(key):
+        store.pop(key, None)
+    monkeypatch.setattr(redis, "get", get)
+    monkeypatch.setattr(redis, "set", set)
+    monkeypatch.setattr(redis, "delete", delete)
+    return fake
+
+
+async def wait_for(event):
+    while not event.is_set():
+        await asyncio.sleep(0.001)
+
+
+def test_cache_hit(stripe):
+    stripe.subscriptions["cus_1"] = [{"id": "sub_1"}]
+    cache = SubscriptionCache()
+
+    async def main():
+        first = await cache.get_active_subscriptions("cus_1")
+        second = await cache.get_active_subscriptions("cus_1")
+        return first, second
+
+    assert asyncio.run(main()) == ([{"id": "sub_1"}], [{"id": "sub_1"}])
+    assert stripe.calls == 1
+    assert cache.get_stats()["hits"] == 1
+
+
+def test_concurrent_misses_share_one_request(stripe):
+    stripe.subscriptions["cus_1"] = [{"id": "sub_1"}]
+    stripe.release.clear()
+    cache = SubscriptionCache()
+
+    async def main():
+        reads = [asyncio.create_task(cache.get_active_subscriptions("cus_1")) for _ in range(5)]
+        await wait_for(stripe.started)
+        stripe.release.set()
+        return await asyncio.gather(*reads)
+
+    assert asyncio.run(main()) == [[{"id": "sub_1"}]] * 5
+    assert stripe.calls == 1
+
+
+def test_waiters_take_over_when_the_owner_is_cancelled(stripe):
+    stripe.subscriptions["cus_1"] = [{"id": "sub_1"}]
+    stripe.release.clear()
+    cache = SubscriptionCache()
+
+    async def main():
+        owner = asyncio.create_task(cache.get_active_subscriptions("cus_1"))
+        await wait_for(stripe.started)
+        waiter = asyncio.create_task(cache.get_active_subscriptions("cus_1"))
+        await asyncio.sleep(0.01)
+        owner.cancel()
+        await asyncio.sleep(0.01)
+        stripe.release.set()
+        return await asyncio.wait_for(waiter, 5)
+
+    assert asyncio.run(main()) == [{"id": "sub_1"}]
+
+
+def test_webhook_refresh_replaces_cached_subscriptions(stripe):
+    stripe.subscriptions["cus_1"] = [{"id": "sub_1"}]
+    cache = SubscriptionCache()
+
+    async def main():
+        await cache.get_active_subscriptions("cus_1")
+        stripe.subscriptions["cus_1"] = [{"id": "sub_2"}]
+        await cache.refresh("cus_1")
+        return await cache.get_active_subscriptions("cus_1")
+
+    assert asyncio.run(main()) == [{"id": "sub_2"}]
+    assert stripe.calls == 2
+
+
+def test_stale_fill_is_not_cached(stripe):
+    stripe.subscriptions["cus_1"] = [{"id": "sub_old"}]
+    stripe.release.clear()
+    cache = SubscriptionCache()
+
+    async def main():
+        read = asyncio.create_task(cache.get_active_subscriptions("cus_1"))
+        await wait_for(stripe.started)
+        # The subscription changes while the read is in flight
+        stripe.subscriptions["cus_1"] = [{"id": "sub_new"}]
+        await cache.invalidate("cus_1")
+        stripe.release.set()
+        stale = await read
+        return stale, await cache.get_active_subscriptions("cus_1")
+
+    assert asyncio.run(main()) == ([{"id": "sub_old"}], [{"id": "sub_new"}])
+    assert stripe.calls == 2
@@ -0,0 +1,74 @@
+import asyncio
+
+import services.usage as usage
+from services.usage import UsageEvent, UsagePipeline
+
+
+class FlakyRollups:
+    """Rollup store that applies some writes but reports them as failed."""
+
+    def __init__(self, fail_after_commit=0, fail_before_commit=0):
+        self.fail_after_commit = fail_after_commit
+        self.fail_before_commit = fail_before_commit
+        self.applied = set()
+        self.request_count = 0
+
+    async def write(self, rows, batch_id):
+        if self.fail_before_commit:
+            self.fail_before_commit -= 1
+            raise ConnectionError("connection refused")
+        if batch_id not in self.applied:
+            self.applied.add(batch_id)
+            self.request_count += sum(row["request_count"] for row in rows)
+        if self.fail_after_commit:
+            self.fail_after_commit -= 1
+            raise ConnectionError("connection reset after commit")
+
+
+def make_pipeline(monkeypatch, store, resolve_failures=0):
+    pipeline = UsagePipeline(flush_interval=0.01)
+    monkeypatch.setattr(usage, "_compute_usage", lambda event: (1, 1, 0.0))
+    monkeypatch.setattr(pipeline, "_write_rollups", store.write)
+
+    async def resolve(thread_ids):
+        nonlocal resolve_failures
+        if resolve_failures:
+            resolve_failures -= 1
+            raise ConnectionError("accounts lookup failed")
+        return {thread_id: "account" for thread_id in thread_ids}
+
+    monkeypatch.setattr(pipeline, "_resolve_accounts", resolve)
+    return pipeline
+
+
+def run(pipeline, events):
+    async def main():
+        for event in events:
+            pipeline.record(event)
+        await asyncio.sleep(0.3)
+        await pipeline.stop()
+    asyncio.run(main())
+
+
+def test_retried_batch_is_counted_once(monkeypatch):
+    store = FlakyRollups(fail_after_commit=2)
+    pipeline = make_pipeline(monkeypatch, store)
+    run(pipeline, [UsageEvent(thread_id="t", model="m") for _ in range(3)])
+    assert store.request_count == 3
+    assert pipeline.stats["lost_events"] == 0
+
+
+def test_failed_aggregation_is_retried(monkeypatch):
+    store = FlakyRollups(fail_before_commit=1)
+    pipeline = make_pipeline(monkeypatch, store, resolve_failures=2)
+    run(pipeline, [UsageEvent(thread_id="t", model="m") for _ in range(4)])
+    assert store.request_count == 4
+    assert pipeline.stats["aggregation_errors"] == 2
+
+
+def test_batch_is_dropped_after_max_retries(monkeypatch):
+    store = FlakyRollups(fail_before_commit=usage.USAGE_MAX_RETRIES + 1)
+    pipeline = make_pipeline(monkeypatch, store)
+    run(pipeline, [UsageEvent(thread_id="t", model="m")])
+    assert store.request_count == 0
+    assert pipeline.stats["lost_batches"] == 1
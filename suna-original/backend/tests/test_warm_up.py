@@ -0,0 +1,59 @@
+import asyncio
+from types import SimpleNamespace
+
+from agentpress.response_processor import ProcessorConfig, ResponseProcessor
+from agentpress.tool import Tool, ToolResult, xml_schema
+from agentpress.tool_registry import ToolRegistry
+
+
+class SlowStartTool(Tool):
+    """Tool whose warm-up only ends when cancelled."""
+
+    def __init__(self):
+        super().__init__()
+        self.warm_up_started = asyncio.Event()
+        self.warm_up_cancelled = False
+
+    async def warm_up(self) -> None:
+        self.warm_up_started.set()
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            self.warm_up_cancelled = True
+            raise
+
+    @xml_schema(tag_name="slow-op", mappings=[], example="<slow-op></slow-op>")
+    async def slow_op(self) -> ToolResult:
+        return self.success_response("done")
+
+
+def chunk(content):
+    return SimpleNamespace(choices=[SimpleNamespace(finish_reason=None, delta=SimpleNamespace(content=content))])
+
+
+def test_unfinished_warm_ups_are_cancelled_when_the_stream_fails():
+    registry = ToolRegistry()
+    registry.register_tool(SlowStartTool)
+    tool = registry.xml_tools["slow-op"]["instance"]
+
+    async def add_message(**kwargs):
+        return {"type": kwargs["type"], "content": kwargs["content"]}
+
+    async def llm_response():
+        yield chunk("Let me check. <slow-op")
+        await tool.warm_up_started.wait()
+        raise ConnectionError("stream interrupted")
+
+    async def main():
+        processor = ResponseProcessor(registry, add_message)
+        config = ProcessorConfig(xml_tool_calling=True, native_tool_calling=False, execute_tools=True)
+        messages = [message async for message in processor.process_streaming_response(
+            llm_response(), "thread-1", [], "gpt-4o", config)]
+        await asyncio.sleep(0)
+        # Checked before asyncio.run cancels whatever is left at shutdown
+        return processor, messages, tool.warm_up_cancelled
+
+    processor, messages, cancelled = asyncio.run(main())
+    assert processor.warm_up_stats["warm_ups_started"] == 1
+    assert cancelled
+    assert messages[-1]["content"] == {"status_type": "thread_run_end"}
@@ -0,0 +1,207 @@
+"""
+Read-through cache for thread access checks.
+
+Every authenticated request and SSE stream open checks that the user may access
+the thread. The cache keeps, per process:
+
+- thread -> (project, account, project visibility), which rarely changes
+- (user, thread) -> access decision, with a shorter TTL for denials
+
+Sharing and ownership mostly change outside this backend (the frontend writes
+projects, threads and account members through Supabase). Database triggers
+record those changes in the `access_changes` table, and every backend instance
+polls it and drops the affected entries, so a revocation applies within
+CHANGES_POLL_INTERVAL seconds. Entries also expire after a TTL, which bounds
+staleness if polling fails.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from utils.logger import logger
+
+# Constants
+THREAD_INFO_TTL = 300       # Seconds a thread's project/account/visibility is cached
+ALLOW_TTL = 60              # Seconds a granted access decision is cached
+DENY_TTL = 10               # Seconds a denied access decision is cached
+MAX_ENTRIES = 10000         # Entries kept per cache before evicting the least recently used
+CHANGES_POLL_INTERVAL = 2   # Seconds between polls of the access_changes log
+CHANGES_BATCH_SIZE = 1000   # Max changes read per poll
+
+
+class _TTLCache:
+    """Bounded LRU mapping with a per-entry expiry time."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def pop_where(self, predicate) -> int:
+        """Remove the entries whose (key, value) match a predicate."""
+        keys = [key for key, (_, value) in self._entries.items() if predicate(key, value)]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class AccessCache:
+    """Thread metadata and access decisions, with invalidation hooks."""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self._threads = _TTLCache(max_entries)
+        self._decisions = _TTLCache(max_entries)
+        self._listener: Optional[asyncio.Task] = None
+        self._last_change_id: Optional[int] = None
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get_thread(self, thread_id: str) -> Optional[Dict[str, Any]]:
+        """Get a thread's cached project_id, account_id and is_public."""
+        return self._threads.get(thread_id)
+
+    def set_thread(self, thread_id: str, project_id: Optional[str], account_id: Optional[str], is_public: bool) -> None:
+        self._threads.set(thread_id, {"project_id": project_id, "account_id": account_id, "is_public": is_public},
+                          THREAD_INFO_TTL)
+
+    def get_decision(self, user_id: str, thread_id: str) -> Optional[bool]:
+        """Get a cached access decision (None if unknown)."""
+        decision = self._decisions.get((user_id, thread_id))
+        self.stats["hits" if decision is not None else "misses"] += 1
+        return decision
+
+    def set_decision(self, user_id: str, thread_id: str, allowed: bool) -> None:
+        self._decisions.set((user_id, thread_id), allowed, ALLOW_TTL if allowed else DENY_TTL)
+
+    # --- Invalidation hooks ---
+
+    def invalidate_thread(self, thread_id: str) -> None:
+        """Forget a thread (e.g. deleted or moved to another project)."""
+        self._threads.pop_where(lambda key, _: key == thread_id)
+        self._decisions.pop_where(lambda key, _: key[1] == thread_id)
+        self.stats["invalidations"] += 1
+
+    def invalidate_project(self, project_id: str) -> None:
+        """Forget the threads of a project (e.g. its visibility changed)."""
+        thread_ids = set()
+        def matches(key, value):
+            if value["project_id"] == project_id:
+                thread_ids.add(key)
+                return True
+            return False
+        self._threads.pop_where(matches)
+        self._decisions.pop_where(lambda key, _: key[1] in thread_ids)
+        self.stats["invalidations"] += 1
+
+    def invalidate_account(self, account_id: str, user_id: Optional[str] = None) -> None:
+        """Forget decisions on an account's threads (e.g. a member was added or removed).
+
+        Args:
+            account_id: Account whose membership changed
+            user_id: Only forget this user's decisions
+        """
+        def stale(key, _):
+            if user_id is not None and key[0] != user_id:
+                return False
+            # Threads whose info expired can no longer be matched to an account
+            info = self._threads.get(key[1])
+            return info is None or info["account_id"] == account_id
+        self._decisions.pop_where(stale)
+        self.stats["invalidations"] += 1
+
+    def clear(self) -> None:
+        self._threads.clear()
+        self._decisions.clear()
+
+    # --- Invalidation from the database change log ---
+
+    def _apply(self, change: Dict[str, Any]) -> None:
+        if change["kind"] == "thread":
+            self.invalidate_thread(change["thread_id"])
+        elif change["kind"] == "project":
+            self.invalidate_project(change["project_id"])
+        elif change["kind"] == "account":
+            self.invalidate_account(change["account_id"], change.get("user_id"))
+
+    def start_listener(self) -> None:
+        """Poll the access_changes log and apply its invalidations (requires Supabase)."""
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop_listener(self) -> None:
+        if self._listener and not self._listener.done():
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+
+    async def poll_changes(self, client) -> int:
+        """Apply the changes logged since the last poll.
+
+        The first poll only finds the end of the log: the cache starts empty, so
+        earlier changes do not matter.
+
+        Args:
+            client: Supabase client (service role)
+
+        Returns:
+            Number of changes applied
+        """
+        if self._last_change_id is None:
+            result = await client.table('access_changes').select('id').order('id', desc=True).limit(1).execute()
+            self._last_change_id = result.data[0]['id'] if result.data else 0
+            return 0
+
+        result = await client.table('access_changes') \
+            .select('id, kind, thread_id, project_id, account_id, user_id') \
+            .gt('id', self._last_change_id) \
+            .order('id') \
+            .limit(CHANGES_BATCH_SIZE) \
+            .execute()
+        for change in result.data or []:
+            self._apply(change)
+            self._last_change_id = change['id']
+        return len(result.data or [])
+
+    async def _listen(self) -> None:
+        from services.supabase import DBConnection
+        while True:
+            try:
+                client = await DBConnection().client
+                while True:
+                    # A full batch means more changes are waiting
+                    if await self.poll_changes(client) < CHANGES_BATCH_SIZE:
+                        await asyncio.sleep(CHANGES_POLL_INTERVAL)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Changes may have been missed: start over from an empty cache
+                logger.warning(f"Access cache change polling failed, clearing cache: {str(e)}")
+                self.clear()
+                self._last_change_id = None
+                await asyncio.sleep(CHANGES_POLL_INTERVAL)
+
+
+# Process-wide cache
+access_cache = AccessCache()
@@ -4,6 +4,43 @@ import jwt
 from jwt.exceptions import PyJWTError
 from utils.logger import logger
 from utils.config import config, EnvMode
+from utils.access_cache import access_cache
+from utils.token_cache import token_cache, MISS
+
+def _decode_user_id(token: str) -> Optional[str]:
+    """
+    Get the user ID from a Supabase JWT, caching the result per token.
+    
+    SSE reconnects resend the same token many times, so decoded tokens are
+    cached until they expire and malformed ones are remembered briefly.
+    
+    Args:
+        token: The JWT
+        
+    Returns:
+        Optional[str]: The user ID ('sub' claim), or None if the token is invalid
+    """
+    user_id = token_cache.get(token, scope="jwt")
+    if user_id is not MISS:
+        return user_id
+    
+    try:
+        # For Supabase JWT, we just need to decode and extract the user ID
+        # The actual validation is handled by Supabase's RLS
+        payload = jwt.decode(token, options={"verify_signature": False})
+    except PyJWTError:
+        token_cache.set_invalid(token, scope="jwt")
+        return None
+    
+    # Supabase stores the user ID in the 'sub' claim
+    user_id = payload.get('sub')
+    if user_id:
+        exp = payload.get('exp')
+        token_cache.set(token, user_id, user_id=user_id, scope="jwt",
+                        expires_at=exp if isinstance(exp, (int, float)) else None)
+    else:
+        token_cache.set_invalid(token, scope="jwt")
+    return user_id
 
 # This function extracts the user ID from Supabase JWT
 async def get_current_user_id_from_jwt(request: Request) -> str:
@@ -44,30 +81,16 @@ async def get_current_user_id_from_jwt(request: Request) -> str:
         )
     
     token = auth_header.split(' ')[1]
+    user_id = _decode_user_id(token)
     
-    try:
-        # For Supabase JWT, we just need to decode and extract the user ID
-        # The actual validation is handled by Supabase's RLS
-        payload = jwt.decode(token, options={"verify_signature": False})
-        
-        # Supabase stores the user ID in the 'sub' claim
-        user_id = payload.get('sub')
-        
-        if not user_id:
-            raise HTTPException(
-                status_code=401,
-                detail="Invalid token payload",
-                headers={"WWW-Authenticate": "Bearer"}
-            )
-        
-        return user_id
-        
-    except PyJWTError:
+    if not user_id:
         raise HTTPException(
             status_code=401,
             detail="Invalid token",
             headers={"WWW-Authenticate": "Bearer"}
         )
+    
+    return user_id
 
 async def get_account_id_from_thread(client, thread_id: str) -> str:
     """
@@ -83,8 +106,16 @@ async def get_account_id_from_thread(client, thread_id: str) -> str:
     Raises:
         HTTPException: If the thread is not found or if there's an error
     """
-    try:
-        response = await client.table('threads').select('account_id').eq('thread_id', thread_id).execute()
+    thread_info = access_cache.get_thread(thread_id)
+    if thread_info is None:
+        try:
+            # One joined query for the thread and its project's visibility, cached for access checks
+            response = await client.table('threads').select('account_id, project_id, projects(is_public)').eq('thread_id', thread_id).execute()
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error retrieving thread information: {str(e)}"
+            )
         
         if not response.data or len(response.data) == 0:
             raise HTTPException(
@@ -92,22 +123,21 @@ async def get_account_id_from_thread(client, thread_id: str) -> str:
                 detail="Thread not found"
             )
         
-        account_id = response.data[0].get('account_id')
-        
-        if not account_id:
-            raise HTTPException(
-                status_code=500,
-                detail="Thread has no associated account"
-            )
-        
-        return account_id
+        thread = response.data[0]
+        is_public = bool((thread.get('projects') or {}).get('is_public'))
+        access_cache.set_thread(thread_id, thread.get('project_id'), thread.get('account_id'), is_public)
+        thread_info = access_cache.get_thread(thread_id)
+    
+    account_id = thread_info.get('account_id')
     
-    except Exception as e:
+    if not account_id:
         raise HTTPException(
             status_code=500,
-            detail=f"Error retrieving thread information: {str(e)}"
+            detail="Thread has no associated account"
         )
     
+    return account_id
+    
 async def get_user_id_from_stream_auth(
     request: Request,
     token: Optional[str] = None
@@ -140,27 +170,17 @@ async def get_user_id_from_stream_auth(
     
     # Try to get user_id from token in query param (for EventSource which can't set headers)
     if token:
-        try:
-            # For Supabase JWT, we just need to decode and extract the user ID
-            payload = jwt.decode(token, options={"verify_signature": False})
-            user_id = payload.get('sub')
-            if user_id:
-                return user_id
-        except Exception:
-            pass
+        user_id = _decode_user_id(token)
+        if user_id:
+            return user_id
     
     # If no valid token in query param, try to get it from the Authorization header
     auth_header = request.headers.get('Authorization')
     if auth_header and auth_header.startswith('Bearer '):
-        try:
-            # Extract token from header
-            header_token = auth_header.split(' ')[1]
-            payload = jwt.decode(header_token, options={"verify_signature": False})
-            user_id = payload.get('sub')
-            if user_id:
-                return user_id
-        except Exception:
-            pass
+        # Extract token from header
+        user_id = _decode_user_id(auth_header.split(' ')[1])
+        if user_id:
+            return user_id
     
     # If we still don't have a user_id, return authentication error
     raise HTTPException(
@@ -194,28 +214,24 @@ async def verify_thread_access(client, thread_id: str, user_id: str):
         logger.warning("Database client is None, allowing thread access")
         return True
     
-    # Query the thread to get account information
-    thread_result = await client.table('threads').select('*,project_id').eq('thread_id', thread_id).execute()
-
-    if not thread_result.data or len(thread_result.data) == 0:
-        raise HTTPException(status_code=404, detail="Thread not found")
-    
-    thread_data = thread_result.data[0]
+    # Cached decisions need no database round-trip
+    allowed = access_cache.get_decision(user_id, thread_id)
+    if allowed is None:
+        thread_info = access_cache.get_thread(thread_id)
+        if thread_info and thread_info['is_public']:
+            allowed = True
+        else:
+            # One query for the thread, its project's visibility and the user's membership
+            result = await client.rpc('get_thread_access', {'p_thread_id': thread_id, 'p_user_id': user_id}).execute()
+            if not result.data:
+                raise HTTPException(status_code=404, detail="Thread not found")
+            access = result.data[0]
+            access_cache.set_thread(thread_id, access.get('project_id'), access.get('account_id'), bool(access.get('is_public')))
+            allowed = bool(access.get('is_public') or access.get('is_member'))
+        access_cache.set_decision(user_id, thread_id, allowed)
     
-    # Check if project is public
-    project_id = thread_data.get('project_id')
-    if project_id:
-        project_result = await client.table('projects').select('is_public').eq('project_id', project_id).execute()
-        if project_result.data and len(project_result.data) > 0:
-            if project_result.data[0].get('is_public'):
-                return True
-        
-    account_id = thread_data.get('account_id')
-    # When using service role, we need to manually check account membership instead of using current_user_account_role
-    if account_id:
-        account_user_result = await client.schema('basejump').from_('account_user').select('account_role').eq('user_id', user_id).eq('account_id', account_id).execute()
-        if account_user_result.data and len(account_user_result.data) > 0:
-            return True
+    if allowed:
+        return True
     raise HTTPException(status_code=403, detail="Not authorized to access this thread")
 
 async def get_optional_user_id(request: Request) -> Optional[str]:
@@ -250,13 +266,4 @@ async def get_optional_user_id(request: Request) -> Optional[str]:
     
     token = auth_header.split(' ')[1]
     
-    try:
-        # For Supabase JWT, we just need to decode and extract the user ID
-        payload = jwt.decode(token, options={"verify_signature": False})
-        
-        # Supabase stores the user ID in the 'sub' claim
-        user_id = payload.get('sub')
-        
-        return user_id
-    except PyJWTError:
-        return None
+    return _decode_user_id(token)
@@ -126,6 +126,22 @@ class Configuration:
     # Model configuration
     MODEL_TO_USE: Optional[str] = "local-mistral"
     
+    # LLM request hedging (see services/llm.py)
+    LLM_HEDGE_ENABLED: bool = False
+    LLM_HEDGE_API_BASE: Optional[str] = None  # Second backend; defaults to the primary one
+    LLM_HEDGE_MODEL: Optional[str] = None  # Model on the second backend; defaults to the primary one
+    LLM_HEDGE_PERCENTILE: float = 95.0
+    LLM_HEDGE_MIN_DELAY: float = 1.0
+    LLM_HEDGE_INITIAL_DELAY: float = 5.0
+    LLM_HEDGE_BUDGET: float = 0.1  # Max fraction of requests that may be hedged
+    
+    # Storage for large tool outputs (see agentpress/blob_store.py)
+    BLOB_STORE_PATH: str = "./data/blobs"
+    
+    # Per-turn tool selection (see agentpress/tool_selector.py)
+    TOOL_SELECTION_ENABLED: bool = False
+    TOOL_SELECTION_MAX_TOOLS: int = 4
+    
     # Supabase configuration
     SUPABASE_URL: Optional[str] = None
     SUPABASE_ANON_KEY: Optional[str] = None
@@ -142,6 +158,11 @@ class Configuration:
     DAYTONA_SERVER_URL: Optional[str] = None
     DAYTONA_TARGET: Optional[str] = None
     
+    # Pre-warmed sandbox pool (see sandbox/pool.py)
+    SANDBOX_POOL_SIZE: int = 0  # Started sandboxes kept ready for new projects (0 disables the pool)
+    SANDBOX_POOL_IDLE_TTL: int = 600  # Seconds a pooled sandbox waits before it is replaced
+    SANDBOX_POOL_PROVIDER: str = "daytona"  # "daytona", or "process" for an offline stand-in
+    
     # Search and other API keys
     TAVILY_API_KEY: Optional[str] = None
     RAPID_API_KEY: Optional[str] = None
@@ -153,6 +174,7 @@ class Configuration:
     STRIPE_WEBHOOK_SECRET: Optional[str] = None
     STRIPE_DEFAULT_PLAN_ID: Optional[str] = None
     STRIPE_DEFAULT_TRIAL_DAYS: int = 14
+    STRIPE_API_BASE: Optional[str] = None  # Override the Stripe API URL, e.g. a local stripe-mock server
     
     # Stripe Product IDs
     STRIPE_PRODUCT_ID_PROD: str = 'prod_SCl7AQ2C8kK1CD'  # Production product ID
@@ -201,6 +223,12 @@ class Configuration:
                         setattr(self, key, int(env_val))
                     except ValueError:
                         logger.warning(f"Invalid value for {key}: {env_val}, using default")
+                elif expected_type == float:
+                    # Handle float conversion
+                    try:
+                        setattr(self, key, float(env_val))
+                    except ValueError:
+                        logger.warning(f"Invalid value for {key}: {env_val}, using default")
                 elif expected_type == EnvMode:
                     # Already handled for ENV_MODE
                     pass
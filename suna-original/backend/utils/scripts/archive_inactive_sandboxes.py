@@ -3,12 +3,15 @@
 Script to archive sandboxes for projects whose account_id is not associated with an active billing customer.
 
 Usage:
-    python archive_inactive_sandboxes.py
+    python archive_inactive_sandboxes.py [--dry-run] [--concurrency 10] [--rate 5] [--restart]
 
 This script:
 1. Gets all active account_ids from basejump.billing_customers (active=TRUE)
 2. Gets all projects from the projects table
-3. Archives sandboxes for any project whose account_id is not in the active billing customers list
+3. Archives sandboxes for any project whose account_id is not in the active billing customers list,
+   several at a time, retrying failures
+4. Records archived projects in a checkpoint file, so rerunning after a crash or Ctrl+C
+   resumes where it stopped (--restart starts over)
 
 Make sure your environment variables are properly set:
 - SUPABASE_URL
@@ -20,6 +23,7 @@ import asyncio
 import sys
 import os
 import argparse
+import functools
 from typing import List, Dict, Any, Set
 from dotenv import load_dotenv
 
@@ -29,6 +33,7 @@ load_dotenv(".env")
 from services.supabase import DBConnection
 from sandbox.sandbox import daytona
 from utils.logger import logger
+from utils.scripts.batch_runner import BatchRunner, BatchStats, add_runner_arguments
 
 # Global DB connection to reuse
 db_connection = None
@@ -138,16 +143,21 @@ async def get_all_projects() -> List[Dict[str, Any]]:
     return projects_with_sandboxes
 
 
-async def archive_sandbox(project: Dict[str, Any], dry_run: bool) -> bool:
+def archive_sandbox(project: Dict[str, Any], dry_run: bool) -> str:
     """
     Archive a single sandbox.
     
+    Blocking (Daytona SDK calls); the batch runner runs it in its thread pool.
+    
     Args:
         project: Project information containing sandbox to archive
         dry_run: If True, only simulate archiving
         
     Returns:
-        True if successful, False otherwise
+        What happened: 'archived', 'skipped' (not stopped) or 'dry_run'
+        
+    Raises:
+        Exception: If the sandbox could not be checked or archived (the runner retries it)
     """
     sandbox_id = project['sandbox'].get('id')
     project_name = project.get('name', 'Unknown')
@@ -159,7 +169,7 @@ async def archive_sandbox(project: Dict[str, Any], dry_run: bool) -> bool:
         if dry_run:
             logger.info(f"DRY RUN: Would archive sandbox {sandbox_id}")
             print(f"Would archive sandbox {sandbox_id} for project '{project_name}'")
-            return True
+            return 'dry_run'
         
         # Get the sandbox
         sandbox = daytona.get_current_sandbox(sandbox_id)
@@ -175,70 +185,48 @@ async def archive_sandbox(project: Dict[str, Any], dry_run: bool) -> bool:
             logger.info(f"Archiving sandbox {sandbox_id} as it is in stopped state")
             sandbox.archive()
             logger.info(f"Successfully archived sandbox {sandbox_id}")
-            return True
+            return 'archived'
         else:
             logger.info(f"Skipping sandbox {sandbox_id} as it is not in stopped state (current: {sandbox_info.state})")
-            return True
+            return 'skipped'
             
     except Exception as e:
-        import traceback
-        error_type = type(e).__name__
-        stack_trace = traceback.format_exc()
-        
-        # Log detailed error information
-        logger.error(f"Error processing sandbox {sandbox_id}: {str(e)}")
-        logger.error(f"Error type: {error_type}")
-        logger.error(f"Stack trace:\n{stack_trace}")
-        
         # If the exception has a response attribute (like in HTTP errors), log it
         if hasattr(e, 'response'):
             try:
                 response_data = e.response.json() if hasattr(e.response, 'json') else str(e.response)
-                logger.error(f"Response data: {response_data}")
+                logger.error(f"Response data for sandbox {sandbox_id}: {response_data}")
             except Exception:
                 logger.error(f"Could not parse response data from error")
-        
-        print(f"Failed to process sandbox {sandbox_id}: {error_type} - {str(e)}")
-        return False
+        raise
 
 
-async def process_sandboxes(inactive_projects: List[Dict[str, Any]], dry_run: bool) -> tuple[int, int]:
+async def process_sandboxes(inactive_projects: List[Dict[str, Any]], dry_run: bool, runner: BatchRunner) -> BatchStats:
     """
-    Process all sandboxes sequentially.
+    Process all sandboxes concurrently with the batch runner.
     
     Args:
         inactive_projects: List of projects without active billing
         dry_run: Whether to actually archive sandboxes or just simulate
+        runner: Batch runner (concurrency, rate limit, retries, checkpoint)
         
     Returns:
-        Tuple of (processed_count, failed_count)
+        Statistics of the run; results map project IDs to what happened
     """
-    processed_count = 0
-    failed_count = 0
-    
     if dry_run:
         logger.info(f"DRY RUN: Would archive {len(inactive_projects)} sandboxes")
     else:
         logger.info(f"Archiving {len(inactive_projects)} sandboxes")
     
-    print(f"Processing {len(inactive_projects)} sandboxes...")
+    print(f"Processing {len(inactive_projects)} sandboxes with concurrency {runner.concurrency}...")
     
-    # Process each sandbox sequentially
-    for i, project in enumerate(inactive_projects):
-        success = await archive_sandbox(project, dry_run)
-        
-        if success:
-            processed_count += 1
-        else:
-            failed_count += 1
-        
-        # Print progress periodically
-        if (i + 1) % 20 == 0 or (i + 1) == len(inactive_projects):
-            progress = (i + 1) / len(inactive_projects) * 100
-            print(f"Progress: {i + 1}/{len(inactive_projects)} sandboxes processed ({progress:.1f}%)")
-            print(f"  - Processed: {processed_count}, Failed: {failed_count}")
-    
-    return processed_count, failed_count
+    return await runner.run(
+        inactive_projects,
+        key=lambda project: project['project_id'],
+        worker=functools.partial(archive_sandbox, dry_run=dry_run),
+        # Sandboxes that were not stopped yet, or only looked at in a dry run, are retried next time
+        finished=lambda outcome: outcome == 'archived'
+    )
 
 
 async def main():
@@ -246,7 +234,11 @@ async def main():
     # Parse command line arguments
     parser = argparse.ArgumentParser(description='Archive sandboxes for projects without active billing')
     parser.add_argument('--dry-run', action='store_true', help='Show what would be archived without actually archiving')
+    add_runner_arguments(parser)
     args = parser.parse_args()
+    if args.dry_run:
+        # A dry run must not mark sandboxes as done for the real run
+        args.no_checkpoint = True
 
     logger.info("Starting sandbox cleanup for projects without active billing")
     if args.dry_run:
@@ -322,18 +314,26 @@ async def main():
             print(f"   ... and {len(inactive_projects) - 5} more projects")
         
         # Process all sandboxes
-        processed_count, failed_count = await process_sandboxes(inactive_projects, args.dry_run)
+        runner = BatchRunner.from_args("archive_inactive_sandboxes", args)
+        stats = await process_sandboxes(inactive_projects, args.dry_run, runner)
         
         # Print final summary
         print("\nSandbox Cleanup Summary:")
         print(f"Total projects without active billing: {len(inactive_projects)}")
-        print(f"Total sandboxes processed: {len(inactive_projects)}")
+        print(f"Total sandboxes processed: {stats.succeeded + stats.failed}")
+        if stats.skipped:
+            print(f"Already processed by a previous run: {stats.skipped}")
         
         if args.dry_run:
             print(f"DRY RUN: No sandboxes were actually archived")
         else:
-            print(f"Successfully processed: {processed_count}")
-            print(f"Failed to process: {failed_count}")
+            outcomes = list(stats.results.values())
+            print(f"Successfully processed: {stats.succeeded} "
+                  f"({outcomes.count('archived')} archived, {outcomes.count('skipped')} not stopped)")
+            print(f"Failed to process: {stats.failed}")
+            for project_id, error in stats.errors.items():
+                print(f"  - {project_id}: {error}")
+        print(f"Elapsed: {stats.elapsed:.1f}s ({stats.throughput:.1f} sandboxes/s, {stats.retries} retries)")
         
         logger.info("Sandbox cleanup completed")
             
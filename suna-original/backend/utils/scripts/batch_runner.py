@@ -0,0 +1,340 @@
+"""
+Concurrent, resumable batch execution for maintenance scripts.
+
+Scripts that touch every project or customer (archiving sandboxes, syncing
+Stripe state) spend nearly all their time waiting on remote APIs. The
+BatchRunner processes items with:
+
+- bounded concurrency (a fixed number of items in flight)
+- an optional rate limit (token bucket, requests per second)
+- retries with exponential backoff and full jitter
+- a checkpoint file, so a crashed or interrupted run resumes where it stopped
+  (removed once a run finishes every item, so the next run starts fresh)
+- periodic progress, throughput and ETA reports
+
+Workers may be coroutine functions or blocking functions (e.g. SDK calls),
+which run in a thread pool sized to the concurrency. Async workers can run
+their blocking calls in the same pool with `runner.run_blocking`.
+
+Usage:
+    parser = argparse.ArgumentParser()
+    add_runner_arguments(parser)
+    args = parser.parse_args()
+
+    runner = BatchRunner.from_args("archive_sandboxes", args)
+    stats = await runner.run(projects, key=lambda p: p['project_id'], worker=archive_sandbox)
+"""
+
+import argparse
+import asyncio
+import functools
+import inspect
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple, Type, TypeVar, Union
+
+from utils.logger import logger
+
+T = TypeVar("T")
+
+# Defaults
+DEFAULT_CONCURRENCY = 10
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BASE_DELAY = 1.0         # Seconds before the first retry (doubled for each further retry)
+DEFAULT_MAX_DELAY = 30.0         # Max seconds between retries
+PROGRESS_INTERVAL = 10.0         # Seconds between progress reports
+
+
+class RateLimiter:
+    """Token bucket allowing `rate` acquisitions per second, with bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+@dataclass
+class BatchStats:
+    """Outcome of a batch run.
+
+    Attributes:
+        total: Items given to the runner
+        succeeded: Items processed successfully in this run
+        failed: Items that still failed after all retries
+        skipped: Items already completed by a previous run (from the checkpoint)
+        unfinished: Items the worker handled without finishing them (retried by the next run)
+        retries: Retries made
+        elapsed: Seconds the run took
+        results: Worker results by item key (successful items of this run)
+        errors: Last error message by item key (failed items)
+    """
+    total: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    skipped: int = 0
+    unfinished: int = 0
+    retries: int = 0
+    elapsed: float = 0.0
+    results: Dict[str, Any] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def throughput(self) -> float:
+        """Items processed per second."""
+        return (self.succeeded + self.failed) / self.elapsed if self.elapsed else 0.0
+
+
+class Checkpoint:
+    """Append-only JSON lines file recording the keys of completed items."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def load(self) -> Set[str]:
+        """Get the keys completed by previous runs."""
+        done = set()
+        if not os.path.exists(self.path):
+            return done
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A line cut short by a crash
+                    continue
+                if entry.get("status") == "done":
+                    done.add(entry["key"])
+        return done
+
+    def record(self, key: str, status: str, detail: Any = None) -> None:
+        if self._file is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._file = open(self.path, "a")
+        self._file.write(json.dumps({"key": key, "status": status, "detail": detail, "at": time.time()}, default=str) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self) -> None:
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class BatchRunner:
+    """Runs a worker over many items with bounded concurrency, rate limiting, retries and checkpoints."""
+
+    def __init__(
+        self,
+        name: str,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        rate: Optional[float] = None,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        base_delay: float = DEFAULT_BASE_DELAY,
+        max_delay: float = DEFAULT_MAX_DELAY,
+        retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+        checkpoint_path: Optional[str] = None,
+        progress_interval: float = PROGRESS_INTERVAL
+    ):
+        """Initialize the runner.
+
+        Args:
+            name: Job name, used in reports and for the default checkpoint file
+            concurrency: Max items processed at once
+            rate: Max worker calls per second (None for no limit)
+            max_retries: Retries per item after the first attempt
+            base_delay: Seconds before the first retry
+            max_delay: Max seconds between retries
+            retry_on: Exception types worth retrying; other exceptions fail the item at once
+            checkpoint_path: Checkpoint file (default: .<name>.checkpoint.jsonl; "" disables checkpoints)
+            progress_interval: Seconds between progress reports
+        """
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.rate_limiter = RateLimiter(rate) if rate else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_on = retry_on
+        self.checkpoint = Checkpoint(checkpoint_path if checkpoint_path is not None else f".{name}.checkpoint.jsonl") \
+            if checkpoint_path != "" else None
+        self.progress_interval = progress_interval
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix=name)
+
+    @classmethod
+    def from_args(cls, name: str, args: argparse.Namespace, **kwargs) -> "BatchRunner":
+        """Create a runner from the options added by add_runner_arguments."""
+        runner = cls(
+            name,
+            concurrency=args.concurrency,
+            rate=args.rate,
+            max_retries=args.max_retries,
+            checkpoint_path="" if args.no_checkpoint else args.checkpoint,
+            **kwargs
+        )
+        if args.restart and runner.checkpoint:
+            runner.checkpoint.remove()
+        return runner
+
+    async def run_blocking(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run a blocking call (e.g. an SDK request) in the runner's thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    async def run(
+        self,
+        items: Iterable[T],
+        key: Callable[[T], str],
+        worker: Union[Callable[[T], Awaitable[Any]], Callable[[T], Any]],
+        finished: Optional[Callable[[Any], bool]] = None
+    ) -> BatchStats:
+        """Process all items not completed by a previous run.
+
+        The checkpoint is removed when every item is finished, so it only
+        carries over to the next run after a crash, an interruption or failures.
+
+        Args:
+            items: Items to process
+            key: Stable unique key of an item, recorded in the checkpoint
+            worker: Called once per item (again on retries); an exception marks the attempt as failed
+            finished: Tells from a worker result whether the item is finished (default: always);
+                unfinished items count as succeeded but are not checkpointed as done
+
+        Returns:
+            Statistics of this run
+        """
+        items = list(items)
+        stats = BatchStats(total=len(items))
+        done = self.checkpoint.load() if self.checkpoint else set()
+        pending = [item for item in items if key(item) not in done]
+        stats.skipped = len(items) - len(pending)
+        if stats.skipped:
+            logger.info(f"[{self.name}] Resuming: {stats.skipped} of {len(items)} items already done")
+            print(f"[{self.name}] Resuming: skipping {stats.skipped} items completed by a previous run")
+
+        is_async = inspect.iscoroutinefunction(worker)
+        queue: asyncio.Queue = asyncio.Queue()
+        for item in pending:
+            queue.put_nowait(item)
+
+        async def call(item: T) -> Any:
+            if self.rate_limiter:
+                await self.rate_limiter.acquire()
+            if is_async:
+                return await worker(item)
+            return await self.run_blocking(worker, item)
+
+        async def process(item: T) -> None:
+            item_key = key(item)
+            for attempt in range(self.max_retries + 1):
+                try:
+                    result = await call(item)
+                except self.retry_on as e:
+                    if attempt < self.max_retries:
+                        stats.retries += 1
+                        # Full jitter keeps retries of concurrent failures from arriving together
+                        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                        logger.warning(f"[{self.name}] {item_key} failed ({type(e).__name__}: {e}), retrying in {delay:.1f}s")
+                        await asyncio.sleep(delay)
+                        continue
+                    self._fail(stats, item_key, e)
+                    return
+                except Exception as e:
+                    self._fail(stats, item_key, e)
+                    return
+                stats.succeeded += 1
+                stats.results[item_key] = result
+                is_finished = finished is None or finished(result)
+                if not is_finished:
+                    stats.unfinished += 1
+                if self.checkpoint:
+                    self.checkpoint.record(item_key, "done" if is_finished else "unfinished", result)
+                return
+
+        async def consume() -> None:
+            while True:
+                try:
+                    item = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await process(item)
+
+        started = time.monotonic()
+
+        async def report() -> None:
+            while True:
+                await asyncio.sleep(self.progress_interval)
+                stats.elapsed = time.monotonic() - started
+                self._report(stats, len(pending))
+
+        reporter = asyncio.create_task(report())
+        consumers = [asyncio.create_task(consume()) for _ in range(min(self.concurrency, len(pending)))]
+        try:
+            await asyncio.gather(*consumers)
+        finally:
+            # On Ctrl+C or a crash, stop all workers; the checkpoint has every completed item
+            for task in consumers:
+                task.cancel()
+            reporter.cancel()
+            if self.checkpoint:
+                self.checkpoint.close()
+            stats.elapsed = time.monotonic() - started
+
+        self._report(stats, len(pending))
+        logger.info(f"[{self.name}] Finished: {stats.succeeded} succeeded, {stats.failed} failed, "
+                    f"{stats.skipped} skipped, {stats.retries} retries in {stats.elapsed:.1f}s")
+        if self.checkpoint:
+            if stats.failed or stats.unfinished:
+                print(f"[{self.name}] Checkpoint kept at {self.checkpoint.path}: the next run retries "
+                      f"{stats.failed + stats.unfinished} items (use --restart to start over)")
+            else:
+                self.checkpoint.remove()
+        return stats
+
+    def _fail(self, stats: BatchStats, item_key: str, error: Exception) -> None:
+        stats.failed += 1
+        stats.errors[item_key] = f"{type(error).__name__}: {error}"
+        logger.error(f"[{self.name}] {item_key} failed: {stats.errors[item_key]}")
+        if self.checkpoint:
+            self.checkpoint.record(item_key, "failed", stats.errors[item_key])
+
+    def _report(self, stats: BatchStats, pending: int) -> None:
+        processed = stats.succeeded + stats.failed
+        remaining = pending - processed
+        eta = f", ETA {remaining / stats.throughput:.0f}s" if stats.throughput and remaining else ""
+        print(f"[{self.name}] {processed}/{pending} processed ({processed / pending * 100 if pending else 100:.1f}%), "
+              f"{stats.failed} failed, {stats.retries} retries, {stats.throughput:.1f} items/s{eta}")
+
+
+def add_runner_arguments(parser: argparse.ArgumentParser, concurrency: int = DEFAULT_CONCURRENCY,
+                         rate: Optional[float] = None) -> None:
+    """Add the batch runner options to a script's argument parser."""
+    group = parser.add_argument_group("batch execution")
+    group.add_argument('--concurrency', type=int, default=concurrency, help=f'Items processed at once (default: {concurrency})')
+    group.add_argument('--rate', type=float, default=rate, help='Max API calls per second (default: no limit)' if rate is None else f'Max API calls per second (default: {rate})')
+    group.add_argument('--max-retries', type=int, default=DEFAULT_MAX_RETRIES, help=f'Retries per item (default: {DEFAULT_MAX_RETRIES})')
+    group.add_argument('--checkpoint', help='Checkpoint file for resuming (default: .<job name>.checkpoint.jsonl)')
+    group.add_argument('--restart', action='store_true', help='Ignore the checkpoint of a previous run and start over')
+    group.add_argument('--no-checkpoint', action='store_true', help='Do not record or resume progress')
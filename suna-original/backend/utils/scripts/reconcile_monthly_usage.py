@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+"""
+Script to check the monthly usage counters used by billing against the raw agent runs.
+
+Usage:
+    python reconcile_monthly_usage.py [--month 2025-05] [--fix] [--tolerance 1]
+
+This script:
+1. Catches up usage of completed agent runs that were never added to their counter
+   (e.g. the instance running them crashed before its final update)
+2. Recomputes each account's agent run seconds for the month from the agent_runs table
+3. Reports the accounts whose counter drifted, and with --fix resets those counters
+
+Run it periodically (e.g. daily from cron) and after incidents.
+
+Make sure your environment variables are properly set:
+- SUPABASE_URL
+- SUPABASE_SERVICE_ROLE_KEY
+"""
+
+import asyncio
+import sys
+import argparse
+from datetime import datetime, timezone, date
+from dotenv import load_dotenv
+
+# Load script-specific environment variables
+load_dotenv(".env")
+
+from services.supabase import DBConnection
+from services.billing import reconcile_monthly_usage, record_agent_run_usage
+from utils.logger import logger
+
+# Completed runs fetched per page when catching up
+PAGE_SIZE = 1000
+
+
+def parse_month(value: str) -> date:
+    """Parse YYYY-MM into the first day of that month."""
+    try:
+        return datetime.strptime(value, "%Y-%m").date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid month '{value}', expected YYYY-MM")
+
+
+async def catch_up_completed_runs(client, month: date) -> int:
+    """
+    Add the unbilled time of the month's completed runs to their counters.
+
+    Returns:
+        Number of runs that were behind
+    """
+    next_month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+    caught_up = 0
+    offset = 0
+    while True:
+        result = await client.table('agent_runs') \
+            .select('id, started_at, completed_at, billed_seconds') \
+            .gte('started_at', month.isoformat()) \
+            .lt('started_at', next_month.isoformat()) \
+            .not_.is_('completed_at', 'null') \
+            .order('id') \
+            .range(offset, offset + PAGE_SIZE - 1) \
+            .execute()
+        runs = result.data or []
+        for run in runs:
+            started = datetime.fromisoformat(run['started_at'].replace('Z', '+00:00'))
+            completed = datetime.fromisoformat(run['completed_at'].replace('Z', '+00:00'))
+            if (completed - started).total_seconds() - float(run['billed_seconds'] or 0) > 1:
+                await record_agent_run_usage(client, run['id'])
+                caught_up += 1
+        if len(runs) < PAGE_SIZE:
+            return caught_up
+        offset += PAGE_SIZE
+
+
+async def main():
+    """Main function to run the script."""
+    now = datetime.now(timezone.utc)
+    parser = argparse.ArgumentParser(description='Reconcile monthly usage counters with the raw agent runs')
+    parser.add_argument('--month', type=parse_month, default=date(now.year, now.month, 1), help='Month to check (YYYY-MM, default: current month)')
+    parser.add_argument('--fix', action='store_true', help='Reset drifted counters to the recomputed usage')
+    parser.add_argument('--tolerance', type=float, default=1.0, help='Seconds of drift tolerated per account')
+    args = parser.parse_args()
+
+    logger.info(f"Reconciling monthly usage for {args.month:%Y-%m}")
+    db_connection = None
+    try:
+        db_connection = DBConnection()
+        client = await db_connection.client
+
+        caught_up = await catch_up_completed_runs(client, args.month)
+        print(f"Caught up {caught_up} completed runs missing from their counters")
+
+        drifted = await reconcile_monthly_usage(client, args.month, fix=args.fix, tolerance=args.tolerance)
+        for row in drifted:
+            counted, actual = float(row['counted_seconds']), float(row['actual_seconds'])
+            print(f"{row['account_id']}: counted {counted / 60:.1f} min, actual {actual / 60:.1f} min "
+                  f"(drift {(actual - counted) / 60:+.1f} min)")
+
+        print(f"\n{len(drifted)} accounts drifted by more than {args.tolerance}s"
+              f"{' and were fixed' if args.fix and drifted else ''}")
+        if drifted:
+            logger.warning(f"Monthly usage drift for {len(drifted)} accounts in {args.month:%Y-%m}"
+                           f"{' (fixed)' if args.fix else ''}")
+
+    except Exception as e:
+        logger.error(f"Error reconciling monthly usage: {str(e)}")
+        sys.exit(1)
+    finally:
+        # Clean up database connection
+        if db_connection:
+            await DBConnection.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
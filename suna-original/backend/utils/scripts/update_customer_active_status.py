@@ -3,12 +3,17 @@
 Script to check Stripe subscriptions for all customers and update their active status.
 
 Usage:
-    python update_customer_active_status.py
+    python update_customer_active_status.py [--concurrency 20] [--rate 50] [--restart]
 
 This script:
 1. Queries all customers from basejump.billing_customers
-2. Checks subscription status directly on Stripe using customer_id
-3. Updates customer active status in database
+2. Checks subscription status directly on Stripe using customer_id, several customers at a time
+   within a rate limit, retrying rate-limited and failed requests with backoff
+3. Updates customer active status in database where it changed
+4. Records checked customers in a checkpoint file, so rerunning after a crash or Ctrl+C
+   resumes where it stopped (--restart starts over)
+
+A customer whose Stripe check keeps failing is reported and left unchanged.
 
 Make sure your environment variables are properly set:
 - SUPABASE_URL
@@ -20,7 +25,9 @@ import asyncio
 import sys
 import os
 import time
-from typing import List, Dict, Any, Tuple
+import argparse
+import functools
+from typing import List, Dict, Any
 from dotenv import load_dotenv
 import stripe
 
@@ -31,13 +38,17 @@ load_dotenv(".env")
 from services.supabase import DBConnection
 from utils.logger import logger
 from utils.config import config
+from utils.scripts.batch_runner import BatchRunner, add_runner_arguments
 
 # Initialize Stripe with the API key
 stripe.api_key = config.STRIPE_SECRET_KEY
 
-# Batch size settings
-BATCH_SIZE = 100  # Process customers in batches
+# Batch execution settings
 MAX_CONCURRENCY = 20  # Maximum concurrent Stripe API calls
+MAX_RATE = 50  # Maximum Stripe API calls per second (Stripe allows 100 in live mode)
+
+# Stripe errors worth retrying; others (e.g. invalid requests) fail the customer at once
+RETRYABLE_ERRORS = (stripe.error.RateLimitError, stripe.error.APIConnectionError, stripe.error.APIError)
 
 # Global DB connection to reuse
 db_connection = None
@@ -73,163 +84,72 @@ async def get_all_customers() -> List[Dict[str, Any]]:
     
     return result.data
 
-async def check_stripe_subscription(customer_id: str) -> bool:
+def check_stripe_subscription(customer_id: str) -> bool:
     """
     Check if a customer has an active subscription directly on Stripe.
     
+    Blocking (Stripe SDK call); run it with runner.run_blocking.
+    
     Args:
         customer_id: Customer ID (billing_customers.id) which is the Stripe customer ID
     
     Returns:
         True if customer has at least one active subscription, False otherwise
+        
+    Raises:
+        stripe.error.StripeError: If Stripe could not be reached or rejected the request
     """
     if not customer_id:
         print(f"⚠️ Empty customer_id")
         return False
     
     try:
-        # Print what we're checking for debugging
-        print(f"Checking Stripe subscriptions for customer: {customer_id}")
-        
         # List all subscriptions for this customer directly on Stripe
         subscriptions = stripe.Subscription.list(
             customer=customer_id,
             status='active',  # Only get active subscriptions
             limit=1  # We only need to know if there's at least one
         )
-        
-        # Print the raw data for debugging
-        print(f"Stripe returned data: {subscriptions.data}")
-        
-        # If there's at least one active subscription, the customer is active
-        has_active_subscription = len(subscriptions.data) > 0
-        
-        if has_active_subscription:
-            print(f"✅ Customer {customer_id} has ACTIVE subscription")
-        else:
-            print(f"❌ Customer {customer_id} has NO active subscription")
-            
-        return has_active_subscription
-    
-    except Exception as e:
-        logger.error(f"Error checking Stripe subscription for customer {customer_id}: {str(e)}")
-        print(f"⚠️ Error checking subscription for {customer_id}: {str(e)}")
+    except stripe.error.InvalidRequestError as e:
+        if e.code != 'resource_missing':
+            raise
+        # The customer was deleted on Stripe
+        logger.warning(f"Stripe customer {customer_id} does not exist")
         return False
-
-async def process_customer_batch(batch: List[Dict[str, Any]], batch_number: int, total_batches: int) -> Dict[str, bool]:
-    """
-    Process a batch of customers by checking their Stripe subscriptions concurrently.
-    
-    Args:
-        batch: List of customer records in this batch
-        batch_number: Current batch number (for logging)
-        total_batches: Total number of batches (for logging)
-    
-    Returns:
-        Dictionary mapping customer IDs to subscription status (True/False)
-    """
-    start_time = time.time()
-    batch_size = len(batch)
-    print(f"Processing batch {batch_number}/{total_batches} ({batch_size} customers)...")
-    
-    # Create a semaphore to limit concurrency within the batch to avoid rate limiting
-    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
-    
-    async def check_single_customer(customer: Dict[str, Any]) -> Tuple[str, bool]:
-        async with semaphore:  # Limit concurrent API calls
-            customer_id = customer['id']
-            
-            # Check directly on Stripe - customer_id IS the Stripe customer ID
-            is_active = await check_stripe_subscription(customer_id)
-            return customer_id, is_active
-    
-    # Create tasks for all customers in this batch
-    tasks = [check_single_customer(customer) for customer in batch]
-    
-    # Run all tasks in this batch concurrently
-    results = await asyncio.gather(*tasks)
-    
-    # Convert results to dictionary
-    subscription_status = {customer_id: status for customer_id, status in results}
-    
-    end_time = time.time()
     
-    # Count active/inactive in this batch
-    active_count = sum(1 for status in subscription_status.values() if status)
-    inactive_count = batch_size - active_count
-    
-    print(f"Batch {batch_number} completed in {end_time - start_time:.2f} seconds")
-    print(f"Results (batch {batch_number}): {active_count} active, {inactive_count} inactive subscriptions")
-    
-    return subscription_status
+    # If there's at least one active subscription, the customer is active
+    return len(subscriptions.data) > 0
 
-async def update_customer_batch(subscription_status: Dict[str, bool]) -> Dict[str, int]:
+async def update_customer_status(customer: Dict[str, Any], runner: BatchRunner) -> Dict[str, Any]:
     """
-    Update a batch of customers in the database.
+    Check a customer's subscriptions on Stripe and update their active status if it changed.
     
     Args:
-        subscription_status: Dictionary mapping customer IDs to active status
+        customer: Customer record (id, active)
+        runner: Batch runner whose threads run the Stripe call
     
     Returns:
-        Dictionary with statistics about the update
+        The customer's status and whether it was updated
     """
-    start_time = time.time()
-    
-    global db_connection
-    if db_connection is None:
-        db_connection = DBConnection()
-    
-    client = await db_connection.client
-    
-    # Separate customers into active and inactive groups
-    active_customers = [cid for cid, status in subscription_status.items() if status]
-    inactive_customers = [cid for cid, status in subscription_status.items() if not status]
-    
-    total_count = len(active_customers) + len(inactive_customers)
-    
-    # Update statistics
-    stats = {
-        'total': total_count,
-        'active_updated': 0,
-        'inactive_updated': 0,
-        'errors': 0
-    }
-    
-    # Update active customers in a single operation
-    if active_customers:
-        try:
-            print(f"Updating {len(active_customers)} customers to ACTIVE status")
-            await client.schema('basejump').from_('billing_customers').update(
-                {'active': True}
-            ).in_('id', active_customers).execute()
-            
-            stats['active_updated'] = len(active_customers)
-            logger.info(f"Updated {len(active_customers)} customers to ACTIVE status")
-        except Exception as e:
-            logger.error(f"Error updating active customers: {str(e)}")
-            stats['errors'] += 1
-    
-    # Update inactive customers in a single operation
-    if inactive_customers:
-        try:
-            print(f"Updating {len(inactive_customers)} customers to INACTIVE status")
-            await client.schema('basejump').from_('billing_customers').update(
-                {'active': False}
-            ).in_('id', inactive_customers).execute()
-            
-            stats['inactive_updated'] = len(inactive_customers)
-            logger.info(f"Updated {len(inactive_customers)} customers to INACTIVE status")
-        except Exception as e:
-            logger.error(f"Error updating inactive customers: {str(e)}")
-            stats['errors'] += 1
+    customer_id = customer['id']
+    is_active = await runner.run_blocking(check_stripe_subscription, customer_id)
     
-    end_time = time.time()
-    print(f"Database updates completed in {end_time - start_time:.2f} seconds")
+    changed = customer.get('active') != is_active
+    if changed:
+        client = await db_connection.client
+        await client.schema('basejump').from_('billing_customers').update(
+            {'active': is_active}
+        ).eq('id', customer_id).execute()
+        logger.info(f"Updated customer {customer_id} to {'ACTIVE' if is_active else 'INACTIVE'} status")
     
-    return stats
+    return {'active': is_active, 'changed': changed}
 
 async def main():
     """Main function to run the script."""
+    parser = argparse.ArgumentParser(description='Update customer active status from their Stripe subscriptions')
+    add_runner_arguments(parser, concurrency=MAX_CONCURRENCY, rate=MAX_RATE)
+    args = parser.parse_args()
+    
     total_start_time = time.time()
     logger.info("Starting customer active status update process")
     
@@ -258,58 +178,37 @@ async def main():
         if len(all_customers) > 5:
             print(f"  ... and {len(all_customers) - 5} more")
         
-        # Split customers into batches
-        batches = [all_customers[i:i + BATCH_SIZE] for i in range(0, len(all_customers), BATCH_SIZE)]
-        total_batches = len(batches)
-        
         # Ask for confirmation before proceeding
-        confirm = input(f"\nProcess {len(all_customers)} customers in {total_batches} batches of {BATCH_SIZE}? (y/n): ")
+        confirm = input(f"\nProcess {len(all_customers)} customers ({args.concurrency} at a time"
+                        f"{f', max {args.rate:g}/s' if args.rate else ''})? (y/n): ")
         if confirm.lower() != 'y':
             logger.info("Operation cancelled by user")
             return
         
-        # Overall statistics
-        all_stats = {
-            'total': 0,
-            'active_updated': 0,
-            'inactive_updated': 0,
-            'errors': 0
-        }
-        
-        # Process each batch
-        for i, batch in enumerate(batches):
-            batch_number = i + 1
-            
-            # STEP 1: Process this batch of customers
-            subscription_status = await process_customer_batch(batch, batch_number, total_batches)
-            
-            # STEP 2: Update this batch in the database
-            batch_stats = await update_customer_batch(subscription_status)
-            
-            # Accumulate statistics
-            all_stats['total'] += batch_stats['total']
-            all_stats['active_updated'] += batch_stats['active_updated']
-            all_stats['inactive_updated'] += batch_stats['inactive_updated']
-            all_stats['errors'] += batch_stats['errors']
-            
-            # Show batch completion
-            print(f"Completed batch {batch_number}/{total_batches}")
-            
-            # Brief pause between batches to avoid Stripe rate limiting
-            if batch_number < total_batches:
-                await asyncio.sleep(1)  # 1 second pause between batches
+        runner = BatchRunner.from_args("update_customer_active_status", args, retry_on=RETRYABLE_ERRORS)
+        stats = await runner.run(
+            all_customers,
+            key=lambda customer: customer['id'],
+            worker=functools.partial(update_customer_status, runner=runner)
+        )
         
         # Print summary
         total_end_time = time.time()
         total_time = total_end_time - total_start_time
+        results = list(stats.results.values())
         
         print("\nCustomer Status Update Summary:")
-        print(f"Total customers processed: {all_stats['total']}")
-        print(f"Customers set to active: {all_stats['active_updated']}")
-        print(f"Customers set to inactive: {all_stats['inactive_updated']}")
-        if all_stats['errors'] > 0:
-            print(f"Update errors: {all_stats['errors']}")
-        print(f"Total processing time: {total_time:.2f} seconds")
+        print(f"Total customers processed: {stats.succeeded + stats.failed}")
+        if stats.skipped:
+            print(f"Already processed by a previous run: {stats.skipped}")
+        print(f"Active customers: {sum(1 for r in results if r['active'])}")
+        print(f"Customers set to active: {sum(1 for r in results if r['changed'] and r['active'])}")
+        print(f"Customers set to inactive: {sum(1 for r in results if r['changed'] and not r['active'])}")
+        if stats.failed > 0:
+            print(f"Failed (status unchanged): {stats.failed}")
+            for customer_id, error in stats.errors.items():
+                print(f"  - {customer_id}: {error}")
+        print(f"Total processing time: {total_time:.2f} seconds ({stats.throughput:.1f} customers/s, {stats.retries} retries)")
         
         logger.info(f"Customer active status update completed in {total_time:.2f} seconds")
             
@@ -0,0 +1,60 @@
+"""
+One load per key shared by concurrent callers.
+
+Caches use this on a miss so that concurrent callers for the same key wait for
+one load instead of each making their own. A failed load fails every caller.
+When the caller that started a load is cancelled, the load stops and one of
+the waiting callers starts it again; the others wait for that one.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Loads in progress, by key."""
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    async def do(self, key: Hashable, load: Callable[[], Awaitable[T]]) -> T:
+        """Run `load`, or wait for the load of `key` already in progress.
+
+        Args:
+            key: What is loaded
+            load: Starts the load; only called when no load of `key` is in progress
+
+        Returns:
+            The result of the load
+        """
+        inflight = self._inflight.get(key)
+        while inflight is not None:
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # The caller that started the load was cancelled, not this one: take over
+                if not inflight.cancelled() or asyncio.current_task().cancelling():
+                    raise
+            inflight = self._inflight.get(key)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await load()
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            # Cancelled: release the waiters instead of leaving them hanging
+            if not future.done():
+                future.cancel()
+            del self._inflight[key]
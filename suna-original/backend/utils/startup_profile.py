@@ -0,0 +1,113 @@
+"""
+Startup profiling for the backend API process.
+
+Imports the API module in a fresh interpreter with `-X importtime`, then prints
+the slowest imports as a tree. With a budget, it exits non-zero when startup is
+slower than allowed, so the check can run in CI to catch heavy imports creeping
+back into the startup path.
+
+Usage:
+    python api.py --profile-startup [--budget SECONDS] [--depth N] [--min-ms MS]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@dataclass
+class ImportNode:
+    """A module import with its self and cumulative time in microseconds."""
+    name: str
+    self_us: int
+    cumulative_us: int
+    children: List["ImportNode"] = field(default_factory=list)
+
+
+def parse_importtime(output: str) -> List[ImportNode]:
+    """Build the import tree from `-X importtime` output.
+
+    Python reports imports in post-order: a module's line follows the lines of
+    the modules it imported, indented one level deeper.
+
+    Args:
+        output: stderr of a `python -X importtime` run
+
+    Returns:
+        The top-level imports
+    """
+    pending = {}  # depth -> nodes waiting for their parent
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        stripped = name.lstrip(" ")
+        depth = (len(name) - len(stripped) - 1) // 2
+        node = ImportNode(stripped, int(self_us), int(cumulative_us))
+        node.children = pending.pop(depth + 1, [])
+        pending.setdefault(depth, []).append(node)
+    return pending.get(0, [])
+
+
+def print_tree(nodes: List[ImportNode], max_depth: int, min_us: int, depth: int = 0) -> None:
+    """Print imports slower than `min_us`, slowest first."""
+    for node in sorted(nodes, key=lambda n: n.cumulative_us, reverse=True):
+        if node.cumulative_us < min_us:
+            break
+        print(f"{node.cumulative_us / 1000:9.1f}ms {node.self_us / 1000:8.1f}ms  {'  ' * depth}{node.name}")
+        if depth + 1 < max_depth:
+            print_tree(node.children, max_depth, min_us, depth + 1)
+
+
+def profile_startup(module: str = "api") -> Tuple[float, List[ImportNode]]:
+    """Import `module` in a fresh interpreter and measure it.
+
+    Returns:
+        Tuple of (wall-clock import time in seconds, top-level import nodes)
+    """
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    return elapsed, parse_importtime(result.stderr)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the startup profiler from the command line.
+
+    Returns:
+        Process exit code: 1 if the startup budget was exceeded
+    """
+    parser = argparse.ArgumentParser(description="Profile backend API import time")
+    parser.add_argument("--module", default="api", help="Module to import (default: api)")
+    parser.add_argument("--budget", type=float, default=float(os.getenv("STARTUP_BUDGET_SECONDS", "0")),
+                        help="Fail if startup takes longer than this many seconds (0 disables)")
+    parser.add_argument("--depth", type=int, default=4, help="Maximum tree depth to print")
+    parser.add_argument("--min-ms", type=float, default=20.0, help="Hide imports faster than this")
+    args = parser.parse_args(argv)
+
+    elapsed, roots = profile_startup(args.module)
+    imported_us = sum(node.cumulative_us for node in roots)
+
+    print(f"{'cumulative':>11} {'self':>10}  module")
+    print_tree(roots, args.depth, int(args.min_ms * 1000))
+    print(f"\nImport time: {imported_us / 1_000_000:.2f}s, process startup: {elapsed:.2f}s")
+
+    if args.budget and elapsed > args.budget:
+        print(f"Startup budget exceeded: {elapsed:.2f}s > {args.budget:.2f}s")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
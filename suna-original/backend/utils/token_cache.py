@@ -0,0 +1,246 @@
+"""
+Cache of verified authentication tokens.
+
+Every API request and every SSE (re)connect authenticates its bearer token. In
+LOCAL mode this reads the user from SQLite, otherwise it decodes the Supabase
+JWT, and a burst of stream reconnects repeats that work for the same few tokens.
+The cache keeps, per process:
+
+- token -> principal (user ID or user record), until the token expires or at
+  most MAX_TTL seconds
+- token -> invalid, for NEGATIVE_TTL seconds, so retries with a bad token are
+  rejected without being verified again
+
+Tokens are keyed by their SHA-256, so raw tokens are not kept in memory. When a
+session is deleted, call `revoke` (or `revoke_user`) so its token stops working
+immediately instead of when its entry expires.
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+
+# Constants
+MAX_ENTRIES = 10000         # Tokens kept before evicting the least recently used
+MAX_TTL = 300               # Max seconds a verified token is trusted without re-verification
+NEGATIVE_TTL = 30           # Seconds an invalid token is remembered
+PURGE_INTERVAL = 60         # Min seconds between sweeps of expired entries when the cache is full
+
+# Returned by `get` when the token is not cached (None means "cached as invalid")
+MISS = object()
+
+
+class TokenCache:
+    """Bounded LRU of verified tokens with expiry-aware eviction and revocation."""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_ttl: float = MAX_TTL, negative_ttl: float = NEGATIVE_TTL):
+        """Initialize the cache.
+
+        Args:
+            max_entries: Max cached tokens, valid and invalid
+            max_ttl: Max seconds a verified token is cached
+            negative_ttl: Seconds an invalid token is cached
+        """
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self.negative_ttl = negative_ttl
+        # key -> (expires at (monotonic), principal or None, user ID)
+        self._entries: "OrderedDict[bytes, Tuple[float, Any, Optional[str]]]" = OrderedDict()
+        self._by_user: Dict[str, Set[bytes]] = {}
+        self._scopes: Set[str] = set()
+        self._last_purge = 0.0
+        self.stats = {"hits": 0, "negative_hits": 0, "misses": 0, "evictions": 0, "expirations": 0,
+                      "revocations": 0}
+
+    @staticmethod
+    def _key(token: str, scope: str) -> bytes:
+        return hashlib.sha256(f"{scope}:{token}".encode()).digest()
+
+    def get(self, token: str, scope: str = "default") -> Any:
+        """Look up a token.
+
+        Args:
+            token: Bearer token
+            scope: Namespace of the verifier that cached the token
+
+        Returns:
+            The cached principal, None if the token is cached as invalid, or MISS
+        """
+        key = self._key(token, scope)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return MISS
+        expires, principal, _ = entry
+        if expires < time.monotonic():
+            self._remove(key)
+            self.stats["expirations"] += 1
+            self.stats["misses"] += 1
+            return MISS
+        self._entries.move_to_end(key)
+        self.stats["hits" if principal is not None else "negative_hits"] += 1
+        return principal
+
+    def set(self, token: str, principal: Any, user_id: Optional[str] = None,
+            expires_at: Optional[float] = None, scope: str = "default") -> None:
+        """Cache a verified token.
+
+        Args:
+            token: Bearer token
+            principal: What the token resolves to (e.g. a user ID or user record)
+            user_id: User the token belongs to, for `revoke_user`
+            expires_at: Token expiry as a Unix timestamp (e.g. the JWT `exp` claim)
+            scope: Namespace of the verifier
+        """
+        ttl = self.max_ttl
+        if expires_at is not None:
+            ttl = min(ttl, expires_at - time.time())
+        if ttl <= 0:
+            return
+        self._scopes.add(scope)
+        self._put(self._key(token, scope), principal, user_id, ttl)
+
+    def set_invalid(self, token: str, scope: str = "default") -> None:
+        """Remember that a token failed verification."""
+        self._scopes.add(scope)
+        self._put(self._key(token, scope), None, None, self.negative_ttl)
+
+    def _put(self, key: bytes, principal: Any, user_id: Optional[str], ttl: float) -> None:
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + ttl, principal, user_id)
+        if user_id is not None:
+            self._by_user.setdefault(user_id, set()).add(key)
+        if len(self._entries) > self.max_entries:
+            self._evict()
+
+    def _evict(self) -> None:
+        """Make room by dropping expired entries first, then the least recently used."""
+        now = time.monotonic()
+        if now - self._last_purge >= PURGE_INTERVAL:
+            self._last_purge = now
+            expired = [key for key, (expires, _, _) in self._entries.items() if expires < now]
+            for key in expired:
+                self._remove(key)
+            self.stats["expirations"] += len(expired)
+        while len(self._entries) > self.max_entries:
+            key = next(iter(self._entries))
+            self._remove(key)
+            self.stats["evictions"] += 1
+
+    def _remove(self, key: bytes) -> None:
+        _, _, user_id = self._entries.pop(key)
+        if user_id is not None:
+            keys = self._by_user.get(user_id)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._by_user[user_id]
+
+    # --- Revocation hooks ---
+
+    def revoke(self, token: str, scope: Optional[str] = None) -> None:
+        """Forget a token (e.g. its session was deleted).
+
+        Args:
+            token: Bearer token
+            scope: Only forget the token in this namespace (default: all namespaces)
+        """
+        for key in [self._key(token, s) for s in ([scope] if scope is not None else self._scopes)]:
+            if key in self._entries:
+                self._remove(key)
+        self.stats["revocations"] += 1
+
+    def revoke_user(self, user_id: str) -> None:
+        """Forget every token of a user (e.g. all their sessions were deleted)."""
+        for key in list(self._by_user.get(user_id, ())):
+            self._remove(key)
+        self.stats["revocations"] += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_user.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache metrics, including the hit rate."""
+        lookups = self.stats["hits"] + self.stats["negative_hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "size": len(self._entries),
+            "hit_rate": (self.stats["hits"] + self.stats["negative_hits"]) / lookups if lookups else 0.0,
+        }
+
+
+# Process-wide cache
+token_cache = TokenCache()
+
+
+if __name__ == "__main__":
+    import argparse
+    import random
+    import sqlite3
+    import statistics
+
+    import jwt
+
+    parser = argparse.ArgumentParser(description="Benchmark auth overhead per request with and without the token cache")
+    parser.add_argument("--requests", type=int, default=50000, help="Authenticated requests to simulate")
+    parser.add_argument("--users", type=int, default=50, help="Distinct users (one token each)")
+    parser.add_argument("--invalid-ratio", type=float, default=0.05, help="Share of requests with an invalid token")
+    args = parser.parse_args()
+
+    # Tokens as issued by Supabase and by the local auth service, plus a SQLite users table
+    secret = "benchmark-secret-at-least-32-bytes-long"
+    tokens = [jwt.encode({"sub": f"user-{i}", "user_id": f"user-{i}", "exp": int(time.time()) + 3600}, secret,
+                         algorithm="HS256") for i in range(args.users)]
+    users_db = sqlite3.connect(":memory:")
+    users_db.row_factory = sqlite3.Row
+    users_db.execute("CREATE TABLE users (id TEXT PRIMARY KEY, email TEXT, created_at TEXT)")
+    users_db.executemany("INSERT INTO users VALUES (?, ?, datetime('now'))",
+                         [(f"user-{i}", f"user-{i}@example.com") for i in range(args.users)])
+
+    # SSE reconnect storms: a few active tokens account for most requests
+    rng = random.Random(0)
+    weights = [1 / (rank + 1) for rank in range(args.users)]
+    workload = [
+        f"invalid-{rng.randrange(100)}" if rng.random() < args.invalid_ratio else rng.choices(tokens, weights)[0]
+        for _ in range(args.requests)
+    ]
+
+    def verify_supabase(token: str) -> Optional[str]:
+        try:
+            return jwt.decode(token, options={"verify_signature": False}).get("sub")
+        except jwt.PyJWTError:
+            return None
+
+    def verify_local(token: str) -> Optional[Dict[str, Any]]:
+        try:
+            payload = jwt.decode(token, secret, algorithms=["HS256"])
+        except jwt.PyJWTError:
+            return None
+        row = users_db.execute("SELECT * FROM users WHERE id = ?", (payload["user_id"],)).fetchone()
+        return dict(row) if row else None
+
+    def run(verify, cache: Optional[TokenCache]) -> Tuple[float, float]:
+        timings = []
+        for token in workload:
+            start = time.perf_counter()
+            principal = cache.get(token) if cache else MISS
+            if principal is MISS:
+                principal = verify(token)
+                if cache is not None:
+                    if principal is None:
+                        cache.set_invalid(token)
+                    else:
+                        cache.set(token, principal)
+            timings.append(time.perf_counter() - start)
+        return statistics.mean(timings) * 1e6, statistics.quantiles(timings, n=100)[98] * 1e6
+
+    for name, verify in (("supabase jwt decode", verify_supabase), ("local jwt + sqlite user", verify_local)):
+        mean_uncached, p99_uncached = run(verify, None)
+        cache = TokenCache()
+        mean_cached, p99_cached = run(verify, cache)
+        print(f"{name}: uncached {mean_uncached:.1f}us/request (p99 {p99_uncached:.1f}us), "
+              f"cached {mean_cached:.1f}us/request (p99 {p99_cached:.1f}us), "
+              f"hit rate {cache.get_stats()['hit_rate']:.1%}")